@@ -23,84 +23,18 @@ from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
 
 from config import config
+from utils.static_assets import StaticAssetIndex
 
 # ============================================================================
-# 导入路由蓝图（按功能模块分组）
+# 路由蓝图声明（按功能组延迟加载，见 routes/registry.py）
 # ============================================================================
-# 文档转换模块
-from routes.document_convert.document_routes import document_bp
-from routes.document_convert.excel2word_routes import excel2word_bp
-from routes.document_convert.markdown_upload_routes import markdown_upload_bp
-from routes.document_convert.word_to_md_routes import word_to_md_bp
-from routes.document_convert.cosmic_routes import cosmic_bp
-from routes.document_convert.es_to_excel_routes import es_to_excel_bp
-from routes.document_convert.es_field_mapping_routes import es_field_mapping_bp
-from routes.document_convert.clean_event_routes import clean_event_bp
-from routes.document_convert.watermark_routes import watermark_bp
-
-# 排班管理模块
-from routes.schedule.schedule_config_routes import schedule_config_bp
-
-# Kafka 模块
-from routes.kafka.kafka_routes import kafka_bp
-from routes.kafka.kafka_generator_routes import kafka_generator_bp
-
-# FPA 功能点估算模块
-from routes.fpa.sql_routes import sql_bp
-from routes.fpa.event_routes import event_bp
-from routes.fpa.fpa_generator_routes import fpa_generator_bp
-# 导入异步路由模块（只注册路由，不导入函数，避免循环依赖）
-from routes.fpa import fpa_async_routes
-from routes.fpa.adjustment_routes import adjustment_bp
-from routes.fpa.adjustment_calc_routes import adjustment_calc_bp
-from routes.fpa.fpa_category_rules_routes import fpa_rules_bp
-from routes.fpa.category_routes import category_bp
-
-# 认证模块
-from routes.auth.auth_routes import auth_bp
-
-# 智能客服模块
-from routes.chat.chatbot_routes import chatbot_bp
-
-# Word 转 Excel 模块
-from routes.word_to_excel.word_to_excel_routes import word_to_excel_bp
-
-# 在线表格模块
-from routes.spreadsheet.spreadsheet_routes import spreadsheet_bp
-
-# 钉钉推送模块
-from routes.dingtalk_push import dingtalk_push_bp
-
-# Swagger API 文档
-from routes.swagger_config import swagger_bp
-
-# SQL 智能生成器
-from routes.tools.sql_generator_routes import sql_generator_bp
-
-# 部署配置管理
-from routes.deploy.deploy_config_routes import deploy_config_bp
-
-# JSON对比工具
-from routes.diff.diff_routes import diff_bp
-
-# 内容转 Excel 工具
-from routes.document_convert.content_to_excel_routes import content_to_excel_bp
-
-# 户型设计模块
-from routes.house_design.house_design_routes import house_design_bp
-
-# CityColor 颜色提取模块（MySQL 持久化）
-from routes.city_color.city_color_routes import city_color_bp, init_city_color
-
-# 彩色抽奖转盘模块
-from routes.wheel_lottery.wheel_lottery_routes import wheel_lottery_bp, init_wheel_config
-
-# 画作与诗集鉴赏模块
-from routes.gallery import gallery_bp
+from routes.registry import BLUEPRINT_SPECS, GROUP_DINGTALK_PUSH, GROUP_SCHEDULE
+from utils.lazy_blueprints import LazyBlueprintRegistry, format_profile_report
 
 # 工具类
 from utils.ollama_client import init_ollama_service, check_omlx_connectivity
 from utils.cleanup_thread import CleanupThread
+from utils.llm_admission_config import LLMAdmissionConfigThread
 from models.fpa_category_rules import db as fpa_db
 from models.visit_log import VisitLog
 
@@ -243,113 +177,17 @@ def create_app(config_name='development'):
             app_logger.error(f"创建数据库表失败：{e}")
     
     # ==========================================================================
-    # 注册蓝图（按功能模块分类）
+    # 注册蓝图（按功能组延迟加载，模块在首个命中请求时导入）
     # ==========================================================================
-    blueprints = [
-        # 文档转换模块（蓝图已定义前缀）
-        document_bp,  # 文档转换主路由（包含 excel-to-cosmic）
-        excel2word_bp,
-        markdown_upload_bp,
-        word_to_md_bp,
-        cosmic_bp,  # 表格转 COSMIC
-        es_to_excel_bp,  # ES 查询结果转 Excel
-        es_field_mapping_bp,  # ES 字段映射管理
-        clean_event_bp,  # 事件数据清洗
-        watermark_bp,  # 图片水印清除
-            
-        # 排班管理模块（蓝图已定义前缀）
-        schedule_config_bp,
-            
-        # Kafka 模块（蓝图已定义前缀）
-        # kafka_bp,  # 已注释，使用 kafka_generator_bp
-        kafka_generator_bp,
-            
-        # FPA 模块（蓝图已定义前缀）
-        sql_bp,
-        event_bp,
-        fpa_generator_bp,
-        adjustment_bp,
-        adjustment_calc_bp,
-        fpa_rules_bp,
-        category_bp,
-            
-        # 认证模块（蓝图已定义前缀）
-        auth_bp,
-            
-        # 智能客服模块（蓝图已定义前缀）
-        chatbot_bp,
-        
-        # Word 转 Excel 模块（蓝图已定义前缀）
-        word_to_excel_bp,
-        
-        # 在线表格模块（蓝图已定义前缀）
-        spreadsheet_bp,
-        
-        # 钉钉推送模块（蓝图已定义前缀）
-        dingtalk_push_bp,
-        
-        # SQL 智能生成器
-        sql_generator_bp,
-        
-        # 部署配置管理
-        deploy_config_bp,
-        
-        # JSON对比工具
-        diff_bp,
-
-        # 内容转 Excel 工具
-        content_to_excel_bp,
-
-        # 户型设计模块
-        house_design_bp,
-
-        # CityColor 颜色提取模块（MySQL 持久化）
-        city_color_bp,
-
-        # 彩色抽奖转盘模块
-        wheel_lottery_bp,
-
-        # 画作与诗集鉴赏模块
-        gallery_bp,
-
-        # Swagger API 文档
-        swagger_bp,
-    ]
-        
-    for blueprint in blueprints:
-        app.register_blueprint(blueprint)
-    
-    # ==========================================================================
-    # 初始化 ES 字段映射
-    # ==========================================================================
-    from routes.document_convert.es_to_excel_routes import init_field_mapping
-    try:
-        init_field_mapping(app)
-        app_logger.info("✅ ES 字段映射初始化完成")
-    except Exception as e:
-        app_logger.error(f"⚠️  ES 字段映射初始化失败: {e}")
-
-    # ==========================================================================
-    # 初始化内容转Excel模块（创建数据库表）
-    # ==========================================================================
-    from routes.document_convert.content_to_excel_routes import init_content_to_excel
-    try:
-        init_content_to_excel(app)
-        app_logger.info("✅ 内容转Excel模块初始化完成")
-    except Exception as e:
-        app_logger.error(f"⚠️  内容转Excel模块初始化失败: {e}")
-    
-    try:
-        init_city_color(app)
-        app_logger.info("✅ CityColor 模块初始化完成")
-    except Exception as e:
-        app_logger.error(f"⚠️  CityColor 模块初始化失败: {e}")
-
-    try:
-        init_wheel_config(app)
-        app_logger.info("✅ 转盘抽奖模块初始化完成")
-    except Exception as e:
-        app_logger.error(f"⚠️  转盘抽奖模块初始化失败: {e}")
+    blueprint_registry = LazyBlueprintRegistry(BLUEPRINT_SPECS)
+    blueprint_registry.init_app(
+        app,
+        enabled_groups=app.config['FEATURE_GROUPS'],
+        lazy=app.config['LAZY_BLUEPRINTS'],
+        warmup=app.config['BLUEPRINT_WARMUP'],
+    )
+    if blueprint_registry.profile_report():
+        app_logger.info("蓝图导入耗时：\n" + format_profile_report(blueprint_registry.profile_report()))
 
     # ==========================================================================
     # 注册中间件
@@ -427,6 +265,12 @@ def create_app(config_name='development'):
     cleanup_thread = CleanupThread(app)
     cleanup_thread.start()
     
+    # ==========================================================================
+    # 大模型准入控制参数跟随部署配置（启动时加载，之后定时检查）
+    # ==========================================================================
+    app.llm_admission_config = LLMAdmissionConfigThread(app)
+    app.llm_admission_config.start()
+    
     # ==========================================================================
     # 启动钉钉定时推送服务
     # ==========================================================================
@@ -444,18 +288,23 @@ def create_app(config_name='development'):
         except Exception as e:
             app_logger.error(f"❌ 钉钉定时推送服务启动失败: {e}")
     
-    # 启动后台线程
-    dingtalk_thread = threading.Thread(target=init_dingtalk_pusher, daemon=True)
-    dingtalk_thread.start()
-    app_logger.info("📡 钉钉定时推送服务初始化线程已启动")
+    # 启动后台线程（排班功能组未启用的进程不启动）
+    if blueprint_registry.is_enabled(GROUP_SCHEDULE):
+        dingtalk_thread = threading.Thread(target=init_dingtalk_pusher, daemon=True)
+        dingtalk_thread.start()
+        app_logger.info("📡 钉钉定时推送服务初始化线程已启动")
     
     # ==========================================================================
-    # 启动钉钉智能推送系统调度器
+    # 启动钉钉智能推送系统调度器（钉钉推送功能组未启用的进程不启动）
     # ==========================================================================
-    from utils.dingtalk_push_scheduler import push_scheduler
-    push_scheduler.init_app(app)
-    app.push_scheduler = push_scheduler
-    app_logger.info("✅ 钉钉智能推送系统调度器已启动")
+    app.push_scheduler = None
+    if blueprint_registry.is_enabled(GROUP_DINGTALK_PUSH):
+        from utils.dingtalk_push_scheduler import push_scheduler
+        from utils.dingtalk_push_stats import init_table as init_push_stats_table
+        init_push_stats_table()
+        push_scheduler.init_app(app)
+        app.push_scheduler = push_scheduler
+        app_logger.info("✅ 钉钉智能推送系统调度器已启动")
     
     return app
 
@@ -488,6 +337,21 @@ app = create_app('development')
 #     return render_template('index.html', demo_exists=demo_exists, user=user_info)
 
 
+# ============================================================================
+# 前端构建产物索引（首次请求时建立，重新构建后自动重建；.br/.gz 在构建后预压缩）
+# ============================================================================
+FRONTEND_DIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'dist')
+frontend_assets = StaticAssetIndex(FRONTEND_DIST)
+
+
+def send_spa_index():
+    """返回前端 index.html（ETag 校验，不长缓存），未构建时返回 404"""
+    response = frontend_assets.send('index.html', request)
+    if response is None:
+        return jsonify({'error': 'Frontend not built'}), 404
+    return response
+
+
 # ============================================================================
 # Vue 应用路由 - Catch-all for SPA
 # ============================================================================
@@ -496,11 +360,7 @@ def index():
     """
     前端应用入口（SPA）
     """
-    if os.path.exists(FRONTEND_DIST):
-        index_html = os.path.join(FRONTEND_DIST, 'index.html')
-        if os.path.exists(index_html):
-            return send_from_directory(FRONTEND_DIST, 'index.html')
-    return jsonify({'error': 'Frontend not built'}), 404
+    return send_spa_index()
 
 # ============================================================================
 # 户型设计 - Vue SPA 入口（精确匹配 /house-design，不拦截 API）
@@ -508,29 +368,17 @@ def index():
 @app.route('/house-design')
 def house_design_spa():
     """户型设计页面 - 返回 Vue SPA HTML"""
-    if os.path.exists(FRONTEND_DIST):
-        index_html = os.path.join(FRONTEND_DIST, 'index.html')
-        if os.path.exists(index_html):
-            return send_from_directory(FRONTEND_DIST, 'index.html')
-    return jsonify({'error': 'Frontend not built'}), 404
+    return send_spa_index()
 
 @app.route('/city-color')
 def city_color_spa():
     """CityColor 页面 - 返回 Vue SPA HTML"""
-    if os.path.exists(FRONTEND_DIST):
-        index_html = os.path.join(FRONTEND_DIST, 'index.html')
-        if os.path.exists(index_html):
-            return send_from_directory(FRONTEND_DIST, 'index.html')
-    return jsonify({'error': 'Frontend not built'}), 404
+    return send_spa_index()
 
 @app.route('/wheel-lottery')
 def wheel_lottery_spa():
     """彩色抽奖转盘页面 - 返回 Vue SPA HTML"""
-    if os.path.exists(FRONTEND_DIST):
-        index_html = os.path.join(FRONTEND_DIST, 'index.html')
-        if os.path.exists(index_html):
-            return send_from_directory(FRONTEND_DIST, 'index.html')
-    return jsonify({'error': 'Frontend not built'}), 404
+    return send_spa_index()
 
 @app.route('/vue')
 @app.route('/vue/<path:path>')
@@ -555,23 +403,24 @@ def uploaded_file(filename):
 @app.after_request
 def add_cache_control_headers(response):
     """
-    为静态资源添加缓存控制头，防止浏览器缓存构建产物
+    为静态资源添加缓存控制头，防止浏览器使用过期的构建产物
+
+    构建目录索引中的文件已由 StaticAssetIndex 设置缓存策略（哈希文件 immutable，
+    其余 no-cache + ETag），这里不再覆盖
     """
-    # 对 JS/CSS 等构建产物禁用缓存
+    if frontend_assets.lookup(request.path) is not None:
+        return response
+    # 其他 JS/CSS 每次向服务端校验（保留 ETag，允许 304）
     if request.path.startswith('/assets/') or \
        request.path.endswith('.js') or \
        request.path.endswith('.css'):
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
+        response.headers['Cache-Control'] = 'no-cache, must-revalidate'
     return response
 
 
 # ============================================================================
 # Vue SPA Fallback - 必须在最后注册
 # ============================================================================
-FRONTEND_DIST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'dist')
-
 @app.errorhandler(404)
 def handle_404(error):
     """
@@ -608,18 +457,20 @@ def handle_404(error):
        request.path.endswith('.jpg') or \
        request.path.endswith('.svg') or \
        request.path.endswith('.ico'):
-        # 尝试从前端构建目录提供静态文件
-        if os.path.exists(FRONTEND_DIST):
-            file_path = os.path.join(FRONTEND_DIST, request.path.lstrip('/'))
-            if os.path.exists(file_path) and os.path.isfile(file_path):
-                return send_from_directory(FRONTEND_DIST, request.path.lstrip('/'))
+        # 从前端构建目录索引提供静态文件（不再逐次检查磁盘）
+        response = frontend_assets.send(request.path, request)
+        if response is not None:
+            return response
         return jsonify({'error': 'Static file not found', 'path': request.path}), 404
     
+    # 构建目录根下的其他文件（如 robots.txt）
+    response = frontend_assets.send(request.path, request)
+    if response is not None:
+        return response
+    
     # 如果是前端路由，返回 index.html（让 Vue Router 处理）
-    if os.path.exists(FRONTEND_DIST):
-        index_html = os.path.join(FRONTEND_DIST, 'index.html')
-        if os.path.exists(index_html):
-            return send_from_directory(FRONTEND_DIST, 'index.html')
+    if 'index.html' in frontend_assets:
+        return send_spa_index()
     
     # 默认 404 响应
     return jsonify({'error': 'Not found'}), 404
@@ -26,6 +26,14 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{FPA_RULES_DB}?charset={MYSQL_CHARSET}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False  # 设为 True 可打印 SQL 语句
+    
+    # 蓝图加载配置（功能组名称见 routes/registry.py）
+    # FEATURE_GROUPS: 本进程启用的功能组，逗号分隔，空值表示全部启用（如只跑智能客服：chatbot,auth）
+    FEATURE_GROUPS = os.getenv('FEATURE_GROUPS', '')
+    # LAZY_BLUEPRINTS: 蓝图模块在首个命中请求时才导入；设为 0 恢复启动时全部导入
+    LAZY_BLUEPRINTS = os.getenv('LAZY_BLUEPRINTS', '1') != '0'
+    # BLUEPRINT_WARMUP: 延迟模式下启动时即导入的功能组
+    BLUEPRINT_WARMUP = os.getenv('BLUEPRINT_WARMUP', 'auth')
 
 
 class DevelopmentConfig(Config):
@@ -5,9 +5,25 @@ import hashlib
 import secrets
 import sqlite3
 import os
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 
+# 会话有效期
+SESSION_LIFETIME = timedelta(hours=24)
+
+# 会话校验缓存：条目上限与存活时间（秒）。TTL 兜底其他进程对 users.db 的修改
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv('SESSION_CACHE_MAX_ENTRIES', '10000'))
+SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', '60'))
+
+# 过期会话清理间隔（秒）
+SESSION_PURGE_INTERVAL = int(os.getenv('SESSION_PURGE_INTERVAL', '3600'))
+
+# SQLite 写锁等待时间（毫秒）
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
 
 def _hash_password(password: str, salt: str = None) -> tuple:
     """密码哈希处理（全局工具函数）"""
@@ -43,6 +59,7 @@ class DatabaseManager:
     
     def __init__(self, db_path: str = 'users.db'):
         self.db_path = db_path
+        self._local = threading.local()
         self.init_database()
     
     def init_database(self):
@@ -50,6 +67,9 @@ class DatabaseManager:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # WAL 模式（持久化在库文件中）：读写互不阻塞，会话写入不再与校验争锁
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # 用户表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -113,6 +133,20 @@ class DatabaseManager:
         """获取数据库连接"""
         return sqlite3.connect(self.db_path)
     
+    def get_thread_connection(self):
+        """
+        获取当前线程复用的数据库连接（调用方不要 close）
+        
+        会话校验等高频路径使用，避免每次请求重新打开 users.db
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+            conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+    
     def _init_default_admin(self, cursor):
         """初始化默认管理员账户"""
         try:
@@ -160,8 +194,9 @@ class DatabaseManager:
 class User:
     """用户模型"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, cache: 'SessionCache' = None):
         self.db = db_manager
+        self.cache = cache
     
     @staticmethod
     def _hash_password(password: str, salt: str = None) -> tuple:
@@ -327,6 +362,31 @@ class User:
             return False
 
 
+    def set_active(self, user_id: int, is_active: bool) -> bool:
+        """启用/禁用用户，并使该用户的会话缓存失效"""
+        return self._update_user_field(user_id, 'is_active', 1 if is_active else 0)
+    
+    def update_role(self, user_id: int, role: str) -> bool:
+        """修改用户角色，并使该用户的会话缓存失效"""
+        return self._update_user_field(user_id, 'role', role)
+    
+    def _update_user_field(self, user_id: int, field: str, value) -> bool:
+        """更新 users 表单个字段（field 仅限内部白名单）"""
+        if field not in ('is_active', 'role'):
+            raise ValueError(f"不支持更新字段: {field}")
+        try:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f'UPDATE users SET {field} = ? WHERE id = ?', (value, user_id))
+            conn.commit()
+            conn.close()
+            (self.cache if self.cache is not None else session_cache).invalidate_user(user_id)
+            return True
+            
+        except Exception:
+            return False
+
+
 class SecurityQuestion:
     """安全问题模型"""
     
@@ -410,114 +470,217 @@ class SecurityQuestion:
             return None
 
 
+class SessionCache:
+    """
+    会话校验缓存：令牌哈希 -> (用户信息, 会话过期时间, 缓存过期时间)
+    
+    - 只保存令牌的 SHA-256，不在内存中留明文令牌
+    - LRU 淘汰，条目数有上限；短 TTL 兜底其他进程的写入
+    - 登出、禁用、角色变更时主动失效
+    """
+    
+    def __init__(self, max_entries: int = SESSION_CACHE_MAX_ENTRIES, ttl: float = SESSION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(session_token: str) -> str:
+        return hashlib.sha256(session_token.encode('utf-8')).hexdigest()
+    
+    def get(self, session_token: str) -> Optional[Dict[str, Any]]:
+        """命中且未过期返回用户信息副本，否则返回 None"""
+        key = self._key(session_token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user_info, expires_at, cached_until = entry
+            if time.monotonic() > cached_until or datetime.now() > expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return dict(user_info)
+    
+    def put(self, session_token: str, user_info: Dict[str, Any], expires_at: datetime):
+        """写入缓存（超过上限时淘汰最久未使用的条目）"""
+        key = self._key(session_token)
+        with self._lock:
+            self._entries[key] = (dict(user_info), expires_at, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, session_token: str):
+        """使单个令牌失效"""
+        with self._lock:
+            self._entries.pop(self._key(session_token), None)
+    
+    def invalidate_user(self, user_id: int):
+        """使某用户的全部缓存会话失效"""
+        with self._lock:
+            stale = [key for key, (info, _, _) in self._entries.items() if info.get('user_id') == user_id]
+            for key in stale:
+                del self._entries[key]
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+
+
 class SessionManager:
     """会话管理器"""
     
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(self, db_manager: DatabaseManager, cache: SessionCache = None,
+                 purge_interval: int = SESSION_PURGE_INTERVAL):
         self.db = db_manager
+        self.cache = cache if cache is not None else session_cache
+        self.purge_interval = purge_interval
+        self._purge_thread = None
+        self._purge_lock = threading.Lock()
+    
+    def start_purge_thread(self):
+        """启动过期会话的后台定期清理（重复调用无副作用）"""
+        with self._purge_lock:
+            if self._purge_thread is not None or self.purge_interval <= 0:
+                return
+            self._purge_thread = threading.Thread(target=self._purge_loop, name='session-purge', daemon=True)
+            self._purge_thread.start()
+    
+    def _purge_loop(self):
+        while True:
+            time.sleep(self.purge_interval)
+            self.purge_expired_sessions()
     
     def create_session(self, user_id: int, ip_address: str = None, user_agent: str = None) -> str:
         """创建用户会话"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
+            conn = self.db.get_thread_connection()
             
             # 生成会话令牌
             session_token = secrets.token_urlsafe(32)
             
             # 设置过期时间（24小时）
-            expires_at = datetime.now().replace(microsecond=0)
-            expires_at = expires_at.replace(day=expires_at.day + 1)
+            expires_at = datetime.now().replace(microsecond=0) + SESSION_LIFETIME
             
-            cursor.execute('''
-                INSERT INTO sessions (user_id, session_token, expires_at, ip_address, user_agent)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, session_token, expires_at.isoformat(), ip_address, user_agent))
-            
-            conn.commit()
-            conn.close()
+            with conn:
+                conn.execute('''
+                    INSERT INTO sessions (user_id, session_token, expires_at, ip_address, user_agent)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, session_token, expires_at.isoformat(), ip_address, user_agent))
             
+            self.start_purge_thread()
             return session_token
             
         except Exception:
             return None
     
     def validate_session(self, session_token: str) -> Optional[Dict[str, Any]]:
-        """验证会话有效性"""
+        """验证会话有效性（优先命中内存缓存，未命中才查询 users.db）"""
+        cached = self.cache.get(session_token)
+        if cached is not None:
+            return cached
+        
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
+            conn = self.db.get_thread_connection()
+            result = conn.execute('''
                 SELECT s.user_id, s.expires_at, u.username, u.email, u.role, u.is_active
                 FROM sessions s
                 JOIN users u ON s.user_id = u.id
                 WHERE s.session_token = ? AND s.is_active = 1
-            ''', (session_token,))
-            
-            result = cursor.fetchone()
-            conn.close()
+            ''', (session_token,)).fetchone()
             
             if not result:
                 return None
             
             user_id, expires_at, username, email, role, is_active = result
+            expires_at = datetime.fromisoformat(expires_at)
             
             # 检查是否过期
-            if datetime.now() > datetime.fromisoformat(expires_at):
+            if datetime.now() > expires_at:
                 self.invalidate_session(session_token)
                 return None
             
-            return {
+            user_info = {
                 'user_id': user_id,
                 'username': username,
                 'email': email,
                 'role': role,
                 'is_active': is_active
             }
+            self.cache.put(session_token, user_info, expires_at)
+            return user_info
+            
+        except Exception:
+            return None
+    
+    def get_session_info(self, session_token: str) -> Optional[Dict[str, Any]]:
+        """获取会话的创建与过期时间"""
+        try:
+            conn = self.db.get_thread_connection()
+            result = conn.execute('''
+                SELECT created_at, expires_at FROM sessions WHERE session_token = ?
+            ''', (session_token,)).fetchone()
+            if not result:
+                return None
+            return {'created_at': result[0], 'expires_at': result[1]}
             
         except Exception:
             return None
     
     def invalidate_session(self, session_token: str) -> bool:
         """使会话失效"""
+        self.cache.invalidate(session_token)
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE sessions 
-                SET is_active = 0 
-                WHERE session_token = ?
-            ''', (session_token,))
-            
-            conn.commit()
-            conn.close()
+            conn = self.db.get_thread_connection()
+            with conn:
+                conn.execute('''
+                    UPDATE sessions 
+                    SET is_active = 0 
+                    WHERE session_token = ?
+                ''', (session_token,))
             return True
             
         except Exception:
             return False
     
     def cleanup_expired_sessions(self):
-        """清理过期会话"""
+        """清理过期会话（标记失效）"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE sessions 
-                SET is_active = 0 
-                WHERE expires_at < CURRENT_TIMESTAMP
-            ''')
-            
-            conn.commit()
-            conn.close()
+            conn = self.db.get_thread_connection()
+            with conn:
+                # expires_at 以本地时间 ISO 格式存储，需用同格式比较
+                conn.execute('''
+                    UPDATE sessions 
+                    SET is_active = 0 
+                    WHERE expires_at < ?
+                ''', (datetime.now().isoformat(),))
             
         except Exception:
             pass
+    
+    def purge_expired_sessions(self) -> int:
+        """删除已过期或已失效的会话记录，返回删除条数"""
+        try:
+            conn = self.db.get_thread_connection()
+            with conn:
+                cursor = conn.execute(
+                    'DELETE FROM sessions WHERE expires_at < ? OR is_active = 0',
+                    (datetime.now().isoformat(),)
+                )
+            return cursor.rowcount
+            
+        except Exception:
+            return 0
 
 
 # 全局数据库管理器实例
+session_cache = SessionCache()
 db_manager = DatabaseManager()
 user_model = User(db_manager)
 security_question_model = SecurityQuestion(db_manager)
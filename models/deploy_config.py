@@ -1,8 +1,38 @@
 """
 部署配置模型
+
+- 配置行整体加载到 deploy_config_store 的内存快照中，get_config / get_all_configs 不再查询数据库
+- 写入（单个或批量）在一个事务中完成，成功后快照版本号加一并通知订阅者
+- 其他进程的修改通过 行数 + 最后更新时间 发现（最多每 CONFIG_STORE_CHECK_SECONDS 秒查询一次）
 """
+import json
 from datetime import datetime
+
+from sqlalchemy import func
+
 from models import db
+from utils.config_store import ConfigStore
+
+
+def typed_value(config_type, config_value):
+    """按配置类型转换配置值"""
+    if config_type == 'number':
+        try:
+            return int(config_value)
+        except ValueError:
+            try:
+                return float(config_value)
+            except ValueError:
+                return 0
+    elif config_type == 'boolean':
+        return config_value.lower() in ('true', '1', 'yes')
+    elif config_type == 'json':
+        try:
+            return json.loads(config_value)
+        except (TypeError, ValueError):
+            return {}
+    else:
+        return config_value
 
 
 class DeployConfig(db.Model):
@@ -37,24 +67,13 @@ class DeployConfig(db.Model):
     
     def get_typed_value(self):
         """获取类型化的配置值"""
-        if self.config_type == 'number':
-            try:
-                return int(self.config_value)
-            except ValueError:
-                try:
-                    return float(self.config_value)
-                except ValueError:
-                    return 0
-        elif self.config_type == 'boolean':
-            return self.config_value.lower() in ('true', '1', 'yes')
-        elif self.config_type == 'json':
-            import json
-            try:
-                return json.loads(self.config_value)
-            except:
-                return {}
-        else:
-            return self.config_value
+        return typed_value(self.config_type, self.config_value)
+
+    def to_entry(self):
+        """快照中保存的配置项（完整信息 + 类型化的值）"""
+        entry = self.to_dict(hide_sensitive=False)
+        entry['typed_value'] = self.get_typed_value()
+        return entry
     
     @staticmethod
     def get_config(key, default=None):
@@ -68,10 +87,21 @@ class DeployConfig(db.Model):
         Returns:
             配置值（已转换为对应类型）
         """
-        config = DeployConfig.query.filter_by(config_key=key).first()
-        if config:
-            return config.get_typed_value()
+        entry = deploy_config_store.get(key)
+        if entry:
+            return entry['typed_value']
         return default
+
+    @staticmethod
+    def get_config_entry(key):
+        """
+        获取单个配置的完整信息（含敏感值）
+
+        Returns:
+            配置字典，不存在时返回 None
+        """
+        entry = deploy_config_store.get(key)
+        return _public_entry(entry, hide_sensitive=False) if entry else None
     
     @staticmethod
     def set_config(key, value, updated_by=None):
@@ -83,21 +113,21 @@ class DeployConfig(db.Model):
             value: 配置值
             updated_by: 更新人ID
         """
-        config = DeployConfig.query.filter_by(config_key=key).first()
-        if config:
-            config.config_value = str(value)
-            if updated_by:
-                config.updated_by = updated_by
-            config.updated_at = datetime.utcnow()
-            db.session.commit()
-        else:
-            new_config = DeployConfig(
-                config_key=key,
-                config_value=str(value),
-                updated_by=updated_by
-            )
-            db.session.add(new_config)
-            db.session.commit()
+        DeployConfig.set_configs({key: value}, updated_by=updated_by)
+
+    @staticmethod
+    def set_configs(changes, updated_by=None):
+        """
+        批量设置配置值（一个事务，全部成功或全部不生效）
+
+        Args:
+            changes: 配置键 -> 配置值
+            updated_by: 更新人ID
+
+        Returns:
+            更新后的配置版本号
+        """
+        return deploy_config_store.update(changes, updated_by=updated_by)
     
     @staticmethod
     def get_all_configs(category=None, hide_sensitive=True):
@@ -111,9 +141,60 @@ class DeployConfig(db.Model):
         Returns:
             配置列表
         """
-        query = DeployConfig.query
+        entries = deploy_config_store.snapshot().values()
         if category:
-            query = query.filter_by(category=category)
-        
-        configs = query.order_by(DeployConfig.category, DeployConfig.config_key).all()
-        return [config.to_dict(hide_sensitive=hide_sensitive) for config in configs]
+            entries = [entry for entry in entries if entry['category'] == category]
+        entries = sorted(entries, key=lambda entry: (entry['category'] or '', entry['config_key']))
+        return [_public_entry(entry, hide_sensitive=hide_sensitive) for entry in entries]
+
+    @staticmethod
+    def get_categories():
+        """获取所有配置分类"""
+        return sorted({entry['category'] for entry in deploy_config_store.snapshot().values() if entry['category']})
+
+
+def _public_entry(entry, hide_sensitive=True):
+    """快照中的配置项转换为接口返回的字典"""
+    data = {key: value for key, value in entry.items() if key != 'typed_value'}
+    if hide_sensitive and entry['is_sensitive']:
+        data['config_value'] = '***'
+    return data
+
+
+class DeployConfigSource:
+    """deploy_config 表作为 ConfigStore 的数据源"""
+
+    def load(self):
+        return {config.config_key: config.to_entry() for config in DeployConfig.query.all()}
+
+    def save(self, changes, current, updated_by=None):
+        now = datetime.utcnow()
+        try:
+            existing = {config.config_key: config for config in
+                        DeployConfig.query.filter(DeployConfig.config_key.in_(list(changes))).all()}
+            rows = []
+            for key, value in changes.items():
+                config = existing.get(key)
+                if config:
+                    config.config_value = str(value)
+                    if updated_by:
+                        config.updated_by = updated_by
+                    config.updated_at = now
+                else:
+                    config = DeployConfig(config_key=key, config_value=str(value), updated_by=updated_by,
+                                          updated_at=now)
+                    db.session.add(config)
+                rows.append(config)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return {config.config_key: config.to_entry() for config in rows}
+
+    def fingerprint(self):
+        count, last_updated = db.session.query(func.count(DeployConfig.id), func.max(DeployConfig.updated_at)).one()
+        return count, last_updated
+
+
+# 全局配置快照
+deploy_config_store = ConfigStore('deploy_config', DeployConfigSource())
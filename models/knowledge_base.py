@@ -385,6 +385,27 @@ class KnowledgeBaseManager:
             print(f"获取 FAQ 列表失败：{e}")
             return []
     
+    def list_faq_terms(self) -> List[Dict]:
+        """获取构建问题理解词典所需的 FAQ 字段（只查必要列）"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT id, question, category, tags, domain_id FROM faqs')
+            rows = cursor.fetchall()
+            conn.close()
+            
+            return [{
+                'id': row[0],
+                'question': row[1],
+                'category': row[2],
+                'tags': row[3].split(',') if row[3] else [],
+                'domain_id': row[4]
+            } for row in rows]
+        except Exception as e:
+            print(f"获取 FAQ 词条失败：{e}")
+            return []
+    
     # ========== 对话历史方法 ==========
     
     def add_conversation_message(self, session_id: str, message_role: str, 
@@ -411,6 +432,43 @@ class KnowledgeBaseManager:
             print(f"添加对话消息失败：{e}")
             return -1
     
+    def add_conversation_messages(self, messages: List[Dict]) -> int:
+        """
+        批量写入对话消息（同一连接、同一事务）
+        
+        Args:
+            messages: [{session_id, user_id, role, content, related_faq_ids, created_at}]
+            
+        Returns:
+            写入条数，失败返回 -1
+        """
+        if not messages:
+            return 0
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.executemany('''
+                INSERT INTO conversation_history (session_id, user_id, message_role, 
+                                                  message_content, related_faq_ids, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            ''', [(
+                message['session_id'],
+                message.get('user_id'),
+                message['role'],
+                message['content'],
+                json.dumps(message['related_faq_ids']) if message.get('related_faq_ids') else None,
+                message.get('created_at') or datetime.now()
+            ) for message in messages])
+            
+            conn.commit()
+            conn.close()
+            
+            return len(messages)
+        except Exception as e:
+            print(f"批量添加对话消息失败：{e}")
+            return -1
+    
     def get_conversation_history(self, session_id: str, limit: int = 50) -> List[Dict]:
         """获取对话历史"""
         try:
@@ -421,11 +479,12 @@ class KnowledgeBaseManager:
                 SELECT id, message_role, message_content, related_faq_ids, created_at
                 FROM conversation_history
                 WHERE session_id = %s
-                ORDER BY created_at ASC
+                ORDER BY created_at DESC, id DESC
                 LIMIT %s
             ''', (session_id, limit))
             
-            rows = cursor.fetchall()
+            # 取最近的 limit 条，按时间正序返回
+            rows = list(reversed(cursor.fetchall()))
             conn.close()
             
             return [{
@@ -454,6 +513,21 @@ class KnowledgeBaseManager:
             print(f"清空对话历史失败：{e}")
             return False
     
+    def delete_conversation_history_before(self, cutoff: datetime) -> int:
+        """删除指定时间之前的对话历史，返回删除条数"""
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            removed = cursor.execute('DELETE FROM conversation_history WHERE created_at < %s', (cutoff,))
+            conn.commit()
+            conn.close()
+            
+            return removed
+        except Exception as e:
+            print(f"清理过期对话历史失败：{e}")
+            return -1
+    
     # ========== 专业领域管理方法（新增） ==========
     
     def add_category(self, name: str, description: str = None, color: str = '#1890ff') -> int:
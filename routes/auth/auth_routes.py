@@ -28,6 +28,7 @@ def login_required(f):
                     session['user_id'] = user_info['user_id']
                     session['username'] = user_info['username']
                     session['role'] = user_info['role']
+                    session['is_active'] = bool(user_info['is_active'])
                 else:
                     return jsonify({'error': '会话已过期，请重新登录'}), 401
             else:
@@ -192,6 +193,7 @@ def login():
                 session['email'] = user_info['email']
                 session['role'] = user_info['role']
                 session['is_active'] = user_info['is_active']
+                session_info = session_manager.get_session_info(session_token) or {}
                 
                 # 返回详细的成功信息
                 response_data = {
@@ -205,8 +207,8 @@ def login():
                         'is_active': user_info['is_active']
                     },
                     'session_info': {
-                        'created_at': session_manager.get_session_info(session_token).get('created_at') if session_manager.get_session_info(session_token) else None,
-                        'expires_at': session_manager.get_session_info(session_token).get('expires_at') if session_manager.get_session_info(session_token) else None
+                        'created_at': session_info.get('created_at'),
+                        'expires_at': session_info.get('expires_at')
                     }
                 }
                 
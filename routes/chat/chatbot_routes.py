@@ -4,13 +4,17 @@
 智能客服路由模块
 提供聊天、文档上传、知识库管理等功能接口
 """
-from flask import Blueprint, render_template, request, jsonify, session
+from flask import Blueprint, render_template, request, jsonify, session, Response, stream_with_context
 import os
+import json
+import time
 import uuid
 import logging
 import threading
 from datetime import datetime
 
+from utils.progress_bus import progress_bus, TERMINAL_STATUSES, STATUS_COMPLETED, STATUS_FAILED, STATUS_PROCESSING
+
 logger = logging.getLogger(__name__)
 
 # 创建蓝图
@@ -29,10 +33,86 @@ chatbot_bp = Blueprint('chatbot', __name__, url_prefix='/chatbot')
 #     return render_template('chat/faq_preview.html')
 
 
+# SSE 推送最小间隔（秒），间隔内的多次更新合并为一条
+PROGRESS_STREAM_INTERVAL = 0.25
+# SSE 心跳间隔（秒）
+PROGRESS_STREAM_KEEPALIVE = 15
+# 任务不在本进程时回退为轮询数据库的间隔（秒）
+PROGRESS_DB_POLL_INTERVAL = 2
+# 订阅时任务尚未创建（客户端预先生成 preview_id）的最长等待时间（秒）
+PROGRESS_TASK_WAIT_SECONDS = 60
+
+
+def _progress_payload(snapshot):
+    """进度总线快照转换为接口返回格式"""
+    payload = {
+        'success': True,
+        'preview_id': snapshot['task_id'],
+        'total_sections': snapshot.get('total', 0),
+        'processed_sections': snapshot.get('processed', 0),
+        'faqs_extracted': snapshot.get('faqs_extracted', 0),
+        'progress_percent': snapshot.get('progress_percent', 0),
+        'status': snapshot.get('status', STATUS_PROCESSING)
+    }
+    if snapshot.get('error'):
+        payload['error'] = snapshot['error']
+    return payload
+
+
+def _load_progress_from_db(preview_id):
+    """从数据库读取进度（任务由其他进程处理时使用），不存在返回 None"""
+    from models.knowledge_base import knowledge_base_manager
+    conn = knowledge_base_manager.get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT total_sections, processed_sections, faqs_extracted, status, error_message
+        FROM faq_preview_cache
+        WHERE preview_id = %s
+    ''', (preview_id,))
+    
+    row = cursor.fetchone()
+    conn.close()
+    
+    if not row:
+        return None
+    
+    total_sections, processed_sections, faqs_extracted, stored_status, error_message = row
+    
+    # 计算进度百分比
+    progress_percent = 0
+    status = STATUS_PROCESSING
+    
+    if total_sections > 0:
+        progress_percent = int((processed_sections / total_sections) * 100)
+        
+        if processed_sections >= total_sections:
+            status = STATUS_COMPLETED
+    
+    # 已落库的结束状态优先（失败的任务已处理章节数不会达到总数）
+    if stored_status in TERMINAL_STATUSES:
+        status = stored_status
+    if status == STATUS_COMPLETED:
+        progress_percent = 100
+    
+    payload = {
+        'success': True,
+        'preview_id': preview_id,
+        'total_sections': total_sections,
+        'processed_sections': processed_sections,
+        'faqs_extracted': faqs_extracted,
+        'progress_percent': progress_percent,
+        'status': status
+    }
+    if status == STATUS_FAILED and error_message:
+        payload['error'] = error_message
+    return payload
+
+
 @chatbot_bp.route('/upload_progress/<preview_id>')
 def upload_progress(preview_id):
     """
-    查询上传处理进度
+    查询上传处理进度（本进程的任务直接读进度总线，否则读数据库里程碑）
     
     Response JSON:
         {
@@ -46,46 +126,17 @@ def upload_progress(preview_id):
         }
     """
     try:
-        from models.knowledge_base import knowledge_base_manager
-        conn = knowledge_base_manager.get_connection()
-        cursor = conn.cursor()
+        snapshot = progress_bus.get(preview_id)
+        if snapshot is not None:
+            return jsonify(_progress_payload(snapshot))
         
-        cursor.execute('''
-            SELECT total_sections, processed_sections, faqs_extracted
-            FROM faq_preview_cache
-            WHERE preview_id = %s
-        ''', (preview_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if not row:
+        payload = _load_progress_from_db(preview_id)
+        if payload is None:
             return jsonify({
                 'success': False,
                 'error': '预览不存在'
             }), 404
-        
-        total_sections, processed_sections, faqs_extracted = row
-        
-        # 计算进度百分比
-        progress_percent = 0
-        status = 'processing'
-        
-        if total_sections > 0:
-            progress_percent = int((processed_sections / total_sections) * 100)
-            
-            if processed_sections >= total_sections:
-                status = 'completed'
-        
-        return jsonify({
-            'success': True,
-            'preview_id': preview_id,
-            'total_sections': total_sections,
-            'processed_sections': processed_sections,
-            'faqs_extracted': faqs_extracted,
-            'progress_percent': progress_percent,
-            'status': status
-        })
+        return jsonify(payload)
         
     except Exception as e:
         logger.error(f"查询进度失败：{e}")
@@ -95,6 +146,79 @@ def upload_progress(preview_id):
         }), 500
 
 
+@chatbot_bp.route('/upload_progress/<preview_id>/stream')
+def upload_progress_stream(preview_id):
+    """
+    以 SSE 推送上传处理进度
+    
+    - 每条事件的 id 为进度序号，断线重连时浏览器自动带上 Last-Event-ID，只补发最新快照
+    - 高频更新按 PROGRESS_STREAM_INTERVAL 合并，任务结束（completed / failed）后关闭连接
+    - 任务不在本进程时回退为定时读取数据库里程碑
+    
+    Query:
+        last_event_id: 已收到的最后序号（不支持自定义请求头的客户端使用）
+    
+    Event:
+        id: 序号
+        event: progress
+        data: 与 /upload_progress/<preview_id> 相同的 JSON
+    """
+    try:
+        last_seq = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        last_seq = 0
+    
+    def format_event(seq, payload):
+        event_id = f"id: {seq}\n" if seq is not None else ''
+        return f"{event_id}event: progress\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    
+    def generate():
+        nonlocal last_seq
+        yield "retry: 1000\n\n"
+        
+        if progress_bus.get(preview_id) is None:
+            # 其他进程处理的任务：定时读数据库（没有总线序号，事件不带 id）
+            last_payload = None
+            started = time.monotonic()
+            while True:
+                try:
+                    payload = _load_progress_from_db(preview_id)
+                except Exception as e:
+                    logger.error(f"[PROGRESS] 读取进度失败 {preview_id}: {e}")
+                    payload = None
+                if payload is None:
+                    # 客户端可能在上传请求到达之前就已订阅，等待任务出现
+                    if time.monotonic() - started > PROGRESS_TASK_WAIT_SECONDS:
+                        yield format_event(None, {'success': False, 'preview_id': preview_id, 'error': '预览不存在'})
+                        return
+                elif payload != last_payload:
+                    last_payload = payload
+                    yield format_event(None, payload)
+                if payload and payload['status'] in TERMINAL_STATUSES:
+                    return
+                if progress_bus.get(preview_id) is not None:
+                    break
+                time.sleep(PROGRESS_DB_POLL_INTERVAL)
+        
+        while True:
+            snapshot = progress_bus.wait(preview_id, last_seq, timeout=PROGRESS_STREAM_KEEPALIVE)
+            if snapshot is None:
+                if progress_bus.get(preview_id) is None:
+                    return
+                yield ": keepalive\n\n"
+                continue
+            last_seq = snapshot['seq']
+            yield format_event(last_seq, _progress_payload(snapshot))
+            if snapshot['status'] in TERMINAL_STATUSES:
+                return
+            time.sleep(PROGRESS_STREAM_INTERVAL)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @chatbot_bp.route('/chat', methods=['POST'])
 def chat():
     """
@@ -176,6 +300,74 @@ def chat():
         }), 500
 
 
+@chatbot_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    流式聊天接口（SSE）
+    
+    - 检索结果在模型开始生成前作为 retrieval 事件发出
+    - 模型每产生一段文本推送一条 token 事件，结束时推送 done 事件并一次性保存对话
+    - 客户端断开时取消上游生成，本轮对话不保存
+    
+    Request JSON:
+        {
+            "message": "用户问题",
+            "session_id": "会话 ID（可选）",
+            "domain_id": "专业领域 ID（可选）"
+        }
+    
+    Event:
+        event: retrieval | token | done | error
+        data: JSON
+    """
+    data = request.get_json(silent=True)
+    if not data or not data.get('message'):
+        return jsonify({
+            'success': False,
+            'error': '缺少消息内容'
+        }), 400
+    
+    user_message = data['message']
+    session_id = data.get('session_id') or session.get('chat_session_id')
+    if not session_id:
+        session_id = str(uuid.uuid4())
+        session['chat_session_id'] = session_id
+    logger.info(f"[CHATBOT_STREAM] 👤 用户问题：{user_message[:200]}，Session ID: {session_id}")
+    
+    from utils.chatbot_core import get_chatbot_core
+    chatbot = get_chatbot_core()
+    context = chatbot.get_session_context(session_id)
+    
+    cancel_event = threading.Event()
+    events = chatbot.stream_query(
+        query=user_message,
+        session_id=session_id,
+        context=context,
+        domain_id=data.get('domain_id'),
+        cancel_event=cancel_event
+    )
+    
+    def generate():
+        try:
+            for event, payload in events:
+                if event == 'queued':
+                    # 排队心跳：SSE 注释行，前端忽略；客户端已断开时写入失败，随即取消排队
+                    yield ": queued\n\n"
+                    continue
+                if event == 'retrieval':
+                    payload = dict(payload, session_id=session_id)
+                yield f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+        finally:
+            # 客户端断开时服务器关闭本生成器，随之断开模型服务连接
+            cancel_event.set()
+            events.close()
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @chatbot_bp.route('/upload_document/preview', methods=['POST'])
 def upload_document_preview():
     """
@@ -184,6 +376,7 @@ def upload_document_preview():
     Form Data:
         file: 文件对象
         domain_id: 专业领域 ID(可选)
+        preview_id: 客户端预先生成的 UUID(可选)，用于上传前订阅 /upload_progress/<preview_id>/stream
     
     Response JSON:
         {
@@ -198,6 +391,7 @@ def upload_document_preview():
             "duplicate_count": 5
         }
     """
+    preview_id = None
     try:
         # 记录请求信息
         logger.info(f"[UPLOAD_PREVIEW] ====== 收到文档上传预览请求 ======")
@@ -246,10 +440,12 @@ def upload_document_preview():
                 'error': doc_result.get('error', '文档处理失败')
             }), 400
         
-        # 生成预览 ID 并存储到数据库临时表
-        import uuid
-        import json
-        preview_id = str(uuid.uuid4())
+        # 生成预览 ID 并存储到数据库临时表（客户端可预先生成以便提前订阅进度）
+        try:
+            preview_id = str(uuid.UUID(request.form.get('preview_id', '')))
+        except ValueError:
+            preview_id = str(uuid.uuid4())
+        progress_bus.start(preview_id)
         
         # 存储到 MySQL 临时表
         from models.knowledge_base import knowledge_base_manager
@@ -269,7 +465,9 @@ def upload_document_preview():
                 expires_at TIMESTAMP NULL,
                 total_sections INT DEFAULT 0,
                 processed_sections INT DEFAULT 0,
-                faqs_extracted INT DEFAULT 0
+                faqs_extracted INT DEFAULT 0,
+                status VARCHAR(20) DEFAULT 'processing',
+                error_message TEXT
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
         ''')
         
@@ -305,10 +503,13 @@ def upload_document_preview():
         content_length = len(doc_result['content'])
         logger.info(f"[UPLOAD_PREVIEW] 文档内容长度：{content_length} 字符")
         
-        # 先统计有多少个章节（功能点）
+        # 先统计有多少个章节（功能点）；并行模式按结构化分段计数，进度按分段推进
         from utils.document_processor import count_sections
-        total_sections = count_sections(doc_result['content'])
+        from utils.faq_chunker import chunk_document
+        chunks = chunk_document(doc_result['content']) if content_length > 10000 else None
+        total_sections = len(chunks) if chunks is not None else count_sections(doc_result['content'])
         logger.info(f"[PREVIEW] Document has {total_sections} sections to process")
+        progress_bus.start(preview_id, total=total_sections, faqs_extracted=0)
         
         # 更新总章节数
         conn = knowledge_base_manager.get_connection()
@@ -327,10 +528,10 @@ def upload_document_preview():
             faqs = extract_faq_parallel_with_progress(
                 doc_result['content'], 
                 ollama_client,
-                chunk_size=2000,
                 max_workers=2,
                 domain_id=domain_id,
-                preview_id=preview_id  # 传递 preview_id 用于更新进度
+                preview_id=preview_id,  # 传递 preview_id 用于更新进度
+                chunks=chunks
             )
             logger.info(f"[UPLOAD_PREVIEW] 并行模式提取完成，共 {len(faqs)} 条 FAQ")
         else:
@@ -374,17 +575,20 @@ def upload_document_preview():
             UPDATE faq_preview_cache 
             SET faqs_data = %s,
                 processed_sections = %s,
-                faqs_extracted = %s
+                faqs_extracted = %s,
+                status = %s
             WHERE preview_id = %s
         ''', (
             json.dumps(faqs_with_dup, ensure_ascii=False),
             total_sections,  # 已处理完成
             len(faqs),
+            STATUS_COMPLETED,
             preview_id
         ))
         
         conn.commit()
         conn.close()
+        progress_bus.finish(preview_id, processed=total_sections, faqs_extracted=len(faqs))
         
         logger.info(f"[PREVIEW] Generated preview {preview_id} with {len(faqs)} FAQs (saved to DB)")
         
@@ -405,6 +609,12 @@ def upload_document_preview():
         logger.error(f"预览文档失败：{e}")
         import traceback
         traceback.print_exc()
+        if preview_id:
+            progress_bus.fail(preview_id, error=str(e))
+            snapshot = progress_bus.get(preview_id)
+            from utils.document_processor import persist_progress
+            persist_progress(preview_id, snapshot.get('processed', 0), snapshot.get('faqs_extracted', 0),
+                             status=STATUS_FAILED, error=str(e))
         return jsonify({
             'success': False,
             'error': str(e)
@@ -527,6 +737,11 @@ def upload_document_confirm():
         
         logger.info(f"[IMPORT] Imported {imported_count} FAQs from preview {preview_id}")
         
+        # FAQ 变化后重建问题理解词典
+        if imported_count:
+            from utils.chatbot_core import get_chatbot_core
+            get_chatbot_core().query_understanding.invalidate()
+        
         return jsonify({
             'success': True,
             'document_id': doc_id,
@@ -721,6 +936,50 @@ def check_ollama_status():
         }), 500
 
 
+@chatbot_bp.route('/llm/admission', methods=['GET'])
+def llm_admission_stats():
+    """大模型准入控制统计：并发上限、各优先级排队深度、等待时间与拒绝 / 超时 / 取消次数"""
+    from utils.llm_admission import llm_admission
+    return jsonify({
+        'success': True,
+        'data': llm_admission.stats()
+    })
+
+
+@chatbot_bp.route('/llm/telemetry', methods=['GET'])
+def llm_telemetry_stats():
+    """
+    大模型调用遥测：按（调用方式, 模型）汇总的耗时 / 首 token / 排队直方图、token 数与结果状态
+
+    Query:
+        recent: 同时返回的最近调用条数（默认 20，不含请求内容）
+    """
+    from utils.llm_telemetry import llm_telemetry
+    recent = request.args.get('recent', 20, type=int)
+    return jsonify({
+        'success': True,
+        'data': dict(llm_telemetry.stats(), recent=llm_telemetry.recent(max(0, min(recent, 200))))
+    })
+
+
+@chatbot_bp.route('/query_understanding/stats', methods=['GET'])
+def query_understanding_stats():
+    """问题理解统计：缓存命中率、大模型调用比例与各层耗时"""
+    try:
+        from utils.chatbot_core import get_chatbot_core
+        stats = get_chatbot_core().query_understanding.stats()
+        return jsonify({
+            'success': True,
+            'data': stats
+        })
+    except Exception as e:
+        logger.error(f"[CHATBOT_QU] 获取问题理解统计失败：{e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 # 辅助函数：从文档内容提取 FAQ
 def extract_faq_from_content(content: str, ollama_client=None) -> list:
     """从文档内容中提取 FAQ"""
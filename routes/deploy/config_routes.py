@@ -3,7 +3,7 @@
 """
 from flask import Blueprint, jsonify, request, send_file
 # from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity  # 暂时禁用JWT
-from models.deploy_config import DeployConfig
+from models.deploy_config import DeployConfig, deploy_config_store
 from models import db
 import os
 import subprocess
@@ -44,14 +44,11 @@ def list_configs():
             hide_sensitive=hide_sensitive
         )
         
-        # 获取所有分类
-        categories = db.session.query(DeployConfig.category).distinct().all()
-        category_list = [cat[0] for cat in categories if cat[0]]
-        
         return jsonify({
             'success': True,
             'configs': configs,
-            'categories': category_list
+            'categories': DeployConfig.get_categories(),
+            'version': deploy_config_store.version
         })
         
     except Exception as e:
@@ -76,14 +73,14 @@ def get_config(key):
     }
     """
     try:
-        config = DeployConfig.query.filter_by(config_key=key).first()
+        config = DeployConfig.get_config_entry(key)  # 管理员可查看完整信息
         
         if not config:
             return jsonify({'success': False, 'error': '配置不存在'}), 404
         
         return jsonify({
             'success': True,
-            'config': config.to_dict(hide_sensitive=False)  # 管理员可查看完整信息
+            'config': config
         })
         
     except Exception as e:
@@ -137,7 +134,7 @@ def update_config():
 # @admin_required  # 已禁用权限验证
 def batch_update_configs():
     """
-    批量更新配置
+    批量更新配置（一个事务：任一配置不合法或写入失败时全部不生效）
     
     Request Body:
     {
@@ -151,49 +148,53 @@ def batch_update_configs():
     {
         "success": true,
         "updated_count": 2,
+        "version": 12,
         "message": "批量更新成功"
     }
     """
-    print("[DEBUG] ===== BATCH_UPDATE_CONFIGS CALLED =====")
     try:
-        print("[DEBUG] batch_update_configs called")
         data = request.json
-        print(f"[DEBUG] Received data: {data}")
         configs = data.get('configs', [])
-        print(f"[DEBUG] Configs count: {len(configs)}")
         
         if not configs:
             return jsonify({'success': False, 'error': '没有提供配置数据'}), 400
         
-        # user_id = get_jwt_identity()
-        user_id = None
-        print(f"[DEBUG] Starting to update configs with user_id={user_id}")
-        updated_count = 0
-        
-        for item in configs:
+        # 先校验全部配置，避免只更新了一部分
+        changes = {}
+        invalid = []
+        for index, item in enumerate(configs):
             config_key = item.get('config_key')
             config_value = item.get('config_value')
-            print(f"[DEBUG] Updating {config_key} = {config_value}")
-            
-            if config_key and config_value is not None:
-                DeployConfig.set_config(config_key, config_value, updated_by=user_id)
-                updated_count += 1
+            if not config_key or config_value is None:
+                invalid.append(index)
+            else:
+                changes[config_key] = config_value
+        
+        if invalid:
+            return jsonify({'success': False, 'error': f'第 {invalid} 项缺少 config_key 或 config_value，未做任何更新'}), 400
+        
+        # user_id = get_jwt_identity()
+        user_id = None
+        version = DeployConfig.set_configs(changes, updated_by=user_id)
         
-        print(f"[DEBUG] Updated {updated_count} configs successfully")
         return jsonify({
             'success': True,
-            'updated_count': updated_count,
-            'message': f'成功更新 {updated_count} 个配置'
+            'updated_count': len(changes),
+            'version': version,
+            'message': f'成功更新 {len(changes)} 个配置'
         })
         
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"[ERROR] batch_update_configs exception:\n{error_trace}")
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@config_bp.route('/store-stats', methods=['GET'])
+def config_store_stats():
+    """配置快照的版本号、加载 / 重新加载 / 更新次数"""
+    return jsonify({'success': True, 'data': deploy_config_store.stats()})
+
+
 @config_bp.route('/reset/<key>', methods=['POST'])
 @admin_required
 def reset_config(key):
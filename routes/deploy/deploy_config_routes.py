@@ -15,6 +15,8 @@ from pathlib import Path
 import logging
 import traceback
 
+from utils.config_store import ConfigStore, JsonFileSource
+
 logger = logging.getLogger(__name__)
 
 deploy_config_bp = Blueprint('deploy_config_bp', __name__, url_prefix='/deploy-config')
@@ -36,33 +38,41 @@ DEFAULT_CONFIG = {
 }
 
 
+# 配置快照：读取不再打开文件，文件被手工修改时最多 CONFIG_STORE_CHECK_SECONDS 秒后生效
+deploy_settings_store = ConfigStore('deploy_settings', JsonFileSource(CONFIG_FILE, DEFAULT_CONFIG))
+
+
 def get_deploy_config():
-    """获取配置"""
-    if CONFIG_FILE.exists():
-        try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            pass
-    return DEFAULT_CONFIG.copy()
+    """获取配置（当前快照的副本）"""
+    return deploy_settings_store.snapshot()
 
 
-def save_deploy_config(config):
-    """保存配置"""
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+def save_deploy_config(changes):
+    """
+    保存配置（写临时文件后替换，成功后版本号加一）
 
+    Returns:
+        更新后的配置版本号
+    """
+    return deploy_settings_store.update(changes)
+
+
+def _apply_deploy_config(values, changed, version):
+    """配置版本变化时更新模块级配置"""
+    global config, REMOTE_USER, REMOTE_HOST, REMOTE_PATH, BACKUP_DIR, LOCAL_PORT, NGINX_PORT
+    config = dict(values)
+    REMOTE_USER = config.get('remote_user', DEFAULT_CONFIG['remote_user'])
+    REMOTE_HOST = config.get('remote_host', DEFAULT_CONFIG['remote_host'])
+    REMOTE_PATH = config.get('remote_path', DEFAULT_CONFIG['remote_path'])
+    BACKUP_DIR = config.get('backup_dir', DEFAULT_CONFIG['backup_dir'])
+    LOCAL_PORT = config.get('local_port', DEFAULT_CONFIG['local_port'])
+    NGINX_PORT = config.get('nginx_port', DEFAULT_CONFIG['nginx_port'])
+    logger.info(f"部署配置已更新到版本 {version}: {sorted(changed)}")
 
-# 加载配置
-config = get_deploy_config()
 
-# 动态配置
-REMOTE_USER = config.get('remote_user', DEFAULT_CONFIG['remote_user'])
-REMOTE_HOST = config.get('remote_host', DEFAULT_CONFIG['remote_host'])
-REMOTE_PATH = config.get('remote_path', DEFAULT_CONFIG['remote_path'])
-BACKUP_DIR = config.get('backup_dir', DEFAULT_CONFIG['backup_dir'])
-LOCAL_PORT = config.get('local_port', DEFAULT_CONFIG['local_port'])
-NGINX_PORT = config.get('nginx_port', DEFAULT_CONFIG['nginx_port'])
+# 加载配置，之后只在版本变化时更新动态配置
+config = get_deploy_config()
+deploy_settings_store.subscribe(_apply_deploy_config, replay=True)
 # PROJECT_ROOT 指向项目根目录（deploy.py 所在位置）
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 
@@ -372,6 +382,8 @@ def start_deploy():
 def execute_deploy(deploy_type, backup_file=None):
     """执行部署"""
     try:
+        # 部署开始时确认配置文件没有被手工修改过（未修改时只比较文件修改时间）
+        deploy_settings_store.refresh()
         deploy_status['is_deploying'] = True
         deploy_status['logs'] = []
         deploy_status['progress'] = 0
@@ -1276,15 +1288,14 @@ def get_config():
     """获取部署配置"""
     return jsonify({
         'success': True,
-        'data': config
+        'data': get_deploy_config(),
+        'version': deploy_settings_store.version
     })
 
 
 @deploy_config_bp.route('/config', methods=['POST'])
 def update_config():
     """更新部署配置"""
-    global REMOTE_USER, REMOTE_HOST, REMOTE_PATH, BACKUP_DIR, LOCAL_PORT, NGINX_PORT
-
     data = request.get_json()
     if not data:
         return jsonify({
@@ -1313,32 +1324,20 @@ def update_config():
             'message': f'端口号格式错误: {str(e)}'
         }), 400
 
-    # 更新配置
-    config.update(data)
-    config['local_port'] = local_port
-    config['nginx_port'] = nginx_port
-
-    # 保存到文件
+    # 保存到文件，成功后通过订阅更新全局变量
     try:
-        save_deploy_config(config)
+        version = save_deploy_config(dict(data, local_port=local_port, nginx_port=nginx_port))
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'保存配置失败: {str(e)}'
         }), 500
 
-    # 更新全局变量
-    REMOTE_USER = config['remote_user']
-    REMOTE_HOST = config['remote_host']
-    REMOTE_PATH = config['remote_path']
-    BACKUP_DIR = config['backup_dir']
-    LOCAL_PORT = config['local_port']
-    NGINX_PORT = config['nginx_port']
-
     add_log('✅ 部署配置已更新', 'success')
 
     return jsonify({
         'success': True,
         'message': '配置更新成功',
-        'data': config
+        'data': get_deploy_config(),
+        'version': version
     })
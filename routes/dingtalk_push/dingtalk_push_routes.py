@@ -12,6 +12,11 @@ from cryptography.fernet import Fernet
 from flask import Blueprint, request, jsonify, current_app
 from jinja2 import Template, Environment, BaseLoader, sandbox
 
+from utils import dingtalk_push_stats
+from utils.dingtalk_render_cache import (
+    data_source_cache, get_http_session, get_sql_connection, template_cache
+)
+
 logger = logging.getLogger(__name__)
 
 dingtalk_push_bp = Blueprint('dingtalk_push', __name__, url_prefix='/dingtalk-push')
@@ -432,14 +437,21 @@ def update_config(config_id):
         
         logger.info(f"更新推送配置成功: ID={config_id}")
         
-        # 如果更新了调度配置或启用状态，重新加载任务
-        if 'schedule_config' in data or 'enabled' in data:
-            try:
-                from flask import current_app
-                scheduler = current_app.push_scheduler
+        # 模板或数据源变更后清除该配置的渲染缓存
+        if 'template_content' in data or 'data_source_config' in data:
+            template_cache.invalidate(config_id)
+            data_source_cache.invalidate(config_id)
+        
+        # 如果更新了调度配置或启用状态，重新加载任务；否则只刷新调度器中的配置快照
+        try:
+            from flask import current_app
+            scheduler = current_app.push_scheduler
+            if 'schedule_config' in data or 'enabled' in data:
                 scheduler.reload_config(config_id)
-            except Exception as e:
-                logger.warning(f"重新加载定时任务失败: {e}")
+            else:
+                scheduler.refresh_snapshot(config_id)
+        except Exception as e:
+            logger.warning(f"重新加载定时任务失败: {e}")
         
         return jsonify({'success': True, 'msg': '配置更新成功'})
     
@@ -483,6 +495,16 @@ def delete_config(config_id):
         
         logger.info(f"软删除推送配置成功: ID={config_id}, 删除时间={deleted_at}")
         
+        template_cache.invalidate(config_id)
+        data_source_cache.invalidate(config_id)
+        
+        # 移除定时任务（恢复时 restore_config 会重新加载）
+        try:
+            from flask import current_app
+            current_app.push_scheduler.remove_job(config_id)
+        except Exception as e:
+            logger.warning(f"移除定时任务失败: {e}")
+        
         return jsonify({'success': True, 'msg': '配置已删除（可在历史记录中恢复）'})
     
     except Exception as e:
@@ -656,10 +678,8 @@ def preview_template():
         template_content = data.get('template_content', '')
         sample_data = data.get('sample_data', {})
         
-        # 渲染模板
-        env = sandbox.SandboxedEnvironment(loader=BaseLoader())
-        template = env.from_string(template_content)
-        rendered_content = template.render(**sample_data)
+        # 渲染模板（共用沙箱环境，相同模板只编译一次）
+        rendered_content = template_cache.render(template_content, sample_data)
         
         # 构建消息 JSON
         message_json = build_dingtalk_message(
@@ -687,6 +707,26 @@ def preview_template():
         logger.error(f"模板预览失败: {e}")
         return jsonify({'success': False, 'msg': f'模板渲染失败: {str(e)}'}), 400
 
+@dingtalk_push_bp.route('/render-cache/stats', methods=['GET'])
+def render_cache_stats():
+    """编译模板缓存与数据源结果缓存的命中统计"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'templates': template_cache.stats(),
+            'data_sources': data_source_cache.stats()
+        }
+    })
+
+@dingtalk_push_bp.route('/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    """定时调度器的触发、合并、拒绝、错过统计"""
+    from flask import current_app
+    scheduler = getattr(current_app, 'push_scheduler', None)
+    if scheduler is None:
+        return jsonify({'success': False, 'msg': '调度器未初始化'}), 503
+    return jsonify({'success': True, 'data': scheduler.stats()})
+
 # ==================== 手动推送 API ====================
 
 @dingtalk_push_bp.route('/configs/<int:config_id>/execute', methods=['POST'])
@@ -754,7 +794,7 @@ def execute_push_task(config):
             data['phone'] = at_mobiles_for_template[0]  # 使用第一个手机号
         
         # 渲染模板
-        rendered_content = render_template(config['template_content'], data)
+        rendered_content = render_template(config['template_content'], data, config_id=config_id)
         
         # 构建消息
         at_mobiles = json.loads(config['at_mobiles']) if config['at_mobiles'] else []
@@ -947,67 +987,20 @@ def get_push_history_detail(history_id):
 
 @dingtalk_push_bp.route('/statistics', methods=['GET'])
 def get_statistics():
-    """获取统计数据"""
+    """获取统计数据（读取每日汇总，不扫描推送历史）"""
     try:
         config_id = request.args.get('config_id', type=int)
         period = request.args.get('period', '7d')
         
-        # 计算时间范围
+        # 计算时间范围（按天，含起始当天）
         days_map = {'7d': 7, '30d': 30, '90d': 90}
         days = days_map.get(period, 7)
-        start_date = datetime.now() - timedelta(days=days)
+        start_date = (datetime.now() - timedelta(days=days)).date()
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
         
-        # 基础统计
-        query = """
-            SELECT 
-                COUNT(*) as total_runs,
-                SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as success_count,
-                SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failed_count,
-                AVG(execution_duration_ms) as avg_execution_time_ms
-            FROM dingtalk_push_history 
-            WHERE triggered_at >= %s
-        """
-        params = [start_date]
-        
-        if config_id:
-            query += " AND config_id = %s"
-            params.append(config_id)
-        
-        cursor.execute(query, params)
-        stats = cursor.fetchone()
-        
-        # 计算成功率
-        if stats['total_runs'] > 0:
-            stats['success_rate'] = round(
-                (stats['success_count'] / stats['total_runs']) * 100, 2
-            )
-        else:
-            stats['success_rate'] = 0
-        
-        # 趋势数据
-        trend_query = """
-            SELECT 
-                DATE(triggered_at) as date,
-                COUNT(*) as runs,
-                SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as success
-            FROM dingtalk_push_history 
-            WHERE triggered_at >= %s
-        """
-        trend_params = [start_date]
-        
-        if config_id:
-            trend_query += " AND config_id = %s"
-            trend_params.append(config_id)
-        
-        trend_query += " GROUP BY DATE(triggered_at) ORDER BY date ASC"
-        
-        cursor.execute(trend_query, trend_params)
-        trend = cursor.fetchall()
-        
-        stats['trend'] = trend
+        stats = dingtalk_push_stats.query_statistics(cursor, start_date, config_id)
         stats['period'] = period
         
         cursor.close()
@@ -1019,6 +1012,28 @@ def get_statistics():
         logger.error(f"获取统计数据失败: {e}")
         return jsonify({'success': False, 'msg': str(e)}), 500
 
+@dingtalk_push_bp.route('/statistics/rebuild', methods=['POST'])
+def rebuild_statistics():
+    """从推送历史重算每日汇总（补历史数据或修正汇总）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date() if data.get('start_date') else None
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else None
+    except ValueError:
+        return jsonify({'success': False, 'msg': '日期格式应为 YYYY-MM-DD'}), 400
+    
+    try:
+        conn = get_db_connection()
+        try:
+            rows = dingtalk_push_stats.rebuild(conn, start_date, end_date)
+        finally:
+            conn.close()
+        return jsonify({'success': True, 'data': {'rows': rows}})
+    
+    except Exception as e:
+        logger.error(f"重算推送统计失败: {e}")
+        return jsonify({'success': False, 'msg': str(e)}), 500
+
 # ==================== 辅助函数 ====================
 
 def create_push_history(config_id, trigger_time, trigger_type='manual'):
@@ -1034,6 +1049,7 @@ def create_push_history(config_id, trigger_time, trigger_type='manual'):
     )
     
     history_id = cursor.lastrowid
+    dingtalk_push_stats.record_created(cursor, config_id, trigger_time)
     conn.commit()
     cursor.close()
     conn.close()
@@ -1069,10 +1085,23 @@ def update_push_history(history_id, **kwargs):
             fields.append(f"{db_field} = %s")
             values.append(value)
     
+    # 状态或耗时变化时同步更新每日汇总（按更新前后的差值）
+    old_row = None
+    if 'status' in kwargs or 'execution_duration_ms' in kwargs:
+        row_cursor = conn.cursor(dictionary=True)
+        row_cursor.execute(
+            """SELECT config_id, triggered_at, status, execution_duration_ms
+               FROM dingtalk_push_history WHERE id = %s FOR UPDATE""",
+            (history_id,)
+        )
+        old_row = row_cursor.fetchone()
+        row_cursor.close()
+    
     values.append(history_id)
     query = f"UPDATE dingtalk_push_history SET {', '.join(fields)} WHERE id = %s"
     
     cursor.execute(query, values)
+    dingtalk_push_stats.record_updated(cursor, old_row, kwargs)
     conn.commit()
     cursor.close()
     conn.close()
@@ -1097,14 +1126,23 @@ def add_push_log(config_id, history_id, log_level, message, context_data=None):
         logger.error(f"添加推送日志失败: {e}")
 
 def fetch_data_source(config):
-    """获取数据源"""
+    """获取数据源（结果按数据源缓存，并发请求同一数据源只获取一次）"""
     data_source_config = json.loads(config['data_source_config']) if config['data_source_config'] else {}
     source_type = data_source_config.get('type', 'static')
     
     if source_type == 'static':
         return data_source_config.get('data', {})
     
-    elif source_type == 'api':
+    if source_type not in ('api', 'sql'):
+        return {}
+    
+    return data_source_cache.get(data_source_config, load_data_source, config_id=config.get('id'))
+
+def load_data_source(data_source_config):
+    """实际获取 api / sql 数据源"""
+    source_type = data_source_config.get('type', 'static')
+    
+    if source_type == 'api':
         api_config = data_source_config.get('config', {})
         url = api_config.get('url')
         method = api_config.get('method', 'GET')
@@ -1112,7 +1150,7 @@ def fetch_data_source(config):
         headers = api_config.get('headers', {})
         timeout = api_config.get('timeout', 5)
         
-        response = requests.request(
+        response = get_http_session().request(
             method=method,
             url=url,
             params=params,
@@ -1140,17 +1178,7 @@ def fetch_data_source(config):
             raise ValueError("SQL 查询不能为空")
         
         try:
-            from config import Config
-            import mysql.connector
-            
-            conn = mysql.connector.connect(
-                host=Config.MYSQL_HOST,
-                port=Config.MYSQL_PORT,
-                user=Config.MYSQL_USER,
-                password=Config.MYSQL_PASSWORD,
-                database=database,
-                charset='utf8mb4'
-            )
+            conn = get_sql_connection(database)
             
             cursor = conn.cursor(dictionary=True)
             
@@ -1159,7 +1187,7 @@ def fetch_data_source(config):
             results = cursor.fetchall()
             
             cursor.close()
-            conn.close()
+            conn.close()  # 连接池中的连接 close 即归还
             
             return {'results': results, 'count': len(results)}
         
@@ -1169,26 +1197,9 @@ def fetch_data_source(config):
     
     return {}
 
-def render_template(template_content, data):
-    """渲染 Jinja2 模板"""
-    env = sandbox.SandboxedEnvironment(loader=BaseLoader())
-    
-    # 添加内置函数和变量
-    def format_datetime(dt, fmt='%Y-%m-%d %H:%M'):
-        if isinstance(dt, str):
-            dt = datetime.fromisoformat(dt)
-        return dt.strftime(fmt)
-    
-    # 预格式化当前时间字符串（用于直接引用 {{ now }}）
-    now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    now_dt = datetime.now()
-    
-    env.globals['now'] = now_str  # 默认返回格式化字符串
-    env.globals['now_datetime'] = now_dt  # 返回 datetime 对象
-    env.filters['format_datetime'] = format_datetime
-    
-    template = env.from_string(template_content)
-    return template.render(**data)
+def render_template(template_content, data, config_id=None):
+    """渲染 Jinja2 模板（共用沙箱环境，按配置与模板内容缓存编译结果）"""
+    return template_cache.render(template_content, data, config_id=config_id)
 
 def build_dingtalk_message(message_type, content, at_mobiles=None, at_all=False, config=None):
     """构建钉钉消息"""
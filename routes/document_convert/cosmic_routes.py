@@ -14,6 +14,9 @@ from docx.oxml.ns import qn
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 import logging
 
+from utils.conversion_cache import conversion_cache, sha256_file, source_version
+from utils.cosmic_parser import cosmic_parse_cache, split_subprocess_description
+
 logger = logging.getLogger(__name__)
 
 cosmic_bp = Blueprint('cosmic', __name__, url_prefix='/api/cosmic')
@@ -27,6 +30,10 @@ ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
 UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
 OUTPUT_FOLDER.mkdir(parents=True, exist_ok=True)
 
+# 转换逻辑变化时缓存的转换结果自动失效
+CACHE_VERSION = source_version(__name__, 'utils.cosmic_parser')
+CACHE_ARTIFACT = 'output.docx'
+
 
 def allowed_file(filename):
     """检查文件扩展名是否允许"""
@@ -52,135 +59,25 @@ def get_font_size_for_level(level):
     return 10.5
 
 
-def split_subprocess_description(text):
-    """拆分子过程描述字段"""
-    if not text or pd.isna(text):
-        return []
-
-    text = str(text).strip()
-    if not text:
-        return []
-
-    prefixes = ['输入-', '查询-', '呈现-', '校验-', '输出-']
-    result = []
-    current_segment = []
-
-    i = 0
-    while i < len(text):
-        is_prefix = False
-        for prefix in prefixes:
-            if text[i:i+len(prefix)] == prefix:
-                if current_segment:
-                    result.append(''.join(current_segment).strip())
-                    current_segment = []
-                current_segment.append(prefix)
-                i += len(prefix)
-                is_prefix = True
-                break
-
-        if not is_prefix:
-            current_segment.append(text[i])
-            i += 1
-
-    if current_segment:
-        result.append(''.join(current_segment).strip())
-
-    result = [seg.rstrip('；;').strip() for seg in result if seg]
-
-    if not result and text:
-        return [text]
-
-    return result
-
-
 def read_excel_robust(excel_path):
-    """健壮地读取 Excel 文件"""
-    try:
-        xl = pd.ExcelFile(excel_path)
-    except Exception as e:
-        logger.error(f"无法打开 Excel 文件：{e}")
+    """
+    健壮地读取 Excel 文件
+
+    工作簿只读取一次，解析结果按文件内容哈希缓存（见 utils.cosmic_parser），
+    返回清洗后的原始数据行（一级模块/二级模块/三级模块/功能过程/子过程描述）。
+    """
+    workbook = cosmic_parse_cache.get(excel_path)
+    if workbook is None:
         return None
+    return workbook.rows.copy()
 
-    # 查找包含数据的 Sheet
-    target_sheet = None
-    for sheet in xl.sheet_names:
-        if '拆分表' in sheet or '功能点' in sheet:
-            target_sheet = sheet
-            break
-
-    if not target_sheet:
-        target_sheet = xl.sheet_names[0]
-        logger.warning(f"未找到特定 Sheet，使用：{target_sheet}")
-    else:
-        logger.info(f"使用 Sheet: {target_sheet}")
-
-    # Excel 结构分析 (0-indexed):
-    # 行 0: 通用软件评估模型
-    # 行 1: 度量策略阶段 | 映射阶段 | 度量阶段
-    # 行 2: 客户需求 | 功能用户 | 触发事件 | 功能过程 | 子过程描述 | ...
-    # 行 3: NaN | 一级模块 | 二级模块 | 三级模块 (这些列标签)
-    # 行 4+: 数据行 - 列 1=一级模块值，列 2=二级模块值，列 3=三级模块值，列 5=功能过程，列 7=子过程描述
-
-    df_raw = pd.read_excel(excel_path, sheet_name=target_sheet, header=None)
-
-    # 查找"一级模块" | "二级模块" | "三级模块" 所在的行 (第 3 行)
-    header_row_idx = 3
-    for idx, row in df_raw.iloc[:5].iterrows():
-        row_values = [str(v) if pd.notna(v) else '' for v in row]
-        row_text = ' '.join(row_values)
-        if '一级模块' in row_text and '二级模块' in row_text and '三级模块' in row_text:
-            header_row_idx = int(idx)
-            break
-
-    logger.info(f"定位到表头在第 {header_row_idx} 行")
-
-    # 数据从第 header_row_idx + 1 行开始
-    df_data = df_raw.iloc[header_row_idx + 1:].reset_index(drop=True)
-
-    # 数据行的列索引：
-    # 列 1: 一级模块值 (如"流程管理")
-    # 列 2: 二级模块值 (如"数据接入流程")
-    # 列 3: 三级模块值 (如"数据接入流程")
-    # 列 6: 功能过程 (如"创建数据接入流程工单") - 注意：列 5 是触发事件
-    # 列 7: 子过程描述 (如"输入-用户...")
-
-    module_l1_col = 1
-    module_l2_col = 2
-    module_l3_col = 3
-    func_col = 6       # 修正：功能过程在列 6，不是列 5
-    subproc_col = 7
-
-    # 收集数据 - 每行的模块值直接读取
-    result = []
-    for idx, row in df_data.iterrows():
-        values = row.tolist()
-
-        # 从数据行直接读取模块值
-        module_l1 = str(values[module_l1_col]).strip() if module_l1_col < len(values) and pd.notna(values[module_l1_col]) else ''
-        module_l2 = str(values[module_l2_col]).strip() if module_l2_col < len(values) and pd.notna(values[module_l2_col]) else ''
-        module_l3 = str(values[module_l3_col]).strip() if module_l3_col < len(values) and pd.notna(values[module_l3_col]) else ''
-
-        # 获取功能过程和子过程描述
-        function_name = str(values[func_col]).strip() if func_col < len(values) and pd.notna(values[func_col]) else ''
-        subprocess_desc = str(values[subproc_col]).strip() if subproc_col < len(values) and pd.notna(values[subproc_col]) else ''
-
-        # 不再在这里过滤，交给 excel_to_word_conversion 处理（需要向下填充）
-        result.append({
-            '一级模块': module_l1,
-            '二级模块': module_l2,
-            '三级模块': module_l3,
-            '功能过程': function_name,
-            '子过程描述': subprocess_desc
-        })
-
-    return pd.DataFrame(result)
 
 def excel_to_word_conversion(excel_path, word_path):
     """执行 Excel 到 Word 的转换（COSMIC 标准格式）"""
     logger.info(f"正在处理：{excel_path.name}")
 
-    df = read_excel_robust(excel_path)
-    if df is None:
+    workbook = cosmic_parse_cache.get(excel_path)
+    if workbook is None:
         raise Exception("无法读取 Excel 文件")
 
     # 创建 Word 文档
@@ -193,151 +90,10 @@ def excel_to_word_conversion(excel_path, word_path):
     font._element.rPr.rFonts.set(qn('w:eastAsia'), '宋体')
     font.size = Pt(10.5)  # 五号字
 
-    # 按模块分组收集数据
-    # 结构：{三级模块：{功能过程：[子过程描述]}}
-    module_data = {}
-    module_l1_value = None  # 一级模块值
-    module_l2_value = None  # 二级模块值
-    module_l3_value = None  # 三级模块值（用于向下填充）
-
-    # Excel 数据结构说明 (基于 header=None 读取):
-    # 行 0-2: 表头信息
-    # 行 3: 包含"一级模块"、"二级模块"、"三级模块"等标签
-    # 行 4+: 实际数据
-    #   列 0: 客户需求描述
-    #   列 1: 一级模块 (如"流程管理")
-    #   列 2: 二级模块 (如"数据接入流程")
-    #   列 3: 三级模块 (如"数据接入流程")
-    #   列 4: 功能用户
-    #   列 5: 触发事件
-    #   列 6: 功能过程 (如"创建数据接入流程工单") ← 关键!
-    #   列 7: 子过程描述 (如"输入-用户...")
-    #   列 8+: 其他列
-    
-    # 直接使用固定列索引，不通过列名查找
-    module_l1_col = 1   # 一级模块在列 1
-    module_l2_col = 2   # 二级模块在列 2
-    module_l3_col = 3   # 三级模块在列 3
-    function_col = 6    # 功能过程在列 6 (不是列 5!)
-    subprocess_col = 7  # 子过程描述在列 7
-
-    logger.info(f"使用列索引：一级模块={module_l1_col}, 二级模块={module_l2_col}, 三级模块={module_l3_col}, 功能过程={function_col}, 子过程描述={subprocess_col}")
-
-    # 调试：统计处理的数据行
-    total_rows = len(df)
-    processed_rows = 0
-    skipped_rows = 0
-    function_name_value = None  # 功能过程值（用于向下填充）
-    logger.debug(f"开始处理 {total_rows} 行数据")
-
-    for idx, row in df.iterrows():
-        # 提取模块信息（通过列名）
-        module_l1 = str(row.get('一级模块', '')) if pd.notna(row.get('一级模块', '')) else ''
-        module_l2 = str(row.get('二级模块', '')) if pd.notna(row.get('二级模块', '')) else ''
-        module_l3 = str(row.get('三级模块', '')) if pd.notna(row.get('三级模块', '')) else ''
-        function_name = str(row.get('功能过程', '')) if pd.notna(row.get('功能过程', '')) else ''
-        subprocess_desc = str(row.get('子过程描述', '')) if pd.notna(row.get('子过程描述', '')) else ''
-
-        # 记录一级模块和二级模块（取第一个非空值）
-        if module_l1 and module_l1 != 'nan' and module_l1.strip():
-            module_l1_value = module_l1
-            logger.debug(f"行 {idx}: 检测到一级模块: {module_l1}")
-        if module_l2 and module_l2 != 'nan' and module_l2.strip():
-            module_l2_value = module_l2
-            logger.debug(f"行 {idx}: 检测到二级模块: {module_l2}")
-        
-        # 三级模块向下填充：如果当前行为空，使用上一个非空值
-        if module_l3 and module_l3 != 'nan' and module_l3.strip():
-            module_l3_value = module_l3
-            logger.debug(f"行 {idx}: 检测到三级模块: {module_l3}")
-        else:
-            module_l3 = module_l3_value if module_l3_value else ''
-        
-        # 功能过程向下填充：如果当前行为空，使用上一个非空值
-        if function_name and function_name != 'nan' and function_name.strip():
-            function_name_value = function_name
-            logger.debug(f"行 {idx}: 检测到功能过程: {function_name}")
-        else:
-            function_name = function_name_value if function_name_value else ''
-
-        # 跳过空行（功能过程和子过程描述都为空）
-        if (not function_name or function_name == 'nan') and (not subprocess_desc or subprocess_desc == 'nan'):
-            skipped_rows += 1
-            continue
-        
-        # 如果功能过程为空但子过程描述不为空，说明这行只有子过程描述，需要继承功能过程
-        if not function_name or function_name == 'nan':
-            # 这种情况不应该发生，因为上面已经做了向下填充
-            # 但如果真的发生了，说明前面没有功能过程定义，跳过
-            skipped_rows += 1
-            logger.debug(f"行 {idx}: 跳过 - 功能过程为空但有子过程描述")
-            continue
-
-        processed_rows += 1
-        logger.debug(f"行 {idx}: 功能过程={function_name}, 三级模块={module_l3}, 子过程={subprocess_desc[:50] if subprocess_desc else '无'}")
-
-        # 按三级模块分组
-        if module_l3 not in module_data:
-            module_data[module_l3] = {}
-            logger.debug(f"创建新的三级模块分组: {module_l3}")
-
-        if function_name not in module_data[module_l3]:
-            module_data[module_l3][function_name] = []
-            logger.debug(f"添加新功能点: {function_name} 到模块 {module_l3}")
-
-        # 收集子过程描述
-        if subprocess_desc and subprocess_desc != 'nan' and subprocess_desc.strip():
-            sub_items = split_subprocess_description(subprocess_desc)
-            module_data[module_l3][function_name].extend(sub_items)
-            logger.debug(f"添加 {len(sub_items)} 个子过程描述到 {function_name}")
-
-    # 按一级模块 -> 二级模块 -> 三级模块分组（嵌套字典）
-    # 结构: {L1: {L2: {L3: {功能过程: [子过程]}}}}
-    hierarchical_data = {}
-    
-    logger.info(f"数据处理完成: 总行数={total_rows}, 处理={processed_rows}, 跳过={skipped_rows}")
-    
-    # 重新遍历，使用向下填充后的值构建完整层级
-    module_l1_value = None
-    module_l2_value = None
-    module_l3_value = None
-    function_name_value = None
-    
-    for idx, row in df.iterrows():
-        module_l1 = str(row.get('一级模块', '')) if pd.notna(row.get('一级模块', '')) else ''
-        module_l2 = str(row.get('二级模块', '')) if pd.notna(row.get('二级模块', '')) else ''
-        module_l3 = str(row.get('三级模块', '')) if pd.notna(row.get('三级模块', '')) else ''
-        function_name = str(row.get('功能过程', '')) if pd.notna(row.get('功能过程', '')) else ''
-        subprocess_desc = str(row.get('子过程描述', '')) if pd.notna(row.get('子过程描述', '')) else ''
-        
-        # 向下填充所有层级
-        if module_l1 and module_l1 != 'nan' and module_l1.strip(): module_l1_value = module_l1
-        if module_l2 and module_l2 != 'nan' and module_l2.strip(): module_l2_value = module_l2
-        if module_l3 and module_l3 != 'nan' and module_l3.strip(): module_l3_value = module_l3
-        if function_name and function_name != 'nan' and function_name.strip():
-            function_name_value = function_name
-        else:
-            function_name = function_name_value if function_name_value else ''
-            
-        # 使用填充后的值
-        if not module_l1 or module_l1 == 'nan': module_l1 = module_l1_value or '未分类'
-        if not module_l2 or module_l2 == 'nan': module_l2 = module_l2_value or '未分类'
-        if not module_l3 or module_l3 == 'nan': module_l3 = module_l3_value or '未分类'
-        
-        # 跳过空行
-        if not function_name or function_name == 'nan': continue
-            
-        # 构建四级嵌套结构: L1 -> L2 -> L3 -> {Func: []}
-        if module_l1 not in hierarchical_data: hierarchical_data[module_l1] = {}
-        if module_l2 not in hierarchical_data[module_l1]: hierarchical_data[module_l1][module_l2] = {}
-        if module_l3 not in hierarchical_data[module_l1][module_l2]: hierarchical_data[module_l1][module_l2][module_l3] = {}
-        if function_name not in hierarchical_data[module_l1][module_l2][module_l3]:
-            hierarchical_data[module_l1][module_l2][module_l3][function_name] = []
-            
-        # 添加子过程
-        if subprocess_desc and subprocess_desc != 'nan' and subprocess_desc.strip():
-            hierarchical_data[module_l1][module_l2][module_l3][function_name].extend(split_subprocess_description(subprocess_desc))
-    
+    # 层级结构由解析器向下填充后构建: {L1: {L2: {L3: {功能过程: [子过程]}}}}
+    hierarchical_data = workbook.hierarchy
+
+    logger.info(f"数据处理完成: 总行数={workbook.total_rows}, 处理={workbook.valid_rows}, 跳过={workbook.skipped_rows}")
     logger.info(f"层级数据统计:")
     for l1, l2_dict in hierarchical_data.items():
         logger.info(f"  一级模块 '{l1}' 包含 {len(l2_dict)} 个二级模块")
@@ -514,75 +270,33 @@ def convert_excel():
         if not excel_path.exists():
             return jsonify({'success': False, 'message': '文件不存在'}), 404
 
-        # 读取数据用于统计
-        df = read_excel_robust(excel_path)
-        if df is None:
-            return jsonify({'success': False, 'message': '无法读取 Excel 文件'}), 500
-
-        # 统计模块数据
-        module_l1_set = set()
-        module_l2_set = set()
-        module_l3_set = set()
-        function_set = set()
-        subprocess_count = 0
-        
-        module_l1_value = None
-        module_l2_value = None
-        module_l3_value = None
-        function_name_value = None
-
-        for idx, row in df.iterrows():
-            module_l1 = str(row.get('一级模块', '')) if pd.notna(row.get('一级模块', '')) else ''
-            module_l2 = str(row.get('二级模块', '')) if pd.notna(row.get('二级模块', '')) else ''
-            module_l3 = str(row.get('三级模块', '')) if pd.notna(row.get('三级模块', '')) else ''
-            function_name = str(row.get('功能过程', '')) if pd.notna(row.get('功能过程', '')) else ''
-            subprocess_desc = str(row.get('子过程描述', '')) if pd.notna(row.get('子过程描述', '')) else ''
-
-            # 记录一级模块和二级模块
-            if module_l1 and module_l1 != 'nan' and module_l1.strip():
-                module_l1_value = module_l1
-                module_l1_set.add(module_l1)
-            if module_l2 and module_l2 != 'nan' and module_l2.strip():
-                module_l2_value = module_l2
-                module_l2_set.add(module_l2)
-            
-            # 三级模块向下填充
-            if module_l3 and module_l3 != 'nan' and module_l3.strip():
-                module_l3_value = module_l3
-            else:
-                module_l3 = module_l3_value if module_l3_value else ''
-            
-            if module_l3 and module_l3.strip():
-                module_l3_set.add(module_l3)
-            
-            # 功能过程向下填充
-            if function_name and function_name != 'nan' and function_name.strip():
-                function_name_value = function_name
-            else:
-                function_name = function_name_value if function_name_value else ''
-
-            # 跳过空行
-            if (not function_name or function_name == 'nan') and (not subprocess_desc or subprocess_desc == 'nan'):
-                continue
-            
-            if not function_name or function_name == 'nan':
-                continue
-            
-            # 只有有效数据才加入功能过程集合
-            if function_name and function_name != 'nan':
-                function_set.add(function_name)
-
-            # 统计子过程
-            if subprocess_desc and subprocess_desc != 'nan' and subprocess_desc.strip():
-                sub_items = split_subprocess_description(subprocess_desc)
-                subprocess_count += len(sub_items)
-
         # 生成输出文件名
         output_filename = f"{Path(filename).stem}_COSMIC.docx"
         word_path = OUTPUT_FOLDER / output_filename
 
-        # 执行转换
-        module_count = excel_to_word_conversion(excel_path, word_path)
+        # 相同内容的 Excel 直接复用缓存的 Word 文档与统计
+        cache_key = conversion_cache.key('cosmic', CACHE_VERSION, sha256_file(excel_path))
+        result = conversion_cache.get(cache_key, {CACHE_ARTIFACT: str(word_path)})
+        if result is None:
+            # 读取数据用于统计（与 Word 生成共享同一次解析）
+            workbook = cosmic_parse_cache.get(excel_path)
+            if workbook is None:
+                return jsonify({'success': False, 'message': '无法读取 Excel 文件'}), 500
+            stats = workbook.stats
+
+            # 执行转换
+            module_count = excel_to_word_conversion(excel_path, word_path)
+            result = {
+                'module_count': module_count,
+                'stats': {
+                    'l1_modules': stats['l1_count'],
+                    'l2_modules': stats['l2_count'],
+                    'l3_modules': stats['l3_count'],
+                    'functions': stats['function_count'],
+                    'subprocesses': stats['subprocess_count']
+                }
+            }
+            conversion_cache.put(cache_key, result, {CACHE_ARTIFACT: str(word_path)})
 
         logger.info(f"转换完成：{output_filename}")
 
@@ -590,14 +304,8 @@ def convert_excel():
             'success': True,
             'message': '转换成功',
             'output_filename': output_filename,
-            'module_count': module_count,
-            'stats': {
-                'l1_modules': len(module_l1_set),
-                'l2_modules': len(module_l2_set),
-                'l3_modules': len(module_l3_set),
-                'functions': len(function_set),
-                'subprocesses': subprocess_count
-            }
+            'module_count': result['module_count'],
+            'stats': result['stats']
         })
 
     except Exception as e:
@@ -639,78 +347,13 @@ def get_module_stats():
         if not excel_path.exists():
             return jsonify({'success': False, 'message': '文件不存在'}), 404
 
-        # 读取数据
-        df = read_excel_robust(excel_path)
-        if df is None:
+        workbook = cosmic_parse_cache.get(excel_path)
+        if workbook is None:
             return jsonify({'success': False, 'message': '无法读取 Excel 文件'}), 500
 
-        # 统计各层级模块数量
-        module_l1_set = set()
-        module_l2_set = set()
-        module_l3_set = set()
-        function_set = set()
-        total_subprocesses = 0
-        
-        module_l1_value = None
-        module_l2_value = None
-        module_l3_value = None
-        function_name_value = None
-
-        for idx, row in df.iterrows():
-            module_l1 = str(row.get('一级模块', '')) if pd.notna(row.get('一级模块', '')) else ''
-            module_l2 = str(row.get('二级模块', '')) if pd.notna(row.get('二级模块', '')) else ''
-            module_l3 = str(row.get('三级模块', '')) if pd.notna(row.get('三级模块', '')) else ''
-            function_name = str(row.get('功能过程', '')) if pd.notna(row.get('功能过程', '')) else ''
-            subprocess_desc = str(row.get('子过程描述', '')) if pd.notna(row.get('子过程描述', '')) else ''
-
-            # 记录一级模块和二级模块
-            if module_l1 and module_l1 != 'nan' and module_l1.strip():
-                module_l1_value = module_l1
-                module_l1_set.add(module_l1)
-            if module_l2 and module_l2 != 'nan' and module_l2.strip():
-                module_l2_value = module_l2
-                module_l2_set.add(module_l2)
-            
-            # 三级模块向下填充
-            if module_l3 and module_l3 != 'nan' and module_l3.strip():
-                module_l3_value = module_l3
-            else:
-                module_l3 = module_l3_value if module_l3_value else ''
-            
-            if module_l3 and module_l3.strip():
-                module_l3_set.add(module_l3)
-            
-            # 功能过程向下填充
-            if function_name and function_name != 'nan' and function_name.strip():
-                function_name_value = function_name
-            else:
-                function_name = function_name_value if function_name_value else ''
-
-            # 跳过空行
-            if (not function_name or function_name == 'nan') and (not subprocess_desc or subprocess_desc == 'nan'):
-                continue
-            
-            if not function_name or function_name == 'nan':
-                continue
-            
-            # 只有有效数据才加入功能过程集合
-            if function_name and function_name != 'nan':
-                function_set.add(function_name)
-
-            # 统计子过程数量
-            if subprocess_desc and subprocess_desc != 'nan' and subprocess_desc.strip():
-                sub_items = split_subprocess_description(subprocess_desc)
-                total_subprocesses += len(sub_items)
-
         return jsonify({
             'success': True,
-            'data': {
-                'l1_count': len(module_l1_set),
-                'l2_count': len(module_l2_set),
-                'l3_count': len(module_l3_set),
-                'function_count': len(function_set),
-                'subprocess_count': total_subprocesses
-            }
+            'data': dict(workbook.stats)
         })
 
     except Exception as e:
@@ -732,85 +375,10 @@ def export_module_stats():
         if not excel_path.exists():
             return jsonify({'success': False, 'message': '文件不存在'}), 404
 
-        # 读取数据
-        df = read_excel_robust(excel_path)
-        if df is None:
+        workbook = cosmic_parse_cache.get(excel_path)
+        if workbook is None:
             return jsonify({'success': False, 'message': '无法读取 Excel 文件'}), 500
-
-        # 重新执行转换逻辑获取详细的模块数据
-        module_data = {}
-        module_l1_value = None
-        module_l2_value = None
-        module_l3_value = None
-        function_name_value = None
-        
-        # 统计用集合
-        module_l1_set = set()
-        module_l2_set = set()
-        module_l3_set = set()
-        function_set = set()
-        total_subprocesses = 0
-
-        for idx, row in df.iterrows():
-            module_l1 = str(row.get('一级模块', '')) if pd.notna(row.get('一级模块', '')) else ''
-            module_l2 = str(row.get('二级模块', '')) if pd.notna(row.get('二级模块', '')) else ''
-            module_l3 = str(row.get('三级模块', '')) if pd.notna(row.get('三级模块', '')) else ''
-            function_name = str(row.get('功能过程', '')) if pd.notna(row.get('功能过程', '')) else ''
-            subprocess_desc = str(row.get('子过程描述', '')) if pd.notna(row.get('子过程描述', '')) else ''
-
-            # 记录一级模块和二级模块
-            if module_l1 and module_l1 != 'nan' and module_l1.strip():
-                module_l1_value = module_l1
-                module_l1_set.add(module_l1)
-            if module_l2 and module_l2 != 'nan' and module_l2.strip():
-                module_l2_value = module_l2
-                module_l2_set.add(module_l2)
-            
-            # 三级模块向下填充
-            if module_l3 and module_l3 != 'nan' and module_l3.strip():
-                module_l3_value = module_l3
-            else:
-                module_l3 = module_l3_value if module_l3_value else ''
-            
-            if module_l3 and module_l3.strip():
-                module_l3_set.add(module_l3)
-            
-            # 功能过程向下填充
-            if function_name and function_name != 'nan' and function_name.strip():
-                function_name_value = function_name
-            else:
-                function_name = function_name_value if function_name_value else ''
-
-            # 跳过空行
-            if (not function_name or function_name == 'nan') and (not subprocess_desc or subprocess_desc == 'nan'):
-                continue
-            
-            if not function_name or function_name == 'nan':
-                continue
-            
-            # 只有有效数据才加入功能过程集合
-            if function_name and function_name != 'nan':
-                function_set.add(function_name)
-
-            # 按三级模块分组
-            if module_l3 not in module_data:
-                module_data[module_l3] = {
-                    '一级模块': module_l1_value,
-                    '二级模块': module_l2_value,
-                    '三级模块': module_l3,
-                    '功能点': {},
-                    'subprocess_count': 0
-                }
-
-            if function_name not in module_data[module_l3]['功能点']:
-                module_data[module_l3]['功能点'][function_name] = []
-
-            # 收集子过程描述
-            if subprocess_desc and subprocess_desc != 'nan' and subprocess_desc.strip():
-                sub_items = split_subprocess_description(subprocess_desc)
-                module_data[module_l3]['功能点'][function_name].extend(sub_items)
-                module_data[module_l3]['subprocess_count'] += len(sub_items)
-                total_subprocesses += len(sub_items)
+        stats = workbook.stats
 
         # 生成输出文件名
         output_filename = f"{Path(filename).stem}_模块统计.xlsx"
@@ -821,11 +389,11 @@ def export_module_stats():
             # Sheet 1: 汇总统计
             summary_data = [
                 ['统计项', '数值'],
-                ['一级模块数量', len(module_l1_set)],
-                ['二级模块数量', len(module_l2_set)],
-                ['三级模块数量', len(module_l3_set)],
-                ['功能过程总数', len(function_set)],
-                ['子过程总数', total_subprocesses]
+                ['一级模块数量', stats['l1_count']],
+                ['二级模块数量', stats['l2_count']],
+                ['三级模块数量', stats['l3_count']],
+                ['功能过程总数', stats['function_count']],
+                ['子过程总数', stats['subprocess_count']]
             ]
             summary_df = pd.DataFrame(summary_data[1:], columns=summary_data[0])
             summary_df.to_excel(writer, sheet_name='汇总统计', index=False)
@@ -837,7 +405,7 @@ def export_module_stats():
             
             # Sheet 2: 详细数据
             detail_data = []
-            for module_l3, module_info in module_data.items():
+            for module_info in workbook.module_details:
                 detail_data.append({
                     '一级模块名称': module_info['一级模块'],
                     '二级模块名称': module_info['二级模块'],
@@ -4,6 +4,7 @@ import os
 import logging
 from docx import Document
 
+from utils.conversion_cache import conversion_cache, file_fingerprint, sha256_bytes, source_version
 from utils.demo_generator import generate_demo_doc
 from utils.demo_validator import validate_demo_format
 from utils.document_formatter import analyze_template_format, enhanced_apply_format_to_document
@@ -14,6 +15,10 @@ from utils.format_matcher import match_document_format
 document_bp = Blueprint('document', __name__)
 logger = logging.getLogger(__name__)
 
+# 解析 / 生成逻辑变化时缓存的转换结果自动失效；Demo 模板作为转换选项参与缓存键
+CONVERT_CACHE_VERSION = source_version('utils.document_parser', 'utils.demo_generator')
+CONVERT_CACHE_ARTIFACT = 'converted_demo.docx'
+
 
 def inspect_document(doc_path):
     """检查文档基本信息"""
@@ -138,9 +143,25 @@ def upload_and_convert():
                                convert_result={'success': False, 'msg': '文件名不能为空'})
 
     try:
+        output_doc_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'converted_demo.docx')
+
+        # 相同文档与模板：直接复用缓存的转换结果
+        data = convert_file.read()
+        cache_key = conversion_cache.key('demo_doc', CONVERT_CACHE_VERSION, sha256_bytes(data),
+                                         {'template': file_fingerprint(current_app.config['DEMO_TEMPLATE_PATH'])})
+        cached = conversion_cache.get(cache_key, {CONVERT_CACHE_ARTIFACT: output_doc_path})
+        if cached is not None:
+            logger.info(f"命中转换缓存，共 {cached['count']} 条数据")
+            return render_template('convert_upload（作废）.html', demo_exists=True, convert_result={
+                'success': True,
+                'msg': f"文档已成功转换为Demo格式，共处理 {cached['count']} 条数据",
+                'download_url': '/download-converted-doc'
+            })
+
         # 保存待转换文件
         source_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'source_doc.docx')
-        convert_file.save(source_path)
+        with open(source_path, 'wb') as f:
+            f.write(data)
         logger.info(f"待转换文件已保存至: {source_path}")
 
         # 文档预检
@@ -170,7 +191,6 @@ def upload_and_convert():
         logger.info(f"文档解析成功，共提取到 {len(parsed_data)} 条数据")
 
         # 步骤2：按Demo模板格式生成新文档
-        output_doc_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'converted_demo.docx')
         logger.info("开始生成转换后的文档")
 
         generate_success, generate_error = generate_demo_doc(
@@ -185,6 +205,7 @@ def upload_and_convert():
                                    convert_result={'success': False, 'msg': f'文档转换失败：{generate_error}'})
 
         logger.info(f"文档转换成功，输出文件路径: {output_doc_path}")
+        conversion_cache.put(cache_key, {'count': len(parsed_data)}, {CONVERT_CACHE_ARTIFACT: output_doc_path})
 
         # 转换成功，返回下载链接
         return render_template('convert_upload（作废）.html', demo_exists=True, convert_result={
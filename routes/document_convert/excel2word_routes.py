@@ -6,10 +6,15 @@ import threading
 import os
 from utils.excel_to_word_core import excel_to_word, verify_consistency
 from utils.cleanup_thread import run_cleanup_loop
+from utils.conversion_cache import conversion_cache, sha256_file, source_version
 
 # 新建蓝图，前缀统一为 /excel2word
 excel2word_bp = Blueprint('excel2word', __name__, url_prefix='/excel2word')
 
+# 转换逻辑变化时缓存的转换结果自动失效
+CACHE_VERSION = source_version('utils.excel_to_word_core')
+CACHE_ARTIFACT = 'output.docx'
+
 # 保存上传的Excel文件（复用现有UPLOAD_FOLDER配置，统一文件管理）
 def save_excel_file(uploaded_file):
     """保存上传的Excel文件，生成唯一文件名"""
@@ -72,8 +77,11 @@ def convert_excel_to_word():
     try:
         excel_path = session['excel_path']
         word_path = session['word_path']
-        # 调用核心转换方法
-        excel_to_word(excel_path, word_path)
+        # 相同内容的 Excel 直接复用缓存的 Word 文档，否则调用核心转换方法
+        cache_key = conversion_cache.key('excel_to_word', CACHE_VERSION, sha256_file(excel_path))
+        if conversion_cache.get(cache_key, {CACHE_ARTIFACT: word_path}) is None:
+            excel_to_word(excel_path, word_path)
+            conversion_cache.put(cache_key, files={CACHE_ARTIFACT: word_path})
         session['converted'] = True
         flash("Word文档生成成功！", "success")
     except Exception as e:
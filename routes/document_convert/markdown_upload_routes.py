@@ -12,6 +12,8 @@ from docx.shared import Pt, RGBColor
 from docx.oxml.ns import qn
 from bs4 import BeautifulSoup
 
+from utils.conversion_cache import conversion_cache, file_fingerprint, sha256_bytes, source_version
+
 # 创建 Blueprint 实例
 markdown_upload_bp = Blueprint('markdown', __name__)
 
@@ -28,6 +30,10 @@ logging.basicConfig(level=logging.INFO)
 KEYWORDS_FILE = os.path.join('config', 'keywords.json')
 TEMPLATE_DOCX = "templates（弃用）/template.docx"
 
+# 转换逻辑变化时缓存的转换结果自动失效；关键词配置作为转换选项参与缓存键
+CACHE_VERSION = source_version(__name__)
+CACHE_ARTIFACT = 'output.docx'
+
 
 def get_db():
     """
@@ -261,6 +267,19 @@ def markdown_convert_api():
         md_filepath = os.path.join(UPLOAD_FOLDER, md_filename)
         word_filename = f'temp_{timestamp}.docx'
         word_filepath = os.path.join(UPLOAD_FOLDER, word_filename)
+        download_url = f'/markdown-upload/download/{word_filename}'
+
+        # 相同内容与关键词配置：直接复用缓存的 Word 文档
+        cache_key = conversion_cache.key('markdown_to_docx', CACHE_VERSION, sha256_bytes(md_content),
+                                         {'keywords': file_fingerprint(KEYWORDS_FILE)})
+        if conversion_cache.get(cache_key, {CACHE_ARTIFACT: word_filepath}) is not None:
+            return jsonify({
+                'success': True,
+                'message': '转换成功',
+                'download_url': download_url,
+                'filename': word_filename,
+                'cached': True
+            })
 
         # 保存 Markdown 内容
         with open(md_filepath, 'w', encoding='utf-8') as f:
@@ -269,9 +288,9 @@ def markdown_convert_api():
         logging.info(f"开始转换 Markdown 内容 -> {word_filepath}")
         convert_md_to_docx(md_filepath, word_filepath)
         logging.info(f"转换完成：{word_filepath}")
+        conversion_cache.put(cache_key, files={CACHE_ARTIFACT: word_filepath})
 
         # 返回下载链接
-        download_url = f'/markdown-upload/download/{word_filename}'
 
         return jsonify({
             'success': True,
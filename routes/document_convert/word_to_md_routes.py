@@ -3,6 +3,8 @@ from flask import Blueprint, request, render_template, send_file, abort, jsonify
 from werkzeug.utils import secure_filename
 from docx import Document
 from markdownify import markdownify as md
+from utils.conversion_cache import conversion_cache, sha256_bytes, source_version
+from utils.docx_reader import DocxReader, HEADING, LIST_ITEM, TABLE
 import io
 import logging
 
@@ -15,6 +17,9 @@ ALLOWED_EXTENSIONS = {'docx'}
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# 转换逻辑变化时缓存的转换结果自动失效
+CACHE_VERSION = source_version(__name__, 'utils.docx_reader')
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -41,81 +46,44 @@ def run_to_md(run):
     return text
 
 
-def detect_heading_level(paragraph):
+def detect_heading_level(event):
     """
     检测段落的标题层级
+    
+    标题样式（Heading / 标题 / 大纲级别）已由 docx_reader 识别为 heading 事件，
+    这里对正文样式的段落做启发式判断
+    
     返回: (level, text) 或 None
     """
-    style_name = paragraph.style.name if paragraph.style else ''
-    style_lower = style_name.lower().strip()
-    
-    # 方法1: 标准 Heading 样式匹配（精确匹配）
-    heading_map = {
-        'heading 1': 1,
-        'heading 2': 2,
-        'heading 3': 3,
-        'heading 4': 4,
-        'heading 5': 5,
-        'heading 6': 6,
-        # 可能的变体
-        'title': 1,
-        'subtitle': 2,
-        # 中文样式名称
-        '标题': 1,
-        '标题 1': 1,
-        '标题 2': 2,
-        '标题 3': 3,
-        '标题 4': 4,
-        '标题 5': 5,
-        '标题 6': 6,
-        '一级标题': 1,
-        '二级标题': 2,
-        '三级标题': 3,
-        '四级标题': 4,
-        '五级标题': 5,
-        '六级标题': 6,
-        'heading1': 1,
-        'heading2': 2,
-        'heading3': 3,
-        'heading4': 4,
-        'heading5': 5,
-        'heading6': 6,
-    }
+    if event.kind == HEADING:
+        text = ''.join(run_to_md(run) for run in event.runs).strip()
+        if text:
+            level = min(6, event.level)
+            logger.debug(f"检测到标准标题 [Level {level}]: {text[:50]}")
+            return level, text
+        return None
     
-    for key, level in heading_map.items():
-        if style_lower == key or style_lower.startswith(key + ' '):
-            text = ''.join(run_to_md(run) for run in paragraph.runs).strip()
-            if text:
-                logger.debug(f"检测到标准标题 [Level {level}]: {text[:50]}")
-                return level, text
+    style_lower = event.style.lower().strip()
     
-    # 方法2: 启发式检测 - 基于样式的潜在标题
-    text_runs = [run for run in paragraph.runs if run.text.strip()]
+    # 启发式检测 - 基于样式的潜在标题
+    text_runs = [run for run in event.runs if run.text.strip()]
     full_text = ''.join(run.text for run in text_runs).strip()
     
     if not full_text:
         return None
     
-    # 检查是否为正文样式（排除已经处理的 Heading 样式）
+    # 检查是否为正文样式
     normal_styles = ['normal', 'normal0', 'body text', '', '正文', '正文文本', '默认段落字体']
     is_normal_style = style_lower in normal_styles
     
-    # 方法3: 通过段落属性检测标题（间距、字体大小等）
-    try:
-        # 检查段落是否有特殊的间距属性（通常标题会有更大的段后间距）
-        paragraph_format = paragraph.paragraph_format
-        if paragraph_format:
-            # 段后间距大于12磅可能是标题
-            if paragraph_format.space_after and paragraph_format.space_after > 120:
-                # 结合加粗判断
-                if any(run.bold for run in text_runs):
-                    text = ''.join(run_to_md(run) for run in paragraph.runs).strip()
-                    if text and not text.endswith(('。', '.', '；', ';', '：', ':', '）', ')')):
-                        level = 3  # 假设是三级标题
-                        logger.debug(f"间距检测标题 [Level {level}]: {text[:50]}")
-                        return level, text
-    except:
-        pass
+    # 通过段落属性检测标题：段后间距大于 12 磅（通常标题会有更大的段后间距）且含加粗
+    if event.space_after and event.space_after > 12:
+        if any(run.bold for run in text_runs):
+            text = ''.join(run_to_md(run) for run in event.runs).strip()
+            if text and not text.endswith(('。', '.', '；', ';', '：', ':', '）', ')')):
+                level = 3  # 假设是三级标题
+                logger.debug(f"间距检测标题 [Level {level}]: {text[:50]}")
+                return level, text
     
     if not is_normal_style:
         return None
@@ -166,33 +134,26 @@ def detect_heading_level(paragraph):
     return None
 
 
-def para_to_md(paragraph):
-    """将段落转换为 Markdown 格式"""
+def para_to_md(event):
+    """将段落事件转换为 Markdown 格式"""
     # 首先尝试检测是否为标题
-    heading_result = detect_heading_level(paragraph)
+    heading_result = detect_heading_level(event)
     if heading_result:
         level, text = heading_result
         return '#' * level + ' ' + text
     
     # 普通段落处理
-    text = ''.join(run_to_md(run) for run in paragraph.runs).strip()
+    text = ''.join(run_to_md(run) for run in event.runs).strip()
     return text if text else ''
 
 
-def table_to_md(table):
-    """将 Word 表格转换为 Markdown 表格格式"""
+def table_to_md(rows):
+    """将表格单元格文本转换为 Markdown 表格格式"""
     try:
         md_lines = []
-        rows = []
         
-        # 提取所有行的数据
-        for row in table.rows:
-            cells = []
-            for cell in row.cells:
-                # 清理单元格内容（去除多余空白）
-                cell_text = cell.text.strip().replace('\n', ' ').replace('|', '\\|')
-                cells.append(cell_text)
-            rows.append(cells)
+        # 清理单元格内容（去除多余空白）
+        rows = [[cell.strip().replace('\n', ' ').replace('|', '\\|') for cell in row] for row in rows]
         
         if not rows:
             return ''
@@ -223,80 +184,20 @@ def table_to_md(table):
         return ''
 
 
-def list_item_to_md(paragraph, is_numbered=False):
-    """将列表项转换为 Markdown 格式"""
-    text = ''.join(run_to_md(run) for run in paragraph.runs).strip()
+def list_item_to_md(event):
+    """将列表项事件转换为 Markdown 格式（每级缩进 2 个空格）"""
+    text = ''.join(run_to_md(run) for run in event.runs).strip()
     if not text:
         return ''
     
-    prefix = '1. ' if is_numbered else '- '
-    return prefix + text
-
-
-def is_list_paragraph(paragraph):
-    """检测段落是否为列表项"""
-    # 方法1: 通过样式名称检测
-    if paragraph.style and 'list' in paragraph.style.name.lower():
-        return True
-    
-    # 方法2: 通过 XML 元素检测编号属性
-    if paragraph._element.xpath('.//w:numPr'):
-        return True
-    
-    # 方法3: 通过段落格式属性检测
-    try:
-        if hasattr(paragraph, 'style') and paragraph.style:
-            style_id = paragraph.style.id
-            if style_id and ('list' in style_id.lower() or 'num' in style_id.lower()):
-                return True
-    except:
-        pass
-    
-    return False
-
-
-def get_list_level(paragraph):
-    """获取列表项的层级（从0开始）"""
-    try:
-        # 尝试从段落的编号属性中获取层级
-        num_pr = paragraph._element.xpath('.//w:numPr')
-        if num_pr:
-            # 查找 w:ilvl 元素
-            ilvl = num_pr[0].xpath('.//w:ilvl')
-            if ilvl:
-                # 获取层级值
-                val = ilvl[0].xpath('.//w:val')
-                if val:
-                    return int(val[0].text) if val[0].text else 0
-        return 0
-    except:
-        return 0
-
-
-def is_numbered_list(paragraph):
-    """检测是否为有序列表"""
-    try:
-        num_pr = paragraph._element.xpath('.//w:numPr')
-        if num_pr:
-            # 查找编号格式类型
-            num_fmt = num_pr[0].xpath('.//w:numFmt')
-            if num_fmt:
-                val = num_fmt[0].xpath('.//w:val')
-                if val and val[0].text:
-                    # 如果是数字格式，则为有序列表
-                    return val[0].text in ['decimal', 'lowerRoman', 'upperRoman', 'lowerLetter', 'upperLetter']
-            # 默认认为有编号属性的是有序列表
-            return True
-        return False
-    except:
-        return False
+    prefix = '1. ' if event.numbered else '- '
+    return '  ' * event.level + prefix + text
 
 
 def docx_to_markdown(docx_path):
-    """将 Word 文档转换为 Markdown 格式"""
+    """将 Word 文档转换为 Markdown 格式（按正文顺序，段落与表格交错输出）"""
     logger.info(f"开始转换 Word 文档: {docx_path}")
     
-    doc = Document(docx_path)
     md_lines = []
     
     # 统计信息
@@ -308,27 +209,29 @@ def docx_to_markdown(docx_path):
     # 追踪列表状态
     in_list = False
     
-    # 处理段落
-    for para in doc.paragraphs:
-        # 检查是否为列表项
-        if is_list_paragraph(para):
-            # 获取列表层级和类型
-            level = get_list_level(para)
-            is_numbered = is_numbered_list(para)
-            text = ''.join(run_to_md(run) for run in para.runs).strip()
-            
-            if text:
-                # 添加缩进（每级2个空格）
-                indent = '  ' * level
-                prefix = '1. ' if is_numbered else '- '
-                md_line = indent + prefix + text
+    for event in DocxReader(docx_path):
+        if event.kind == TABLE:
+            table_md = table_to_md(event.rows)
+            if table_md:
+                # 在表格前后添加空行
+                if md_lines and md_lines[-1]:
+                    md_lines.append('')
+                md_lines.append(table_md)
+                md_lines.append('')
+                table_count += 1
+                in_list = False
+            continue
+        
+        if event.kind == LIST_ITEM:
+            md_line = list_item_to_md(event)
+            if md_line:
                 md_lines.append(md_line)
                 list_count += 1
                 in_list = True
                 continue
         
         # 普通段落或标题处理
-        md_line = para_to_md(para)
+        md_line = para_to_md(event)
         if md_line:
             # 如果之前是列表，现在不是，添加空行分隔
             if in_list:
@@ -342,17 +245,6 @@ def docx_to_markdown(docx_path):
             if md_line.startswith('#'):
                 heading_count += 1
     
-    # 处理表格
-    for table in doc.tables:
-        table_md = table_to_md(table)
-        if table_md:
-            # 在表格前后添加空行
-            if md_lines and md_lines[-1]:
-                md_lines.append('')
-            md_lines.append(table_md)
-            md_lines.append('')
-            table_count += 1
-    
     # 处理段落中的换行符（保留合理的换行）
     final_lines = []
     for line in md_lines:
@@ -397,9 +289,23 @@ def word_to_md_convert_api():
         filename_without_ext = os.path.splitext(safe_filename)[0]
         md_filename = filename_without_ext + '.md'
         
+        # 相同内容的文件直接返回缓存的转换结果
+        data = file.read()
+        cache_key = conversion_cache.key('word_to_md', CACHE_VERSION, sha256_bytes(data))
+        cached = conversion_cache.get(cache_key)
+        if cached is not None:
+            return jsonify({
+                'success': True,
+                'message': '转换成功',
+                'markdown': cached['markdown'],
+                'filename': md_filename,
+                'cached': True
+            })
+
         # 保存文件
         filepath = os.path.join(UPLOAD_FOLDER, safe_filename)
-        file.save(filepath)
+        with open(filepath, 'wb') as f:
+            f.write(data)
 
         try:
             markdown_text = docx_to_markdown(filepath)
@@ -413,6 +319,8 @@ def word_to_md_convert_api():
         if os.path.exists(filepath):
             os.remove(filepath)
 
+        conversion_cache.put(cache_key, {'markdown': markdown_text})
+
         return jsonify({
             'success': True,
             'message': '转换成功',
@@ -2,12 +2,19 @@
 # -*- coding: utf-8 -*-
 """
 调整因子计算器路由
+
+计算使用编译后的因子表（utils/fpa_adjustment_factors.py），修改因子分值的接口需调用
+factor_table_cache.invalidate()
 """
 from flask import Blueprint, render_template, request, jsonify, current_app
 import mysql.connector
 from decimal import Decimal
 import json
 
+from utils.fpa_adjustment_factors import (
+    FACTOR_ROWS_SQL, evaluate, evaluate_matrix, factor_table_cache, option_lookup
+)
+
 adjustment_calc_bp = Blueprint('adjustment_calc', __name__, url_prefix='/adjustment-calc')
 
 
@@ -30,6 +37,24 @@ def decimal_to_float(obj):
     return obj
 
 
+def load_factor_rows():
+    """读取 fpa_adjustment_factor 全部行（编译因子表用）"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(FACTOR_ROWS_SQL)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    finally:
+        conn.close()
+
+
+def get_factor_table():
+    """编译后的因子表（因子被修改后重新加载）"""
+    return factor_table_cache.get(load_factor_rows)
+
+
 @adjustment_calc_bp.route('/page')
 def adjustment_calculator_page():
     """调整因子计算器页面"""
@@ -64,6 +89,7 @@ def fix_scale_timing():
         conn.commit()
         cursor.close()
         conn.close()
+        factor_table_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -152,6 +178,7 @@ def calculate_score():
         
         cursor.close()
         conn.close()
+        factor_table_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -209,13 +236,8 @@ def excel_if_formula_c2_b36_d39(selected_value, config_data):
     返回:
         对应的分值，如果没有匹配则返回 0
     """
-    # 将 Excel 的 IF 嵌套转换为 Python 的循环查找
-    for config in config_data:
-        if selected_value == config['option_name']:
-            return float(config['score_value'])
-    
-    # 如果没有匹配，返回 0（对应 Excel 公式最后的 0）
-    return 0.0
+    # Excel 的 IF 嵌套即按顺序取第一个匹配项；没有匹配返回 0（对应 Excel 公式最后的 0）
+    return option_lookup(config_data).get(selected_value, 0.0)
 
 
 def excel_formula_lookup(selected_value, b_cells, d_cells):
@@ -235,11 +257,7 @@ def excel_formula_lookup(selected_value, b_cells, d_cells):
     if len(b_cells) != len(d_cells):
         raise ValueError("B 列和 D 列的长度必须相同")
     
-    for i in range(len(b_cells)):
-        if selected_value == b_cells[i]:
-            return float(d_cells[i])
-    
-    return 0.0
+    return option_lookup(b_cells, d_cells).get(selected_value, 0.0)
 
 
 @adjustment_calc_bp.route('/api/scale-timing-config', methods=['GET'])
@@ -317,6 +335,7 @@ def save_scale_timing_config():
         
         cursor.close()
         conn.close()
+        factor_table_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -403,261 +422,63 @@ def get_calculator_data():
 def calculate_adjustment():
     """根据用户选择计算调整因子"""
     try:
-        data = request.json
-        
-        # 用户选择
-        scale_timing = data.get('scale_timing')  # 估算早期/中期/晚期/项目完成
-        application_type = data.get('application_type')  # 业务处理/应用集成等
-        distributed_processing = data.get('distributed_processing')  # 分布式处理选项
-        performance = data.get('performance')  # 性能选项
-        reliability = data.get('reliability')  # 可靠性选项
-        multi_site = data.get('multi_site')  # 多重站点选项
-        language = data.get('language')  # 开发语言
-        team_background = data.get('team_background')  # 开发团队背景
-        reuse_level = data.get('reuse_level', '低')  # 重用程度
-        change_type = data.get('change_type', '新增')  # 修改类型
-        
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        data = request.json or {}
         
-        result = {
-            'scale_factor': 0,  # 规模变更调整因子
-            'application_factor': 0,  # 应用类型调整因子
-            'quality_factor': 0,  # 质量特性调整因子（分布式 + 性能 + 可靠性 + 多重站点）
-            'language_factor': 0,  # 开发语言调整因子
-            'team_factor': 0,  # 开发团队背景调整因子
-            'reuse_factor': 0,  # 重用程度调整因子
-            'change_factor': 0,  # 修改类型调整因子
-            'total_factor': 0,  # 总调整因子
-            'details': {}  # 详细计算过程
-        }
+        # 用户选择：scale_timing（估算早期/中期/晚期/项目完成）、application_type、
+        # 质量特性四项（distributed_processing / performance / reliability / multi_site）、
+        # language、team_background、reuse_level（默认 低）、change_type（默认 新增）
+        result = evaluate(get_factor_table(), data)
         
-        # 1. 规模变更调整因子
-        cursor.execute('''
-            SELECT * FROM fpa_adjustment_factor 
-            WHERE factor_category = '规模变更调整系数' AND option_name = %s
-        ''', (scale_timing,))
-        scale_row = cursor.fetchone()
-        # 清除未读取的结果
-        cursor.fetchall() if cursor.with_rows else None
-        if scale_row:
-            result['scale_factor'] = scale_row['score_value']
-            result['details']['scale'] = {
-                'name': '规模变更调整因子',
-                'option': scale_row['option_name'],
-                'value': scale_row['score_value']
-            }
-        
-        # 2. 应用类型调整因子
-        cursor.execute('''
-            SELECT * FROM fpa_adjustment_factor 
-            WHERE factor_category = '应用类型' AND option_name = %s
-        ''', (application_type,))
-        app_row = cursor.fetchone()
-        # 清除未读取的结果
-        cursor.fetchall() if cursor.with_rows else None
-        if app_row:
-            result['application_factor'] = app_row['score_value']
-            result['details']['application'] = {
-                'name': '应用类型调整因子',
-                'option': app_row['option_name'],
-                'value': app_row['score_value']
-            }
-        
-        # 3. 质量特性调整因子（分布式 + 性能 + 可靠性 + 多重站点）
-        quality_total = 0
-        quality_details = []
-        
-        # 分布式处理
-        cursor.execute('''
-            SELECT * FROM fpa_adjustment_factor 
-            WHERE factor_name = '分布式处理' AND option_name = %s
-        ''', (distributed_processing,))
-        dp_row = cursor.fetchone()
-        # 清除未读取的结果
-        cursor.fetchall() if cursor.with_rows else None
-        if dp_row:
-            quality_total += dp_row['score_value']
-            quality_details.append({
-                'name': '分布式处理',
-                'option': dp_row['option_name'],
-                'value': dp_row['score_value']
-            })
-        
-        # 性能
-        cursor.execute('''
-            SELECT * FROM fpa_adjustment_factor 
-            WHERE factor_name = '性能' AND option_name = %s
-        ''', (performance,))
-        perf_row = cursor.fetchone()
-        # 清除未读取的结果
-        cursor.fetchall() if cursor.with_rows else None
-        if perf_row:
-            quality_total += perf_row['score_value']
-            quality_details.append({
-                'name': '性能',
-                'option': perf_row['option_name'],
-                'value': perf_row['score_value']
-            })
-        
-        # 可靠性
-        cursor.execute('''
-            SELECT * FROM fpa_adjustment_factor 
-            WHERE factor_name = '可靠性' AND option_name = %s
-        ''', (reliability,))
-        rel_row = cursor.fetchone()
-        # 清除未读取的结果
-        cursor.fetchall() if cursor.with_rows else None
-        if rel_row:
-            quality_total += rel_row['score_value']
-            quality_details.append({
-                'name': '可靠性',
-                'option': rel_row['option_name'],
-                'value': rel_row['score_value']
-            })
-        
-        # 多重站点
-        cursor.execute('''
-            SELECT * FROM fpa_adjustment_factor 
-            WHERE factor_name = '多重站点' AND option_name = %s
-        ''', (multi_site,))
-        ms_row = cursor.fetchone()
-        # 清除未读取的结果
-        cursor.fetchall() if cursor.with_rows else None
-        if ms_row:
-            quality_total += ms_row['score_value']
-            quality_details.append({
-                'name': '多重站点',
-                'option': ms_row['option_name'],
-                'value': ms_row['score_value']
-            })
-        
-        result['quality_factor'] = quality_total
-        result['details']['quality'] = {
-            'name': '质量特性调整因子',
-            'sub_items': quality_details,
-            'total': quality_total
-        }
+        return jsonify({
+            'success': True,
+            'data': result
+        })
         
-        # 4. 开发语言调整因子
-        cursor.execute('''
-            SELECT * FROM fpa_adjustment_factor 
-            WHERE factor_category = '开发语言' AND option_name = %s
-        ''', (language,))
-        lang_row = cursor.fetchone()
-        # 清除未读取的结果
-        cursor.fetchall() if cursor.with_rows else None
-        if lang_row:
-            result['language_factor'] = lang_row['score_value']
-            result['details']['language'] = {
-                'name': '开发语言调整因子',
-                'option': lang_row['option_name'],
-                'value': lang_row['score_value']
-            }
-        else:
-            result['language_factor'] = 0
-            result['details']['language'] = {
-                'name': '开发语言调整因子',
-                'option': language,
-                'value': 0
-            }
-        
-        # 5. 开发团队背景调整因子
-        cursor.execute('''
-            SELECT * FROM fpa_adjustment_factor 
-            WHERE factor_category = '开发团队背景' AND option_name = %s
-        ''', (team_background,))
-        team_row = cursor.fetchone()
-        # 清除未读取的结果
-        cursor.fetchall() if cursor.with_rows else None
-        if team_row:
-            result['team_factor'] = team_row['score_value']
-            result['details']['team'] = {
-                'name': '开发团队背景调整因子',
-                'option': team_row['option_name'],
-                'value': team_row['score_value']
-            }
-        else:
-            result['team_factor'] = 0
-            result['details']['team'] = {
-                'name': '开发团队背景调整因子',
-                'option': team_background,
-                'value': 0
-            }
-        
-        # 6. 重用程度调整因子
-        cursor.execute('''
-            SELECT * FROM fpa_adjustment_factor 
-            WHERE factor_category = '重用程度调整系数' AND option_name = %s
-        ''', (reuse_level,))
-        reuse_row = cursor.fetchone()
-        # 清除未读取的结果
-        cursor.fetchall() if cursor.with_rows else None
-        if reuse_row:
-            result['reuse_factor'] = reuse_row['score_value']
-            result['details']['reuse'] = {
-                'name': '重用程度调整因子',
-                'option': reuse_row['option_name'],
-                'value': reuse_row['score_value']
-            }
-        else:
-            result['reuse_factor'] = 0
-            result['details']['reuse'] = {
-                'name': '重用程度调整因子',
-                'option': reuse_level,
-                'value': 0
-            }
-        
-        # 7. 修改类型调整因子
-        cursor.execute('''
-            SELECT * FROM fpa_adjustment_factor 
-            WHERE factor_category = '修改类型调整系数' AND option_name = %s
-        ''', (change_type,))
-        change_row = cursor.fetchone()
-        # 清除未读取的结果
-        cursor.fetchall() if cursor.with_rows else None
-        if change_row:
-            result['change_factor'] = change_row['score_value']
-            result['details']['change'] = {
-                'name': '修改类型调整因子',
-                'option': change_row['option_name'],
-                'value': change_row['score_value']
-            }
-        else:
-            result['change_factor'] = 0
-            result['details']['change'] = {
-                'name': '修改类型调整因子',
-                'option': change_type,
-                'value': 0
-            }
-        
-        # 计算总调整因子（所有因子的乘积）
-        result['total_factor'] = (
-            result['scale_factor'] *
-            result['application_factor'] *
-            result['quality_factor'] *
-            result['language_factor'] *
-            result['team_factor'] *
-            result['reuse_factor'] *
-            result['change_factor']
-        )
-        
-        result['details']['total'] = {
-            'name': '总调整因子',
-            'formula': '规模变更 × 应用类型 × 质量特性 × 开发语言 × 团队背景 × 重用程度 × 修改类型',
-            'value': result['total_factor']
-        }
+    except Exception as e:
+        current_app.logger.error(f"计算调整因子失败：{e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@adjustment_calc_bp.route('/api/what-if', methods=['POST'])
+def what_if_adjustment():
+    """
+    批量计算多个选项组合的调整因子（情景对比）
+    
+    请求参数：
+    {
+        "base": {与 /api/calculate 相同的选择，作为不变部分},
+        "vary": {"scale_timing": "*", "performance": ["低", "高"]}   // "*" 表示该项的全部选项
+    }
+    """
+    try:
+        data = request.json or {}
+        vary = data.get('vary') or {}
+        if not vary:
+            return jsonify({
+                'success': False,
+                'message': '请提供需要对比的选项（vary）'
+            }), 400
         
-        cursor.close()
-        conn.close()
+        table = get_factor_table()
+        try:
+            matrix = evaluate_matrix(table, data.get('base') or {}, vary)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
         
+        matrix['factor_version'] = table.version
         return jsonify({
             'success': True,
-            'data': result
+            'data': matrix
         })
         
     except Exception as e:
-        current_app.logger.error(f"计算调整因子失败：{e}")
+        current_app.logger.error(f"批量计算调整因子失败：{e}")
         return jsonify({
             'success': False,
             'message': str(e)
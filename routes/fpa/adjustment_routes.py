@@ -9,6 +9,8 @@ from decimal import Decimal
 import json
 from datetime import datetime
 
+from utils.fpa_adjustment_factors import factor_table_cache
+
 adjustment_bp = Blueprint('adjustment', __name__, url_prefix='/adjustment')
 
 
@@ -105,6 +107,7 @@ def create_factor():
         
         cursor.close()
         conn.close()
+        factor_table_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -159,6 +162,7 @@ def update_factor(factor_id):
         
         cursor.close()
         conn.close()
+        factor_table_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -189,6 +193,7 @@ def delete_factor(factor_id):
         
         cursor.close()
         conn.close()
+        factor_table_cache.invalidate()
         
         return jsonify({
             'success': True,
@@ -346,6 +351,7 @@ def import_from_excel():
         
         cursor.close()
         conn.close()
+        factor_table_cache.invalidate()
         
         # 删除临时文件
         os.remove(temp_path)
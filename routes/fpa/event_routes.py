@@ -4,6 +4,8 @@ import re
 import json
 import logging
 
+from utils.event_cleaner import iter_hit_batches, ndjson_response, normalize_event_time
+
 event_bp = Blueprint('event', __name__)
 logger = logging.getLogger(__name__)
 
@@ -91,39 +93,25 @@ def parse_es_json():
         if not hits:
             return jsonify({'success': False, 'message': '未找到事件数据'}), 400
         
-        result_list = []
+        # 输出方式：json（默认）/ ndjson（流式）/ download（NDJSON 文件下载）
+        output = request.args.get('output') or request_data.get('output') or 'json'
+        if output in ('ndjson', 'download'):
+            return ndjson_response(iter_hit_batches(hits),
+                                   download_name='es_events' if output == 'download' else None)
         
-        for hit in hits:
-            source = hit.get('_source', {})
-            dispatch_info = source.get('DISPATCH_INFO', {})
-            dispatch_reason = dispatch_info.get('DISPATCH_REASON', '')
-            
-            # 判断主单还是子单
-            is_main_order = (dispatch_reason == '工单派发成功')
-            order_type = '主单' if is_main_order else '子单'
-            
-            # 提取关键字段
-            event_data = {
-                'order_type': order_type,
-                'is_main_order': is_main_order,
-                'dispatch_reason': dispatch_reason,
-                'event_id': source.get('EVENT_ID'),
-                'event_name': source.get('EVENT_NAME'),
-                'equipment_name': source.get('EQUIPMENT_NAME'),
-                'alarm_name': source.get('ALARM_NAME'),
-                'event_time': source.get('EVENT_TIME'),
-                'order_id': source.get('ORDER_ID'),
-                'full_source': source  # 保留完整数据用于复制
-            }
-            
-            result_list.append(event_data)
+        # 按批整列识别主单/子单
+        result_list = []
+        main_count = 0
+        for records, stats in iter_hit_batches(hits):
+            result_list.extend(records)
+            main_count += stats['main']
         
         return jsonify({
             'success': True,
             'data': result_list,
             'total': len(result_list),
-            'main_count': sum(1 for item in result_list if item['is_main_order']),
-            'sub_count': sum(1 for item in result_list if not item['is_main_order'])
+            'main_count': main_count,
+            'sub_count': len(result_list) - main_count
         })
         
     except json.JSONDecodeError as e:
@@ -138,47 +126,8 @@ def clean_event_data(fp_value, event_time):
     """清洗事件数据"""
     active_status = "3"  # 保持不变
 
-    # 统一处理日期分隔符，将"/"替换为"-"
-    cleaned_time = event_time.replace("/", "-")
-
-    # 分割日期和时间部分
-    if " " in cleaned_time:
-        date_part, time_part = cleaned_time.split(" ", 1)
-    else:
-        # 如果只有日期部分，默认时间为00:00
-        date_part = cleaned_time
-        time_part = "00:00:00"
-
-    # 处理日期部分
-    if "-" in date_part:
-        date_components = date_part.split("-")
-        if len(date_components) >= 3:
-            year, month, day = date_components[0], date_components[1], date_components[2]
-        else:
-            raise ValueError("日期格式不正确")
-    else:
-        raise ValueError("日期格式不正确")
-
-    # 处理时间部分
-    if ":" in time_part:
-        time_components = time_part.split(":")
-        if len(time_components) >= 2:
-            hour, minute = time_components[0], time_components[1]
-            # 如果有秒部分则保留，否则设为00
-            second = time_components[2] if len(time_components) >= 3 else "00"
-        else:
-            hour, minute, second = time_components[0], "00", "00"
-    else:
-        hour, minute, second = "00", "00", "00"
-
-    # 确保各部分为两位数
-    formatted_hour = hour.zfill(2)
-    formatted_minute = minute.zfill(2)
-    formatted_second = second.zfill(2)
-
-    # 确保年月日为正确格式
-    cleaned_date = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-    cleaned_event_time = f"{cleaned_date} {formatted_hour}:{formatted_minute}:{formatted_second}"
+    # 统一为 YYYY-MM-DD HH:MM:SS（"/" 与 "-" 分隔均可，缺省的时间部分补 00）
+    cleaned_event_time = normalize_event_time(event_time)
 
     # 构建目标格式数据
     result = {
@@ -6,6 +6,8 @@ import threading
 import time
 import re
 
+from utils.llm_admission import PRIORITY_BATCH
+
 logger = logging.getLogger(__name__)
 
 
@@ -241,7 +243,8 @@ JSON 格式（每个功能点对应一个数组）：
             # 调用本地 AI 模型
             response = ollama.generate(
                 prompt=prompt,
-                stream=False
+                stream=False,
+                priority=PRIORITY_BATCH  # 批量扩展让位于交互请求
             )
 
             # 重置失败计数
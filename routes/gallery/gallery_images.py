@@ -0,0 +1,203 @@
+"""
+画廊图片存储
+- 上传图片按内容哈希命名（同一图片重复上传只存一份）
+- 上传时生成多尺寸缩略图（WebP + JPEG），列表页只需加载缩略图
+- 读取时返回强 ETag；内容哈希命名的文件可 immutable 长缓存，并支持 Range 请求
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# 缩略图宽度（像素），列表页用 THUMB_LIST_WIDTH
+THUMBNAIL_WIDTHS = (320, 960)
+THUMB_LIST_WIDTH = 320
+THUMBNAIL_QUALITY = 80
+HASH_LENGTH = 16
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# 原图 <hash>.<ext>，缩略图 <hash>_w<width>.<webp|jpg>
+HASHED_NAME_PATTERN = re.compile(r'^(?P<hash>[0-9a-f]{%d})(?:_w(?P<width>\d+))?\.(?P<ext>[a-z0-9]+)$' % HASH_LENGTH)
+
+WEBP_SUPPORTED = features.check('webp')
+
+# 目录列表缓存：{目录: (目录 mtime_ns, 文件名集合)}，列表页按集合判断缩略图是否存在，不再逐条 stat
+_listing_cache = {}
+_listing_lock = threading.Lock()
+
+
+def content_hash(data: bytes) -> str:
+    """返回内容 SHA-256 前缀，作为文件名和 ETag"""
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def thumbnail_name(digest, width, fmt='webp'):
+    """缩略图文件名"""
+    ext = 'jpg' if fmt == 'jpeg' else fmt
+    return f"{digest}_w{width}.{ext}"
+
+
+def generate_thumbnails(source_path, images_dir, digest):
+    """
+    生成多尺寸缩略图
+
+    Args:
+        source_path: 原图路径
+        images_dir: 输出目录
+        digest: 原图内容哈希
+
+    Returns:
+        {宽度: {'webp': 文件名, 'jpeg': 文件名}}，原图比目标宽度小时不放大
+    """
+    thumbnails = {}
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'P') else 'RGB')
+
+        for width in THUMBNAIL_WIDTHS:
+            thumb = img.copy()
+            if thumb.width > width:
+                height = max(1, round(thumb.height * width / thumb.width))
+                thumb = thumb.resize((width, height), Image.LANCZOS)
+
+            variants = {}
+            if WEBP_SUPPORTED:
+                name = thumbnail_name(digest, width, 'webp')
+                thumb.save(os.path.join(images_dir, name), 'WEBP', quality=THUMBNAIL_QUALITY, method=4)
+                variants['webp'] = name
+
+            name = thumbnail_name(digest, width, 'jpeg')
+            rgb = thumb
+            if thumb.mode == 'RGBA':
+                rgb = Image.new('RGB', thumb.size, (255, 255, 255))
+                rgb.paste(thumb, mask=thumb.split()[-1])
+            rgb.save(os.path.join(images_dir, name), 'JPEG', quality=THUMBNAIL_QUALITY,
+                     optimize=True, progressive=True)
+            variants['jpeg'] = name
+            thumbnails[width] = variants
+    return thumbnails
+
+
+def image_names(images_dir):
+    """
+    目录下的文件名集合（按目录 mtime 缓存，新增或删除文件后自动重新列目录）
+
+    Returns:
+        frozenset；目录不存在时为空集合
+    """
+    try:
+        mtime = os.stat(images_dir).st_mtime_ns
+    except OSError:
+        return frozenset()
+    cached = _listing_cache.get(images_dir)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with _listing_lock:
+        names = frozenset(os.listdir(images_dir))
+        _listing_cache[images_dir] = (mtime, names)
+    return names
+
+
+def _forget_listing(images_dir):
+    """写入文件后丢弃目录列表缓存（mtime 精度较粗的文件系统上同一时刻的写入也能被看到）"""
+    with _listing_lock:
+        _listing_cache.pop(images_dir, None)
+
+
+def _existing_thumbnails(images_dir, digest):
+    """已生成的缩略图（全部尺寸的 JPEG 都存在才视为完整）"""
+    thumbnails = {}
+    for width in THUMBNAIL_WIDTHS:
+        variants = {fmt: thumbnail_name(digest, width, fmt)
+                    for fmt in (('webp', 'jpeg') if WEBP_SUPPORTED else ('jpeg',))}
+        if not all(os.path.exists(os.path.join(images_dir, name)) for name in variants.values()):
+            return {}
+        thumbnails[width] = variants
+    return thumbnails
+
+
+def save_image(data: bytes, ext: str, images_dir: str):
+    """
+    保存上传图片并生成缩略图
+
+    Args:
+        data: 图片字节
+        ext: 扩展名（小写，不含点）
+        images_dir: 存储目录
+
+    Returns:
+        (原图文件名, 缩略图字典)；图片无法解码时缩略图字典为空
+    """
+    digest = content_hash(data)
+    filename = f"{digest}.{ext}"
+    filepath = os.path.join(images_dir, filename)
+    existing = _existing_thumbnails(images_dir, digest)
+    if os.path.exists(filepath) and existing:
+        # 重复上传同一图片：原图与缩略图都已存在
+        return filename, existing
+
+    if not os.path.exists(filepath):
+        tmp_path = f"{filepath}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, filepath)
+
+    try:
+        thumbnails = generate_thumbnails(filepath, images_dir, digest)
+    except (OSError, ValueError) as e:
+        logger.warning(f"[GALLERY] 缩略图生成失败 {filename}: {e}")
+        thumbnails = {}
+    finally:
+        _forget_listing(images_dir)
+    return filename, thumbnails
+
+
+def thumbnail_for(image_url, images_dir, url_prefix, width=THUMB_LIST_WIDTH, names=None):
+    """
+    为画廊图片 URL 找到对应缩略图 URL（按客户端 Accept 选择 WebP / JPEG）
+
+    非本画廊上传的图片或缩略图不存在时返回原 URL。
+    names 为 image_names() 的结果，列表页整页共用一次，省略时自行查询。
+    """
+    if not image_url or not image_url.startswith(url_prefix):
+        return image_url
+    match = HASHED_NAME_PATTERN.match(image_url[len(url_prefix):])
+    if not match or match.group('width'):
+        return image_url
+
+    fmt = 'webp' if WEBP_SUPPORTED and 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    name = thumbnail_name(match.group('hash'), width, fmt)
+    if names is None:
+        names = image_names(images_dir)
+    if name not in names:
+        return image_url
+    return f"{url_prefix}{name}"
+
+
+def send_image(images_dir, filename):
+    """
+    发送图片文件：强 ETag + 条件请求 (304) + Range (206)
+
+    内容哈希命名的文件内容永不变化，返回 immutable 一年缓存；其余文件每次校验 ETag。
+    """
+    filepath = safe_join(images_dir, filename)
+    if filepath is None or not os.path.isfile(filepath):
+        abort(404)
+    match = HASHED_NAME_PATTERN.match(filename)
+    if match:
+        etag = filename.replace('.', '-')
+    else:
+        stat = os.stat(filepath)
+        etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    response = send_file(filepath, conditional=True, etag=etag, max_age=0)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if match else 'no-cache'
+    return response
@@ -2,11 +2,13 @@
 画作与诗集展示 - 后端路由
 提供画作和诗集的 CRUD 及浏览接口
 """
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, jsonify, request
 import os
-import json
 from datetime import datetime
 
+from .gallery_images import image_names, save_image, send_image, thumbnail_for
+from .gallery_store import GalleryStore
+
 gallery_bp = Blueprint('gallery', __name__, url_prefix='/api/gallery')
 
 # ==================== 数据存储路径 ====================
@@ -160,66 +162,60 @@ DEFAULT_POETRY = [
 ]
 
 
+# ==================== 存储实例 ====================
+# 图片访问 URL 前缀（由本蓝图的 /images/<filename> 提供）
+IMAGE_URL_PREFIX = '/api/gallery/images/'
+
+paintings_store = GalleryStore(
+    PAINTINGS_FILE, DEFAULT_PAINTINGS,
+    search_fields=('title', 'artist', 'description'),
+    facet_fields=('category',),
+)
+poetry_store = GalleryStore(
+    POETRY_FILE, DEFAULT_POETRY,
+    search_fields=('title', 'author', 'content'),
+    facet_fields=('category', 'dynasty'),
+)
+
+
 # ==================== 工具函数 ====================
-def _load_json(filepath, default=None):
-    """安全读取 JSON 文件"""
-    if default is None:
-        return []
-    try:
-        if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        pass
-    _save_json(filepath, default)
-    return default
-
-
-def _save_json(filepath, data):
-    """安全写入 JSON 文件"""
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-
-def _init_data():
-    """初始化数据（如果文件不存在）"""
-    if not os.path.exists(PAINTINGS_FILE):
-        _save_json(PAINTINGS_FILE, DEFAULT_PAINTINGS)
-    if not os.path.exists(POETRY_FILE):
-        _save_json(POETRY_FILE, DEFAULT_POETRY)
+def _list_view(items):
+    """列表视图：图片替换为缩略图，原图地址保留在 image_url 供详情页使用"""
+    result = []
+    names = image_names(IMAGES_DIR)
+    for item in items:
+        image_url = item.get('image_url', '')
+        thumb_url = thumbnail_for(image_url, IMAGES_DIR, IMAGE_URL_PREFIX, names=names)
+        result.append({**item, 'thumbnail_url': thumb_url})
+    return result
+
+
+def _list_response(payload):
+    """列表响应：缩略图格式随 Accept 协商，需声明 Vary"""
+    response = jsonify(payload)
+    response.headers['Vary'] = 'Accept'
+    return response
 
 
 # ==================== 画作接口 ====================
 @gallery_bp.route('/paintings', methods=['GET'])
 def get_paintings():
     """获取画作列表（支持筛选和搜索）"""
-    _init_data()
-    paintings = _load_json(PAINTINGS_FILE, DEFAULT_PAINTINGS)
-
     category = request.args.get('category', '')
-    keyword = request.args.get('keyword', '').strip().lower()
+    keyword = request.args.get('keyword', '')
+    tag = request.args.get('tag', '')
     sort_by = request.args.get('sort', 'year')
 
-    if category:
-        paintings = [p for p in paintings if p.get('category') == category]
-
-    if keyword:
-        paintings = [p for p in paintings if (
-            keyword in p.get('title', '').lower() or
-            keyword in p.get('artist', '').lower() or
-            keyword in p.get('description', '').lower() or
-            any(keyword in tag.lower() for tag in p.get('tags', []))
-        )]
+    paintings = paintings_store.search(keyword=keyword, tag=tag, category=category)
 
     if sort_by == 'year':
         paintings.sort(key=lambda p: p.get('year', 0))
     elif sort_by == 'title':
         paintings.sort(key=lambda p: p.get('title', ''))
 
-    return jsonify({
+    return _list_response({
         'code': 200,
-        'data': paintings,
+        'data': _list_view(paintings),
         'total': len(paintings),
         'categories': list(set(p.get('category', '') for p in DEFAULT_PAINTINGS))
     })
@@ -228,9 +224,7 @@ def get_paintings():
 @gallery_bp.route('/paintings/<int:painting_id>', methods=['GET'])
 def get_painting(painting_id):
     """获取单幅画作详情"""
-    _init_data()
-    paintings = _load_json(PAINTINGS_FILE, DEFAULT_PAINTINGS)
-    painting = next((p for p in paintings if p['id'] == painting_id), None)
+    painting = paintings_store.get(painting_id)
     if not painting:
         return jsonify({'code': 404, 'message': '画作不存在'}), 404
     return jsonify({'code': 200, 'data': painting})
@@ -239,16 +233,11 @@ def get_painting(painting_id):
 @gallery_bp.route('/paintings', methods=['POST'])
 def create_painting():
     """新增画作"""
-    _init_data()
     data = request.get_json()
     if not data:
         return jsonify({'code': 400, 'message': '缺少数据'}), 400
 
-    paintings = _load_json(PAINTINGS_FILE, DEFAULT_PAINTINGS)
-    max_id = max((p['id'] for p in paintings), default=0)
-
-    painting = {
-        'id': max_id + 1,
+    painting = paintings_store.create({
         'title': data.get('title', ''),
         'artist': data.get('artist', ''),
         'year': data.get('year', 0),
@@ -257,9 +246,7 @@ def create_painting():
         'description': data.get('description', ''),
         'tags': data.get('tags', []),
         'created_at': datetime.now().strftime('%Y-%m-%d')
-    }
-    paintings.append(painting)
-    _save_json(PAINTINGS_FILE, paintings)
+    })
 
     return jsonify({'code': 200, 'message': '添加成功', 'data': painting})
 
@@ -267,26 +254,17 @@ def create_painting():
 @gallery_bp.route('/paintings/<int:painting_id>', methods=['PUT'])
 def update_painting(painting_id):
     """更新画作"""
-    _init_data()
     data = request.get_json()
-    paintings = _load_json(PAINTINGS_FILE, DEFAULT_PAINTINGS)
-
-    for p in paintings:
-        if p['id'] == painting_id:
-            p.update({k: v for k, v in data.items() if k != 'id'})
-            _save_json(PAINTINGS_FILE, paintings)
-            return jsonify({'code': 200, 'message': '更新成功', 'data': p})
-
-    return jsonify({'code': 404, 'message': '画作不存在'}), 404
+    painting = paintings_store.update(painting_id, data or {})
+    if painting is None:
+        return jsonify({'code': 404, 'message': '画作不存在'}), 404
+    return jsonify({'code': 200, 'message': '更新成功', 'data': painting})
 
 
 @gallery_bp.route('/paintings/<int:painting_id>', methods=['DELETE'])
 def delete_painting(painting_id):
     """删除画作"""
-    _init_data()
-    paintings = _load_json(PAINTINGS_FILE, DEFAULT_PAINTINGS)
-    paintings = [p for p in paintings if p['id'] != painting_id]
-    _save_json(PAINTINGS_FILE, paintings)
+    paintings_store.delete(painting_id)
     return jsonify({'code': 200, 'message': '删除成功'})
 
 
@@ -294,26 +272,14 @@ def delete_painting(painting_id):
 @gallery_bp.route('/poetry', methods=['GET'])
 def get_poetry():
     """获取诗集列表（支持筛选和搜索）"""
-    _init_data()
-    poetry_list = _load_json(POETRY_FILE, DEFAULT_POETRY)
-
     category = request.args.get('category', '')
-    keyword = request.args.get('keyword', '').strip().lower()
+    keyword = request.args.get('keyword', '')
     dynasty = request.args.get('dynasty', '')
+    tag = request.args.get('tag', '')
 
-    if category:
-        poetry_list = [p for p in poetry_list if p.get('category') == category]
-    if dynasty:
-        poetry_list = [p for p in poetry_list if p.get('dynasty') == dynasty]
-    if keyword:
-        poetry_list = [p for p in poetry_list if (
-            keyword in p.get('title', '').lower() or
-            keyword in p.get('author', '').lower() or
-            keyword in p.get('content', '').lower() or
-            any(keyword in tag.lower() for tag in p.get('tags', []))
-        )]
+    poetry_list = poetry_store.search(keyword=keyword, tag=tag, category=category, dynasty=dynasty)
 
-    return jsonify({
+    return _list_response({
         'code': 200,
         'data': poetry_list,
         'total': len(poetry_list),
@@ -325,9 +291,7 @@ def get_poetry():
 @gallery_bp.route('/poetry/<int:poetry_id>', methods=['GET'])
 def get_poetry_detail(poetry_id):
     """获取单首诗详情"""
-    _init_data()
-    poetry_list = _load_json(POETRY_FILE, DEFAULT_POETRY)
-    poem = next((p for p in poetry_list if p['id'] == poetry_id), None)
+    poem = poetry_store.get(poetry_id)
     if not poem:
         return jsonify({'code': 404, 'message': '诗歌不存在'}), 404
     return jsonify({'code': 200, 'data': poem})
@@ -336,16 +300,11 @@ def get_poetry_detail(poetry_id):
 @gallery_bp.route('/poetry', methods=['POST'])
 def create_poetry():
     """新增诗歌"""
-    _init_data()
     data = request.get_json()
     if not data:
         return jsonify({'code': 400, 'message': '缺少数据'}), 400
 
-    poetry_list = _load_json(POETRY_FILE, DEFAULT_POETRY)
-    max_id = max((p['id'] for p in poetry_list), default=0)
-
-    poem = {
-        'id': max_id + 1,
+    poem = poetry_store.create({
         'title': data.get('title', ''),
         'author': data.get('author', ''),
         'dynasty': data.get('dynasty', ''),
@@ -354,9 +313,7 @@ def create_poetry():
         'description': data.get('description', ''),
         'tags': data.get('tags', []),
         'created_at': datetime.now().strftime('%Y-%m-%d')
-    }
-    poetry_list.append(poem)
-    _save_json(POETRY_FILE, poetry_list)
+    })
 
     return jsonify({'code': 200, 'message': '添加成功', 'data': poem})
 
@@ -364,33 +321,24 @@ def create_poetry():
 @gallery_bp.route('/poetry/<int:poetry_id>', methods=['PUT'])
 def update_poetry(poetry_id):
     """更新诗歌"""
-    _init_data()
     data = request.get_json()
-    poetry_list = _load_json(POETRY_FILE, DEFAULT_POETRY)
-
-    for p in poetry_list:
-        if p['id'] == poetry_id:
-            p.update({k: v for k, v in data.items() if k != 'id'})
-            _save_json(POETRY_FILE, poetry_list)
-            return jsonify({'code': 200, 'message': '更新成功', 'data': p})
-
-    return jsonify({'code': 404, 'message': '诗歌不存在'}), 404
+    poem = poetry_store.update(poetry_id, data or {})
+    if poem is None:
+        return jsonify({'code': 404, 'message': '诗歌不存在'}), 404
+    return jsonify({'code': 200, 'message': '更新成功', 'data': poem})
 
 
 @gallery_bp.route('/poetry/<int:poetry_id>', methods=['DELETE'])
 def delete_poetry(poetry_id):
     """删除诗歌"""
-    _init_data()
-    poetry_list = _load_json(POETRY_FILE, DEFAULT_POETRY)
-    poetry_list = [p for p in poetry_list if p['id'] != poetry_id]
-    _save_json(POETRY_FILE, poetry_list)
+    poetry_store.delete(poetry_id)
     return jsonify({'code': 200, 'message': '删除成功'})
 
 
 # ==================== 图片上传接口 ====================
 @gallery_bp.route('/upload-image', methods=['POST'])
 def upload_image():
-    """上传图片文件"""
+    """上传图片文件（按内容哈希命名，并生成缩略图）"""
     if 'file' not in request.files:
         return jsonify({'code': 400, 'message': '没有文件'}), 400
 
@@ -407,41 +355,37 @@ def upload_image():
     if ext not in allowed_extensions:
         return jsonify({'code': 400, 'message': f'只支持 {", ".join(allowed_extensions)} 格式'}), 400
 
-    # 生成唯一文件名
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    unique_name = f"{timestamp}_{os.urandom(4).hex()}.{ext}"
-    filepath = os.path.join(IMAGES_DIR, unique_name)
-
-    file.save(filepath)
-    image_url = f"/static/gallery/images/{unique_name}"
+    filename, thumbnails = save_image(file.read(), ext, IMAGES_DIR)
 
     return jsonify({
         'code': 200,
         'message': '上传成功',
-        'data': {'image_url': image_url}
+        'data': {
+            'image_url': f"{IMAGE_URL_PREFIX}{filename}",
+            'thumbnails': {
+                str(width): {fmt: f"{IMAGE_URL_PREFIX}{name}" for fmt, name in variants.items()}
+                for width, variants in thumbnails.items()
+            }
+        }
     })
 
 
+@gallery_bp.route('/images/<path:filename>', methods=['GET'])
+def get_image(filename):
+    """图片访问（强 ETag、immutable 缓存、Range 分段）"""
+    return send_image(IMAGES_DIR, filename)
+
+
 # ==================== 统计接口 ====================
 @gallery_bp.route('/stats', methods=['GET'])
 def get_stats():
     """获取画廊统计数据"""
-    _init_data()
-    paintings = _load_json(PAINTINGS_FILE, DEFAULT_PAINTINGS)
-    poetry_list = _load_json(POETRY_FILE, DEFAULT_POETRY)
-
     return jsonify({
         'code': 200,
         'data': {
-            'paintings_total': len(paintings),
-            'poetry_total': len(poetry_list),
-            'painting_categories': dict(
-                (c, len([p for p in paintings if p.get('category') == c]))
-                for c in set(p.get('category', '') for p in paintings)
-            ),
-            'poetry_categories': dict(
-                (c, len([p for p in poetry_list if p.get('category') == c]))
-                for c in set(p.get('category', '') for p in poetry_list)
-            )
+            'paintings_total': len(paintings_store),
+            'poetry_total': len(poetry_store),
+            'painting_categories': paintings_store.facet_counts('category'),
+            'poetry_categories': poetry_store.facet_counts('category')
         }
     })
@@ -0,0 +1,200 @@
+"""
+画廊数据存储层
+- JSON 文件内容常驻内存，文件 mtime 变化时才重新加载
+- 关键词 / 标签 / 分类倒排索引，列表查询不再逐条线性扫描
+"""
+import json
+import os
+import threading
+from collections import defaultdict
+
+# 分面字段缺失或为空的条目归入该分组（None 键会让 jsonify 排序键时报错）
+UNCATEGORIZED = '未分类'
+
+
+class GalleryStore:
+    """
+    单个 JSON 集合（画作或诗集）的内存索引存储
+
+    Args:
+        filepath: JSON 文件路径
+        default_items: 文件缺失或损坏时写入的初始数据
+        search_fields: 参与关键词搜索的字段（标签字段 tags 总是参与）
+        facet_fields: 需要建立精确匹配索引的字段（如 category、dynasty）
+    """
+
+    def __init__(self, filepath, default_items, search_fields, facet_fields=('category',)):
+        self.filepath = filepath
+        self.default_items = default_items
+        self.search_fields = tuple(search_fields)
+        self.facet_fields = tuple(facet_fields)
+        self._lock = threading.RLock()
+        self._mtime = None
+        self._items = []
+        self._by_id = {}
+        self._position = {}
+        self._char_index = {}
+        self._tag_index = {}
+        self._facet_index = {}
+
+    # ==================== 加载与索引 ====================
+    def _current_mtime(self):
+        try:
+            return os.stat(self.filepath).st_mtime_ns
+        except OSError:
+            return None
+
+    def _ensure_loaded(self):
+        """文件 mtime 变化（含外部编辑）时重新加载并重建索引"""
+        mtime = self._current_mtime()
+        if mtime is not None and mtime == self._mtime:
+            return
+        with self._lock:
+            mtime = self._current_mtime()
+            if mtime is not None and mtime == self._mtime:
+                return
+            items = None
+            if mtime is not None:
+                try:
+                    with open(self.filepath, 'r', encoding='utf-8') as f:
+                        items = json.load(f)
+                except (json.JSONDecodeError, IOError):
+                    items = None
+            if items is None:
+                items = [dict(item) for item in self.default_items]
+                self._write(items)
+            self._rebuild(items)
+            self._mtime = self._current_mtime()
+
+    def _write(self, items):
+        """原子写入：先写临时文件再替换，读者不会看到半截文件"""
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        tmp_path = f"{self.filepath}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(items, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.filepath)
+
+    def _searchable_texts(self, item):
+        texts = [str(item.get(field, '') or '').lower() for field in self.search_fields]
+        texts.extend(str(tag).lower() for tag in item.get('tags', []) or [])
+        return texts
+
+    def _rebuild(self, items):
+        char_index = defaultdict(set)
+        tag_index = defaultdict(set)
+        facet_index = {field: defaultdict(set) for field in self.facet_fields}
+
+        for item in items:
+            item_id = item.get('id')
+            for text in self._searchable_texts(item):
+                for ch in set(text):
+                    char_index[ch].add(item_id)
+            for tag in item.get('tags', []) or []:
+                tag_index[tag].add(item_id)
+            for field in self.facet_fields:
+                facet_index[field][item.get(field) or UNCATEGORIZED].add(item_id)
+
+        self._items = items
+        self._by_id = {item.get('id'): item for item in items}
+        self._position = {item.get('id'): pos for pos, item in enumerate(items)}
+        self._char_index = dict(char_index)
+        self._tag_index = dict(tag_index)
+        self._facet_index = {field: dict(index) for field, index in facet_index.items()}
+
+    # ==================== 查询 ====================
+    def all(self):
+        """返回全部条目（按文件顺序）"""
+        self._ensure_loaded()
+        return list(self._items)
+
+    def get(self, item_id):
+        """按 ID 获取单个条目，不存在返回 None"""
+        self._ensure_loaded()
+        return self._by_id.get(item_id)
+
+    def search(self, keyword='', tag='', **facets):
+        """
+        组合查询
+
+        Args:
+            keyword: 关键词（不区分大小写的子串匹配，先用字符倒排索引取候选再校验）
+            tag: 精确标签
+            **facets: 精确匹配字段，如 category='印象派'，空值忽略
+
+        Returns:
+            命中的条目列表（保持文件顺序）
+        """
+        self._ensure_loaded()
+        with self._lock:
+            candidates = None
+
+            def narrow(ids):
+                nonlocal candidates
+                candidates = set(ids) if candidates is None else candidates & ids
+
+            for field, value in facets.items():
+                if value:
+                    narrow(self._facet_index.get(field, {}).get(value, set()))
+            if tag:
+                narrow(self._tag_index.get(tag, set()))
+
+            keyword = (keyword or '').strip().lower()
+            if keyword:
+                for ch in set(keyword):
+                    narrow(self._char_index.get(ch, set()))
+                    if not candidates:
+                        break
+
+            if candidates is None:
+                return list(self._items)
+
+            matched = sorted(candidates, key=self._position.__getitem__)
+            items = [self._by_id[item_id] for item_id in matched]
+            if keyword:
+                items = [item for item in items
+                         if any(keyword in text for text in self._searchable_texts(item))]
+            return items
+
+    def facet_counts(self, field):
+        """字段取值 -> 条目数（缺失或为空的取值计入 UNCATEGORIZED）"""
+        self._ensure_loaded()
+        return {value: len(ids) for value, ids in self._facet_index.get(field, {}).items()}
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._items)
+
+    # ==================== 写入 ====================
+    def create(self, item):
+        """追加新条目并分配自增 ID，返回写入后的条目"""
+        self._ensure_loaded()
+        with self._lock:
+            item = dict(item)
+            item['id'] = max((i['id'] for i in self._items), default=0) + 1
+            items = self._items + [item]
+            self._commit(items)
+            return item
+
+    def update(self, item_id, changes):
+        """更新条目（忽略 id 字段），不存在返回 None"""
+        self._ensure_loaded()
+        with self._lock:
+            if item_id not in self._by_id:
+                return None
+            items = [dict(i) for i in self._items]
+            target = items[self._position[item_id]]
+            target.update({k: v for k, v in changes.items() if k != 'id'})
+            self._commit(items)
+            return target
+
+    def delete(self, item_id):
+        """删除条目（不存在时静默）"""
+        self._ensure_loaded()
+        with self._lock:
+            items = [i for i in self._items if i.get('id') != item_id]
+            self._commit(items)
+
+    def _commit(self, items):
+        self._write(items)
+        self._rebuild(items)
+        self._mtime = self._current_mtime()
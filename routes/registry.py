@@ -0,0 +1,123 @@
+# routes/registry.py
+"""
+蓝图声明表（按功能组分类）
+
+app.py 通过 LazyBlueprintRegistry 按此表注册蓝图；蓝图模块在第一次命中其 URL 前缀时才导入。
+新增蓝图时在这里声明，前缀需覆盖蓝图的全部路由。
+
+查看各蓝图的导入耗时：
+    python -m routes.registry
+"""
+from utils.lazy_blueprints import BlueprintSpec
+
+# 功能组名称
+GROUP_DOCUMENT = 'document'
+GROUP_SCHEDULE = 'schedule'
+GROUP_KAFKA = 'kafka'
+GROUP_FPA = 'fpa'
+GROUP_AUTH = 'auth'
+GROUP_CHATBOT = 'chatbot'
+GROUP_WORD_TO_EXCEL = 'word_to_excel'
+GROUP_SPREADSHEET = 'spreadsheet'
+GROUP_DINGTALK_PUSH = 'dingtalk_push'
+GROUP_TOOLS = 'tools'
+GROUP_DEPLOY = 'deploy'
+GROUP_HOUSE_DESIGN = 'house_design'
+GROUP_CITY_COLOR = 'city_color'
+GROUP_WHEEL_LOTTERY = 'wheel_lottery'
+GROUP_GALLERY = 'gallery'
+GROUP_SWAGGER = 'swagger'
+
+BLUEPRINT_SPECS = [
+    # 文档转换模块
+    BlueprintSpec(GROUP_DOCUMENT, 'routes.document_convert.document_routes', 'document_bp', (
+        '/convert-page', '/document-formatter', '/download-converted-doc', '/download-demo-template',
+        '/download-formatted-doc', '/excel-to-cosmic', '/format-check', '/format-document',
+        '/upload-and-convert', '/upload-demo',
+    )),
+    BlueprintSpec(GROUP_DOCUMENT, 'routes.document_convert.excel2word_routes', 'excel2word_bp', ('/excel2word',)),
+    BlueprintSpec(GROUP_DOCUMENT, 'routes.document_convert.markdown_upload_routes', 'markdown_upload_bp',
+                  ('/markdown-upload', '/api/keywords')),
+    BlueprintSpec(GROUP_DOCUMENT, 'routes.document_convert.word_to_md_routes', 'word_to_md_bp', ('/api/word-to-md',)),
+    BlueprintSpec(GROUP_DOCUMENT, 'routes.document_convert.cosmic_routes', 'cosmic_bp', ('/api/cosmic',)),
+    BlueprintSpec(GROUP_DOCUMENT, 'routes.document_convert.es_to_excel_routes', 'es_to_excel_bp',
+                  ('/api/es-to-excel',),
+                  init='routes.document_convert.es_to_excel_routes:init_field_mapping'),
+    BlueprintSpec(GROUP_DOCUMENT, 'routes.document_convert.es_field_mapping_routes', 'es_field_mapping_bp',
+                  ('/api/es-field-mapping',)),
+    BlueprintSpec(GROUP_DOCUMENT, 'routes.document_convert.clean_event_routes', 'clean_event_bp',
+                  ('/api/clean-event/process', '/api/clean-event/upload')),
+    BlueprintSpec(GROUP_DOCUMENT, 'routes.document_convert.watermark_routes', 'watermark_bp', ('/api/watermark',)),
+    BlueprintSpec(GROUP_DOCUMENT, 'routes.document_convert.content_to_excel_routes', 'content_to_excel_bp',
+                  ('/api/content-to-excel',),
+                  init='routes.document_convert.content_to_excel_routes:init_content_to_excel'),
+
+    # 排班管理模块
+    BlueprintSpec(GROUP_SCHEDULE, 'routes.schedule.schedule_config_routes', 'schedule_config_bp', ('/schedule-config',)),
+
+    # Kafka 模块
+    BlueprintSpec(GROUP_KAFKA, 'routes.kafka.kafka_generator_routes', 'kafka_generator_bp', ('/kafka-generator',)),
+
+    # FPA 功能点估算模块（异步路由挂在 fpa_generator_bp 上，需先导入）
+    BlueprintSpec(GROUP_FPA, 'routes.fpa.sql_routes', 'sql_bp', ('/format_ids', '/sql-formatter')),
+    BlueprintSpec(GROUP_FPA, 'routes.fpa.event_routes', 'event_bp', ('/api/clean-event', '/clean-event-page')),
+    BlueprintSpec(GROUP_FPA, 'routes.fpa.fpa_generator_routes', 'fpa_generator_bp', ('/fpa-generator',),
+                  preload=('routes.fpa.fpa_async_routes',)),
+    BlueprintSpec(GROUP_FPA, 'routes.fpa.adjustment_routes', 'adjustment_bp', ('/adjustment',)),
+    BlueprintSpec(GROUP_FPA, 'routes.fpa.adjustment_calc_routes', 'adjustment_calc_bp', ('/adjustment-calc',)),
+    BlueprintSpec(GROUP_FPA, 'routes.fpa.fpa_category_rules_routes', 'fpa_rules_bp', ('/fpa-rules',)),
+    BlueprintSpec(GROUP_FPA, 'routes.fpa.category_routes', 'category_bp', ('/api/category',)),
+
+    # 认证模块
+    BlueprintSpec(GROUP_AUTH, 'routes.auth.auth_routes', 'auth_bp', (
+        '/login', '/register', '/forgot-password', '/api/login', '/api/logout', '/api/register',
+        '/api/check-auth', '/api/current-user', '/api/change-password', '/api/get-security-question',
+        '/api/verify-security-answer', '/api/reset-password',
+    )),
+
+    # 智能客服模块
+    BlueprintSpec(GROUP_CHATBOT, 'routes.chat.chatbot_routes', 'chatbot_bp', ('/chatbot',)),
+
+    # Word 转 Excel 模块
+    BlueprintSpec(GROUP_WORD_TO_EXCEL, 'routes.word_to_excel.word_to_excel_routes', 'word_to_excel_bp',
+                  ('/word-to-excel',)),
+
+    # 在线表格模块
+    BlueprintSpec(GROUP_SPREADSHEET, 'routes.spreadsheet.spreadsheet_routes', 'spreadsheet_bp', ('/spreadsheet',)),
+
+    # 钉钉推送模块
+    BlueprintSpec(GROUP_DINGTALK_PUSH, 'routes.dingtalk_push', 'dingtalk_push_bp', ('/dingtalk-push',)),
+
+    # 工具：SQL 智能生成器、JSON 对比
+    BlueprintSpec(GROUP_TOOLS, 'routes.tools.sql_generator_routes', 'sql_generator_bp', (
+        '/sql-generator', '/api/generate-sql', '/api/optimize-sql', '/api/explain-sql',
+    )),
+    BlueprintSpec(GROUP_TOOLS, 'routes.diff.diff_routes', 'diff_bp', ('/api/diff',)),
+
+    # 部署配置管理
+    BlueprintSpec(GROUP_DEPLOY, 'routes.deploy.deploy_config_routes', 'deploy_config_bp', ('/deploy-config',)),
+
+    # 户型设计模块
+    BlueprintSpec(GROUP_HOUSE_DESIGN, 'routes.house_design.house_design_routes', 'house_design_bp', ('/house-design',)),
+
+    # CityColor 颜色提取模块（MySQL 持久化）
+    BlueprintSpec(GROUP_CITY_COLOR, 'routes.city_color.city_color_routes', 'city_color_bp', ('/city-color',),
+                  init='routes.city_color.city_color_routes:init_city_color'),
+
+    # 彩色抽奖转盘模块
+    BlueprintSpec(GROUP_WHEEL_LOTTERY, 'routes.wheel_lottery.wheel_lottery_routes', 'wheel_lottery_bp',
+                  ('/api/wheel-lottery',),
+                  init='routes.wheel_lottery.wheel_lottery_routes:init_wheel_config'),
+
+    # 画作与诗集鉴赏模块
+    BlueprintSpec(GROUP_GALLERY, 'routes.gallery', 'gallery_bp', ('/api/gallery',)),
+
+    # Swagger API 文档
+    BlueprintSpec(GROUP_SWAGGER, 'routes.swagger_config', 'swagger_bp', ('/swagger',)),
+]
+
+
+if __name__ == '__main__':
+    from utils.lazy_blueprints import format_profile_report, profile_imports
+
+    print(format_profile_report(profile_imports(BLUEPRINT_SPECS)))
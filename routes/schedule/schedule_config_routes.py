@@ -15,6 +15,8 @@ import os
 import logging
 from cryptography.fernet import Fernet
 
+from utils.roster_read_model import roster_read_model
+
 # 初始化日志器
 logger = logging.getLogger(__name__)
 
@@ -326,6 +328,7 @@ def generate_schedule():
         generator.generate_roster(start_date, end_date)
 
         db.close()
+        roster_read_model.invalidate(start_date, end_date)
 
         return jsonify({"success": True, "msg": f"排班表生成成功：{start_date_str} 至 {end_date_str}"})
     except Exception as e:
@@ -342,34 +345,8 @@ def schedule_records():
             if not start_date or not end_date:
                 return jsonify({"success": False, "msg": "开始日期和结束日期不能为空"})
 
-            db = RosterDB(DB_CONFIG)
-            if not db.connect():
-                return jsonify({"success": False, "msg": "数据库连接失败"})
-
-            # sql = """
-            # SELECT r.*, sc.staff_type
-            # FROM roster r
-            # LEFT JOIN staff_config sc ON r.staff_name = sc.staff_name
-            # WHERE r.date BETWEEN %s AND %s
-            # ORDER BY r.date, r.time_slot, r.is_main DESC
-            # """
-            sql = """
-            SELECT r.*, sc.staff_type
-            FROM roster r
-            LEFT JOIN staff_config sc ON r.staff_name = sc.staff_name
-            WHERE r.date BETWEEN %s AND %s
-            ORDER BY r.date,
-                     CASE r.time_slot
-                         WHEN '8:00～12:00' THEN 1
-                         WHEN '13:30～17:30' THEN 2
-                         WHEN '17:30～21:30' THEN 3
-                         ELSE 4
-                     END,
-                     r.is_main DESC
-            """
-
-            results = db.query(sql, (start_date, end_date))
-            db.close()
+            # 读模型按日期窗口缓存，已按日期、时段顺序、主班优先排序
+            results = roster_read_model.get_records(start_date, end_date)
 
             # 使用辅助函数处理时间字段，将timedelta等不可序列化对象转换为字符串
             processed_results = serialize_datetime_objects(results)
@@ -392,35 +369,14 @@ def check_existing_roster():
         if not start_date or not end_date:
             return jsonify({"success": False, "msg": "开始日期和结束日期不能为空"})
 
-        db = RosterDB(DB_CONFIG)
-        if not db.connect():
-            return jsonify({"success": False, "msg": "数据库连接失败"})
-
-        # 查询指定日期范围内的排班记录
-        sql = "SELECT COUNT(*) as count FROM roster WHERE date BETWEEN %s AND %s"
-        result = db.query(sql, (start_date, end_date))
+        # 查询指定日期范围内的排班记录（读模型缓存）
+        count, details = roster_read_model.summary(start_date, end_date)
         
-        count = result[0]['count'] if result else 0
-        
-        # 如果有记录，返回详细信息
-        if count > 0:
-            detail_sql = "SELECT DISTINCT date, time_slot FROM roster WHERE date BETWEEN %s AND %s ORDER BY date, time_slot"
-            details = db.query(detail_sql, (start_date, end_date))
-            
-            db.close()
-            
-            return jsonify({
-                "success": True,
-                "data": details,
-                "total": count
-            })
-        else:
-            db.close()
-            return jsonify({
-                "success": True,
-                "data": [],
-                "total": 0
-            })
+        return jsonify({
+            "success": True,
+            "data": details,
+            "total": count
+        })
     except Exception as e:
         return jsonify({"success": False, "msg": "检查现有排班失败: " + str(e)})
 
@@ -570,6 +526,7 @@ def confirm_import_schedule():
                     inserted_count += 1
         
         db.close()
+        roster_read_model.invalidate(start_date, end_date)
         
         return jsonify({
             "success": True, 
@@ -602,6 +559,7 @@ def delete_existing_roster():
         success = db.execute(sql, (start_date, end_date))
         
         db.close()
+        roster_read_model.invalidate(start_date, end_date)
         
         if success:
             return jsonify({"success": True, "msg": "现有排班记录已清除"})
@@ -705,99 +663,12 @@ def send_dingtalk_message():
         if not webhook_url or not webhook_url.startswith('http'):
             return jsonify({"success": False, "msg": "Webhook 地址格式不正确，请检查配置"})
         
-        db = RosterDB(DB_CONFIG)
-        if not db.connect():
-            return jsonify({"success": False, "msg": "数据库连接失败"})
-        
-        # 查询指定日期范围的排班数据
-        sql = """
-        SELECT r.*
-        FROM roster r
-        WHERE r.date BETWEEN %s AND %s
-        ORDER BY r.date, r.time_slot, r.is_main DESC
-        """
-        
-        results = db.query(sql, (start_date, end_date))
-        db.close()
-        
-        if not results:
+        # 查询指定日期范围的排班数据（读模型缓存）
+        if not roster_read_model.get_days(start_date, end_date):
             return jsonify({"success": False, "msg": "没有找到排班数据"})
         
-        # 按日期和时段分组
-        grouped_data = {}
-        for record in results:
-            date_key = record['date'].strftime('%Y-%m-%d') if hasattr(record['date'], 'strftime') else str(record['date'])
-            time_slot = record['time_slot']
-            
-            # 如果指定了时段过滤，则只推送指定的时段
-            if time_slots and time_slot not in time_slots:
-                continue
-            
-            if date_key not in grouped_data:
-                grouped_data[date_key] = {}
-            
-            if time_slot not in grouped_data[date_key]:
-                grouped_data[date_key][time_slot] = []
-            
-            grouped_data[date_key][time_slot].append(record)
-        
-        # 构建钉钉消息内容（优化后的Markdown格式）
-        today = datetime.now().date()
-        msg_content = "# 📅 排班信息推送\n\n"
-        
-        # 按日期排序
-        sorted_dates = sorted(grouped_data.keys())
-        
-        for date_str in sorted_dates:
-            day_data = grouped_data[date_str]
-            
-            # 计算星期和相对日期描述
-            date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-            weekday = ['周一', '周二', '周三', '周四', '周五', '周六', '周日'][date_obj.weekday()]
-            
-            # 判断是今天、明天还是其他日期
-            delta = (date_obj - today).days
-            if delta == 0:
-                date_label = f"**今天** {date_str} ({weekday})"
-            elif delta == 1:
-                date_label = f"**明天** {date_str} ({weekday})"
-            elif delta == -1:
-                date_label = f"**昨天** {date_str} ({weekday})"
-            else:
-                date_label = f"**{date_str}** ({weekday})"
-            
-            msg_content += f"### {date_label}\n\n"
-            
-            # 按时段排序（按时间顺序）
-            time_slot_order = [
-                '8:00～9:00',
-                '8:00～12:00',
-                '9:00～12:00',
-                '13:30～17:30',
-                '13:30～18:00',
-                '17:30～21:30',
-                '18:00～21:00'
-            ]
-            
-            sorted_slots = sorted(day_data.keys(), 
-                                key=lambda x: time_slot_order.index(x) if x in time_slot_order else 999)
-            
-            for time_slot in sorted_slots:
-                staff_records = day_data[time_slot]
-                
-                # 提取主班和辅班
-                main_staff = [r['staff_name'] for r in staff_records if r['is_main']]
-                backup_staff = [r['staff_name'] for r in staff_records if not r['is_main']]
-                
-                staff_display = '、'.join(main_staff + backup_staff) if (main_staff + backup_staff) else '空闲'
-                
-                msg_content += f"- **{time_slot}**: {staff_display}\n"
-            
-            msg_content += "\n---\n\n"
-        
-        # 添加查看详情链接（Markdown格式，钉钉会自动渲染为按钮）
-        schedule_view_url = "https://alidocs.dingtalk.com/i/nodes/20eMKjyp81LOavDgf46AORZwJxAZB1Gv?utm_scene=person_space&iframeQuery=viewId%3Drm8nwl6hqzo0v1952seh4%26sheetId%3Dhe1d5bovtjfxcies7i3fi"
-        msg_content += f"[查看完整排班]({schedule_view_url})\n"
+        # 构建钉钉消息内容（同一范围与时段过滤只渲染一次）
+        msg_content = roster_read_model.render_markdown(start_date, end_date, time_slots)
         
         # 发送钉钉消息（使用 actionCard 类型）
         dingtalk_data = {
@@ -1121,82 +992,9 @@ def execute_dingtalk_schedule_now(config_id):
         return jsonify({"success": False, "msg": "执行推送失败: " + str(e)})
 
 def build_roster_markdown(start_date, end_date, time_slots=None):
-    """构建排班 Markdown 消息"""
+    """构建排班 Markdown 消息（同一范围与时段过滤只渲染一次）"""
     try:
-        db = RosterDB(DB_CONFIG)
-        if not db.connect():
-            return None
-        
-        sql = """
-        SELECT r.*
-        FROM roster r
-        WHERE r.date BETWEEN %s AND %s
-        ORDER BY r.date, r.time_slot, r.is_main DESC
-        """
-        
-        results = db.query(sql, (start_date, end_date))
-        db.close()
-        
-        if not results:
-            return None
-        
-        grouped_data = {}
-        for record in results:
-            date_key = record['date'].strftime('%Y-%m-%d') if hasattr(record['date'], 'strftime') else str(record['date'])
-            time_slot = record['time_slot']
-            
-            if time_slots and time_slot not in time_slots:
-                continue
-            
-            if date_key not in grouped_data:
-                grouped_data[date_key] = {}
-            
-            if time_slot not in grouped_data[date_key]:
-                grouped_data[date_key][time_slot] = []
-            
-            grouped_data[date_key][time_slot].append(record)
-        
-        today = datetime.now().date()
-        msg_content = "# 📅 排班信息推送\n\n"
-        
-        sorted_dates = sorted(grouped_data.keys())
-        
-        for date_str in sorted_dates:
-            day_data = grouped_data[date_str]
-            date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-            weekday = ['周一', '周二', '周三', '周四', '周五', '周六', '周日'][date_obj.weekday()]
-            
-            delta = (date_obj - today).days
-            if delta == 0:
-                date_label = f"**今天** {date_str} ({weekday})"
-            elif delta == 1:
-                date_label = f"**明天** {date_str} ({weekday})"
-            else:
-                date_label = f"**{date_str}** ({weekday})"
-            
-            msg_content += f"### {date_label}\n\n"
-            
-            time_slot_order = [
-                '8:00～9:00', '8:00～12:00', '9:00～12:00',
-                '13:30～17:30', '13:30～18:00', '17:30～21:30', '18:00～21:00'
-            ]
-            
-            sorted_slots = sorted(day_data.keys(), 
-                                key=lambda x: time_slot_order.index(x) if x in time_slot_order else 999)
-            
-            for time_slot in sorted_slots:
-                staff_records = day_data[time_slot]
-                main_staff = [r['staff_name'] for r in staff_records if r['is_main']]
-                backup_staff = [r['staff_name'] for r in staff_records if not r['is_main']]
-                staff_display = '、'.join(main_staff + backup_staff) if (main_staff + backup_staff) else '空闲'
-                msg_content += f"- **{time_slot}**: {staff_display}\n"
-            
-            msg_content += "\n---\n\n"
-        
-        schedule_view_url = "https://alidocs.dingtalk.com/i/nodes/20eMKjyp81LOavDgf46AORZwJxAZB1Gv?utm_scene=person_space&iframeQuery=viewId%3Drm8nwl6hqzo0v1952seh4%26sheetId%3Dhe1d5bovtjfxcies7i3fi"
-        msg_content += f"[查看完整排班]({schedule_view_url})\n"
-        
-        return msg_content
+        return roster_read_model.render_markdown(start_date, end_date, time_slots)
     except Exception as e:
         print(f"[ERROR] 构建消息失败: {e}")
         return None
@@ -2,14 +2,61 @@
 SQL 智能生成器路由
 功能：根据表结构和自然语言描述，自动生成 SQL 语句
 支持：复杂查询、多表关联、聚合、子查询等
+
+表结构按内容哈希解析并缓存（utils/sql_schema.py），提示词中只放与需求相关的表和列；
+生成结果先在内存 SQLite 上校验，校验失败时把错误交给模型修正一次，结果按需求缓存
 """
 from flask import Blueprint, request, jsonify, render_template
 import logging
 import json
 
+from utils.sql_schema import schema_catalog_cache, sql_result_cache, validate_sql
+
 sql_generator_bp = Blueprint('sql_generator', __name__)
 logger = logging.getLogger(__name__)
 
+SQL_GENERATION_SYSTEM_PROMPT = """你是一个专业的 SQL 生成助手，精通各种数据库的 SQL 语法。
+你的任务是根据用户提供的表结构和需求，生成高质量、高效的 SQL 语句。
+
+要求：
+1. 生成的 SQL 必须符合指定的数据库语法，只使用表结构中列出的表和字段
+2. 如果需求涉及复杂查询，使用合适的 JOIN、子查询、窗口函数等
+3. 添加必要的注释说明 SQL 的逻辑
+4. 如果可能，提供 SQL 优化建议
+5. 只返回 SQL 语句和相关说明，不要其他内容
+
+输出格式：
+```sql
+-- SQL 语句
+SELECT ...
+```
+
+说明：
+- 简要说明 SQL 的逻辑
+- 如果有优化建议，在这里说明
+"""
+
+# 各数据库的语法要点（只放当前数据库的一条）
+DIALECT_NOTES = {
+    'mysql': 'MySQL: 标准 MySQL 语法',
+    'postgresql': 'PostgreSQL: PostgreSQL 语法，支持窗口函数、CTE',
+    'oracle': 'Oracle: Oracle 语法，支持 ROWNUM、CONNECT BY',
+    'sqlserver': 'SQL Server: T-SQL 语法，支持 TOP、CTE',
+    'sqlite': 'SQLite: SQLite 轻量级语法',
+    'dameng': """达梦数据库(DM): 兼容 Oracle 语法，支持：
+  * 使用 SYS_GUID() 生成唯一 ID
+  * 使用 SYSDATE 获取当前时间
+  * 支持 Oracle 风格的 ROWID、ROWNUM
+  * 支持 CONNECT BY 递归查询
+  * 数据类型：VARCHAR2, NUMBER, DATE, CLOB, BLOB
+  * 分页：ROWNUM 或 OFFSET/FETCH""",
+}
+
+
+def _response_text(response):
+    """chat() 直接返回字符串内容（兼容 OpenAI 格式的字典）"""
+    return response if isinstance(response, str) else response.get('choices', [{}])[0].get('message', {}).get('content', '')
+
 @sql_generator_bp.route('/sql-generator')
 def sql_generator_page():
     """SQL 智能生成器页面 - 已由 Vue 前端处理"""
@@ -50,9 +97,18 @@ def generate_sql():
         
         logger.info(f"收到 SQL 生成请求 - 数据库: {database_type}, 类型: {sql_type}")
         
-        # 构建 AI 提示词
+        # 表结构按哈希解析一次；相同表结构 + 需求直接返回缓存结果
+        catalog = schema_catalog_cache.get(table_structure)
+        cache_key = sql_result_cache.key(catalog.hash, requirement, database_type, sql_type, optimization)
+        cached = sql_result_cache.get(cache_key)
+        if cached:
+            logger.info("SQL 生成命中缓存")
+            return jsonify({'success': True, 'data': dict(cached, cached=True)})
+        
+        # 构建 AI 提示词（只放与需求相关的表和列）
+        schema_digest = catalog.digest(requirement)
         prompt = build_sql_generation_prompt(
-            table_structure, 
+            schema_digest, 
             requirement, 
             database_type, 
             sql_type,
@@ -63,68 +119,52 @@ def generate_sql():
         from utils.ollama_client import get_ollama_client
         client = get_ollama_client()
         
-        response = client.chat(
-            messages=[
-                {
-                    "role": "system",
-                    "content": """你是一个专业的 SQL 生成助手，精通各种数据库的 SQL 语法。
-你的任务是根据用户提供的表结构和需求，生成高质量、高效的 SQL 语句。
-
-支持的数据库类型：
-- MySQL: 标准 MySQL 语法
-- PostgreSQL: PostgreSQL 语法，支持窗口函数、CTE
-- Oracle: Oracle 语法，支持 ROWNUM、CONNECT BY
-- SQL Server: T-SQL 语法，支持 TOP、CTE
-- SQLite: SQLite 轻量级语法
-- 达梦数据库(DM): 兼容 Oracle 语法，支持：
-  * 使用 SYS_GUID() 生成唯一 ID
-  * 使用 SYSDATE 获取当前时间
-  * 支持 Oracle 风格的 ROWID、ROWNUM
-  * 支持 CONNECT BY 递归查询
-  * 数据类型：VARCHAR2, NUMBER, DATE, CLOB, BLOB
-  * 分页：ROWNUM 或 OFFSET/FETCH
-
-要求：
-1. 生成的 SQL 必须符合指定的数据库语法
-2. 如果需求涉及复杂查询，使用合适的 JOIN、子查询、窗口函数等
-3. 添加必要的注释说明 SQL 的逻辑
-4. 如果可能，提供 SQL 优化建议
-5. 只返回 SQL 语句和相关说明，不要其他内容
-
-输出格式：
-```sql
--- SQL 语句
-SELECT ...
-```
-
-说明：
-- 简要说明 SQL 的逻辑
-- 如果有优化建议，在这里说明
-"""
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        )
-        
-        # chat() 直接返回字符串内容
-        generated_sql = response if isinstance(response, str) else response.get('choices', [{}])[0].get('message', {}).get('content', '')
+        system_prompt = SQL_GENERATION_SYSTEM_PROMPT + '\n数据库语法：\n' + DIALECT_NOTES.get(
+            database_type.lower(), database_type)
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        generated_sql = _response_text(client.chat(messages=messages))
         
         # 提取 SQL 语句和说明
         sql_result = extract_sql_and_explanation(generated_sql)
         
-        logger.info(f"SQL 生成成功，长度: {len(generated_sql)} 字符")
+        # 本地校验；失败时把错误交给模型修正一次
+        validation = validate_sql(catalog, sql_result['sql'], database_type)
+        if validation['status'] == 'error':
+            logger.warning(f"生成的 SQL 校验失败，请求修正: {validation['error']}")
+            repair_messages = messages + [
+                {"role": "assistant", "content": generated_sql},
+                {"role": "user", "content": f"上面的 SQL 校验失败：{validation['error']}\n"
+                                            f"请只使用表结构中的表和字段修正后重新输出，格式不变。"}
+            ]
+            repaired_text = _response_text(client.chat(messages=repair_messages))
+            repaired = extract_sql_and_explanation(repaired_text)
+            repaired_validation = validate_sql(catalog, repaired['sql'], database_type)
+            if repaired_validation['status'] != 'error':
+                generated_sql, sql_result, validation = repaired_text, repaired, repaired_validation
+        
+        logger.info(f"SQL 生成成功，长度: {len(generated_sql)} 字符，提示词 {len(system_prompt) + len(prompt)} 字符")
+        
+        result = {
+            'sql': sql_result['sql'],
+            'explanation': sql_result['explanation'],
+            'database_type': database_type,
+            'sql_type': sql_type,
+            'validation': validation,
+            'schema': {
+                'parsed': catalog.parsed,
+                'tables': len(catalog.tables),
+                'prompt_chars': len(system_prompt) + len(prompt)
+            }
+        }
+        if validation['status'] != 'error':
+            sql_result_cache.put(cache_key, result)
         
         return jsonify({
             'success': True,
-            'data': {
-                'sql': sql_result['sql'],
-                'explanation': sql_result['explanation'],
-                'database_type': database_type,
-                'sql_type': sql_type
-            }
+            'data': dict(result, cached=False)
         })
         
     except Exception as e:
@@ -160,6 +200,10 @@ def optimize_sql():
         
         logger.info(f"收到 SQL 优化请求 - 数据库: {database_type}")
         
+        # 只放 SQL 涉及的表
+        if table_structure:
+            table_structure = schema_catalog_cache.get(table_structure).digest(sql)
+        
         prompt = f"""请优化以下 {database_type.upper()} SQL 语句：
 
 表结构信息：
@@ -242,6 +286,9 @@ def explain_sql():
         
         logger.info(f"收到 SQL 解释请求")
         
+        if table_structure:
+            table_structure = schema_catalog_cache.get(table_structure).digest(sql)
+        
         prompt = f"""请详细解释以下 SQL 语句的作用和执行逻辑：
 
 表结构（如果有）：
@@ -292,8 +339,25 @@ SQL 语句：
         }), 500
 
 
+@sql_generator_bp.route('/sql-generator/cache-stats', methods=['GET'])
+def sql_generator_cache_stats():
+    """表结构解析缓存与生成结果缓存的命中统计"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'schemas': schema_catalog_cache.stats(),
+            'results': sql_result_cache.stats()
+        }
+    })
+
+
 def build_sql_generation_prompt(table_structure, requirement, database_type, sql_type, optimization):
-    """构建 SQL 生成的提示词"""
+    """
+    构建 SQL 生成的提示词
+    
+    Args:
+        table_structure: 表结构摘要（SchemaCatalog.digest 的结果）
+    """
     
     # 达梦数据库特殊处理
     dm_note = ""
@@ -311,6 +375,8 @@ def build_sql_generation_prompt(table_structure, requirement, database_type, sql
 - 分页也可使用：OFFSET x ROWS FETCH NEXT y ROWS ONLY
 """
     
+    optimization_note = "6. 需要对 SQL 进行优化" if optimization else ""
+
     prompt = f"""请根据以下信息生成 {database_type.upper()} {sql_type.upper()} 语句：
 
 数据库类型：{database_type}
@@ -329,7 +395,7 @@ SQL 类型：{sql_type}
 4. 如果开启了优化，请提供优化建议
 5. 只返回 SQL 和说明，不要其他内容
 
-{"""6. 需要对 SQL 进行优化" """ if optimization else ""}
+{optimization_note}
 """
     
     return prompt
@@ -11,6 +11,8 @@ from flask import Blueprint, request, jsonify, send_file, render_template
 from werkzeug.utils import secure_filename
 from pathlib import Path
 
+from utils.conversion_cache import conversion_cache, sha256_bytes, source_version
+
 logger = logging.getLogger(__name__)
 
 # 创建蓝图
@@ -21,9 +23,15 @@ UPLOAD_FOLDER = 'uploads/word_to_excel'
 ALLOWED_EXTENSIONS = {'.docx'}  # 注意：这里需要带点
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
 
+DOWNLOAD_FOLDER = 'downloads/word_to_excel'
+
 # 确保上传目录存在
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# 转换逻辑变化时缓存的转换结果自动失效
+CACHE_VERSION = source_version('utils.word_to_excel')
+CACHE_ARTIFACT = 'output.xlsx'
+
 
 def allowed_file(filename: str) -> bool:
     """检查文件扩展名是否允许"""
@@ -113,11 +121,33 @@ def upload_document():
         original_filename = Path(file.filename).stem
         ext = Path(file.filename).suffix.lower()
         unique_filename = f"{uuid.uuid4().hex}{ext}"
+        download_filename = f"{original_filename}_软件资产清单.xlsx"
+        
+        # 相同内容的文件直接复用缓存的 Excel（放到新的下载链接下）
+        data = file.read()
+        cache_key = conversion_cache.key('word_to_excel', CACHE_VERSION, sha256_bytes(data))
+        download_id = uuid.uuid4().hex
+        download_filepath = os.path.join(DOWNLOAD_FOLDER, f"{download_id}_{download_filename}")
+        cached = conversion_cache.get(cache_key, {CACHE_ARTIFACT: download_filepath})
+        if cached is not None:
+            logger.info(f"[WORD_TO_EXCEL] ✅ 命中转换缓存，提取 {cached['total_functions']} 条功能点")
+            return jsonify({
+                'success': True,
+                'message': f"转换成功，共提取 {cached['total_functions']} 条功能点",
+                'download_url': f'/word-to-excel/download/{download_id}',
+                'filename': download_filename,
+                'stats': {
+                    'total_functions': cached['total_functions'],
+                    'file_size': f"{os.path.getsize(download_filepath) // 1024} KB"
+                },
+                'cached': True
+            })
         
         # 保存文件
         filepath = os.path.join(UPLOAD_FOLDER, unique_filename)
         logger.info(f"[WORD_TO_EXCEL] 保存文件到：{filepath}")
-        file.save(filepath)
+        with open(filepath, 'wb') as f:
+            f.write(data)
         
         # 执行转换（带进度反馈）
         logger.info(f"[WORD_TO_EXCEL] 开始转换...")
@@ -136,19 +166,14 @@ def upload_document():
         excel_path = result['excel_path']
         total_functions = result['total_functions']
         
-        # 生成下载文件名
-        download_filename = f"{original_filename}_软件资产清单.xlsx"
-        
         # 生成下载 URL（使用临时文件 ID）
-        download_id = uuid.uuid4().hex
         # 将文件路径映射到临时 ID（实际项目中可以使用 Redis 或数据库）
         # 这里简单处理：直接将文件复制到临时下载目录
-        download_folder = 'downloads/word_to_excel'
-        os.makedirs(download_folder, exist_ok=True)
-        download_filepath = os.path.join(download_folder, f"{download_id}_{download_filename}")
+        os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
         
         import shutil
         shutil.copy2(excel_path, download_filepath)
+        conversion_cache.put(cache_key, {'total_functions': total_functions}, {CACHE_ARTIFACT: excel_path})
         
         download_url = f'/word-to-excel/download/{download_id}'
         
@@ -189,7 +214,7 @@ def download_file(download_id: str):
     
     try:
         # 查找文件
-        download_folder = 'downloads/word_to_excel'
+        download_folder = DOWNLOAD_FOLDER
         
         # 查找匹配的文件
         matching_files = [f for f in os.listdir(download_folder) if f.startswith(f"{download_id}_")]
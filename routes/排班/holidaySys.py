@@ -11,6 +11,9 @@ from apscheduler.triggers.cron import CronTrigger
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from utils.holiday_calendar import holiday_calendar, load_dataset, save_dataset
+
 # 加载.env配置文件
 load_dotenv()
 # 配置日志（打印时间、级别、信息，方便排查问题）
@@ -96,10 +99,16 @@ def sync_holiday_to_mysql(year):
     :param year: 要同步的年份（int）
     :return: 布尔值，同步成功返回True，失败返回False
     """
-    # 1. 拉取接口数据
+    # 1. 拉取接口数据（成功时更新离线数据集；接口不可用时使用离线数据集）
     holiday_data = fetch_holiday_data(year)
-    if not holiday_data:
-        return False
+    if holiday_data:
+        save_dataset(year, holiday_data)
+    else:
+        holiday_data = load_dataset(year)
+        if not holiday_data:
+            logger.error(f"{year} 年没有可用的节假日数据（接口不可用且无离线数据集）")
+            return False
+        logger.info(f"{year} 年使用离线数据集同步")
 
     # 2. 数据清洗转换：适配holiday_config表结构
     insert_data = []
@@ -166,6 +175,9 @@ def batch_sync(years=None):
         if sync_holiday_to_mysql(year):
             success_count += 1
     logger.info(f"批量同步完成，共{len(years)}个年份，成功{success_count}个，失败{len(years)-success_count}个")
+    if success_count:
+        # 同步后立即刷新内存日历（同进程内的推送调度与排班生成）
+        holiday_calendar.refresh()
 
 
 # -------------------------- 定时任务与主入口 --------------------------
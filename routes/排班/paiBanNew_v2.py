@@ -10,6 +10,8 @@ Python 3.8.10 排班程序 (改进版)
 5. 核心人员从数据库动态获取
 6. 每次排班后更新可排人员队列
 7. 考虑前一天已排班人员的延后处理
+8. 值班人可按整段周期统一求解 (设置 ROSTER_SOLVER=local_search 开启，默认仍为逐日轮换)，兼顾均衡与节假日公平
+9. 日期类型从共用的内存节假日日历 (utils.holiday_calendar) 读取，不再逐日查 holiday_config
 """
 from logging import debug
 
@@ -19,6 +21,9 @@ from typing import List, Dict, Set, Tuple
 from dotenv import load_dotenv
 import os
 
+from utils.holiday_calendar import HolidayCalendar, holiday_calendar
+from utils.roster_solver import RosterProblem, get_solver
+
 # 加载环境变量 (建议将数据库配置放在.env 文件，避免硬编码)
 load_dotenv()
 
@@ -33,6 +38,16 @@ DB_CONFIG = {
     "charset": os.getenv("MYSQL_CHARSET", "utf8mb4")
 }
 
+# 值班人分配方式：queue 为逐日轮换队列 (默认)，local_search 为整段周期统一求解
+ROSTER_SOLVER = os.getenv("ROSTER_SOLVER", "queue")
+# 同一人最多连续值班天数 (整段求解时生效)
+ROSTER_MAX_CONSECUTIVE_DAYS = int(os.getenv("ROSTER_MAX_CONSECUTIVE_DAYS", 1))
+
+INSERT_ROSTER_SQL = """
+INSERT INTO roster (date, time_slot, staff_name, is_main, rotation_index, remark)
+VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
 
 # ===================== 数据库工具类 =====================
 class RosterDB:
@@ -78,11 +93,29 @@ class RosterDB:
             print(f"执行失败：{sql} | {params} | {e}")
             return False
 
+    def execute_many(self, sql: str, params_list: List[tuple]) -> bool:
+        """批量执行增删改 (一次提交)"""
+        if not params_list:
+            return True
+        try:
+            self.cursor.executemany(sql, params_list)
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            print(f"批量执行失败：{sql} | {len(params_list)} 条 | {e}")
+            return False
+
 
 # ===================== 排班核心逻辑 =====================
 class RosterGenerator:
-    def __init__(self, db: RosterDB):
+    def __init__(self, db: RosterDB, solver: str = None, calendar: HolidayCalendar = None):
         self.db = db
+        self.solver = solver or ROSTER_SOLVER
+        # 节假日日历 (默认为全局共用的日历)
+        self.calendar = calendar or holiday_calendar
+        # 整段求解时预加载的请假记录 (日期 -> 记录列表)，为 None 时逐日查库
+        self._leave_index = None
         # 初始化人员配置
         self.core_staff = self._get_core_staff()
         self.test_staffs = self._get_test_staffs()
@@ -163,16 +196,8 @@ class RosterGenerator:
         return config
 
     def is_holiday(self, date_obj):
-        """通过查询 holiday_config 表判断是否为节假日"""
-        date_str = date_obj.strftime('%Y-%m-%d')
-
-        # 查询 holiday_config 表
-        sql = """
-        SELECT id FROM holiday_config 
-        WHERE holiday_date = %s AND is_working_day = '0'
-        """
-        result = self.db.query(sql, (date_str,))
-        return len(result) > 0
+        """是否为 holiday_config 中的放假日 (不含普通周末)"""
+        return self.calendar.is_statutory_holiday(date_obj)
 
     def get_time_slots_for_date(self, date_obj):
         """根据日期是否为节假日返回对应的时段列表"""
@@ -205,27 +230,56 @@ class RosterGenerator:
         self.db.execute(sql, (new_index, slot_type))
 
     def _get_date_type(self, target_date: date) -> str:
-        """判断日期类型：日常/节假日"""
-        # 先查询 holiday_config 表 (使用标准日期格式)
+        """判断日期类型：日常/节假日 (调休上班为日常，周末与放假日为节假日)"""
+        return self.calendar.date_type(target_date)
+
+    def _load_date_types(self, start_date: date, end_date: date) -> Dict[date, str]:
+        """日期范围内每天的日期类型，返回 日期 -> 日期类型"""
+        return self.calendar.date_types(start_date, end_date)
+
+    def _load_leave_index(self, start_date: date, end_date: date) -> Dict[date, List[Dict]]:
+        """一次查询日期范围内的请假记录，返回 日期 -> 记录列表"""
         sql = """
-        SELECT is_working_day 
-        FROM holiday_config 
-        WHERE holiday_date = %s
+        SELECT staff_name, leave_date, is_full_day, start_time, end_time
+        FROM leave_record
+        WHERE leave_date BETWEEN %s AND %s
         """
-        # 使用标准日期格式查询
-        result = self.db.query(sql, (target_date.strftime('%Y-%m-%d'),))
+        index = {}
+        current_date = start_date
+        while current_date <= end_date:
+            index[current_date] = []
+            current_date += timedelta(days=1)
+        for row in self.db.query(sql, (start_date, end_date)):
+            leave_date = row["leave_date"]
+            if not isinstance(leave_date, date):
+                leave_date = datetime.strptime(str(leave_date)[:10], "%Y-%m-%d").date()
+            index.setdefault(leave_date, []).append(row)
+        return index
+
+    @staticmethod
+    def _to_time(value):
+        """TIME 字段统一为 time (pymysql 返回 timedelta，字符串可能为 9:00 / 09:00 / 9:00:00)"""
+        if isinstance(value, timedelta):
+            return (datetime.min + value).time()
+        if isinstance(value, str):
+            text = value.strip()
+            for fmt in ("%H:%M:%S", "%H:%M"):
+                try:
+                    return datetime.strptime(text, fmt).time()
+                except ValueError:
+                    continue
+            raise ValueError(f"无法解析的时间：{value}")
+        return value
 
-        # 如果在 holiday_config 中有记录
-        if result:
-            is_working = result[0]["is_working_day"]
-            return "日常" if is_working == 1 else "节假日"
+    def _get_leave_staffs(self, target_date: date, time_slot: str = None) -> Set[str]:
+        """
+        获取指定日期/时段的请假人员
 
-        # 如果不在 holiday_config 中，判断是否为周末
-        weekday = target_date.weekday()
-        return "节假日" if weekday == 5 or weekday == 6 else "日常"
+        time_slot 为 None 时返回当天有任何请假记录的人员
+        """
+        if self._leave_index is not None:
+            return self._leave_staffs_from_index(target_date, time_slot)
 
-    def _get_leave_staffs(self, target_date: date, time_slot: str = None) -> Set[str]:
-        """获取指定日期/时段的请假人员"""
         leave_staffs = set()
 
         # 1. 全天请假人员
@@ -265,6 +319,34 @@ class RosterGenerator:
 
         return leave_staffs
 
+    def _leave_staffs_from_index(self, target_date: date, time_slot: str = None) -> Set[str]:
+        """从预加载的请假记录中获取请假人员 (规则同 _get_leave_staffs，当天没有记录时为空)"""
+        slot_start = slot_end = None
+        if time_slot:
+            start_str, end_str = time_slot.split("～")
+            slot_start = datetime.strptime(start_str, "%H:%M").time()
+            slot_end = datetime.strptime(end_str, "%H:%M").time()
+
+        leave_staffs = set()
+        for row in self._leave_index.get(target_date, ()):
+            if row["is_full_day"]:
+                leave_staffs.add(row["staff_name"])
+            elif time_slot is None:
+                leave_staffs.add(row["staff_name"])
+            elif time_slot:
+                start, end = self._to_time(row["start_time"]), self._to_time(row["end_time"])
+                if start is not None and end is not None and start <= slot_start and end >= slot_end:
+                    leave_staffs.add(row["staff_name"])
+        return leave_staffs
+
+    def _get_duty_unavailable_staffs(self, target_date: date) -> Set[str]:
+        """
+        不能担任当天值班人的人员 (日常 8:00～9:00 + 18:00～21:00、节假日全天)
+
+        当天有任何请假记录 (全天或任一时段) 都不排值班，逐日轮换与整段求解共用此规则
+        """
+        return self._get_leave_staffs(target_date)
+
     def _get_prev_day_staff(self, target_date: date, time_slot_pattern: str) -> Set[str]:
         """获取前一天某时段或类似时段的排班人员"""
         prev_date = target_date - timedelta(days=1)
@@ -336,8 +418,11 @@ class RosterGenerator:
         sql = "UPDATE rotation_config SET current_index = %s WHERE time_slot_type = %s"
         self.db.execute(sql, (new_index, slot_type))
 
-    def _get_daily_roster(self, target_date: date) -> List[Dict]:
-        """生成日常排班数据 (8:00～9:00 和 18:00～21:00 排同一个人)"""
+    def _get_daily_roster(self, target_date: date, duty_staff: str = None) -> List[Dict]:
+        """
+        生成日常排班数据 (8:00～9:00 和 18:00～21:00 排同一个人)
+        duty_staff: 整段求解已确定的 8:00～9:00 / 18:00～21:00 人员，为空时从轮换队列选择
+        """
         roster_list = []
         rotation_daily = self.rotation_config["日常 8-9"]
 
@@ -358,27 +443,31 @@ class RosterGenerator:
         # 1. 8:00～9:00 和 18:00～21:00 轮换 (同一个人)
         slot_8_9 = "8:00～9:00"
         slot_18_21 = "18:00～21:00"
-        leave_8_9 = self._get_leave_staffs(target_date, slot_8_9)
-        available_8_9 = [s for s in available_staffs if s not in leave_8_9]
+        duty_unavailable = self._get_duty_unavailable_staffs(target_date)
+        available_8_9 = [s for s in self.all_staffs if s not in duty_unavailable]
+
+        if duty_staff:
+            # 请假与连续值班约束已在整段求解时处理
+            selected_staff, new_index = duty_staff, None
+        elif available_8_9:
+            # 获取前一天晚班人员，今天应该延后
+            # 无论前一天是日常还是节假日，都要排除其晚班人员
+            prev_date = target_date - timedelta(days=1)
+            sql_prev_evening = """
+            SELECT staff_name 
+            FROM roster 
+            WHERE date = %s AND (time_slot = '18:00～21:00' OR time_slot = '17:30～21:30')
+            """
+            prev_evening_results = self.db.query(sql_prev_evening, (prev_date,))
+            prev_evening_staff = set([row['staff_name'] for row in prev_evening_results]) if prev_evening_results else set()
 
-        # 获取前一天晚班人员，今天应该延后
-        # 无论前一天是日常还是节假日，都要排除其晚班人员
-        prev_date = target_date - timedelta(days=1)
-        sql_prev_evening = """
-        SELECT staff_name 
-        FROM roster 
-        WHERE date = %s AND (time_slot = '18:00～21:00' OR time_slot = '17:30～21:30')
-        """
-        prev_evening_results = self.db.query(sql_prev_evening, (prev_date,))
-        prev_evening_staff = set([row['staff_name'] for row in prev_evening_results]) if prev_evening_results else set()
-        
-        if available_8_9:
             result = self._select_staff_from_queue(
                 "日常 8-9", available_8_9, prev_evening_staff
             )
             debug(f"{target_date} 早班选择结果：{result}")
             selected_staff, new_index = result
-            
+
+        if duty_staff or available_8_9:
             if selected_staff:
                 # 为两个时段安排同一个人
                 remark = remark_template
@@ -397,9 +486,10 @@ class RosterGenerator:
                     "remark": remark
                 })
                 
-                # 更新轮换索引 (关键：每次排班后必须更新)
-                self._update_rotation_to_index("日常 8-9", new_index)
-                debug(f"{target_date} 早班更新索引：{new_index}")
+                # 更新轮换索引 (关键：每次排班后必须更新；整段求解时在入库后统一更新)
+                if new_index is not None:
+                    self._update_rotation_to_index("日常 8-9", new_index)
+                    debug(f"{target_date} 早班更新索引：{new_index}")
         else:
             # 无人可用，默认核心人员
             remark = f"因请假调整（{', '.join(all_leave_staffs)}）" if all_leave_staffs else None
@@ -496,8 +586,11 @@ class RosterGenerator:
 
         return roster_list
 
-    def _get_holiday_roster(self, target_date: date) -> List[Dict]:
-        """生成节假日排班数据 (一天一人轮流)"""
+    def _get_holiday_roster(self, target_date: date, duty_staff: str = None) -> List[Dict]:
+        """
+        生成节假日排班数据 (一天一人轮流)
+        duty_staff: 整段求解已确定的当天值班人员，为空时从轮换队列选择
+        """
         roster_list = []
         rotation_holiday = self.rotation_config["节假日"]
 
@@ -505,7 +598,8 @@ class RosterGenerator:
         all_leave_staffs = self._get_leave_staffs(target_date)
 
         # 可用人员：轮换队列中未请假的人员
-        available_staffs = [s for s in rotation_holiday["order"] if s not in all_leave_staffs]
+        duty_unavailable = self._get_duty_unavailable_staffs(target_date)
+        available_staffs = [s for s in rotation_holiday["order"] if s not in duty_unavailable]
         
         # 记录是否有请假调整
         has_leave_adjustment = len(all_leave_staffs) > 0
@@ -515,24 +609,27 @@ class RosterGenerator:
         if has_leave_adjustment:
             remark_template = f"因请假调整（{', '.join(all_leave_staffs)}）"
 
-        # 获取前一天早班人员 (8:00~12:00),今天应该延后
-        # 节假日排班只需排除前一天 8:00～12:00 时段的人员
-        prev_date = target_date - timedelta(days=1)
-        sql_prev_morning = """
-        SELECT staff_name 
-        FROM roster 
-        WHERE date = %s AND time_slot = '8:00～12:00'
-        """
-        prev_morning_results = self.db.query(sql_prev_morning, (prev_date,))
-        prev_morning_staff = set([row['staff_name'] for row in prev_morning_results]) if prev_morning_results else set()
-        
         # 选择人员
-        if not available_staffs:
+        if duty_staff:
+            # 请假与连续值班约束已在整段求解时处理
+            selected_staff = duty_staff
+        elif not available_staffs:
             # 无人可用，默认核心人员
             selected_staff = self.core_staff
             new_index = 0
             debug(f"{target_date} 节假日无人可用，默认排核心人员 {self.core_staff}")
         else:
+            # 获取前一天早班人员 (8:00~12:00),今天应该延后
+            # 节假日排班只需排除前一天 8:00～12:00 时段的人员
+            prev_date = target_date - timedelta(days=1)
+            sql_prev_morning = """
+            SELECT staff_name 
+            FROM roster 
+            WHERE date = %s AND time_slot = '8:00～12:00'
+            """
+            prev_morning_results = self.db.query(sql_prev_morning, (prev_date,))
+            prev_morning_staff = set([row['staff_name'] for row in prev_morning_results]) if prev_morning_results else set()
+
             result = self._select_staff_from_queue(
                 "节假日", available_staffs, prev_morning_staff
             )
@@ -572,9 +669,13 @@ class RosterGenerator:
         # 强制刷新轮换配置，确保使用最新的人员列表
         self.rotation_config = self._load_rotation_config()
 
+        if self.solver != "queue":
+            self._generate_roster_with_solver(start_date, end_date)
+            return
+
         current_date = start_date
         while current_date <= end_date:
-            # 1. 判断日期类型 (通过查询 holiday_config 表)
+            # 1. 判断日期类型 (读取内存节假日日历)
             date_type = self._get_date_type(current_date)
 
             # 2. 生成排班数据
@@ -609,6 +710,91 @@ class RosterGenerator:
 
         debug(f"排班生成完成:{start_date} 至 {end_date}")
 
+    def _rotated_order(self, slot_type: str) -> List[str]:
+        """轮换队列从当前索引开始的顺序"""
+        rotation = self.rotation_config[slot_type]
+        order, index = rotation["order"], rotation["index"]
+        return order[index:] + order[:index]
+
+    def _build_roster_problem(self, days: List[date], date_types: Dict[date, str]) -> RosterProblem:
+        """由预加载的节假日、请假与前几天排班构造整段求解问题"""
+        daily_order = [s for s in self._rotated_order("日常 8-9") if s in self.all_staffs]
+        holiday_order = self._rotated_order("节假日")
+
+        candidates = {}
+        for day in days:
+            # 请假规则与逐日轮换一致
+            unavailable = self._get_duty_unavailable_staffs(day)
+            order = daily_order if date_types[day] == "日常" else holiday_order
+            candidates[day] = [s for s in order if s not in unavailable]
+
+        # 周期开始前紧邻几天的晚班人员，计入连续值班
+        start_date = days[0]
+        history_start = start_date - timedelta(days=ROSTER_MAX_CONSECUTIVE_DAYS)
+        sql_history = """
+        SELECT date, staff_name
+        FROM roster
+        WHERE date BETWEEN %s AND %s AND (time_slot = '18:00～21:00' OR time_slot = '17:30～21:30')
+        """
+        history_rows = self.db.query(sql_history, (history_start, start_date - timedelta(days=1)))
+        by_date = {str(row["date"])[:10]: row["staff_name"] for row in history_rows}
+        history = [by_date.get((history_start + timedelta(days=i)).strftime('%Y-%m-%d'))
+                   for i in range(ROSTER_MAX_CONSECUTIVE_DAYS)]
+
+        return RosterProblem(days, date_types, candidates, fallback=self.core_staff, history=history,
+                             max_consecutive=ROSTER_MAX_CONSECUTIVE_DAYS)
+
+    def _generate_roster_with_solver(self, start_date: date, end_date: date) -> bool:
+        """整段周期一次求解值班人，再按固定规则生成其余时段并批量入库，返回是否入库成功"""
+        days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        if not days:
+            return True
+
+        # 1. 节假日读取内存日历，请假记录一次性加载，避免逐日查库
+        date_types = self._load_date_types(start_date, end_date)
+        self._leave_index = self._load_leave_index(start_date, end_date)
+        try:
+            # 2. 求解值班人
+            problem = self._build_roster_problem(days, date_types)
+            solution = get_solver(self.solver).solve(problem)
+
+            # 3. 生成各时段排班
+            params_list = []
+            last_index = {}
+            for day in days:
+                duty_staff = solution.assignment[day]
+                if date_types[day] == "日常":
+                    slot_type = "日常 8-9"
+                    roster_data = self._get_daily_roster(day, duty_staff=duty_staff)
+                    rotated_slots = ("8:00～9:00", "18:00～21:00")
+                else:
+                    slot_type = "节假日"
+                    roster_data = self._get_holiday_roster(day, duty_staff=duty_staff)
+                    rotated_slots = None
+
+                # 轮换索引记为值班人在队列中的下一个位置 (与逐日轮换一致)
+                order = self.rotation_config[slot_type]["order"]
+                rot_index = (order.index(duty_staff) + 1) % len(order) if duty_staff in order else 0
+                last_index[slot_type] = rot_index
+                for item in roster_data:
+                    item_index = rot_index if rotated_slots is None or item["time_slot"] in rotated_slots else 0
+                    params_list.append((
+                        item["date"], item["time_slot"], item["staff_name"],
+                        item["is_main"], item_index, item.get("remark")
+                    ))
+        finally:
+            self._leave_index = None
+
+        # 4. 批量入库；入库成功后才把轮换索引更新到周期结束时的位置，失败时轮换位置保持不变
+        if not self.db.execute_many(INSERT_ROSTER_SQL, params_list):
+            print(f"排班入库失败:{start_date} 至 {end_date}，轮换索引未更新")
+            return False
+        for slot_type, new_index in last_index.items():
+            self._update_rotation_to_index(slot_type, new_index)
+
+        debug(f"排班生成完成:{start_date} 至 {end_date}，求解指标：{solution.metrics}")
+        return True
+
     # ===================== 主程序 =====================
 
 
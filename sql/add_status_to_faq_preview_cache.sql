@@ -0,0 +1,38 @@
+-- 为 faq_preview_cache 表添加结束状态字段
+-- 上传预览失败时写入 failed 与失败原因，其他进程的进度查询 / SSE 据此结束
+-- 已有 faq_preview_cache 表的部署在升级前执行本脚本（新建的表已包含这两个字段）
+
+USE knowledge_base;
+
+-- 添加 status 字段
+SET @col_exists = 0;
+SELECT COUNT(*) INTO @col_exists 
+FROM information_schema.COLUMNS 
+WHERE TABLE_SCHEMA = 'knowledge_base' 
+  AND TABLE_NAME = 'faq_preview_cache' 
+  AND COLUMN_NAME = 'status';
+
+SET @sql = IF(@col_exists = 0, 
+    'ALTER TABLE faq_preview_cache ADD COLUMN status VARCHAR(20) DEFAULT \'processing\' COMMENT \'处理状态：processing / completed / failed\'', 
+    'SELECT \'Column status already exists\' AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 添加 error_message 字段
+SET @col_exists = 0;
+SELECT COUNT(*) INTO @col_exists 
+FROM information_schema.COLUMNS 
+WHERE TABLE_SCHEMA = 'knowledge_base' 
+  AND TABLE_NAME = 'faq_preview_cache' 
+  AND COLUMN_NAME = 'error_message';
+
+SET @sql = IF(@col_exists = 0, 
+    'ALTER TABLE faq_preview_cache ADD COLUMN error_message TEXT COMMENT \'失败原因\'', 
+    'SELECT \'Column error_message already exists\' AS message');
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+-- 显示表结构验证
+DESCRIBE faq_preview_cache;
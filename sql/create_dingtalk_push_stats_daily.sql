@@ -0,0 +1,24 @@
+-- 钉钉推送每日统计汇总表（按 配置 × 天 预聚合，/dingtalk-push/statistics 只读此表）
+-- 执行时间: 2026-10-19
+-- 应用启动时也会自动建表（独立事务），汇总表为空而已有推送历史时自动从历史回填；
+-- 需要重算指定区间时执行 python -m utils.dingtalk_push_stats --start YYYY-MM-DD --end YYYY-MM-DD
+
+USE dingtalk_push;
+
+CREATE TABLE IF NOT EXISTS dingtalk_push_stats_daily (
+    config_id INT NOT NULL COMMENT '配置ID',
+    stat_date DATE NOT NULL COMMENT '统计日期（按触发时间）',
+    runs INT NOT NULL DEFAULT 0 COMMENT '执行次数',
+    success_count INT NOT NULL DEFAULT 0 COMMENT '成功次数',
+    failed_count INT NOT NULL DEFAULT 0 COMMENT '失败次数',
+    duration_sum_ms BIGINT NOT NULL DEFAULT 0 COMMENT '耗时总和（毫秒）',
+    duration_count INT NOT NULL DEFAULT 0 COMMENT '有耗时的记录数',
+    duration_le_1s INT NOT NULL DEFAULT 0 COMMENT '耗时 <= 1s',
+    duration_le_3s INT NOT NULL DEFAULT 0 COMMENT '耗时 1s~3s',
+    duration_le_10s INT NOT NULL DEFAULT 0 COMMENT '耗时 3s~10s',
+    duration_le_30s INT NOT NULL DEFAULT 0 COMMENT '耗时 10s~30s',
+    duration_gt_30s INT NOT NULL DEFAULT 0 COMMENT '耗时 > 30s',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    PRIMARY KEY (config_id, stat_date),
+    INDEX idx_stat_date (stat_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='钉钉推送每日统计汇总';
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地假模型服务（测试用）
+
+- 模拟 Ollama 原生接口（/api/chat、/api/generate、/api/tags）与 OpenAI 兼容接口（/v1/chat/completions、/v1/models）
+- 流式请求按固定间隔逐个输出 token，便于测量首 token 延迟
+- 客户端中途断开时记入 cancelled，并记录已发送的 token 数
+- latency 模拟非流式请求的生成耗时；parallel 模拟模型服务的并行能力（超出的请求在服务端排队），
+  active / peak_active 记录同时处理中的请求数
+
+用法：
+    with FakeModelServer(tokens=['你', '好'], delay=0.01) as server:
+        client = OllamaClient(base_url=server.base_url, model='fake')
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+DEFAULT_TOKENS = ['您好', '，', '请', '在', '个人中心', '点击', '“', '重置密码', '”', '。']
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'FakeModel/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json({'models': [{'name': 'fake'}]})
+        elif self.path == '/v1/models':
+            self._send_json({'data': [{'id': 'fake'}]})
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        fake = self.server.fake
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        fake.requests.append((self.path, payload))
+
+        with fake.slots:
+            fake.enter()
+            try:
+                self._respond(fake, payload)
+            finally:
+                fake.leave()
+
+    def _respond(self, fake, payload):
+        if fake.status != 200:
+            self._send_json({'error': 'fake failure'}, fake.status)
+            return
+
+        openai = self.path.startswith('/v1/')
+        if self.path not in ('/api/chat', '/api/generate', '/v1/chat/completions'):
+            self._send_json({'error': 'not found'}, 404)
+            return
+
+        if not payload.get('stream'):
+            if fake.latency:
+                time.sleep(fake.latency)
+            text = ''.join(fake.tokens)
+            if openai:
+                self._send_json({'choices': [{'message': {'role': 'assistant', 'content': text}}]})
+            elif self.path == '/api/generate':
+                self._send_json({'response': text, 'done': True, 'prompt_eval_count': len(payload.get('prompt', '')),
+                                 'eval_count': len(fake.tokens)})
+            else:
+                self._send_json({'message': {'role': 'assistant', 'content': text}, 'done': True})
+            return
+
+        self._stream(fake, openai, self.path == '/api/generate')
+
+    def _stream(self, fake, openai, generate):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream' if openai else 'application/x-ndjson')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        sent = 0
+        try:
+            for token in fake.tokens:
+                time.sleep(fake.delay)
+                if openai:
+                    chunk = {'choices': [{'delta': {'content': token}, 'finish_reason': None}]}
+                    line = f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                elif generate:
+                    line = json.dumps({'response': token, 'done': False}, ensure_ascii=False) + '\n'
+                else:
+                    line = json.dumps({'message': {'role': 'assistant', 'content': token}, 'done': False},
+                                      ensure_ascii=False) + '\n'
+                self.wfile.write(line.encode('utf-8'))
+                self.wfile.flush()
+                sent += 1
+            tail = 'data: [DONE]\n\n' if openai else json.dumps({'done': True}) + '\n'
+            self.wfile.write(tail.encode('utf-8'))
+            self.wfile.flush()
+            fake.record(sent, cancelled=False)
+        except (BrokenPipeError, ConnectionResetError):
+            fake.record(sent, cancelled=True)
+
+
+class FakeModelServer:
+    """在随机端口启动的假模型服务"""
+
+    def __init__(self, tokens: List[str] = None, delay: float = 0.01, host: str = '127.0.0.1',
+                 latency: float = 0.0, parallel: int = 64):
+        self.tokens = list(tokens or DEFAULT_TOKENS)
+        self.delay = delay
+        self.latency = latency
+        self.slots = threading.Semaphore(parallel)
+        self.active = 0
+        self.peak_active = 0
+        self.status = 200
+        self.requests = []
+        self.completed = 0
+        self.cancelled = 0
+        self.tokens_sent = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def enter(self) -> None:
+        with self._lock:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+
+    def leave(self) -> None:
+        with self._lock:
+            self.active -= 1
+
+    def record(self, sent: int, cancelled: bool) -> None:
+        with self._lock:
+            self.tokens_sent.append(sent)
+            if cancelled:
+                self.cancelled += 1
+            else:
+                self.completed += 1
+
+    def wait_for(self, predicate, timeout: float = 5.0) -> bool:
+        """等待条件成立（流式请求的结束由服务端线程异步记录）"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if predicate(self):
+                return True
+            time.sleep(0.01)
+        return predicate(self)
+
+    def start(self) -> 'FakeModelServer':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> 'FakeModelServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
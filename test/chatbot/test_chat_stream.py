@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天流式输出测试（基于本地假模型服务）
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from flask import Flask
+
+from fake_model_server import DEFAULT_TOKENS, FakeModelServer
+from utils.chatbot_core import ChatbotCore
+from utils.ollama_client import OllamaClient
+
+
+class FakeKnowledgeBase:
+    def __init__(self, faqs=None):
+        self.faqs = faqs or []
+        self.turns = []
+        self.views = []
+
+    def search_faqs_by_domain(self, keyword, domain_id=None, limit=10):
+        return [dict(faq) for faq in self.faqs]
+
+    def list_faq_terms(self):
+        return []
+
+    def list_categories(self):
+        return []
+
+    def get_conversation_history(self, session_id, limit=50):
+        return []
+
+    def add_conversation_messages(self, messages):
+        self.turns.extend((message['session_id'], message['role'], message['content']) for message in messages)
+        return len(messages)
+
+    def increment_faq_view(self, faq_id):
+        self.views.append(faq_id)
+
+
+@pytest.fixture
+def server():
+    with FakeModelServer(delay=0.01) as fake:
+        yield fake
+
+
+def _client(server, **kwargs):
+    if kwargs.get('use_omlx'):
+        return OllamaClient(base_url=f'{server.base_url}/v1', model='fake', use_omlx=True)
+    return OllamaClient(base_url=server.base_url, model='fake')
+
+
+def _events(chunks):
+    events = []
+    for block in ''.join(chunks).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line)
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_parse_stream_line_formats():
+    parse = OllamaClient._parse_stream_line
+    assert parse(b'{"message": {"content": "\xe4\xbd\xa0"}, "done": false}') == ('你', False)
+    assert parse('{"response": "", "done": true}') == ('', True)
+    assert parse('data: {"choices": [{"delta": {"content": "好"}, "finish_reason": null}]}') == ('好', False)
+    assert parse('data: [DONE]') == ('', True)
+    assert parse('{"type": "content_block_delta", "delta": {"text": "呀"}}') == ('呀', False)
+    assert parse(': keepalive') == ('', False)
+    assert parse('not json') == ('', False)
+
+
+@pytest.mark.parametrize('use_omlx', [False, True])
+def test_chat_stream_yields_tokens_in_order(server, use_omlx):
+    client = _client(server, use_omlx=use_omlx)
+    tokens = list(client.chat_stream([{'role': 'user', 'content': '你好'}]))
+
+    assert tokens == DEFAULT_TOKENS
+    assert server.requests[-1][1]['stream'] is True
+    assert server.wait_for(lambda s: s.completed == 1)
+
+
+def test_closing_stream_disconnects_upstream(server):
+    server.tokens = [f't{i}' for i in range(200)]
+    client = _client(server)
+
+    stream = client.chat_stream([{'role': 'user', 'content': '写一篇长文'}])
+    assert [next(stream) for _ in range(3)] == ['t0', 't1', 't2']
+    stream.close()
+
+    assert server.wait_for(lambda s: s.cancelled == 1)
+    assert server.tokens_sent[0] < 50
+
+
+def test_chat_stream_http_error(server):
+    server.status = 503
+    with pytest.raises(Exception, match='HTTP 503'):
+        list(_client(server).chat_stream([{'role': 'user', 'content': '你好'}]))
+
+
+def test_stream_query_saves_once_at_the_end(server):
+    kb = FakeKnowledgeBase()
+    chatbot = ChatbotCore(_client(server), kb)
+
+    events = list(chatbot.stream_query('量子纠缠的最新研究进展', session_id='s1'))
+    chatbot.conversation_store.flush()
+    names = [name for name, _ in events]
+    assert names[0] == 'retrieval'
+    assert names[-1] == 'done'
+    assert ''.join(data['text'] for name, data in events if name == 'token') == ''.join(DEFAULT_TOKENS)
+    assert kb.turns == [('s1', 'user', '量子纠缠的最新研究进展'), ('s1', 'assistant', ''.join(DEFAULT_TOKENS))]
+
+
+def test_stream_query_knowledge_base_hit_skips_model(server):
+    kb = FakeKnowledgeBase(faqs=[{'id': 7, 'question': '如何重置密码', 'answer': '在个人中心重置。'}])
+    chatbot = ChatbotCore(_client(server), kb)
+
+    events = list(chatbot.stream_query('如何重置密码', session_id='s2'))
+    assert events[0][1]['source'] == 'knowledge_base'
+    assert events[1] == ('token', {'text': '在个人中心重置。'})
+    assert kb.views == [7]
+    assert not [path for path, _ in server.requests if path == '/api/chat']
+
+
+def test_stream_query_reports_model_errors(server, monkeypatch):
+    monkeypatch.setenv('OLLAMA_MAX_RETRIES', '0')
+    server.status = 500
+    kb = FakeKnowledgeBase()
+    chatbot = ChatbotCore(_client(server), kb)
+    events = list(chatbot.stream_query('量子纠缠的最新研究进展', session_id='s3'))
+    chatbot.conversation_store.flush()
+    assert events[-1][0] == 'error'
+    assert kb.turns == []
+
+
+@pytest.fixture
+def app_client(server, monkeypatch):
+    from routes.chat.chatbot_routes import chatbot_bp
+    import utils.chatbot_core as chatbot_core
+
+    kb = FakeKnowledgeBase()
+    chatbot = ChatbotCore(_client(server), kb)
+    monkeypatch.setattr(chatbot_core, '_chatbot_core', chatbot)
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(chatbot_bp)
+    return app.test_client(), chatbot
+
+
+def test_chat_stream_endpoint_emits_sse(app_client):
+    client, chatbot = app_client
+    response = client.post('/chatbot/chat/stream', json={'message': '量子纠缠的最新研究进展', 'session_id': 'web-1'})
+
+    assert response.mimetype == 'text/event-stream'
+    events = _events([response.get_data(as_text=True)])
+    assert events[0][0] == 'retrieval'
+    assert events[0][1]['session_id'] == 'web-1'
+    assert events[-1] == ('done', {'answer': ''.join(DEFAULT_TOKENS), 'source': 'ai_generated', 'session_id': 'web-1'})
+    chatbot.conversation_store.flush()
+    assert len(chatbot.knowledge_base.turns) == 2
+
+    assert client.post('/chatbot/chat/stream', json={}).status_code == 400
+
+
+def test_chat_stream_endpoint_cancels_on_disconnect(app_client, server):
+    client, chatbot = app_client
+    server.tokens = [f't{i}' for i in range(200)]
+
+    response = client.post('/chatbot/chat/stream', json={'message': '量子纠缠的最新研究进展', 'session_id': 'web-2'},
+                           buffered=False)
+    chunks = iter(response.response)
+    received = [next(chunks) for _ in range(4)]
+    response.close()
+
+    assert b'event: retrieval' in received[0]
+    assert server.wait_for(lambda s: s.cancelled == 1)
+    assert server.tokens_sent[-1] < 50
+    chatbot.conversation_store.flush()
+    assert chatbot.knowledge_base.turns == []
+
+
+@pytest.mark.slow
+def test_benchmark_time_to_first_token(server):
+    """首 token 延迟与完整生成耗时对比"""
+    server.tokens = [f'字{i}' for i in range(50)]
+    server.delay = 0.02
+    chatbot = ChatbotCore(_client(server), FakeKnowledgeBase())
+
+    start = time.perf_counter()
+    first_token = None
+    for name, _ in chatbot.stream_query('量子纠缠的最新研究进展'):
+        if name == 'token' and first_token is None:
+            first_token = time.perf_counter() - start
+    total = time.perf_counter() - start
+
+    print(f"\n[CHAT STREAM BENCH] tokens=50 ttft={first_token * 1000:.0f}ms total={total * 1000:.0f}ms")
+    assert first_token < total / 5
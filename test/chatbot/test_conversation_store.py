@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话历史存储测试：内存上下文窗口、批量写库、失败重试与保留期清理
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+
+from utils.conversation_store import ConversationStore
+
+
+class FakeBackend:
+    """模拟 conversation_history 表，记录每次数据库调用"""
+
+    def __init__(self):
+        self.rows = []
+        self.batches = []
+        self.reads = 0
+        self.fail = False
+        self.lock = threading.Lock()
+
+    def add_conversation_messages(self, messages):
+        if self.fail:
+            return -1
+        with self.lock:
+            self.batches.append(len(messages))
+            self.rows.extend(messages)
+        return len(messages)
+
+    def get_conversation_history(self, session_id, limit=50):
+        self.reads += 1
+        rows = [{'role': row['role'], 'content': row['content']} for row in self.rows if row['session_id'] == session_id]
+        return rows[-limit:]
+
+    def clear_conversation_history(self, session_id):
+        self.rows = [row for row in self.rows if row['session_id'] != session_id]
+        return True
+
+    def delete_conversation_history_before(self, cutoff):
+        before = len(self.rows)
+        self.rows = [row for row in self.rows if row['created_at'] >= cutoff]
+        return before - len(self.rows)
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+def _store(backend, **kwargs):
+    kwargs.setdefault('flush_interval', 60)
+    return ConversationStore(backend, **kwargs)
+
+
+def test_hot_session_context_needs_no_db_read(backend):
+    store = _store(backend, context_messages=4)
+    assert store.get_context('s1') == []
+    assert backend.reads == 1
+
+    for turn in range(3):
+        store.append_turn('s1', f'问{turn}', f'答{turn}')
+        context = store.get_context('s1')
+
+    assert backend.reads == 1
+    assert context == [{'role': 'user', 'content': '问1'}, {'role': 'assistant', 'content': '答1'},
+                       {'role': 'user', 'content': '问2'}, {'role': 'assistant', 'content': '答2'}]
+    assert store.get_context('s1', max_messages=2)[0]['content'] == '问2'
+    assert store.stats()['hot_reads'] == 4
+
+
+def test_flush_writes_in_batches(backend):
+    store = _store(backend, flush_batch=4)
+    for turn in range(5):
+        store.append_turn(f's{turn % 2}', f'问{turn}', f'答{turn}', related_faq_ids=[turn])
+
+    assert backend.rows == []
+    assert store.flush() == 10
+    assert backend.batches == [4, 4, 2]
+    assert [row['role'] for row in backend.rows[:2]] == ['user', 'assistant']
+    assert backend.rows[1]['related_faq_ids'] == [0]
+    assert store.stats()['pending'] == 0
+
+
+def test_background_thread_flushes_and_close_drains(backend):
+    store = _store(backend, flush_interval=0.05)
+    store.append_turn('s1', '问', '答')
+    deadline = time.monotonic() + 2
+    while not backend.rows and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(backend.rows) == 2
+
+    slow = _store(backend, flush_interval=60)
+    slow.append('s2', 'user', '退出前的消息')
+    slow.close()
+    assert backend.rows[-1]['content'] == '退出前的消息'
+
+
+def test_failed_flush_keeps_messages_in_order(backend):
+    store = _store(backend)
+    store.append_turn('s1', '问1', '答1')
+    backend.fail = True
+    assert store.flush() == 0
+    store.append_turn('s1', '问2', '答2')
+    assert store.stats()['failures'] == 1
+
+    backend.fail = False
+    assert store.flush() == 4
+    assert [row['content'] for row in backend.rows] == ['问1', '答1', '问2', '答2']
+
+
+def test_evicted_session_reloads_with_unflushed_messages(backend):
+    store = _store(backend, max_sessions=1)
+    store.get_context('s1')
+    store.append_turn('s1', '已写库的问题', '已写库的回答')
+    store.flush()
+    store.append_turn('s1', '未写库的问题', '未写库的回答')
+
+    store.get_context('s2')
+    assert store.stats()['sessions'] == 1
+
+    context = store.get_context('s1')
+    assert [message['content'] for message in context] == ['已写库的问题', '已写库的回答', '未写库的问题', '未写库的回答']
+
+
+def test_idle_sessions_expire_from_memory(backend):
+    store = _store(backend, session_ttl=-1)
+    store.get_context('s1')
+    assert store.evict_idle() == 1
+    assert store.stats()['sessions'] == 0
+
+
+def test_pending_queue_is_bounded(backend):
+    backend.fail = True
+    store = _store(backend, max_pending=3)
+    for index in range(5):
+        store.append('s1', 'user', f'消息{index}')
+    assert store.stats()['pending'] == 3
+    assert store.stats()['dropped'] == 2
+
+    backend.fail = False
+    store.close()
+    assert [row['content'] for row in backend.rows] == ['消息2', '消息3', '消息4']
+
+
+def test_clear_drops_memory_pending_and_db(backend):
+    store = _store(backend)
+    store.append_turn('s1', '问', '答')
+    store.flush()
+    store.append_turn('s1', '问2', '答2')
+    store.append_turn('s2', '别的会话', '保留')
+
+    assert store.clear('s1')
+    store.flush()
+    assert {row['session_id'] for row in backend.rows} == {'s2'}
+    assert store.get_context('s1') == []
+
+
+def test_retention_purges_old_rows(backend):
+    store = _store(backend, retention_days=30)
+    backend.rows.append({'session_id': 'old', 'role': 'user', 'content': '旧消息',
+                         'created_at': datetime.now() - timedelta(days=31)})
+    store.append('new', 'user', '新消息')
+    store.flush()
+
+    assert store.purge_expired() == 1
+    assert [row['content'] for row in backend.rows] == ['新消息']
+    assert _store(backend, retention_days=0).purge_expired() == 0
+
+
+@pytest.mark.slow
+def test_benchmark_chat_round_trips(backend):
+    """1000 个会话各 5 轮：同步逐条写库 + 每轮查库 与 内存窗口 + 批量写库 的数据库调用次数对比"""
+    db_latency = 0.0005
+
+    class SlowBackend(FakeBackend):
+        def add_conversation_messages(self, messages):
+            time.sleep(db_latency)
+            return super().add_conversation_messages(messages)
+
+        def get_conversation_history(self, session_id, limit=50):
+            time.sleep(db_latency)
+            return super().get_conversation_history(session_id, limit)
+
+    sessions, turns = 1000, 5
+    legacy_calls = sessions * turns * 3  # 每轮读一次历史 + 两条 INSERT
+    legacy_seconds = legacy_calls * db_latency
+
+    slow = SlowBackend()
+    store = _store(slow, flush_batch=500)
+    start = time.perf_counter()
+    for turn in range(turns):
+        for session in range(sessions):
+            store.get_context(f's{session}')
+            store.append_turn(f's{session}', f'问{turn}', f'答{turn}')
+    store.flush()
+    seconds = time.perf_counter() - start
+
+    calls = slow.reads + len(slow.batches)
+    print(f"\n[CONVERSATION BENCH] turns={sessions * turns} legacy_db_calls={legacy_calls} (≈{legacy_seconds:.2f}s) "
+          f"store_db_calls={calls} ({seconds:.2f}s)")
+    assert len(slow.rows) == sessions * turns * 2
+    assert calls < legacy_calls / 10
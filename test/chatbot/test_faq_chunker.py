@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FAQ 结构化分段测试
+覆盖问答不被切断、标题路径与分页、token 预算装箱、确定性分段 ID 与分段结果复用
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.faq_chunker import (
+    PAGE_BREAK,
+    ChunkResultCache,
+    chunk_document,
+    estimate_tokens,
+    parse_units,
+)
+
+
+def _manual(chapters=6, questions=12):
+    """生成带章节、问答与说明段落的长手册"""
+    lines = []
+    for c in range(1, chapters + 1):
+        lines.append(f"# 第{c}章 模块{c}运维")
+        lines.append(f"本章介绍模块{c}的日常巡检、故障排查与配置变更流程，适用于一线运维人员。" * 3)
+        for q in range(1, questions + 1):
+            lines.append(f"## {c}.{q} 告警处理")
+            lines.append(f"问：模块{c}出现第{q}类告警时如何处理？")
+            lines.append(f"答：第一步登录网管平台确认告警级别。第二步查询 alarm_event 表核对工单号{c}{q}。"
+                         f"第三步联系值班人员，按应急预案执行恢复操作，并在工单中记录处理过程。")
+    return '\n'.join(lines)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('告警处理') == 4
+    assert estimate_tokens('select * from t') == 3
+
+
+def test_units_follow_structure():
+    content = "# 总则\n说明第一行\n续行。\n问：如何重启？\n答：执行 restart。\n注意备份。\n## 细则\n正文。"
+    units = parse_units(content)
+    kinds = [unit.kind for unit in units]
+    assert kinds == ['heading', 'paragraph', 'qa', 'heading', 'paragraph']
+    # 答案后的说明行仍属于同一问答
+    assert units[2].text.endswith('注意备份。')
+    assert units[4].path == ('总则', '细则')
+
+
+def test_list_items_and_dotted_numbers_are_not_markers():
+    content = ("说明\na. 检查电源\nA. 检查网线\n"
+               "10.1.2.3 为网关地址\n2024.05.01 完成割接\nv1.2.3 修复告警\n1.5 2.5 3.5\n1.2.3.4 不是章节\n"
+               "2.1 故障排查\n3.2、变更流程\nA1. 重启服务。")
+    units = parse_units(content)
+    headings = [unit.text for unit in units if unit.kind == 'heading']
+    assert headings == ['2.1 故障排查', '3.2、变更流程']
+    # 小写 a. 与 A. 列表项不开启问答，A1. 才是答案标记
+    assert [unit.kind for unit in units].count('qa') == 1
+    assert next(unit for unit in units if unit.kind == 'qa').text == 'A1. 重启服务。'
+
+
+def test_pdf_pages_end_paragraphs():
+    units = parse_units(f"第一页未完的段落{PAGE_BREAK}第二页的段落。")
+    assert [(unit.text, unit.page) for unit in units] == [('第一页未完的段落', 1), ('第二页的段落。', 2)]
+
+
+def test_question_and_answer_never_split():
+    chunks = chunk_document(_manual(), max_tokens=400)
+    for chunk in chunks:
+        for line in chunk['content'].split('\n'):
+            if line.startswith('问：'):
+                position = chunk['content'].index(line)
+                assert '答：' in chunk['content'][position:]
+
+
+def test_chunks_fill_budget_and_reduce_calls():
+    content = _manual(chapters=12)
+    chunks = chunk_document(content, max_tokens=1500)
+    assert all(chunk['tokens'] <= 1500 for chunk in chunks)
+    # 除最后一段外平均装到预算的 70% 以上
+    filled = [chunk['tokens'] for chunk in chunks[:-1]]
+    assert sum(filled) / len(filled) >= 1500 * 0.7
+
+    # 默认 8k 上下文时，模型调用次数明显少于固定 2000 字符切分
+    fixed_slices = len(range(0, len(content), 2000))
+    assert len(chunk_document(content)) < fixed_slices
+
+
+def test_deterministic_ids_and_context():
+    content = '# 总则\n' + '\n'.join(f"第{i}条说明，描述巡检项目{i}的检查方法与判定标准。" for i in range(60))
+    first = chunk_document(content, max_tokens=300)
+    second = chunk_document(content, max_tokens=300)
+    assert [c['id'] for c in first] == [c['id'] for c in second]
+    assert len({c['id'] for c in first}) == len(first)
+    # 从章节中间开始的分段带有章节路径
+    assert first[0]['content'].startswith('# 总则')
+    for chunk in first[1:]:
+        assert chunk['content'].startswith('（所属章节：总则）\n（接上文：')
+
+
+def test_oversized_paragraph_split_by_sentence():
+    paragraph = '这是一句很长的说明。' * 200
+    chunks = chunk_document(paragraph, max_tokens=300, overlap_tokens=0)
+    assert len(chunks) > 1
+    assert all(chunk['content'].endswith('。') for chunk in chunks)
+    assert ''.join(chunk['content'] for chunk in chunks) == paragraph
+
+
+class _FakeClient:
+    model = 'fake-model'
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, prompt, **kwargs):
+        self.calls += 1
+        return json.dumps([{'question': f'问题{self.calls}', 'answer': '答案'}], ensure_ascii=False)
+
+
+def test_parallel_extraction_reuses_chunk_results(monkeypatch):
+    import utils.document_processor as document_processor
+
+    monkeypatch.setattr(document_processor, 'faq_chunk_cache', ChunkResultCache())
+    content = _manual(chapters=3)
+    client = _FakeClient()
+
+    faqs = document_processor.extract_faq_parallel(content, client, max_chunk_tokens=800, domain_id=7)
+    calls = client.calls
+    assert calls == len(chunk_document(content, max_tokens=800))
+    assert all(faq['domain_id'] == 7 for faq in faqs)
+
+    again = document_processor.extract_faq_parallel(content, client, max_chunk_tokens=800, domain_id=8)
+    assert client.calls == calls
+    assert len(again) == len(faqs)
+    assert all(faq['domain_id'] == 8 for faq in again)
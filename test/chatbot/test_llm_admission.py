@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大模型准入控制测试：优先级与 batch 名额、并发上限、截止时间、排队取消、流式心跳与断开、批量请求压力下的交互延迟基准
+"""
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from flask import Flask
+
+import utils.ollama_client
+from fake_model_server import DEFAULT_TOKENS, FakeModelServer
+from test_chat_stream import FakeKnowledgeBase
+from utils import llm_admission
+from utils.chatbot_core import ChatbotCore
+from utils.llm_admission import PRIORITY_BATCH, PRIORITY_INTERACTIVE, LLMAdmission, LLMAdmissionError
+from utils.ollama_client import OllamaClient
+
+MESSAGES = [{'role': 'user', 'content': '你好'}]
+
+
+@pytest.fixture
+def server():
+    with FakeModelServer(delay=0.01) as fake:
+        yield fake
+
+
+def _client(server, admission):
+    return OllamaClient(base_url=server.base_url, model='fake', admission=admission)
+
+
+def _in_thread(func, *args, **kwargs):
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = func(*args, **kwargs)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def _wait_queued(admission, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while admission.stats()['queued'] != count and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert admission.stats()['queued'] == count
+
+
+def test_priority_order_and_batch_reservation():
+    admission = LLMAdmission(max_concurrency=2, batch_max_concurrency=1)
+    batch_1 = admission.enqueue(PRIORITY_BATCH)
+    batch_2 = admission.enqueue(PRIORITY_BATCH)
+    # batch 只能占一个名额，留下的名额给交互请求
+    interactive_1 = admission.enqueue(PRIORITY_INTERACTIVE)
+    interactive_2 = admission.enqueue(PRIORITY_INTERACTIVE)
+    batch_3 = admission.enqueue(PRIORITY_BATCH)
+    assert [t.state for t in (batch_1, batch_2, interactive_1, interactive_2, batch_3)] == [
+        'granted', 'waiting', 'granted', 'waiting', 'waiting']
+
+    # 交互请求越过先到的 batch 请求
+    admission.release(interactive_1)
+    assert (interactive_2.state, batch_2.state) == ('granted', 'waiting')
+    admission.release(batch_1)
+    assert (batch_2.state, batch_3.state) == ('granted', 'waiting')
+
+    stats = admission.stats()
+    assert (stats['in_flight'], stats['queued'], stats['peak_queued']) == (2, 1, 3)
+    assert stats['priorities'][PRIORITY_BATCH]['admitted'] == 2
+    assert stats['priorities'][PRIORITY_INTERACTIVE]['wait_ms']['samples'] == 2
+
+    admission.release(batch_3)
+    assert admission.stats()['priorities'][PRIORITY_BATCH]['cancelled'] == 1
+    full = LLMAdmission(max_concurrency=1, max_queue=0)
+    full.enqueue()
+    with pytest.raises(LLMAdmissionError) as error:
+        full.enqueue()
+    assert error.value.reason == 'queue_full'
+
+
+def test_configure_keeps_configured_batch_limit():
+    admission = LLMAdmission(max_concurrency=4, batch_max_concurrency=3)
+    admission.configure(max_concurrency=1)
+    assert (admission.batch_max_concurrency, admission.stats()['batch_limit']) == (1, 3)
+    # 总上限调回后 batch 名额恢复为配置值
+    admission.configure(max_concurrency=4)
+    assert admission.batch_max_concurrency == 3
+    admission.configure(batch_max_concurrency=2)
+    admission.configure(max_concurrency=0)
+    assert admission.batch_max_concurrency == 2 and not admission.enabled
+
+
+def test_concurrency_cap_against_stub_server():
+    with FakeModelServer(latency=0.1) as server:
+        admission = LLMAdmission(max_concurrency=2)
+        client = _client(server, admission)
+        threads = [_in_thread(client.generate, f'问题{i}') for i in range(6)]
+        for thread, outcome in threads:
+            thread.join(10)
+            assert outcome['result'] == ''.join(DEFAULT_TOKENS)
+
+    assert server.peak_active == 2
+    stats = admission.stats()
+    assert (stats['in_flight'], stats['queued']) == (0, 0)
+    assert stats['priorities'][PRIORITY_INTERACTIVE]['admitted'] == 6
+    assert stats['priorities'][PRIORITY_INTERACTIVE]['wait_ms']['max'] >= 100
+
+
+def test_deadline_fails_fast_while_queued(server):
+    admission = LLMAdmission(max_concurrency=1)
+    client = _client(server, admission)
+    held = admission.acquire(PRIORITY_BATCH)
+
+    started = time.perf_counter()
+    with pytest.raises(LLMAdmissionError) as error:
+        client.generate('问题', deadline=0.2)
+    assert error.value.reason == 'deadline'
+    assert time.perf_counter() - started < 1.0
+
+    # 交互请求的最长排队时间
+    impatient = LLMAdmission(max_concurrency=1, max_waits={PRIORITY_INTERACTIVE: 0.1})
+    impatient.acquire()
+    with pytest.raises(LLMAdmissionError, match='排队'):
+        _client(server, impatient).chat(MESSAGES)
+
+    assert server.requests == []
+    assert admission.stats()['priorities'][PRIORITY_INTERACTIVE]['timeouts'] == 1
+    admission.release(held)
+
+    # 获准后发往模型服务的超时不超过剩余时间
+    ticket = admission.acquire(deadline=30)
+    assert 29 < ticket.timeout(1200) <= 30
+    with pytest.raises(LLMAdmissionError):
+        ticket.check_sleep(60)
+    admission.release(ticket)
+    assert client.chat(MESSAGES, deadline=5) == ''.join(DEFAULT_TOKENS)
+
+
+def test_cancel_queued_requests(server, monkeypatch):
+    monkeypatch.setattr(utils.ollama_client, 'LLM_QUEUE_HEARTBEAT', 0.02)
+    admission = LLMAdmission(max_concurrency=1)
+    client = _client(server, admission)
+    held = admission.acquire()
+
+    cancel_event = threading.Event()
+    thread, outcome = _in_thread(client.chat, MESSAGES, cancel_event=cancel_event)
+    _wait_queued(admission, 1)
+    cancel_event.set()
+    thread.join(5)
+    assert outcome['error'].reason == 'cancelled'
+
+    # 流式请求排队期间产出心跳；关闭生成器即出队
+    stream = client.chat_stream(MESSAGES, heartbeat=True)
+    assert next(stream) == ''
+    assert admission.stats()['queued'] == 1
+    stream.close()
+    assert admission.stats()['queued'] == 0
+
+    assert server.requests == []
+    assert admission.stats()['priorities'][PRIORITY_INTERACTIVE]['cancelled'] == 2
+    admission.release(held)
+    assert list(client.chat_stream(MESSAGES)) == DEFAULT_TOKENS
+
+
+def test_stream_endpoint_heartbeat_then_disconnect(server, monkeypatch):
+    from routes.chat.chatbot_routes import chatbot_bp
+    import utils.chatbot_core as chatbot_core
+
+    monkeypatch.setattr(utils.ollama_client, 'LLM_QUEUE_HEARTBEAT', 0.02)
+    admission = LLMAdmission(max_concurrency=1)
+    monkeypatch.setattr(llm_admission, 'llm_admission', admission)
+    chatbot = ChatbotCore(_client(server, admission), FakeKnowledgeBase())
+    # 问题解析不走模型，只让回答生成进入队列
+    monkeypatch.setattr(chatbot, '_parse_query', lambda query: {'original_query': query})
+    monkeypatch.setattr(chatbot_core, '_chatbot_core', chatbot)
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.register_blueprint(chatbot_bp)
+    http = app.test_client()
+
+    held = admission.acquire(PRIORITY_BATCH)
+    response = http.post('/chatbot/chat/stream', json={'message': '量子纠缠的最新研究进展', 'session_id': 'q-1'},
+                         buffered=False)
+    chunks = iter(response.response)
+    assert b'event: retrieval' in next(chunks)
+    assert next(chunks) == b': queued\n\n'
+    assert admission.stats()['queued'] == 1
+    response.close()
+
+    stats = json.loads(http.get('/chatbot/llm/admission').get_data(as_text=True))['data']
+    assert (stats['queued'], stats['in_flight']) == (0, 1)
+    assert stats['priorities'][PRIORITY_INTERACTIVE]['cancelled'] == 1
+    assert server.requests == []
+    admission.release(held)
+
+
+@pytest.mark.slow
+def test_benchmark_interactive_latency_under_batch_flood():
+    """模型服务只能同时处理一个请求：6 个线程持续提交 batch 请求时，交互请求的端到端耗时（无准入控制 vs 优先级队列）"""
+
+    def run(admission):
+        with FakeModelServer(latency=0.05, parallel=1) as server:
+            client = _client(server, admission)
+            stop = threading.Event()
+
+            def flood():
+                while not stop.is_set():
+                    client.generate('批量抽取 FAQ', priority=PRIORITY_BATCH, retry=0)
+
+            workers = [threading.Thread(target=flood, daemon=True) for _ in range(6)]
+            for worker in workers:
+                worker.start()
+            time.sleep(0.3)
+            latencies, overtaken = [], []
+            for _ in range(8):
+                submitted = len(server.requests)
+                started = time.perf_counter()
+                client.generate('交互问题', retry=0)
+                latencies.append(time.perf_counter() - started)
+                # 提交之后、本请求之前到达模型服务的 batch 请求数
+                arrived = [json.dumps(payload, ensure_ascii=False) for _, payload in server.requests[submitted:]]
+                overtaken.append(next(i for i, text in enumerate(arrived) if '交互问题' in text))
+                time.sleep(0.05)
+            stop.set()
+            for worker in workers:
+                worker.join(10)
+            return latencies, server.peak_active, overtaken
+
+    legacy, _, _ = run(LLMAdmission(max_concurrency=0))
+    queued, peak_active, overtaken = run(LLMAdmission(max_concurrency=1))
+
+    legacy_ms, queued_ms = statistics.mean(legacy) * 1000, statistics.mean(queued) * 1000
+    print(f"\n[LLM ADMISSION BENCH] interactive latency under batch flood: "
+          f"no admission avg={legacy_ms:.0f}ms max={max(legacy) * 1000:.0f}ms | "
+          f"priority queue avg={queued_ms:.0f}ms max={max(queued) * 1000:.0f}ms")
+    assert peak_active == 1
+    # 交互请求排在所有等待中的 batch 请求之前，最多等已放行的那一个
+    assert max(overtaken) <= 1
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大模型调用遥测测试：直方图、各调用方式的指标、采样落盘与滚动、遥测接口、热路径不再打印完整请求、日志开销基准
+"""
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from flask import Flask
+
+import utils.ollama_client
+from fake_model_server import DEFAULT_TOKENS, FakeModelServer
+from utils import llm_telemetry as telemetry_module
+from utils.llm_admission import LLMAdmission, LLMAdmissionError
+from utils.llm_telemetry import LatencyHistogram, LLMTelemetry, PayloadCapture
+from utils.ollama_client import OllamaClient
+
+MESSAGES = [{'role': 'system', 'content': '你是助手'}, {'role': 'user', 'content': '你好'}]
+
+
+@pytest.fixture
+def server():
+    with FakeModelServer(delay=0.01) as fake:
+        yield fake
+
+
+@pytest.fixture
+def telemetry(monkeypatch):
+    fresh = LLMTelemetry(capture=PayloadCapture(rate=0))
+    monkeypatch.setattr(utils.ollama_client, 'llm_telemetry', fresh)
+    return fresh
+
+
+class _Records(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.levelno, record.getMessage()))
+
+
+def test_latency_histogram_buckets_and_percentiles():
+    histogram = LatencyHistogram()
+    for value in [10] * 90 + [700] * 9 + [400000]:
+        histogram.add(value)
+    data = histogram.to_dict()
+    assert (data['count'], data['p50'], data['p95'], data['max']) == (100, 50.0, 1000.0, 400000)
+    assert data['buckets'] == {'<=50': 90, '<=1000': 9, '>300000': 1}
+    assert LatencyHistogram().to_dict()['p95'] == 0.0
+
+
+def test_calls_recorded_per_operation(server, telemetry):
+    admission = LLMAdmission(max_concurrency=1)
+    client = OllamaClient(base_url=server.base_url, model='fake', admission=admission)
+    assert client.generate('介绍一下量子纠缠', system='简洁回答') == ''.join(DEFAULT_TOKENS)
+    assert client.chat(MESSAGES) == ''.join(DEFAULT_TOKENS)
+
+    stream = client.chat_stream(MESSAGES)
+    assert next(stream) == DEFAULT_TOKENS[0]
+    stream.close()
+    assert list(client.chat_stream(MESSAGES)) == DEFAULT_TOKENS
+
+    held = admission.acquire()
+    with pytest.raises(LLMAdmissionError):
+        client.generate('排队超时', deadline=0.05)
+    admission.release(held)
+
+    series = telemetry.stats()['series']
+    generate = series['generate:fake']
+    # 模型服务返回了 token 计数（原生 generate），直接采用
+    assert (generate['calls'], generate['prompt_tokens'], generate['response_tokens']) == (2, 10, 10)
+    assert generate['statuses'] == {'ok': 1, 'deadline': 1}
+    assert generate['estimated_token_calls'] == 1
+    # chat 响应没有计数：按字符数粗估
+    assert (series['chat:fake']['prompt_tokens'], series['chat:fake']['estimated_token_calls']) == (3, 1)
+
+    stream_series = series['chat_stream:fake']
+    assert stream_series['statuses'] == {'cancelled': 1, 'ok': 1}
+    assert stream_series['ttft_ms']['count'] == 2
+
+    recent = telemetry.recent(10)
+    assert [entry['operation'] for entry in recent] == ['generate', 'chat_stream', 'chat_stream', 'chat', 'generate']
+    assert recent[0]['status'] == 'deadline' and recent[0]['queue_ms'] == 0
+    assert 'prompt' not in json.dumps(recent, ensure_ascii=False).replace('prompt_tokens', '')
+
+
+def test_generate_does_not_log_payload_at_info(server, telemetry):
+    handler = _Records()
+    client_logger = logging.getLogger('utils.ollama_client')
+    previous = client_logger.level
+    client_logger.addHandler(handler)
+    client_logger.setLevel(logging.INFO)
+    try:
+        client = OllamaClient(base_url=server.base_url, model='fake', admission=LLMAdmission(max_concurrency=0))
+        handler.messages.clear()
+        client.generate('机密提示词' * 100)
+        client.chat([{'role': 'user', 'content': '机密提示词'}])
+    finally:
+        client_logger.removeHandler(handler)
+        client_logger.setLevel(previous)
+    assert handler.messages == []
+
+
+def test_payload_capture_sampled_async_and_rotated(tmp_path, server, monkeypatch):
+    path = str(tmp_path / 'capture' / 'llm_payloads.jsonl')
+    capture = PayloadCapture(rate=1.0, path=path, max_bytes=2048, backups=2)
+    telemetry = LLMTelemetry(capture=capture)
+    monkeypatch.setattr(utils.ollama_client, 'llm_telemetry', telemetry)
+    client = OllamaClient(base_url=server.base_url, model='fake', admission=LLMAdmission(max_concurrency=0))
+
+    for i in range(12):
+        client.generate(f'第{i}个问题：' + '内容' * 100)
+    assert capture.flush()
+
+    files = sorted(glob.glob(path + '*'))
+    assert len(files) == 3  # 当前文件 + 2 个滚动备份
+    with open(path, encoding='utf-8') as f:
+        line = json.loads(f.readline())
+    assert line['request']['prompt'].startswith('第') and line['response'] == ''.join(DEFAULT_TOKENS)
+    assert line['operation'] == 'generate' and line['status'] == 'ok'
+    assert capture.stats()['written'] == 12
+
+    # 采样率为 0：不启动写入线程，不落盘
+    off = PayloadCapture(rate=0, path=str(tmp_path / 'off.jsonl'))
+    assert not any(off.should_sample() for _ in range(100)) and off._writer is None
+
+    # 写入队列满时丢弃，不阻塞调用方
+    full = PayloadCapture(rate=1.0, path=str(tmp_path / 'full.jsonl'), queue_size=1)
+    full._writer = object()  # 不启动写入线程，模拟磁盘写入跟不上
+    assert full.submit({'a': 1}) and not full.submit({'b': 2})
+    assert full.stats()['dropped'] == 1
+
+
+def test_telemetry_endpoint(server, telemetry, monkeypatch):
+    from routes.chat.chatbot_routes import chatbot_bp
+
+    monkeypatch.setattr(telemetry_module, 'llm_telemetry', telemetry)
+    client = OllamaClient(base_url=server.base_url, model='fake', admission=LLMAdmission(max_concurrency=0))
+    client.generate('问题')
+    app = Flask(__name__)
+    app.register_blueprint(chatbot_bp)
+
+    data = app.test_client().get('/chatbot/llm/telemetry?recent=5').get_json()['data']
+    assert data['calls'] == 1
+    assert data['series']['generate:fake']['latency_ms']['count'] == 1
+    assert data['recent'][0]['model'] == 'fake'
+    assert data['capture']['rate'] == 0
+
+
+@pytest.mark.slow
+def test_benchmark_hot_path_logging_overhead(tmp_path):
+    """30KB 的 FAQ 抽取 prompt：原先每次调用格式化 curl 命令并按 INFO 写日志文件 vs 遥测计量"""
+    prompt = '请从以下文档片段中提取 FAQ，保留所有细节。' + '文档内容示例，' * 4000
+    payload = {'model': 'qwen3:4b', 'prompt': prompt, 'stream': False, 'options': {'temperature': 0.1}}
+    calls = 300
+
+    legacy_logger = logging.getLogger('bench.legacy_curl')
+    legacy_logger.propagate = False
+    legacy_logger.setLevel(logging.INFO)
+    handler = logging.FileHandler(str(tmp_path / 'app.log'), encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    legacy_logger.addHandler(handler)
+    started = time.perf_counter()
+    for _ in range(calls):
+        legacy_logger.info(f"[OLLAMA_REQUEST] Prompt length: {len(prompt)} chars")
+        curl_cmd = 'curl -X POST "http://localhost:11434/api/generate" \\'
+        curl_cmd += '\n  -H "Content-Type: application/json" \\'
+        curl_cmd += f"\n  -d '{json.dumps(payload, ensure_ascii=False)}'"
+        legacy_logger.info(f"[OLLAMA_CURL]\n{curl_cmd}")
+    legacy = time.perf_counter() - started
+    handler.close()
+    log_bytes = os.path.getsize(str(tmp_path / 'app.log'))
+
+    telemetry = LLMTelemetry(capture=PayloadCapture(rate=0))
+    started = time.perf_counter()
+    for _ in range(calls):
+        with telemetry.call('generate', 'qwen3:4b', 'batch', len(prompt), payload=payload) as call:
+            call.admitted(0.0)
+            call.usage({'prompt_eval_count': 9000, 'eval_count': 300})
+            call.done('[{"question": "q", "answer": "a"}]')
+    instrumented = time.perf_counter() - started
+
+    print(f"\n[LLM TELEMETRY BENCH] calls={calls} prompt={len(prompt)} chars "
+          f"legacy={legacy / calls * 1e6:.0f}us/call log={log_bytes / 1024 / 1024:.1f}MB "
+          f"telemetry={instrumented / calls * 1e6:.1f}us/call")
+    assert telemetry.stats()['calls'] == calls
+    assert instrumented * 20 < legacy
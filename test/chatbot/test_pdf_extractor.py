@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF 按页并行抽取测试（含单页失败跳过、按页范围只打开一次文档、工作进程不导入 app）
+
+进程池调度、页缓存与合并顺序用可导入的页函数验证；真实 PDF 抽取需要安装 pdfplumber
+"""
+import os
+import sys
+import time
+import types
+from contextlib import nullcontext
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+
+from utils.pdf_extractor import (METHOD_EMPTY, METHOD_FAILED, METHOD_OCR, METHOD_TEXT, PageCache, PdfExtractionPool,
+                                 build_settings, file_sha256, settings_key)
+
+PAGES = 12
+
+
+def fake_page_count(path):
+    return PAGES
+
+
+def counting_opener(path):
+    """每次打开文档记录一行（工作进程共享同一个计数文件）"""
+    with open(f'{path}.opens', 'a') as f:
+        f.write(f'{os.getpid()}\n')
+    return nullcontext(path)
+
+
+def slow_page(document, page_no, settings):
+    """奇数页有文本层，偶数页模拟扫描页；后面的页先完成，用来检查合并顺序"""
+    time.sleep(0.01 * (PAGES - page_no))
+    method = METHOD_TEXT if page_no % 2 else METHOD_OCR
+    return {'page': page_no, 'text': f'第{page_no}页 {os.getpid()}', 'method': method, 'seconds': 0.0}
+
+
+def worker_main_page(document, page_no, settings):
+    """返回工作进程的 __main__ 模块名，以及是否导入了 Web 应用"""
+    main_spec = getattr(sys.modules['__main__'], '__spec__', None)
+    text = f"{getattr(main_spec, 'name', None)} {'app' in sys.modules}"
+    return {'page': page_no, 'text': text, 'method': METHOD_TEXT, 'seconds': 0.0}
+
+
+def broken_page(document, page_no, settings):
+    """第 5 页解析失败，其余页正常"""
+    if page_no == 5:
+        raise ValueError('页面对象损坏')
+    return slow_page(document, page_no, settings)
+
+
+def dead_page(document, page_no, settings):
+    raise ValueError('文件已损坏')
+
+
+def cpu_page(document, page_no, settings):
+    """CPU 密集的页处理，用于吞吐对比"""
+    total = 0
+    for i in range(600000):
+        total += i * i % 7
+    return {'page': page_no, 'text': str(total), 'method': METHOD_TEXT, 'seconds': 0.0}
+
+
+@pytest.fixture
+def pdf_file(tmp_path):
+    path = tmp_path / 'manual.pdf'
+    path.write_bytes(b'%PDF-1.4 fake content for hashing')
+    return str(path)
+
+
+def test_settings_key_is_stable_and_sensitive():
+    assert settings_key(build_settings()) == settings_key(build_settings())
+    assert settings_key(build_settings(ocr_lang='eng')) != settings_key(build_settings())
+    assert build_settings(ocr_dpi=None)['ocr_dpi'] == 300
+
+
+def test_page_cache_roundtrip_and_prune(tmp_path):
+    cache = PageCache(str(tmp_path / 'cache'))
+    assert cache.get('ab' * 32, 1, 'k') is None
+    cache.put('ab' * 32, 1, 'k', {'text': '内容', 'method': METHOD_OCR, 'page': 1})
+    assert cache.get('ab' * 32, 1, 'k') == {'text': '内容', 'method': METHOD_OCR}
+    assert cache.get('ab' * 32, 1, 'other') is None
+
+    assert cache.prune(max_age_seconds=-1) == 1
+    assert cache.get('ab' * 32, 1, 'k') is None
+
+
+def test_pool_merges_pages_in_order(pdf_file):
+    pool = PdfExtractionPool(max_workers=3, page_extractor=slow_page, page_counter=fake_page_count,
+                             opener=counting_opener)
+    progress = []
+    try:
+        pages = pool.extract(pdf_file, progress_callback=lambda done, total: progress.append((done, total)))
+    finally:
+        pool.shutdown()
+
+    assert [page['page'] for page in pages] == list(range(1, PAGES + 1))
+    assert [page['text'].split()[0] for page in pages] == [f'第{i}页' for i in range(1, PAGES + 1)]
+    # 页在工作进程中处理
+    assert all(page['text'].split()[1] != str(os.getpid()) for page in pages)
+    assert progress[-1] == (PAGES, PAGES)
+    # 每个工作进程一个连续页范围，每个范围只打开一次文档
+    with open(f'{pdf_file}.opens') as f:
+        assert len(f.read().split()) == 3
+
+
+def test_workers_do_not_import_app(pdf_file, tmp_path, monkeypatch):
+    # 模拟以 python app.py 启动的 Web 进程：spawn 子进程默认会按路径重新执行 __main__
+    marker = tmp_path / 'imported'
+    entry = tmp_path / 'web_entry.py'
+    entry.write_text(f"open({str(marker)!r}, 'w').close()\n")
+    web_main = types.ModuleType('__main__')
+    web_main.__file__ = str(entry)
+    web_main.__spec__ = None
+    monkeypatch.setitem(sys.modules, '__main__', web_main)
+
+    pool = PdfExtractionPool(max_workers=2, page_extractor=worker_main_page, page_counter=fake_page_count,
+                             opener=nullcontext)
+    try:
+        pages = pool.extract(pdf_file)
+    finally:
+        pool.shutdown()
+    assert {page['text'] for page in pages} == {'utils.pdf_worker False'}
+    assert not marker.exists()
+
+
+def test_cached_pages_are_skipped(pdf_file, tmp_path):
+    cache = PageCache(str(tmp_path / 'cache'))
+    settings = build_settings()
+    key = settings_key(settings)
+    file_hash = file_sha256(pdf_file)
+    for page_no in range(1, PAGES):
+        cache.put(file_hash, page_no, key, {'text': f'缓存{page_no}', 'method': METHOD_TEXT})
+
+    pool = PdfExtractionPool(max_workers=2, cache=cache, page_extractor=slow_page, page_counter=fake_page_count,
+                             opener=nullcontext)
+    pages = pool.extract(pdf_file, settings)
+
+    assert [page['cached'] for page in pages] == [True] * (PAGES - 1) + [False]
+    assert pages[0]['text'] == '缓存1'
+    # 最后一页抽取后写入缓存，再次抽取全部命中
+    assert cache.get(file_hash, PAGES, key)['method'] == METHOD_OCR
+    assert all(page['cached'] for page in pool.extract(pdf_file, settings))
+    # 引擎设置不同则不复用
+    pool_settings = build_settings(ocr_lang='eng')
+    try:
+        assert not any(page['cached'] for page in pool.extract(pdf_file, pool_settings))
+    finally:
+        pool.shutdown()
+
+
+def test_failed_page_is_skipped(pdf_file, tmp_path):
+    cache = PageCache(str(tmp_path / 'cache'))
+    pool = PdfExtractionPool(max_workers=2, cache=cache, page_extractor=broken_page, page_counter=fake_page_count,
+                             opener=nullcontext)
+    try:
+        pages = pool.extract(pdf_file)
+        text = pool.extract_text(pdf_file)
+    finally:
+        pool.shutdown()
+
+    assert [page['method'] for page in pages].count(METHOD_FAILED) == 1
+    assert pages[4]['text'] == '' and '页面对象损坏' in pages[4]['error']
+    assert [line.split()[0] for line in text.split('\n')] == [f'第{i}页' for i in range(1, PAGES + 1) if i != 5]
+    # 失败页不写缓存，下次重新抽取
+    key, file_hash = settings_key(build_settings()), file_sha256(pdf_file)
+    assert cache.get(file_hash, 5, key) is None and cache.get(file_hash, 6, key) is not None
+
+
+def test_all_pages_failed_raises(pdf_file):
+    pool = PdfExtractionPool(max_workers=2, page_extractor=dead_page, page_counter=fake_page_count,
+                             opener=nullcontext)
+    try:
+        with pytest.raises(RuntimeError, match='文件已损坏'):
+            pool.extract(pdf_file)
+    finally:
+        pool.shutdown()
+
+
+def test_extract_text_skips_empty_pages(pdf_file):
+    def counter(path):
+        return 1
+
+    def extractor(document, page_no, settings):
+        return {'page': page_no, 'text': '  ', 'method': METHOD_EMPTY, 'seconds': 0.0}
+
+    pool = PdfExtractionPool(page_extractor=extractor, page_counter=counter, opener=nullcontext)
+    assert pool.extract_text(pdf_file) == ''
+
+
+def test_real_pdf_text_layer(tmp_path):
+    pdfplumber = pytest.importorskip('pdfplumber')
+    from PIL import Image
+
+    # Pillow 生成的 PDF 只有图片，没有文本层
+    path = str(tmp_path / 'scan.pdf')
+    Image.new('RGB', (200, 100), 'white').save(path)
+    assert pdfplumber.open(path).pages
+
+    pool = PdfExtractionPool(max_workers=1, cache=PageCache(str(tmp_path / 'cache')))
+    try:
+        pages = pool.extract(path, build_settings(ocr=False))
+    finally:
+        pool.shutdown()
+    assert [page['method'] for page in pages] == [METHOD_EMPTY]
+
+
+@pytest.mark.slow
+def test_benchmark_throughput_scales_with_workers(pdf_file):
+    """CPU 密集的页处理：单进程与多进程的吞吐对比"""
+    workers = min(4, os.cpu_count() or 1)
+    if workers < 2:
+        pytest.skip('需要至少 2 个 CPU 核')
+
+    timings = {}
+    for count in (1, workers):
+        pool = PdfExtractionPool(max_workers=count, page_extractor=cpu_page, page_counter=fake_page_count,
+                                 opener=nullcontext)
+        try:
+            pool.warmup()
+            start = time.perf_counter()
+            pool.extract(pdf_file)
+            timings[count] = time.perf_counter() - start
+        finally:
+            pool.shutdown()
+
+    print(f"\n[PDF BENCH] pages={PAGES} workers=1 {timings[1]:.2f}s | workers={workers} {timings[workers]:.2f}s "
+          f"| speedup={timings[1] / timings[workers]:.1f}x")
+    assert timings[workers] < timings[1]
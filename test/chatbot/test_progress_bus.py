@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进度总线与上传进度 SSE 推送测试
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import types
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+from flask import Flask
+
+import utils.document_processor as document_processor
+from utils.progress_bus import ProgressBus, progress_bus, STATUS_COMPLETED, STATUS_FAILED
+
+
+def test_publish_only_reports_milestones():
+    bus = ProgressBus(milestone_step=10)
+    assert bus.start('task', total=200)
+
+    milestones = sum(bus.publish('task', processed=i) for i in range(1, 201))
+    # 10%、20% ... 100% 各一次
+    assert milestones == 10
+    assert bus.get('task')['progress_percent'] == 100
+    assert bus.finish('task')
+    assert bus.get('task')['status'] == STATUS_COMPLETED
+
+
+def test_wait_returns_latest_snapshot_and_supports_resume():
+    bus = ProgressBus()
+    first = bus.start('task', total=10)
+    for i in range(1, 6):
+        bus.publish('task', processed=i)
+
+    # 中间的更新被合并，只拿到最新快照
+    snapshot = bus.wait('task', last_seq=first['seq'], timeout=0)
+    assert snapshot['processed'] == 5
+    # 已是最新序号时超时返回 None
+    assert bus.wait('task', last_seq=snapshot['seq'], timeout=0.01) is None
+    assert bus.wait('missing', timeout=0) is None
+
+
+def test_wait_wakes_up_on_publish():
+    bus = ProgressBus()
+    seq = bus.start('task', total=4)['seq']
+    timer = threading.Timer(0.05, bus.publish, args=('task',), kwargs={'processed': 2})
+    timer.start()
+    try:
+        snapshot = bus.wait('task', last_seq=seq, timeout=5)
+    finally:
+        timer.cancel()
+    assert snapshot['processed'] == 2
+    assert snapshot['progress_percent'] == 50
+
+
+def test_fail_and_restart_keep_sequence():
+    bus = ProgressBus()
+    bus.start('task', total=3)
+    assert bus.fail('task', error='boom')
+    failed = bus.get('task')
+    assert failed['status'] == STATUS_FAILED
+    assert failed['error'] == 'boom'
+
+    restarted = bus.start('task', total=3)
+    assert restarted['seq'] > failed['seq']
+    assert restarted['processed'] == 0
+
+
+def test_finished_channels_are_purged(monkeypatch):
+    bus = ProgressBus()
+    bus.start('old', total=1)
+    bus.finish('old')
+    monkeypatch.setattr('utils.progress_bus.FINISHED_RETENTION_SECONDS', -1)
+    bus.start('new', total=1)
+    assert bus.get('old') is None
+    assert len(bus) == 1
+
+
+def test_update_progress_persists_only_at_milestones(monkeypatch):
+    writes = []
+    monkeypatch.setattr(document_processor, 'persist_progress', lambda *args: writes.append(args))
+
+    progress_bus.start('doc-task', total=100)
+    for i in range(1, 101):
+        document_processor.update_progress('doc-task', i, i * 2)
+
+    assert len(writes) == 10
+    assert writes[-1] == ('doc-task', 100, 200)
+
+
+@pytest.fixture
+def client():
+    from routes.chat.chatbot_routes import chatbot_bp
+
+    app = Flask(__name__)
+    app.register_blueprint(chatbot_bp)
+    return app.test_client()
+
+
+def _events(body: str):
+    events = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'data' in fields:
+            events.append((fields.get('id'), json.loads(fields['data'])))
+    return events
+
+
+def test_progress_json_reads_bus(client):
+    progress_bus.start('json-task', total=4)
+    progress_bus.publish('json-task', processed=1, faqs_extracted=3)
+
+    data = client.get('/chatbot/upload_progress/json-task').get_json()
+    assert data['total_sections'] == 4
+    assert data['processed_sections'] == 1
+    assert data['faqs_extracted'] == 3
+    assert data['progress_percent'] == 25
+
+
+def test_progress_stream_pushes_until_finished(client, monkeypatch):
+    monkeypatch.setattr('routes.chat.chatbot_routes.PROGRESS_STREAM_INTERVAL', 0)
+    progress_bus.start('sse-task', total=2)
+
+    def worker():
+        time.sleep(0.05)
+        progress_bus.publish('sse-task', processed=1)
+        time.sleep(0.05)
+        progress_bus.finish('sse-task', processed=2, faqs_extracted=6)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    response = client.get('/chatbot/upload_progress/sse-task/stream')
+    body = response.get_data(as_text=True)
+    thread.join()
+
+    assert response.mimetype == 'text/event-stream'
+    events = _events(body)
+    assert events[-1][1]['status'] == STATUS_COMPLETED
+    assert events[-1][1]['faqs_extracted'] == 6
+    seqs = [int(event_id) for event_id, _ in events]
+    assert seqs == sorted(seqs)
+
+
+def test_progress_stream_resumes_from_last_event_id(client):
+    progress_bus.start('resume-task', total=2)
+    progress_bus.publish('resume-task', processed=1)
+    progress_bus.finish('resume-task')
+    last_seq = progress_bus.get('resume-task')['seq']
+
+    body = client.get('/chatbot/upload_progress/resume-task/stream',
+                      headers={'Last-Event-ID': str(last_seq - 1)}).get_data(as_text=True)
+    events = _events(body)
+    # 重连只补发最新快照
+    assert len(events) == 1
+    assert events[0][0] == str(last_seq)
+    assert events[0][1]['status'] == STATUS_COMPLETED
+
+
+class _SqliteConnection:
+    """用 SQLite 模拟 faq_preview_cache 所在的 MySQL 连接（%s 占位符转换为 ?）"""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path)
+
+    def cursor(self):
+        conn = self._conn
+
+        class Cursor:
+            def __init__(self):
+                self._cursor = conn.cursor()
+
+            def execute(self, sql, params=()):
+                self._cursor.execute(sql.replace('%s', '?'), params)
+
+            def fetchone(self):
+                return self._cursor.fetchone()
+
+        return Cursor()
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def test_failed_status_is_persisted_for_other_processes(client, tmp_path, monkeypatch):
+    path = str(tmp_path / 'kb.db')
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE faq_preview_cache (preview_id TEXT PRIMARY KEY, total_sections INT DEFAULT 0,
+                    processed_sections INT DEFAULT 0, faqs_extracted INT DEFAULT 0,
+                    status VARCHAR(20) DEFAULT 'processing', error_message TEXT)""")
+    conn.execute("INSERT INTO faq_preview_cache (preview_id, total_sections) VALUES ('db-task', 10)")
+    conn.commit()
+    conn.close()
+    # models.knowledge_base 导入时会连接 MySQL，这里直接替换为 SQLite 连接
+    manager = types.SimpleNamespace(get_connection=lambda: _SqliteConnection(path))
+    monkeypatch.setitem(sys.modules, 'models.knowledge_base', types.SimpleNamespace(knowledge_base_manager=manager))
+
+    document_processor.persist_progress('db-task', 4, 7, status=STATUS_FAILED, error='模型服务不可用')
+
+    # 任务不在本进程：接口读数据库，失败状态与原因可见，SSE 收到失败事件后结束
+    data = client.get('/chatbot/upload_progress/db-task').get_json()
+    assert (data['status'], data['processed_sections'], data['error']) == (STATUS_FAILED, 4, '模型服务不可用')
+    events = _events(client.get('/chatbot/upload_progress/db-task/stream').get_data(as_text=True))
+    assert [payload['status'] for _, payload in events] == [STATUS_FAILED]
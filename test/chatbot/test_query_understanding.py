@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+问题理解分层（缓存 / 规则 / 大模型）测试
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+
+from utils.query_understanding import (TIER_CACHE, TIER_LLM, TIER_RULE, QueryCache, QueryUnderstanding,
+                                       RuleClassifier, normalize_query)
+
+FAQS = [
+    {'id': 1, 'question': '如何重置密码？', 'category': '账号', 'tags': ['密码', '登录'], 'domain_id': 1},
+    {'id': 2, 'question': 'VPN 连接失败怎么办', 'category': None, 'tags': ['VPN'], 'domain_id': 2},
+    {'id': 3, 'question': '工单派发规则是什么', 'category': '工单', 'tags': [], 'domain_id': 3},
+]
+DOMAINS = [{'id': 1, 'name': '账号管理'}, {'id': 2, 'name': '网络'}, {'id': 3, 'name': '工单系统'}]
+
+
+class FakeKnowledgeBase:
+    def __init__(self, faqs=None):
+        self.faqs = list(faqs if faqs is not None else FAQS)
+        self.term_loads = 0
+
+    def list_faq_terms(self):
+        self.term_loads += 1
+        return list(self.faqs)
+
+    def list_categories(self):
+        return list(DOMAINS)
+
+
+class CountingLLM:
+    """模拟大模型解析，记录调用次数"""
+
+    def __init__(self, result=None):
+        self.calls = 0
+        self.result = result if result is not None else {
+            'topic': '其他', 'keywords': ['模型'], 'question_type': '是什么', 'sentiment': '中性'}
+
+    def __call__(self, query):
+        self.calls += 1
+        return self.result
+
+
+def test_normalize_folds_punctuation_width_and_synonyms():
+    assert normalize_query('  怎么 重设登陆口令？？ ') == '如何重置登录密码'
+    assert normalize_query('ＶＰＮ，连不上!') == 'vpn连不上'
+    assert normalize_query('在哪里') == normalize_query('在哪') == '在哪里'
+    assert normalize_query('如何重置密码？') == normalize_query('怎样重置密码')
+
+
+def test_query_cache_lru_and_ttl():
+    cache = QueryCache(max_size=2, ttl=60)
+    cache.put('a', {'topic': 'a'})
+    cache.put('b', {'topic': 'b'})
+    cache.get('a')
+    cache.put('c', {'topic': 'c'})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'topic': 'a'}
+
+    expired = QueryCache(ttl=-1)
+    expired.put('a', {'topic': 'a'})
+    assert expired.get('a') is None
+
+
+def test_rule_classifier_uses_domains_and_question_rules():
+    classifier = RuleClassifier.build(FAQS, DOMAINS)
+
+    parsed, confidence = classifier.classify(normalize_query('怎么重置密码'))
+    assert parsed['topic'] == '账号管理'
+    assert parsed['question_type'] == '怎么做'
+    assert confidence == 1.0
+
+    parsed, confidence = classifier.classify(normalize_query('VPN 又连接失败了，为什么？'))
+    assert parsed['topic'] == '网络'
+    assert parsed['question_type'] == '为什么'
+    assert parsed['sentiment'] == '消极'
+    assert 'vpn' in parsed['keywords']
+    assert confidence >= 0.6
+
+    parsed, confidence = classifier.classify(normalize_query('量子纠缠的最新研究进展'))
+    assert parsed['topic'] == 'unknown'
+    assert confidence < 0.6
+
+
+def test_repeat_questions_skip_the_model():
+    llm = CountingLLM()
+    understanding = QueryUnderstanding(FakeKnowledgeBase(), llm)
+
+    first = understanding.parse('如何重置密码？')
+    assert first['parser'] == TIER_RULE
+    assert understanding.parse('怎样 重置密码')['parser'] == TIER_CACHE
+
+    # 低置信度走大模型，重复提问命中缓存
+    assert understanding.parse('量子纠缠的最新研究进展')['parser'] == TIER_LLM
+    assert understanding.parse('量子纠缠的最新研究进展。')['parser'] == TIER_CACHE
+    assert llm.calls == 1
+
+    stats = understanding.stats()
+    assert stats['total'] == 4
+    assert stats['cache_hit_rate'] == 0.5
+    assert stats['tiers'][TIER_LLM]['count'] == 1
+    assert stats['dictionary_terms'] > 0
+
+
+def test_returned_results_are_copies():
+    understanding = QueryUnderstanding(FakeKnowledgeBase(), CountingLLM())
+    understanding.parse('如何重置密码')['keywords'].append('污染')
+    assert '污染' not in understanding.parse('如何重置密码')['keywords']
+
+
+def test_llm_failure_falls_back_to_rules_without_caching():
+    llm = CountingLLM(result={})
+    understanding = QueryUnderstanding(FakeKnowledgeBase(), llm)
+
+    parsed = understanding.parse('量子纠缠的最新研究进展')
+    assert parsed['parser'] == TIER_RULE
+    assert understanding.parse('量子纠缠的最新研究进展')['parser'] == TIER_RULE
+    assert llm.calls == 2
+    assert understanding.stats()['llm_failures'] == 2
+
+
+def test_invalidate_rebuilds_dictionary():
+    kb = FakeKnowledgeBase(faqs=[])
+    llm = CountingLLM()
+    understanding = QueryUnderstanding(kb, llm)
+
+    assert understanding.parse('工单派发规则是什么')['parser'] == TIER_LLM
+    kb.faqs = list(FAQS)
+    understanding.invalidate()
+    parsed = understanding.parse('工单派发规则是什么')
+    assert parsed['parser'] == TIER_RULE
+    assert parsed['topic'] == '工单系统'
+    assert kb.term_loads == 2
+
+
+def test_chatbot_core_parse_query_uses_fast_path():
+    from utils.chatbot_core import ChatbotCore
+
+    class FakeClient:
+        def __init__(self):
+            self.prompts = []
+
+        def generate(self, prompt):
+            self.prompts.append(prompt)
+            return '分析结果：' + json.dumps({'topic': '其他', 'keywords': [], 'question_type': 'general'})
+
+    client = FakeClient()
+    chatbot = ChatbotCore(client, FakeKnowledgeBase())
+
+    assert chatbot._parse_query('如何重置密码？')['topic'] == '账号管理'
+    assert client.prompts == []
+    assert chatbot._parse_query('量子纠缠的最新研究进展')['topic'] == '其他'
+    assert len(client.prompts) == 1
+
+
+@pytest.mark.slow
+def test_benchmark_repeat_traffic():
+    """模拟 80% 重复提问：对比每次调用大模型与分层处理的耗时"""
+    model_latency = 0.02
+    model_calls = []
+
+    def slow_llm(query):
+        model_calls.append(query)
+        time.sleep(model_latency)
+        return {'topic': '其他', 'keywords': [], 'question_type': 'general', 'sentiment': '中性'}
+
+    faqs = [{'id': i, 'question': f'系统{i}模块如何配置告警规则', 'category': f'模块{i}', 'tags': [f'系统{i}'],
+             'domain_id': i % 5} for i in range(500)]
+    understanding = QueryUnderstanding(FakeKnowledgeBase(faqs), slow_llm)
+    queries = [f'系统{i % 50}模块 怎么 配置告警规则？' if i % 5 else f'完全陌生的问题 {i}' for i in range(500)]
+
+    start = time.perf_counter()
+    for query in queries:
+        understanding.parse(query)
+    tiered_seconds = time.perf_counter() - start
+    baseline_seconds = len(queries) * model_latency
+
+    stats = understanding.stats()
+    print(f"\n[QU BENCH] queries={len(queries)} llm-only≈{baseline_seconds:.2f}s tiered={tiered_seconds:.2f}s "
+          f"cache_hit={stats['cache_hit_rate']:.0%} model_calls={stats['model_call_rate']:.0%} "
+          f"rule_p95={stats['tiers'][TIER_RULE]['p95_ms']}ms")
+    assert stats['model_call_rate'] <= 0.2
+    # 只有 100 个各不相同的陌生问题走到大模型，重复提问命中缓存或规则
+    assert len(model_calls) == len(set(model_calls)) <= len(queries) // 5
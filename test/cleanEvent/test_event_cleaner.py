@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件数据批量清洗测试：时间格式统一、主单/子单识别、按批汇总日志、NDJSON 输出
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+from flask import Flask
+
+from utils import event_cleaner
+from utils.event_cleaner import clean_events, normalize_event_time, normalize_event_times
+
+
+def _items(count):
+    reasons = ['工单派发成功', '同源合并成功', '']
+    return [{
+        'EVENT_FP': f'fp-{i}',
+        'EVENT_TIME': f'2026/{i % 12 + 1}/{i % 28 + 1} {i % 24}:{i % 60}',
+        'DISPATCH_INFO': {'DISPATCH_REASON': reasons[i % 3], 'RULE_NAME': '规则' * 20},
+        'EVENT_NAME': '事件' * 10,
+    } for i in range(count)]
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('2026/3/2 8:05', '2026-03-02 08:05:00'),
+    ('2026-03-02 08:05:09', '2026-03-02 08:05:09'),
+    ('2026-3-2', '2026-03-02 00:00:00'),
+    ('2026-03-02T08:05:09.123+08:00', '2026-03-02 08:05:09'),
+])
+def test_normalize_event_time(raw, expected):
+    assert normalize_event_time(raw) == expected
+
+
+def test_normalize_event_time_rejects_bad_date():
+    with pytest.raises(ValueError, match='日期格式不正确'):
+        normalize_event_time('03-02 08:00')
+
+
+def test_vectorized_matches_scalar_and_keeps_unparsable():
+    values = ['2026/3/2 8:05', '2026-03-02 08:05:09', '2026-3-2', '2026-03-02T08:05:09Z',
+              '2026-02-30 10:00', '', None, 'unknown']
+    expected = ['2026-03-02 08:05:00', '2026-03-02 08:05:09', '2026-03-02 00:00:00', '2026-03-02 08:05:09',
+                '2026-02-30 10:00:00', '', None, 'unknown']
+    assert normalize_event_times(values) == expected
+    assert normalize_event_times([]) == []
+
+
+def test_clean_events_classifies_and_counts():
+    items = _items(7) + [{'EVENT_TIME': '2026-03-02 08:00'}, {'EVENT_FP': 'fp-x', 'DISPATCH_INFO': None}]
+    messages, summary = clean_events(items, batch_size=3)
+
+    assert summary == {'total': 8, 'main': 3, 'sub': 5, 'skipped': 1}
+    assert messages[0] == {
+        'ACTIVE_STATUS': '3',
+        'CFP0_CFP1_CFP2_CFP3': 'fp-0',
+        'EVENT_TIME': '2026-01-01 00:00:00',
+        'FP0_FP1_FP2_FP3': 'fp-0',
+        'ORDER_TYPE': '主单',
+        'IS_MAIN_ORDER': True,
+        'DISPATCH_REASON': '工单派发成功',
+    }
+    assert messages[-1]['ORDER_TYPE'] == '子单' and messages[-1]['EVENT_TIME'] == ''
+
+    custom, _ = clean_events(_items(2), custom_event_time='2026/5/1 9:00')
+    assert {message['EVENT_TIME'] for message in custom} == {'2026-05-01 09:00:00'}
+
+
+def test_one_summary_log_per_batch(caplog, monkeypatch):
+    with caplog.at_level(logging.INFO, logger='utils.event_cleaner'):
+        clean_events(_items(1000), batch_size=400)
+    assert len([record for record in caplog.records if record.levelno == logging.INFO]) == 3
+    assert all('fp-' not in record.getMessage() for record in caplog.records)
+
+    caplog.clear()
+    monkeypatch.setattr(event_cleaner, 'EVENT_CLEAN_TRACE_RATE', 0.01)
+    with caplog.at_level(logging.DEBUG, logger='utils.event_cleaner'):
+        clean_events(_items(1000), batch_size=400)
+    assert len([record for record in caplog.records if record.levelno == logging.DEBUG]) == 10
+
+
+@pytest.fixture
+def client():
+    from routes.document_convert.clean_event_routes import clean_event_bp
+    from routes.fpa.event_routes import event_bp
+
+    app = Flask(__name__)
+    app.register_blueprint(clean_event_bp)
+    app.register_blueprint(event_bp)
+    return app.test_client()
+
+
+def test_process_endpoint_json_and_ndjson(client):
+    response = client.post('/api/clean-event/process', json={'data': _items(5)})
+    body = response.get_json()
+    assert body['success'] and (body['main_count'], body['sub_count']) == (2, 3)
+    assert body['data'][1]['EVENT_TIME'] == '2026-02-02 01:01:00'
+
+    single = client.post('/api/clean-event/process', json={'data': {'EVENT_TIME': '2026-03-02'}})
+    assert single.status_code == 400
+
+    streamed = client.post('/api/clean-event/process?output=ndjson', json={'data': _items(5)})
+    assert streamed.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in streamed.get_data(as_text=True).splitlines()]
+    assert lines == body['data']
+
+    download = client.post('/api/clean-event/process', json={'data': _items(5), 'output': 'download'})
+    assert download.headers['Content-Disposition'].startswith('attachment; filename="clean_event_')
+
+
+def test_parse_es_endpoint(client):
+    hits = [{'_id': str(i), '_source': dict(item, EVENT_LEVEL=4, EVENT_ID=i)} for i, item in enumerate(_items(4))]
+    raw = json.dumps({'hits': {'hits': hits}}, ensure_ascii=False)
+    body = client.post('/api/clean-event/parse-es', json={'json_data': raw}).get_json()
+    assert (body['total'], body['main_count'], body['sub_count']) == (4, 2, 2)
+    assert body['data'][1]['order_type'] == '子单'
+    assert body['data'][1]['dispatch_reason'] == '同源合并成功'
+    assert body['data'][1]['event_id'] == 1
+    assert body['data'][0]['full_source']['EVENT_LEVEL'] == 4
+
+    streamed = client.post('/api/clean-event/parse-es?output=ndjson', json={'json_data': raw})
+    assert [json.loads(line) for line in streamed.get_data(as_text=True).splitlines()] == body['data']
+
+
+def test_clean_event_single_endpoint(client):
+    response = client.post('/api/clean-event', json={'fp_value': 'abc', 'event_time': '2026/3/2 8:05'})
+    assert response.get_json()['result']['EVENT_TIME'] == '2026-03-02 08:05:00'
+
+
+@pytest.mark.slow
+def test_benchmark_clean_100k(tmp_path):
+    """10 万条按批清洗 与 逐条 INFO 日志 + 逐条处理（取 1 万条估算）的吞吐对比（日志写入文件）"""
+    items = _items(100_000)
+    legacy_items = items[:10_000]
+    log_file = tmp_path / 'clean.log'
+    handler = logging.FileHandler(log_file, encoding='utf-8')
+    legacy_logger = logging.getLogger('bench.legacy_clean_event')
+    legacy_logger.setLevel(logging.INFO)
+    legacy_logger.addHandler(handler)
+    engine_logger = logging.getLogger('utils.event_cleaner')
+    engine_logger.addHandler(handler)
+    previous_level = engine_logger.level
+    engine_logger.setLevel(logging.INFO)
+
+    try:
+        start = time.perf_counter()
+        legacy = []
+        for idx, item in enumerate(legacy_items):
+            legacy_logger.info(f'\n--- 处理第 {idx + 1} 条数据 ---')
+            legacy_logger.info(f'🔑 完整数据键: {list(item.keys())}')
+            legacy_logger.info(f'🆔 EVENT_FP: {item["EVENT_FP"]}')
+            legacy_logger.info(f'⏱️  使用数据中的 EVENT_TIME: {item["EVENT_TIME"]}')
+            dispatch_info = item.get('DISPATCH_INFO', {})
+            legacy_logger.info(f'📦 DISPATCH_INFO: {dispatch_info}')
+            reason = dispatch_info.get('DISPATCH_REASON', '')
+            legacy_logger.info(f'📝 DISPATCH_REASON: "{reason}"')
+            is_main = reason == '工单派发成功'
+            message = {'ACTIVE_STATUS': '3', 'CFP0_CFP1_CFP2_CFP3': item['EVENT_FP'], 'EVENT_TIME': item['EVENT_TIME'],
+                       'FP0_FP1_FP2_FP3': item['EVENT_FP'], 'ORDER_TYPE': '主单' if is_main else '子单',
+                       'IS_MAIN_ORDER': is_main, 'DISPATCH_REASON': reason}
+            legacy_logger.info(f'💾 生成的推送消息: {message}')
+            legacy.append(message)
+        legacy_seconds = time.perf_counter() - start
+        legacy_log_bytes = log_file.stat().st_size
+
+        start = time.perf_counter()
+        messages, summary = clean_events(items)
+        engine_seconds = time.perf_counter() - start
+        engine_log_bytes = log_file.stat().st_size - legacy_log_bytes
+    finally:
+        legacy_logger.removeHandler(handler)
+        engine_logger.removeHandler(handler)
+        engine_logger.setLevel(previous_level)
+        handler.close()
+
+    legacy_rate = len(legacy_items) / legacy_seconds
+    engine_rate = len(items) / engine_seconds
+    print(f"\n[EVENT CLEAN BENCH] legacy={legacy_rate:,.0f} items/s (log {legacy_log_bytes / len(legacy_items):.0f}B/item) "
+          f"batch={engine_rate:,.0f} items/s (100000 items in {engine_seconds:.2f}s, log {engine_log_bytes / 1e3:.1f}KB)")
+    assert summary['total'] == len(items)
+    assert len(legacy) == len(legacy_items)
+    # 日志量不随条数增长：10 万条只输出批次汇总，而逐条日志每条数百字节
+    assert engine_log_bytes < 16 * 1024 < legacy_log_bytes
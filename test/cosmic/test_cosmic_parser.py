@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+COSMIC 拆分表解析器测试
+覆盖向下填充、统计口径、按内容哈希缓存，以及 20k 行拆分表的性能基准
+"""
+import os
+import sys
+import time
+
+import pytest
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.cosmic_parser import (
+    CosmicParseCache,
+    parse_cosmic_workbook,
+    split_subprocess_description,
+)
+
+HEADER_ROWS = [
+    ['通用软件评估模型'],
+    ['度量策略阶段', None, None, None, '映射阶段', None, None, '度量阶段'],
+    ['客户需求', '功能用户', '触发事件', '功能过程', '子过程描述'],
+    [None, '一级模块', '二级模块', '三级模块'],
+]
+
+
+def _write_split_table(path, data_rows, sheet_title='功能点拆分表'):
+    """按真实拆分表结构（4 行表头 + 数据行）生成测试 Excel"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet_title
+    for row in HEADER_ROWS + data_rows:
+        ws.append(row)
+    wb.save(path)
+    return path
+
+
+def _row(l1=None, l2=None, l3=None, func=None, subproc=None):
+    return ['需求', l1, l2, l3, '用户', '触发', func, subproc]
+
+
+SAMPLE_ROWS = [
+    _row('流程管理', '数据接入流程', '数据接入', '创建工单', '输入-用户填写工单；查询-查询模板'),
+    _row(None, None, None, None, '输出-返回结果'),
+    _row(None, None, None, '删除工单', '输入-选择工单'),
+    _row(None, None, '数据审核', '审核工单', '校验-校验权限；呈现-展示结果'),
+    _row(None, None, None, None, None),
+    _row('国产化改造', '适配国产化CPU', '编译适配', '编译', '输入-源码'),
+]
+
+
+class TestSplitSubprocess:
+    """子过程描述拆分"""
+
+    def test_split_by_prefix(self):
+        assert split_subprocess_description('输入-A；查询-B;输出-C') == ['输入-A', '查询-B', '输出-C']
+
+    def test_plain_text_kept(self):
+        assert split_subprocess_description('无前缀描述') == ['无前缀描述']
+
+    def test_empty(self):
+        assert split_subprocess_description(None) == []
+        assert split_subprocess_description('   ') == []
+
+
+class TestCosmicWorkbook:
+    """解析结果的统计与层级结构"""
+
+    @pytest.fixture
+    def workbook(self, tmp_path):
+        path = _write_split_table(tmp_path / 'sample.xlsx', SAMPLE_ROWS)
+        return parse_cosmic_workbook(path)
+
+    def test_stats(self, workbook):
+        assert workbook.sheet_name == '功能点拆分表'
+        assert workbook.stats == {
+            'l1_count': 2,
+            'l2_count': 2,
+            'l3_count': 3,
+            'function_count': 4,
+            'subprocess_count': 7,
+        }
+        assert workbook.total_rows == 6
+        # 空行经功能过程向下填充后仍属于"审核工单"
+        assert workbook.valid_rows == 6
+
+    def test_hierarchy_forward_fill(self, workbook):
+        functions = workbook.hierarchy['流程管理']['数据接入流程']['数据接入']
+        assert list(functions) == ['创建工单', '删除工单']
+        assert functions['创建工单'] == ['输入-用户填写工单', '查询-查询模板', '输出-返回结果']
+        assert workbook.hierarchy['流程管理']['数据接入流程']['数据审核']['审核工单'] == ['校验-校验权限', '呈现-展示结果']
+        assert list(workbook.hierarchy) == ['流程管理', '国产化改造']
+
+    def test_module_details(self, workbook):
+        details = workbook.module_details
+        assert [d['三级模块'] for d in details] == ['数据接入', '数据审核', '编译适配']
+        assert [d['subprocess_count'] for d in details] == [4, 2, 1]
+        assert details[2]['一级模块'] == '国产化改造'
+        assert details[2]['二级模块'] == '适配国产化CPU'
+
+    def test_uncategorized_default(self, tmp_path):
+        path = _write_split_table(tmp_path / 'nomodule.xlsx', [_row(func='孤立功能', subproc='输入-X')])
+        workbook = parse_cosmic_workbook(path)
+        assert workbook.hierarchy == {'未分类': {'未分类': {'未分类': {'孤立功能': ['输入-X']}}}}
+
+    def test_unreadable_file(self, tmp_path):
+        bad = tmp_path / 'bad.xlsx'
+        bad.write_bytes(b'not an excel file')
+        assert parse_cosmic_workbook(bad) is None
+
+
+class TestCosmicParseCache:
+    """按内容哈希缓存"""
+
+    def test_same_content_parsed_once(self, tmp_path):
+        first = _write_split_table(tmp_path / 'a_1.xlsx', SAMPLE_ROWS)
+        cache = CosmicParseCache(max_entries=2)
+
+        workbook = cache.get(first)
+        assert cache.get(first) is workbook
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_lru_eviction(self, tmp_path):
+        cache = CosmicParseCache(max_entries=1)
+        a = _write_split_table(tmp_path / 'a.xlsx', SAMPLE_ROWS)
+        b = _write_split_table(tmp_path / 'b.xlsx', SAMPLE_ROWS[:1])
+
+        cache.get(a)
+        cache.get(b)
+        cache.get(a)
+        assert cache.misses == 3
+
+
+@pytest.mark.slow
+def test_benchmark_20k_rows(tmp_path):
+    """20k 行拆分表：单次解析耗时与缓存命中耗时"""
+    rows = []
+    for i in range(20000):
+        if i % 200 == 0:
+            rows.append(_row(f'一级{i // 2000}', f'二级{i // 1000}', f'三级{i // 200}', f'功能{i // 4}',
+                             '输入-参数；查询-数据；输出-结果'))
+        elif i % 4 == 0:
+            rows.append(_row(func=f'功能{i // 4}', subproc='输入-参数；输出-结果'))
+        else:
+            rows.append(_row(subproc='查询-明细'))
+    path = _write_split_table(tmp_path / 'bench.xlsx', rows)
+    cache = CosmicParseCache()
+
+    start = time.perf_counter()
+    workbook = cache.get(path)
+    parse_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cache.get(path)
+    cached_seconds = time.perf_counter() - start
+
+    print(f"\n[COSMIC BENCH] rows=20000 parse={parse_seconds:.3f}s cached={cached_seconds * 1000:.2f}ms")
+    assert workbook.stats['function_count'] == 5000
+    assert workbook.stats['l3_count'] == 100
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置快照测试：懒加载与版本号、订阅过滤、写入失败不生效、数据源指纹、部署配置文件、数据库批量更新的原子性、
+大模型准入参数热更新、读取开销基准
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+from flask import Flask
+
+import models.deploy_config as deploy_config_module
+import routes.deploy.deploy_config_routes as deploy_routes
+from models import db
+from models.deploy_config import DeployConfig, DeployConfigSource
+from utils.config_store import ConfigStore, JsonFileSource
+from utils.llm_admission import LLMAdmission
+from utils.llm_admission_config import LLMAdmissionConfigThread
+
+
+class FakeSource:
+    def __init__(self, values):
+        self.values = dict(values)
+        self.loads = 0
+        self.fail = False
+
+    def load(self):
+        self.loads += 1
+        return dict(self.values)
+
+    def save(self, changes, current, **kwargs):
+        if self.fail:
+            raise RuntimeError('写入失败')
+        self.values.update(changes)
+        return changes
+
+    def fingerprint(self):
+        return tuple(sorted(self.values.items()))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lazy_load_versions_and_subscribers():
+    source = FakeSource({'host': 'a', 'port': 1})
+    store = ConfigStore('test', source, check_seconds=0)
+    assert (source.loads, store.version) == (0, 0)
+
+    events = []
+    store.subscribe(lambda values, changed, version: events.append(('all', sorted(changed), version)))
+    unsubscribe = store.subscribe(lambda values, changed, version: events.append(('port', values['port'], version)),
+                                  keys=['port'])
+    assert [store.get('host') for _ in range(100)] == ['a'] * 100
+    assert (source.loads, store.version) == (1, 1)
+    assert events == [('all', ['host', 'port'], 1), ('port', 1, 1)]
+
+    # 只有关心的键变化时才通知
+    events.clear()
+    assert store.update({'host': 'b'}) == 2
+    assert events == [('all', ['host'], 2)]
+    snapshot = store.snapshot()
+    store.update({'port': 2})
+    assert events[-1] == ('port', 2, 3)
+    assert snapshot == {'host': 'b', 'port': 1}  # 旧快照不受后续修改影响
+
+    # 写入失败：快照、版本号不变，不通知
+    events.clear()
+    source.fail = True
+    with pytest.raises(RuntimeError):
+        store.update({'host': 'c', 'port': 3})
+    assert (store.get('host'), store.get('port'), store.version, events) == ('b', 2, 3, [])
+
+    unsubscribe()
+    source.fail = False
+    store.update({'port': 4})
+    assert [event[0] for event in events] == ['all']
+    assert store.stats()['failed_updates'] == 1 and source.loads == 1
+
+
+def test_reload_when_source_changes_elsewhere():
+    source = FakeSource({'host': 'a'})
+    clock = FakeClock()
+    store = ConfigStore('test', source, check_seconds=10, clock=clock)
+    versions = []
+    store.subscribe(lambda values, changed, version: versions.append(version))
+    assert store.get('host') == 'a'
+
+    source.values['host'] = 'b'  # 其他进程修改
+    assert store.get('host') == 'a'  # 检查周期内不访问数据源
+    clock.now = 11
+    assert store.get('host') == 'b'
+    assert (store.version, versions, source.loads) == (2, [1, 2], 2)
+
+    # 指纹未变：不重新加载
+    clock.now = 30
+    assert not store.refresh()
+    assert source.loads == 2
+
+
+def test_deploy_config_file_and_routes(tmp_path, monkeypatch):
+    path = tmp_path / 'deploy_config.json'
+    store = ConfigStore('deploy_settings', JsonFileSource(path, deploy_routes.DEFAULT_CONFIG), check_seconds=0)
+    monkeypatch.setattr(deploy_routes, 'deploy_settings_store', store)
+    for name in ('config', 'REMOTE_USER', 'REMOTE_HOST', 'REMOTE_PATH', 'BACKUP_DIR', 'LOCAL_PORT', 'NGINX_PORT'):
+        monkeypatch.setattr(deploy_routes, name, getattr(deploy_routes, name))
+    monkeypatch.setattr(deploy_routes, 'add_log', lambda *args, **kwargs: None)
+    store.subscribe(deploy_routes._apply_deploy_config)
+    assert deploy_routes.get_deploy_config()['remote_host'] == deploy_routes.DEFAULT_CONFIG['remote_host']
+
+    app = Flask(__name__)
+    app.register_blueprint(deploy_routes.deploy_config_bp)
+    http = app.test_client()
+    body = dict(deploy_routes.DEFAULT_CONFIG, remote_host='10.0.0.8', local_port='6004')
+    result = http.post('/deploy-config/config', json=body).get_json()
+    assert result['success'] and result['version'] == 2
+    assert (deploy_routes.REMOTE_HOST, deploy_routes.LOCAL_PORT) == ('10.0.0.8', 6004)
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f)['remote_host'] == '10.0.0.8'
+
+    # 端口不合法：不写文件、版本号不变
+    assert http.post('/deploy-config/config', json=dict(body, nginx_port='0')).status_code == 400
+    assert http.get('/deploy-config/config').get_json()['version'] == 2
+
+    # 手工修改文件：部署开始前 refresh 发现变化
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(body, remote_path='/srv/app', local_port=6004), f)
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    assert store.refresh()
+    assert deploy_routes.REMOTE_PATH == '/srv/app' and store.version == 3
+
+
+@pytest.fixture
+def db_app(monkeypatch):
+    from routes.deploy.config_routes import config_bp
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    app.register_blueprint(config_bp)
+    store = ConfigStore('deploy_config', DeployConfigSource(), check_seconds=0)
+    monkeypatch.setattr(deploy_config_module, 'deploy_config_store', store)
+    import routes.deploy.config_routes as config_routes
+    monkeypatch.setattr(config_routes, 'deploy_config_store', store)
+    with app.app_context():
+        DeployConfig.__table__.create(db.engine)
+        db.session.add_all([
+            DeployConfig(config_key='remote_host', config_value='8.146.228.47', category='server'),
+            DeployConfig(config_key='ssh_port', config_value='22', config_type='number', category='server'),
+            DeployConfig(config_key='db_password', config_value='secret', category='database', is_sensitive=True),
+        ])
+        db.session.commit()
+        yield app, store
+        db.session.remove()
+        DeployConfig.__table__.drop(db.engine)
+
+
+def test_db_config_reads_from_snapshot_and_batch_update_is_atomic(db_app):
+    app, store = db_app
+    assert DeployConfig.get_config('ssh_port') == 22
+    assert DeployConfig.get_config('missing', 'x') == 'x'
+    configs = DeployConfig.get_all_configs()
+    assert [c['config_key'] for c in configs] == ['db_password', 'remote_host', 'ssh_port']
+    assert configs[0]['config_value'] == '***' and 'typed_value' not in configs[0]
+    assert DeployConfig.get_categories() == ['database', 'server']
+    assert store.stats()['loads'] == 1
+
+    http = app.test_client()
+    assert http.get('/api/deploy/config/get/db_password').get_json()['config']['config_value'] == 'secret'
+    assert http.get('/api/deploy/config/get/missing').status_code == 404
+
+    # 有一项不合法：整批不生效
+    bad = {'configs': [{'config_key': 'remote_host', 'config_value': '10.0.0.1'}, {'config_key': 'ssh_port'}]}
+    assert http.post('/api/deploy/config/batch-update', json=bad).status_code == 400
+    assert DeployConfig.query.filter_by(config_key='remote_host').first().config_value == '8.146.228.47'
+
+    # 写入中途失败：前面已修改的行随事务回滚，快照不变
+    class Unwritable:
+        def __str__(self):
+            raise ValueError('无法写入')
+
+    version = store.version
+    with pytest.raises(ValueError):
+        store.update({'remote_host': '10.0.0.1', 'ssh_port': '2222', 'broken': Unwritable()})
+    assert store.version == version and DeployConfig.get_config('ssh_port') == 22
+    assert DeployConfig.query.filter_by(config_key='ssh_port').first().config_value == '22'
+
+    good = {'configs': [{'config_key': 'remote_host', 'config_value': '10.0.0.1'},
+                        {'config_key': 'ssh_port', 'config_value': '2222'},
+                        {'config_key': 'git_branch', 'config_value': 'main'}]}
+    result = http.post('/api/deploy/config/batch-update', json=good).get_json()
+    assert result['updated_count'] == 3 and result['version'] == version + 1
+    assert (DeployConfig.get_config('ssh_port'), DeployConfig.get_config('git_branch')) == (2222, 'main')
+    assert DeployConfig.query.count() == 4
+    assert http.get('/api/deploy/config/list').get_json()['version'] == version + 1
+
+
+def test_llm_admission_follows_db_config(db_app):
+    app, store = db_app
+    admission = LLMAdmission(max_concurrency=1, batch_max_concurrency=1)
+    db.session.add(DeployConfig(config_key='llm_max_queue', config_value='16', config_type='number', category='llm'))
+    db.session.commit()
+    sync = LLMAdmissionConfigThread(app, store=store, admission=admission, interval=0)
+    # 启动时加载：没有请求读取配置也会生效
+    assert sync.check() and store.stats()['loads'] == 1
+    assert admission.max_queue == 16
+
+    first = admission.acquire()
+    waiting = admission.enqueue()
+    assert waiting.state == 'waiting'
+    DeployConfig.set_configs({'llm_max_concurrency': 3, 'llm_batch_max_concurrency': 2})
+    # 调大并发上限后排队的请求立即放行
+    assert waiting.state == 'granted'
+    assert (admission.max_concurrency, admission.batch_max_concurrency) == (3, 2)
+
+    DeployConfig.set_config('remote_host', '10.0.0.2')  # 无关配置不触发
+    DeployConfig.set_config('llm_max_queue', 8)
+    assert admission.max_queue == 8
+    admission.release(first)
+    admission.release(waiting)
+
+    # 其他进程直接改表：定时检查发现指纹变化后生效
+    row = DeployConfig.query.filter_by(config_key='llm_max_concurrency').first()
+    row.config_value, row.updated_at = '5', datetime(2100, 1, 1)
+    db.session.commit()
+    assert admission.max_concurrency == 3
+    assert sync.check() and admission.max_concurrency == 5
+    assert not sync.check()
+    sync.stop()
+    DeployConfig.set_config('llm_max_concurrency', 1)
+    assert admission.max_concurrency == 5
+
+
+@pytest.mark.slow
+def test_benchmark_config_reads(db_app):
+    """部署流程一次读取 10 个配置：逐个查询数据库 vs 快照字典查找"""
+    app, store = db_app
+    keys = ['remote_host', 'ssh_port', 'db_password', 'missing'] * 2 + ['remote_host', 'ssh_port']
+    rounds = 300
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for key in keys:
+            config = DeployConfig.query.filter_by(config_key=key).first()
+            config.get_typed_value() if config else None
+    legacy = time.perf_counter() - started
+
+    store.get('remote_host')
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for key in keys:
+            DeployConfig.get_config(key)
+    cached = time.perf_counter() - started
+
+    reads = rounds * len(keys)
+    print(f"\n[CONFIG STORE BENCH] reads={reads} query={legacy / reads * 1e6:.0f}us/read "
+          f"snapshot={cached / reads * 1e6:.2f}us/read")
+    # 3000 次读取不访问数据库：只有首次加载
+    assert store.stats()['loads'] == 1 and store.stats()['reloads'] == 0
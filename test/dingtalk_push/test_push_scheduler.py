@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+钉钉推送调度器测试：重复触发去重、执行中合并、队列上限、错过宽限、配置快照、移除后清理、长时间运行内存基准
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+
+from utils import dingtalk_push_scheduler
+from utils.dingtalk_push_scheduler import DingTalkPushScheduler
+
+SCHEDULE = {'type': 'daily', 'config': {'times': ['08:00', '17:30']}}
+
+
+class InlineExecutor:
+    """提交即执行（结果确定，便于断言）"""
+
+    def submit(self, func, *args):
+        func(*args)
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class QueuedExecutor:
+    """提交后排队，手动 drain 执行"""
+
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, func, *args):
+        self.pending.append((func, args))
+
+    def drain(self):
+        pending, self.pending = self.pending, []
+        for func, args in pending:
+            func(*args)
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class Clock:
+    def __init__(self, now=1_790_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _config(config_id, schedule=SCHEDULE):
+    return {'id': config_id, 'name': f'配置{config_id}', 'schedule_config': json.dumps(schedule)}
+
+
+def _scheduler(configs=(1,), **kwargs):
+    pushed = []
+    kwargs.setdefault('executor', InlineExecutor())
+    kwargs.setdefault('clock', Clock())
+    scheduler = DingTalkPushScheduler(push_func=lambda config: pushed.append(config['id']), **kwargs)
+    fetches = []
+
+    def fetch(config_id):
+        fetches.append(config_id)
+        return _config(config_id) if config_id in configs else None
+
+    scheduler._fetch_config = fetch
+    return scheduler, pushed, fetches
+
+
+def test_duplicate_fire_within_window_skipped():
+    clock = Clock()
+    scheduler, pushed, fetches = _scheduler(clock=clock)
+    scheduler._execute_push_task(1)
+    clock.now += 5
+    scheduler._execute_push_task(1)
+    clock.now += 60
+    scheduler._execute_push_task(1)
+
+    assert pushed == [1, 1]
+    stats = scheduler.stats()
+    assert (stats['fired'], stats['duplicate'], stats['completed']) == (3, 1, 2)
+    # 配置只读取一次，之后使用快照
+    assert fetches == [1]
+
+
+def test_adjacent_minute_fires_with_jitter_both_pushed():
+    """09:00 与 09:01 两个时间点：触发抖动使两次间隔不足 60 秒时第二次也要推送"""
+    clock = Clock(now=1000.010)
+    scheduler, pushed, _ = _scheduler(clock=clock)
+    scheduler._execute_push_task(1, '1_0900')
+    clock.now = 1060.002
+    scheduler._execute_push_task(1, '1_0901')
+    # 同一任务同一分钟内的重复触发仍然跳过
+    clock.now = 1060.5
+    scheduler._execute_push_task(1, '1_0901')
+
+    assert pushed == [1, 1]
+    stats = scheduler.stats()
+    assert (stats['submitted'], stats['duplicate'], stats['last_fired']) == (2, 1, 1)
+
+
+def test_job_args_carry_job_id():
+    scheduler, _, _ = _scheduler()
+    scheduler.register_job(1, {'type': 'cron', 'config': {'times': ['09:00', '09:01']}})
+    assert sorted(tuple(job.args) for job in scheduler.scheduler.get_jobs()) == [(1, '1_0900'), (1, '1_0901')]
+
+
+def test_duplicate_fires_logged_as_one_summary_per_interval(caplog):
+    clock = Clock()
+    scheduler, _, _ = _scheduler(configs=range(5), clock=clock)
+    with caplog.at_level('INFO', logger='utils.dingtalk_push_scheduler'):
+        for _ in range(3):
+            for config_id in range(5):
+                scheduler._execute_push_task(config_id)
+                scheduler._execute_push_task(config_id)
+            clock.now += 60
+        clock.now += dingtalk_push_scheduler.PUSH_DUPLICATE_LOG_SECONDS
+        scheduler._execute_push_task(0)
+        scheduler._execute_push_task(0)
+
+    summaries = [r.getMessage() for r in caplog.records if '跳过重复执行' in r.getMessage()]
+    assert scheduler.stats()['duplicate'] == 16
+    assert len(summaries) == 2 and '跳过重复执行 15 次' in summaries[1]
+
+
+def test_fire_while_previous_push_running_is_coalesced():
+    started, release = threading.Event(), threading.Event()
+    pushed = []
+
+    def slow_push(config):
+        pushed.append(config['id'])
+        started.set()
+        release.wait(5)
+
+    clock = Clock()
+    scheduler = DingTalkPushScheduler(push_func=slow_push, clock=clock, workers=2, queue_size=0)
+    scheduler._fetch_config = _config
+    try:
+        scheduler._execute_push_task(1)
+        assert started.wait(5)
+        clock.now += 120
+        scheduler._execute_push_task(1)  # 上一次还在执行：合并
+        assert scheduler.stats()['coalesced'] == 1
+        release.set()
+    finally:
+        release.set()
+        scheduler.shutdown()
+        scheduler._executor.shutdown(wait=True)
+    assert pushed == [1]
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_queue_limit_rejects_and_misfire_skips():
+    executor, clock = QueuedExecutor(), Clock()
+    scheduler, pushed, _ = _scheduler(configs=range(10), executor=executor, clock=clock, workers=1, queue_size=2)
+    for config_id in range(5):
+        scheduler._execute_push_task(config_id)
+    stats = scheduler.stats()
+    assert (stats['submitted'], stats['rejected'], stats['in_flight']) == (3, 2, 3)
+
+    # 排队超过宽限时间才轮到执行：不再推送，但释放名额
+    clock.now += dingtalk_push_scheduler.PUSH_MISFIRE_GRACE_SECONDS + 1
+    executor.drain()
+    assert pushed == []
+    stats = scheduler.stats()
+    assert (stats['misfired'], stats['in_flight']) == (3, 0)
+
+    scheduler._execute_push_task(7)
+    executor.drain()
+    assert pushed == [7]
+
+
+def test_snapshot_refresh_reload_and_remove():
+    scheduler, pushed, fetches = _scheduler(configs=(1, 2))
+    scheduler.register_job(1, SCHEDULE)
+    scheduler._snapshots[1] = _config(1)
+    scheduler._execute_push_task(1)
+    assert fetches == [] and pushed == [1]
+
+    # 配置内容变化后刷新快照；配置被禁用 / 删除时快照清除且不再推送
+    scheduler.refresh_snapshot(1)
+    assert fetches == [1] and 1 in scheduler._snapshots
+    scheduler._fetch_config = lambda config_id: None
+    scheduler.reload_config(1)
+    assert scheduler.stats()['snapshots'] == 0
+    assert scheduler.scheduler.get_jobs() == []
+    assert scheduler._last_fired == {}
+
+    scheduler.register_job(2, SCHEDULE)
+    scheduler._snapshots[2] = _config(2)
+    scheduler._execute_push_task(2)
+    scheduler.remove_job(2)
+    assert (scheduler._snapshots, scheduler._last_fired) == ({}, {})
+
+
+def test_holiday_skip_uses_snapshot(monkeypatch):
+    class Closed:
+        def is_workday(self, day):
+            return False
+
+    monkeypatch.setattr(dingtalk_push_scheduler, 'holiday_calendar', Closed())
+    scheduler, pushed, _ = _scheduler()
+    scheduler._snapshots[1] = _config(1, {'type': 'daily', 'config': {'times': ['08:00'], 'exclude_holidays': True}})
+    scheduler._execute_push_task(1)
+    assert pushed == [] and scheduler.stats()['skipped_holiday'] == 1
+
+
+@pytest.mark.slow
+def test_soak_two_weeks_of_minute_triggers():
+    """20 个每分钟触发的配置连续运行两周（模拟时钟）：内存中的记录数与配置数一致，内存不随触发次数增长"""
+    configs = range(20)
+    clock = Clock()
+    scheduler, _, fetches = _scheduler(configs=configs, clock=clock)
+    pushed = [0]
+
+    def count(config):
+        pushed[0] += 1
+
+    scheduler._push_func = count
+    minutes = 14 * 24 * 60
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    for minute in range(minutes):
+        if minute == 1440:
+            baseline = tracemalloc.get_traced_memory()[0]
+        for config_id in configs:
+            scheduler._execute_push_task(config_id)
+        # 同一分钟内 APScheduler 偶发的重复触发
+        scheduler._execute_push_task(minute % 20)
+        clock.now += 60
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    elapsed = time.perf_counter() - started
+
+    stats = scheduler.stats()
+    print(f"\n[PUSH SCHEDULER BENCH] fires={stats['fired']} pushes={pushed[0]} elapsed={elapsed:.1f}s "
+          f"memory growth after day 1={(current - baseline) / 1024:.1f}KB peak={peak / 1024:.1f}KB")
+    assert pushed[0] == minutes * 20
+    assert stats['duplicate'] == minutes
+    assert (stats['last_fired'], stats['snapshots'], stats['in_flight']) == (20, 20, 0)
+    assert len(fetches) == 20
+    assert current - baseline < 64 * 1024
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+钉钉推送每日统计汇总测试：增量更新、重复更新不重复计数、重算与原统计一致、统计接口只读汇总、汇总失败不影响推送历史
+
+用 SQLite 模拟推送库（%s 占位符与 MySQL 的 upsert 语法在游标包装里转换）
+"""
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+from flask import Flask
+
+from routes.dingtalk_push import dingtalk_push_routes
+from utils import dingtalk_push_stats
+from utils.dingtalk_push_stats import contribution, duration_bucket, query_statistics, rebuild
+
+HISTORY_DDL = """
+    CREATE TABLE dingtalk_push_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, config_id INT NOT NULL, trigger_type TEXT,
+        triggered_at DATETIME NOT NULL, execution_duration_ms INT, status TEXT NOT NULL,
+        message_content TEXT, error_message TEXT, retry_count INT DEFAULT 0, completed_at TEXT
+    )
+"""
+STATS_DDL = (f"CREATE TABLE {dingtalk_push_stats.STATS_TABLE} (config_id INT, stat_date TEXT, "
+             + ', '.join(f'{column} INT NOT NULL DEFAULT 0' for column in dingtalk_push_stats.COUNTER_COLUMNS)
+             + ', PRIMARY KEY (config_id, stat_date))')
+
+LEGACY_TOTALS_SQL = """
+    SELECT COUNT(*) as total_runs,
+           SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as success_count,
+           SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failed_count,
+           AVG(execution_duration_ms) as avg_execution_time_ms
+    FROM dingtalk_push_history WHERE triggered_at >= %s
+"""
+LEGACY_TREND_SQL = """
+    SELECT DATE(triggered_at) as date, COUNT(*) as runs,
+           SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END) as success
+    FROM dingtalk_push_history WHERE triggered_at >= %s
+    GROUP BY DATE(triggered_at) ORDER BY date ASC
+"""
+
+
+def _to_sqlite(sql):
+    sql = sql.replace('%s', '?').replace('FOR UPDATE', '')
+    if 'ON DUPLICATE KEY UPDATE' in sql:
+        sql = sql.replace('ON DUPLICATE KEY UPDATE', 'ON CONFLICT(config_id, stat_date) DO UPDATE SET')
+        sql = re.sub(r'VALUES\((\w+)\)', r'excluded.\1', sql)
+    return sql
+
+
+def _param(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+class SqliteCursor:
+    def __init__(self, conn, dictionary):
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(_to_sqlite(sql), [_param(value) for value in params])
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+# 与 mysql.connector 一样把 DATETIME 列读成 datetime
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+
+
+class SqliteConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+
+    def cursor(self, dictionary=False):
+        return SqliteCursor(self._conn, dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+@pytest.fixture
+def push_db(tmp_path, monkeypatch):
+    path = str(tmp_path / 'push.db')
+    conn = sqlite3.connect(path)
+    conn.execute(HISTORY_DDL)
+    conn.execute('CREATE INDEX idx_triggered_at ON dingtalk_push_history (triggered_at)')
+    conn.execute(STATS_DDL)
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(dingtalk_push_stats, '_table_ready', True)
+    monkeypatch.setattr(dingtalk_push_routes, 'get_db_connection', lambda: SqliteConnection(path))
+    return path
+
+
+def _rollup_rows(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(f'SELECT config_id, stat_date, {", ".join(dingtalk_push_stats.COUNTER_COLUMNS)} '
+                        f'FROM {dingtalk_push_stats.STATS_TABLE} ORDER BY config_id, stat_date').fetchall()
+    conn.close()
+    return rows
+
+
+def _legacy(path, start):
+    conn = SqliteConnection(path)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(LEGACY_TOTALS_SQL, [start])
+    totals = cursor.fetchone()
+    cursor.execute(LEGACY_TREND_SQL, [start])
+    trend = cursor.fetchall()
+    conn.close()
+    return totals, trend
+
+
+def test_contribution_and_buckets():
+    assert [duration_bucket(ms) for ms in (0, 1000, 1001, 30000, 30001)] == [
+        'duration_le_1s', 'duration_le_1s', 'duration_le_3s', 'duration_le_30s', 'duration_gt_30s']
+    assert contribution('pending', None) == {}
+    assert contribution('success', 2500) == {
+        'success_count': 1, 'duration_sum_ms': 2500, 'duration_count': 1, 'duration_le_3s': 1}
+
+
+def test_incremental_updates_match_rebuild(push_db):
+    day = datetime(2026, 10, 19, 9, 0)
+    first = dingtalk_push_routes.create_push_history(1, day)
+    second = dingtalk_push_routes.create_push_history(1, day + timedelta(minutes=1))
+    third = dingtalk_push_routes.create_push_history(2, day + timedelta(days=1))
+
+    dingtalk_push_routes.update_push_history(first, status='success', execution_duration_ms=800, retry_count=0)
+    dingtalk_push_routes.update_push_history(second, status='success', execution_duration_ms=4000)
+    # 推送成功后的收尾步骤异常，同一条记录再被标为失败：只改计数，不重复计执行次数
+    dingtalk_push_routes.update_push_history(second, status='failed', error_message='日志写入失败')
+    dingtalk_push_routes.update_push_history(third, retry_count=1)
+
+    incremental = _rollup_rows(push_db)
+    assert incremental == [
+        (1, '2026-10-19', 2, 1, 1, 4800, 2, 1, 0, 1, 0, 0),
+        (2, '2026-10-20', 1, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+    ]
+
+    assert rebuild(SqliteConnection(push_db)) == 2
+    assert _rollup_rows(push_db) == incremental
+
+
+def test_rollup_failure_keeps_history_write(push_db, caplog):
+    day = datetime(2026, 10, 19, 9, 0)
+    kept = dingtalk_push_routes.create_push_history(1, day)
+    conn = sqlite3.connect(push_db)
+    conn.execute(f'ALTER TABLE {dingtalk_push_stats.STATS_TABLE} RENAME TO stats_offline')
+    conn.commit()
+    conn.close()
+
+    # 汇总更新失败只回滚到保存点：同一事务里的推送历史照常提交
+    history_id = dingtalk_push_routes.create_push_history(2, day)
+    dingtalk_push_routes.update_push_history(kept, status='success', execution_duration_ms=800)
+    assert caplog.text.count('[PUSH_STATS] 更新汇总失败') == 2
+    conn = sqlite3.connect(push_db)
+    assert conn.execute('SELECT id, status FROM dingtalk_push_history ORDER BY id').fetchall() == [
+        (kept, 'success'), (history_id, 'pending')]
+    conn.execute(f'ALTER TABLE stats_offline RENAME TO {dingtalk_push_stats.STATS_TABLE}')
+    conn.commit()
+    conn.close()
+    assert [row[:3] for row in _rollup_rows(push_db)] == [(1, '2026-10-19', 1)]
+
+    assert rebuild(SqliteConnection(push_db)) == 2
+    assert [row[:4] for row in _rollup_rows(push_db)] == [(1, '2026-10-19', 1, 1), (2, '2026-10-19', 1, 0)]
+
+
+def test_init_table_backfills_empty_rollup(push_db):
+    day = datetime(2026, 10, 19, 9, 0)
+    conn = sqlite3.connect(push_db)
+    conn.executemany("INSERT INTO dingtalk_push_history (config_id, triggered_at, status, execution_duration_ms) "
+                     "VALUES (?, ?, ?, ?)",
+                     [(1, '2026-10-19 09:00:00', 'success', 800), (1, '2026-10-19 10:00:00', 'failed', 4000),
+                      (2, '2026-10-18 09:00:00', 'success', None)])
+    conn.commit()
+    conn.close()
+
+    # 升级后首次启动：汇总表为空，从历史重算
+    assert dingtalk_push_stats.init_table()
+    backfilled = _rollup_rows(push_db)
+    assert [(row[0], row[1], row[2]) for row in backfilled] == [(1, '2026-10-19', 2), (2, '2026-10-18', 1)]
+
+    # 汇总表已有数据时不再重算
+    dingtalk_push_routes.create_push_history(1, day)
+    assert dingtalk_push_stats.init_table()
+    assert _rollup_rows(push_db)[0][2] == 3
+
+
+def test_rebuild_range_and_matches_legacy_statistics(push_db):
+    rng = random.Random(3)
+    start = date(2026, 9, 1)
+    conn = sqlite3.connect(push_db)
+    conn.executemany(
+        'INSERT INTO dingtalk_push_history (config_id, triggered_at, status, execution_duration_ms) VALUES (?, ?, ?, ?)',
+        [(rng.randint(1, 5), (datetime(2026, 9, 1) + timedelta(minutes=rng.randrange(30 * 1440))).strftime('%Y-%m-%d %H:%M:%S'),
+          rng.choice(['success', 'success', 'failed', 'pending']), rng.choice([None, rng.randint(100, 40000)]))
+         for _ in range(3000)]
+    )
+    conn.commit()
+    conn.close()
+
+    rebuild(SqliteConnection(push_db))
+    stats = query_statistics(SqliteConnection(push_db).cursor(dictionary=True), start)
+    totals, trend = _legacy(push_db, start)
+    assert (stats['total_runs'], stats['success_count'], stats['failed_count']) == (
+        totals['total_runs'], totals['success_count'], totals['failed_count'])
+    assert stats['avg_execution_time_ms'] == pytest.approx(totals['avg_execution_time_ms'])
+    assert [(day['date'], day['runs'], day['success']) for day in stats['trend']] == [
+        (day['date'], day['runs'], day['success']) for day in trend]
+    assert sum(bucket['count'] for bucket in stats['duration_histogram']) == sum(
+        row[6] for row in _rollup_rows(push_db))
+
+    # 只重算一段：区间外的汇总保持不变
+    before = [row for row in _rollup_rows(push_db) if row[1] < '2026-09-10']
+    conn = sqlite3.connect(push_db)
+    conn.execute("UPDATE dingtalk_push_history SET status = 'success' WHERE triggered_at >= '2026-09-10'")
+    conn.commit()
+    conn.close()
+    rebuild(SqliteConnection(push_db), date(2026, 9, 10), date(2026, 9, 30))
+    assert [row for row in _rollup_rows(push_db) if row[1] < '2026-09-10'] == before
+    assert all(row[3] == row[2] for row in _rollup_rows(push_db) if row[1] >= '2026-09-10')
+
+
+def test_statistics_endpoint_reads_rollup_only(push_db, monkeypatch):
+    today = datetime.now()
+    for offset, status in [(0, 'success'), (1, 'failed'), (40, 'success')]:
+        history_id = dingtalk_push_routes.create_push_history(3, today - timedelta(days=offset))
+        dingtalk_push_routes.update_push_history(history_id, status=status, execution_duration_ms=1500)
+
+    conn = sqlite3.connect(push_db)
+    conn.execute('DROP TABLE dingtalk_push_history')
+    conn.commit()
+    conn.close()
+
+    app = Flask(__name__)
+    app.register_blueprint(dingtalk_push_routes.dingtalk_push_bp)
+    body = app.test_client().get('/dingtalk-push/statistics?period=7d&config_id=3').get_json()
+    assert body['success']
+    data = body['data']
+    assert (data['total_runs'], data['success_count'], data['failed_count'], data['success_rate']) == (2, 1, 1, 50.0)
+    assert data['avg_execution_time_ms'] == 1500
+    assert data['period'] == '7d' and len(data['trend']) == 2
+
+
+@pytest.mark.slow
+def test_benchmark_statistics_query(push_db):
+    """30 万条推送历史（50 个配置 × 90 天）：原统计（两次区间扫描 + GROUP BY DATE）与 读汇总 的对比"""
+    rng = random.Random(11)
+    base = datetime(2026, 7, 1)
+    conn = sqlite3.connect(push_db)
+    conn.executemany(
+        'INSERT INTO dingtalk_push_history (config_id, triggered_at, status, execution_duration_ms) VALUES (?, ?, ?, ?)',
+        [(rng.randint(1, 50), (base + timedelta(seconds=rng.randrange(90 * 86400))).strftime('%Y-%m-%d %H:%M:%S'),
+          'success' if rng.random() < 0.9 else 'failed', rng.randint(100, 5000)) for _ in range(300_000)]
+    )
+    conn.commit()
+    conn.close()
+
+    start_rebuild = time.perf_counter()
+    rebuild(SqliteConnection(push_db))
+    rebuild_seconds = time.perf_counter() - start_rebuild
+
+    start = date(2026, 7, 1)
+    started = time.perf_counter()
+    for _ in range(5):
+        totals, _ = _legacy(push_db, start)
+    legacy_ms = (time.perf_counter() - started) / 5 * 1000
+
+    started = time.perf_counter()
+    for _ in range(5):
+        connection = SqliteConnection(push_db)
+        stats = query_statistics(connection.cursor(dictionary=True), start)
+        connection.close()
+    rollup_ms = (time.perf_counter() - started) / 5 * 1000
+
+    rollup_rows = len(_rollup_rows(push_db))
+    print(f"\n[PUSH STATS BENCH] history=300000 legacy={legacy_ms:.1f}ms rollup={rollup_ms:.2f}ms "
+          f"rollup_rows={rollup_rows} rebuild={rebuild_seconds:.2f}s")
+    assert stats['total_runs'] == totals['total_runs'] == 300_000
+    assert rollup_rows <= 50 * 90  # 统计读的是每个配置每天一行，而不是 30 万条历史
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+钉钉推送渲染缓存测试：编译模板复用、数据源结果缓存与并发合并、失效、整点批量推送基准
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+from jinja2 import BaseLoader, sandbox
+
+from routes.dingtalk_push import dingtalk_push_routes
+from utils.dingtalk_render_cache import DataSourceCache, TemplateCache
+
+TEMPLATE = """### {{ title }}
+{% for row in results %}- {{ row.name }}：{{ row.value }}
+{% endfor %}
+> 更新时间：{{ now_datetime | format_datetime('%m-%d %H:%M') }}"""
+
+
+def _api_source(url='http://example.com/api', **extra):
+    return dict({'type': 'api', 'config': {'url': url, 'method': 'GET'}}, **extra)
+
+
+def test_template_compiled_once_and_filters_available():
+    cache = TemplateCache()
+    data = {'title': '值班', 'results': [{'name': '甲', 'value': 1}]}
+    outputs = {cache.render(TEMPLATE, data, config_id=1) for _ in range(20)}
+
+    assert len(outputs) == 1 and '- 甲：1' in outputs.pop()
+    assert cache.stats() == {'hits': 19, 'compiles': 1, 'size': 1}
+    assert cache.render("{{ '2026-03-02T08:05:00' | format_datetime }}", {}) == '2026-03-02 08:05'
+
+
+def test_template_data_overrides_builtin_and_invalidate():
+    cache = TemplateCache()
+    assert cache.render('{{ now }}', {'now': '固定时间'}, config_id=1) == '固定时间'
+    assert cache.render('{{ now }}', {}, config_id=1) != '固定时间'
+
+    cache.render('{{ a }}', {'a': 1}, config_id=2)
+    cache.invalidate(1)
+    assert cache.stats()['size'] == 1
+    # 模板修改后哈希变化，不会用到旧的编译结果
+    assert cache.render('{{ a }}!', {'a': 1}, config_id=2) == '1!'
+
+
+def test_data_source_ttl_and_disabled_cache():
+    cache = DataSourceCache(default_ttl=60)
+    calls = []
+
+    def loader(config):
+        calls.append(config)
+        return {'results': [len(calls)]}
+
+    first = cache.get(_api_source(), loader, config_id=1)
+    first['extra'] = '调用方追加的变量'
+    first['results'].append('调用方修改的行')
+    second = cache.get(_api_source(), loader, config_id=1)
+    assert len(calls) == 1 and second == {'results': [1]}
+
+    for _ in range(3):
+        cache.get(_api_source(cache_ttl=0), loader, config_id=2)
+    assert len(calls) == 4
+
+    cache.invalidate(1)
+    cache.get(_api_source(), loader, config_id=1)
+    assert len(calls) == 5
+
+
+def test_data_source_not_cached_by_default():
+    cache = DataSourceCache()
+    calls = []
+    loader = lambda config: calls.append(1) or {'value': len(calls)}
+
+    assert [cache.get(_api_source(), loader)['value'] for _ in range(3)] == [1, 2, 3]
+    assert cache.stats()['hits'] == 0
+
+
+def test_data_source_shared_across_configs():
+    cache = DataSourceCache()
+    calls = []
+    loader = lambda config: calls.append(1) or {'value': 1}
+
+    for config_id in range(10):
+        cache.get(_api_source(cache_ttl=30), loader, config_id=config_id)
+    cache.get(_api_source(url='http://example.com/other'), loader, config_id=0)
+    assert len(calls) == 2
+    assert cache.stats()['hits'] == 9
+
+
+def test_concurrent_misses_load_once():
+    cache = DataSourceCache()
+    calls = []
+    release = threading.Event()
+
+    def loader(config):
+        calls.append(1)
+        release.wait(5)
+        return {'value': 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(_api_source(), loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{'value': 42}] * 8
+    assert cache.stats()['shared'] == 7
+
+
+def test_concurrent_failure_shared_and_not_cached():
+    cache = DataSourceCache()
+    calls = []
+    release = threading.Event()
+
+    def failing(config):
+        calls.append(1)
+        release.wait(5)
+        raise ValueError('接口不可用')
+
+    errors = []
+
+    def worker():
+        try:
+            cache.get(_api_source(), failing)
+        except ValueError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1 and errors == ['接口不可用'] * 4
+    assert cache.get(_api_source(), lambda config: {'ok': True}) == {'ok': True}
+
+
+def test_route_helpers_use_caches(monkeypatch):
+    calls = []
+    monkeypatch.setattr(dingtalk_push_routes, 'data_source_cache', DataSourceCache())
+    monkeypatch.setattr(dingtalk_push_routes, 'load_data_source', lambda config: calls.append(1) or {'results': []})
+
+    config = {'id': 7, 'data_source_config': json.dumps(_api_source(cache_ttl=30))}
+    assert dingtalk_push_routes.fetch_data_source(config) == {'results': []}
+    dingtalk_push_routes.fetch_data_source(config)
+    assert len(calls) == 1
+
+    static = {'id': 8, 'data_source_config': json.dumps({'type': 'static', 'data': {'title': '静态'}})}
+    assert dingtalk_push_routes.fetch_data_source(static) == {'title': '静态'}
+    assert dingtalk_push_routes.render_template('{{ title }}', {'title': '值班'}, config_id=7) == '值班'
+
+
+@pytest.mark.slow
+def test_benchmark_top_of_hour_push_burst():
+    """09:00 同时触发 50 个群的推送（共用 5 个数据源，每次获取耗时 20ms）：逐次获取 + 编译 与 缓存 的对比"""
+    fetch_seconds = 0.02
+    rows = [{'name': f'员工{i}', 'value': i} for i in range(30)]
+
+    def loader(config):
+        time.sleep(fetch_seconds)
+        return {'title': '今日值班', 'results': rows}
+
+    configs = [(config_id, _api_source(url=f'http://example.com/roster/{config_id % 5}'),
+                TEMPLATE + f'\n<!-- 群 {config_id} -->') for config_id in range(50)]
+
+    start = time.perf_counter()
+    legacy = []
+    for config_id, source, template_content in configs:
+        data = loader(source)
+        env = sandbox.SandboxedEnvironment(loader=BaseLoader())
+        env.filters['format_datetime'] = lambda dt, fmt='%Y-%m-%d %H:%M': dt.strftime(fmt)
+        legacy.append(env.from_string(template_content).render(
+            now=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), now_datetime=datetime.now(), **data))
+    legacy_seconds = time.perf_counter() - start
+
+    templates = TemplateCache()
+    sources = DataSourceCache(default_ttl=60)  # 数据源配置了 cache_ttl
+    for config_id, source, template_content in configs:
+        templates.get(template_content, config_id)  # 模板首次推送（或预览）时已编译
+
+    start = time.perf_counter()
+    cached = []
+    for _ in range(3):
+        cached = [templates.render(template_content, sources.get(source, loader, config_id), config_id)
+                  for config_id, source, template_content in configs]
+    cached_seconds = (time.perf_counter() - start) / 3
+
+    print(f"\n[DINGTALK RENDER BENCH] 50 pushes legacy={legacy_seconds * 1000:.0f}ms "
+          f"cached={cached_seconds * 1000:.0f}ms loads={sources.stats()['loads']} "
+          f"compiles={templates.stats()['compiles']}")
+    assert [text.splitlines()[:-2] for text in cached] == [text.splitlines()[:-2] for text in legacy]
+    assert sources.stats()['loads'] == 5
+    assert templates.stats()['compiles'] == len(configs)  # 三轮推送不再重新编译
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FPA 调整因子计算测试：编译后的因子表与逐因子查库结果一致、修改因子后失效、批量情景对比、10 万次计算基准
+
+用 SQLite 模拟 fpa_adjustment_factor（%s 占位符在游标包装里转换）
+"""
+import itertools
+import math
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+from flask import Flask
+
+from routes.fpa import adjustment_calc_routes, adjustment_routes
+from utils.fpa_adjustment_factors import (
+    FactorTable, FactorTableCache, INPUT_KEYS, evaluate, evaluate_matrix, evaluate_total, option_lookup
+)
+
+FACTOR_ROWS = [
+    ('规模变更调整因子', '规模变更调整系数', '估算早期', 1.39),
+    ('规模变更调整因子', '规模变更调整系数', '估算中期', 1.21),
+    ('规模变更调整因子', '规模变更调整系数', '估算晚期', 1.10),
+    ('规模变更调整因子', '规模变更调整系数', '项目完成', 1.00),
+    ('应用类型', '应用类型', '业务处理', 1.0),
+    ('应用类型', '应用类型', '应用集成', 1.2),
+    ('应用类型', '应用类型', '科技', 1.2),
+    ('应用类型', '应用类型', '智能信息', 1.7),
+    ('应用类型', '应用类型', '通信控制', 1.9),
+] + [
+    (name, '质量特性', option, score)
+    for name in ('分布式处理', '性能', '可靠性', '多重站点')
+    for option, score in (('没有明示', 0.25), ('一般要求', 0.3), ('较高要求', 0.35))
+] + [
+    ('开发语言', '开发语言', 'Java', 1.0),
+    ('开发语言', '开发语言', 'C', 1.5),
+    ('开发语言', '开发语言', 'Python', 1.0),
+    ('开发团队背景', '开发团队背景', '为本行业开发过类似的软件', 0.8),
+    ('开发团队背景', '开发团队背景', '为其他行业开发过类似的软件', 1.0),
+    ('开发团队背景', '开发团队背景', '没有开发过类似的软件', 1.2),
+    ('重用程度', '重用程度调整系数', '高', 0.33),
+    ('重用程度', '重用程度调整系数', '中', 0.67),
+    ('重用程度', '重用程度调整系数', '低', 1.0),
+    ('修改类型', '修改类型调整系数', '新增', 1.0),
+    ('修改类型', '修改类型调整系数', '修改', 0.8),
+    ('修改类型', '修改类型调整系数', '删除', 0.2),
+    # 同一选项重复出现：与逐条查询一样取第一条
+    ('开发语言', '开发语言', 'Java', 9.9),
+]
+
+SELECTION = {
+    'scale_timing': '估算中期', 'application_type': '应用集成', 'distributed_processing': '一般要求',
+    'performance': '较高要求', 'reliability': '没有明示', 'multi_site': '一般要求',
+    'language': 'Java', 'team_background': '没有开发过类似的软件',
+}
+
+# 原 calculate_adjustment 的逐因子查询：(请求字段, 匹配列, 匹配值, 默认选项)
+LEGACY_QUERIES = [
+    ('scale_timing', 'factor_category', '规模变更调整系数', None),
+    ('application_type', 'factor_category', '应用类型', None),
+    ('distributed_processing', 'factor_name', '分布式处理', None),
+    ('performance', 'factor_name', '性能', None),
+    ('reliability', 'factor_name', '可靠性', None),
+    ('multi_site', 'factor_name', '多重站点', None),
+    ('language', 'factor_category', '开发语言', None),
+    ('team_background', 'factor_category', '开发团队背景', None),
+    ('reuse_level', 'factor_category', '重用程度调整系数', '低'),
+    ('change_type', 'factor_category', '修改类型调整系数', '新增'),
+]
+
+
+class SqliteCursor:
+    def __init__(self, conn, dictionary, log):
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+        self._log = log
+
+    def execute(self, sql, params=()):
+        self._log.append(sql)
+        self._cursor.execute(sql.replace('%s', '?'), params)
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SqliteConnection:
+    def __init__(self, path, log):
+        self._conn = sqlite3.connect(path)
+        self._log = log
+
+    def cursor(self, dictionary=False):
+        return SqliteCursor(self._conn, dictionary, self._log)
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+def _create_factor_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE fpa_adjustment_factor (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, factor_name TEXT, factor_category TEXT, option_name TEXT,
+        score_value REAL, formula TEXT, display_order INT DEFAULT 0, parent_id INT, updated_at TEXT)""")
+    conn.execute('CREATE INDEX idx_category_option ON fpa_adjustment_factor (factor_category, option_name)')
+    conn.execute('CREATE INDEX idx_name_option ON fpa_adjustment_factor (factor_name, option_name)')
+    conn.executemany('INSERT INTO fpa_adjustment_factor (factor_name, factor_category, option_name, score_value) '
+                     'VALUES (?, ?, ?, ?)', FACTOR_ROWS)
+    conn.commit()
+    conn.close()
+
+
+def _rows():
+    return [{'id': index, 'factor_name': name, 'factor_category': category, 'option_name': option, 'score_value': score}
+            for index, (name, category, option, score) in enumerate(FACTOR_ROWS, 1)]
+
+
+def _legacy_total(conn, selection):
+    """逐因子查库计算总调整因子（原实现）"""
+    values = {}
+    for key, column, match, default in LEGACY_QUERIES:
+        option = selection.get(key, default)
+        row = conn.execute(f'SELECT * FROM fpa_adjustment_factor WHERE {column} = ? AND option_name = ? LIMIT 1',
+                           (match, option)).fetchone()
+        values[key] = row[4] if row else 0
+    quality = sum(values[key] for key in ('distributed_processing', 'performance', 'reliability', 'multi_site'))
+    total = quality
+    for key in ('scale_timing', 'application_type', 'language', 'team_background', 'reuse_level', 'change_type'):
+        total *= values[key]
+    return total
+
+
+@pytest.fixture
+def factor_app(tmp_path, monkeypatch):
+    path = str(tmp_path / 'kb.db')
+    _create_factor_db(path)
+    log = []
+    for module in (adjustment_calc_routes, adjustment_routes):
+        monkeypatch.setattr(module, 'get_db_connection', lambda: SqliteConnection(path, log))
+    cache = FactorTableCache(ttl=0)
+    monkeypatch.setattr(adjustment_calc_routes, 'factor_table_cache', cache)
+    monkeypatch.setattr(adjustment_routes, 'factor_table_cache', cache)
+    app = Flask(__name__)
+    app.register_blueprint(adjustment_calc_routes.adjustment_calc_bp)
+    app.register_blueprint(adjustment_routes.adjustment_bp)
+    return app.test_client(), log, path
+
+
+def test_evaluate_matches_per_factor_queries(tmp_path):
+    path = str(tmp_path / 'kb.db')
+    _create_factor_db(path)
+    conn = sqlite3.connect(path)
+    table = FactorTable(_rows())
+
+    result = evaluate(table, SELECTION)
+    assert result['scale_factor'] == 1.21 and result['language_factor'] == 1.0
+    assert result['quality_factor'] == pytest.approx(0.3 + 0.35 + 0.25 + 0.3)
+    assert [item['name'] for item in result['details']['quality']['sub_items']] == ['分布式处理', '性能', '可靠性', '多重站点']
+    assert result['details']['reuse'] == {'name': '重用程度调整因子', 'option': '低', 'value': 1.0}
+    assert result['total_factor'] == pytest.approx(_legacy_total(conn, SELECTION))
+
+    # 未匹配的规模 / 应用类型不输出明细，其他因子输出 0
+    partial = evaluate(table, {'scale_timing': '未知', 'language': 'Go'})
+    assert 'scale' not in partial['details'] and 'application' not in partial['details']
+    assert partial['details']['language'] == {'name': '开发语言调整因子', 'option': 'Go', 'value': 0}
+    assert partial['total_factor'] == 0
+
+    for values in itertools.islice(itertools.product(*(table.options(key) + ['缺失'] for key in INPUT_KEYS)), 0, None, 997):
+        selection = dict(zip(INPUT_KEYS, values))
+        assert evaluate_total(table, selection) == pytest.approx(_legacy_total(conn, selection))
+    conn.close()
+
+
+def test_option_lookup_keeps_nested_if_semantics():
+    assert option_lookup(['估算早期', '估算中期', '估算早期'], ['1.39', 1.21, 2]) == {'估算早期': 1.39, '估算中期': 1.21}
+    assert adjustment_calc_routes.excel_formula_lookup('估算中期', ['估算早期', '估算中期'], [1.39, 1.21]) == 1.21
+    assert adjustment_calc_routes.excel_if_formula_c2_b36_d39(
+        '未知', [{'option_name': '估算早期', 'score_value': 1.39}]) == 0.0
+    with pytest.raises(ValueError):
+        adjustment_calc_routes.excel_formula_lookup('x', ['a'], [])
+
+
+def test_calculate_loads_table_once_and_reloads_after_update(factor_app):
+    client, log, _ = factor_app
+    first = client.post('/adjustment-calc/api/calculate', json=SELECTION).get_json()
+    for _ in range(5):
+        assert client.post('/adjustment-calc/api/calculate', json=SELECTION).get_json() == first
+    assert len(log) == 1 and 'ORDER BY id' in log[0]
+
+    # 修改因子分值后重新编译
+    client.put('/adjustment/api/factor/2', json={
+        'factor_name': '规模变更调整因子', 'factor_category': '规模变更调整系数', 'option_name': '估算中期',
+        'score_value': 1.5})
+    updated = client.post('/adjustment-calc/api/calculate', json=SELECTION).get_json()['data']
+    assert updated['scale_factor'] == 1.5
+    assert updated['total_factor'] == pytest.approx(first['data']['total_factor'] / 1.21 * 1.5)
+
+    client.delete('/adjustment/api/factor/2')
+    assert client.post('/adjustment-calc/api/calculate', json=SELECTION).get_json()['data']['total_factor'] == 0
+    assert sum('ORDER BY id' in sql for sql in log) == 3
+
+
+def test_what_if_matrix(factor_app):
+    client, _, _ = factor_app
+    body = client.post('/adjustment-calc/api/what-if', json={
+        'base': SELECTION, 'vary': {'scale_timing': '*', 'performance': ['没有明示', '较高要求']}}).get_json()
+    assert body['success']
+    data = body['data']
+    assert data['count'] == 8 and sorted(data['keys']) == ['performance', 'scale_timing']
+    table = FactorTable(_rows())
+    for item in data['results']:
+        assert item['total_factor'] == pytest.approx(evaluate_total(table, dict(SELECTION, **item['selection'])))
+    assert data['max'] == max(item['total_factor'] for item in data['results'])
+    assert data['results'][0]['selection'] == {'scale_timing': '估算早期', 'performance': '没有明示'}
+
+    assert client.post('/adjustment-calc/api/what-if', json={'vary': {'colour': ['红']}}).status_code == 400
+    with pytest.raises(ValueError):
+        evaluate_matrix(table, {}, {'scale_timing': '*', 'language': '*'}, max_combinations=5)
+
+
+@pytest.mark.slow
+def test_benchmark_100k_evaluations(tmp_path):
+    """10 万次计算：逐因子查库（SQLite 本地库，已建索引，每次 10 条查询） 与 编译后的因子表 的对比"""
+    path = str(tmp_path / 'kb.db')
+    _create_factor_db(path)
+    table = FactorTable(_rows())
+    selections = [dict(zip(INPUT_KEYS, values))
+                  for values in itertools.product(*(table.options(key) for key in INPUT_KEYS))]
+    selections = (selections * (100_000 // len(selections) + 1))[:100_000]
+
+    conn = sqlite3.connect(path)
+    legacy_sample = selections[::10]
+    started = time.perf_counter()
+    legacy = [_legacy_total(conn, selection) for selection in legacy_sample]
+    legacy_seconds = (time.perf_counter() - started) * 10
+    conn.close()
+
+    started = time.perf_counter()
+    totals = [evaluate_total(table, selection) for selection in selections]
+    compiled_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matrix = evaluate_matrix(table, {}, {'scale_timing': '*', 'application_type': '*', 'performance': '*',
+                                         'reliability': '*', 'language': '*', 'change_type': '*'})
+    matrix_ms = (time.perf_counter() - started) * 1000
+
+    print(f"\n[FPA FACTOR BENCH] evaluations=100000 per-factor queries={legacy_seconds:.1f}s (extrapolated from 10000) "
+          f"compiled={compiled_seconds * 1000:.0f}ms what-if {matrix['count']} combinations={matrix_ms:.1f}ms")
+    assert totals[::10] == pytest.approx(legacy)
+    varied = ('scale_timing', 'application_type', 'performance', 'reliability', 'language', 'change_type')
+    assert matrix['count'] == math.prod(len(table.options(key)) for key in varied)
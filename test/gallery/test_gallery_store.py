@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+画廊存储层测试
+覆盖 mtime 热加载、倒排索引检索、缩略图生成，以及图片的 ETag / immutable / Range 响应
+"""
+import io
+import json
+import os
+import sys
+import time
+
+import pytest
+from flask import Flask
+from PIL import Image
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from routes.gallery import gallery_images, gallery_routes
+from routes.gallery.gallery_store import UNCATEGORIZED, GalleryStore
+
+ITEMS = [
+    {'id': 1, 'title': '静夜思', 'author': '李白', 'content': '床前明月光', 'category': '思乡',
+     'dynasty': '唐', 'tags': ['唐诗', '月亮']},
+    {'id': 2, 'title': '江雪', 'author': '柳宗元', 'content': '独钓寒江雪', 'category': '山水田园',
+     'dynasty': '唐', 'tags': ['唐诗', '孤独']},
+    {'id': 3, 'title': '水调歌头', 'author': '苏轼', 'content': '明月几时有', 'category': '抒情',
+     'dynasty': '宋', 'tags': ['宋词', 'Moon']},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return GalleryStore(str(tmp_path / 'poetry.json'), ITEMS,
+                        search_fields=('title', 'author', 'content'),
+                        facet_fields=('category', 'dynasty'))
+
+
+class TestGalleryStore:
+    """内存索引存储"""
+
+    def test_default_data_written(self, store):
+        assert len(store) == 3
+        assert os.path.exists(store.filepath)
+
+    def test_keyword_substring(self, store):
+        assert [p['id'] for p in store.search(keyword='明月')] == [1, 3]
+        assert [p['id'] for p in store.search(keyword='moon')] == [3]
+        assert store.search(keyword='不存在的词') == []
+
+    def test_facets_and_tag(self, store):
+        assert [p['id'] for p in store.search(dynasty='唐')] == [1, 2]
+        assert [p['id'] for p in store.search(tag='唐诗', keyword='江')] == [2]
+        assert [p['id'] for p in store.search(dynasty='宋', category='思乡')] == []
+        assert store.facet_counts('dynasty') == {'唐': 2, '宋': 1}
+
+    def test_missing_facet_counted_as_uncategorized(self, store):
+        store.create({'title': '无题', 'author': '佚名', 'content': '', 'category': None, 'tags': []})
+        assert store.facet_counts('category')[UNCATEGORIZED] == 1
+        assert store.facet_counts('dynasty')[UNCATEGORIZED] == 1
+        assert [p['id'] for p in store.search(category=UNCATEGORIZED)] == [4]
+
+    def test_write_updates_index(self, store):
+        created = store.create({'title': '春晓', 'author': '孟浩然', 'content': '处处闻啼鸟',
+                                'category': '山水田园', 'dynasty': '唐', 'tags': []})
+        assert created['id'] == 4
+        assert [p['id'] for p in store.search(keyword='啼鸟')] == [4]
+
+        store.update(4, {'id': 99, 'content': '花落知多少'})
+        assert store.search(keyword='啼鸟') == []
+        assert store.get(4)['content'] == '花落知多少'
+
+        store.delete(1)
+        assert store.get(1) is None
+        assert len(store) == 3
+
+    def test_reload_on_external_edit(self, store):
+        store.all()
+        with open(store.filepath, 'w', encoding='utf-8') as f:
+            json.dump(ITEMS[:1], f, ensure_ascii=False)
+        # 保证 mtime 一定变化
+        later = time.time() + 5
+        os.utime(store.filepath, (later, later))
+        assert len(store) == 1
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    images_dir = tmp_path / 'images'
+    images_dir.mkdir()
+    monkeypatch.setattr(gallery_routes, 'IMAGES_DIR', str(images_dir))
+    monkeypatch.setattr(gallery_routes, 'paintings_store', GalleryStore(
+        str(tmp_path / 'paintings.json'), [], search_fields=('title', 'artist', 'description')))
+
+    app = Flask(__name__)
+    app.register_blueprint(gallery_routes.gallery_bp)
+    return app.test_client()
+
+
+def _png_bytes(width=1600, height=1200):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 120, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class TestGalleryImages:
+    """图片上传与访问"""
+
+    def test_upload_generates_thumbnails(self, client):
+        resp = client.post('/api/gallery/upload-image',
+                           data={'file': (io.BytesIO(_png_bytes()), 'big.png')},
+                           content_type='multipart/form-data')
+        data = resp.get_json()['data']
+        assert data['image_url'].startswith('/api/gallery/images/')
+        thumb = data['thumbnails']['320']['jpeg']
+
+        thumb_resp = client.get(thumb)
+        assert thumb_resp.status_code == 200
+        with Image.open(io.BytesIO(thumb_resp.data)) as img:
+            assert img.width == 320
+
+        # 相同内容重复上传得到相同地址
+        again = client.post('/api/gallery/upload-image',
+                            data={'file': (io.BytesIO(_png_bytes()), 'copy.png')},
+                            content_type='multipart/form-data')
+        assert again.get_json()['data']['image_url'] == data['image_url']
+
+    def test_list_uses_thumbnail(self, client):
+        upload = client.post('/api/gallery/upload-image',
+                             data={'file': (io.BytesIO(_png_bytes()), 'big.png')},
+                             content_type='multipart/form-data').get_json()['data']
+        client.post('/api/gallery/paintings', json={'title': '测试', 'image_url': upload['image_url']})
+
+        listing = client.get('/api/gallery/paintings', headers={'Accept': 'image/webp,*/*'}).get_json()
+        assert listing['data'][0]['image_url'] == upload['image_url']
+        assert listing['data'][0]['thumbnail_url'] == upload['thumbnails']['320']['webp']
+
+    def test_list_reads_directory_listing_once(self, client, monkeypatch):
+        upload = client.post('/api/gallery/upload-image',
+                             data={'file': (io.BytesIO(_png_bytes()), 'big.png')},
+                             content_type='multipart/form-data').get_json()['data']
+        for title in ('一', '二', '三'):
+            client.post('/api/gallery/paintings', json={'title': title, 'image_url': upload['image_url']})
+
+        listdir_calls = []
+        real_listdir = os.listdir
+        monkeypatch.setattr(gallery_images.os, 'listdir',
+                            lambda path: listdir_calls.append(path) or real_listdir(path))
+        monkeypatch.setattr(gallery_images.os.path, 'exists',
+                            lambda path: pytest.fail(f'逐条检查缩略图: {path}'))
+        for _ in range(2):
+            listing = client.get('/api/gallery/paintings').get_json()['data']
+            assert [p['thumbnail_url'] for p in listing] == [upload['thumbnails']['320']['jpeg']] * 3
+        # 目录未变化时复用缓存的列表
+        assert len(listdir_calls) <= 1
+
+    def test_stats_with_uncategorized_painting(self, client):
+        client.post('/api/gallery/paintings', json={'title': '无分类', 'category': None})
+        stats = client.get('/api/gallery/stats')
+        assert stats.status_code == 200
+        assert stats.get_json()['data']['painting_categories'] == {UNCATEGORIZED: 1}
+
+    def test_etag_immutable_and_range(self, client):
+        image_url = client.post('/api/gallery/upload-image',
+                                data={'file': (io.BytesIO(_png_bytes()), 'big.png')},
+                                content_type='multipart/form-data').get_json()['data']['image_url']
+
+        resp = client.get(image_url)
+        assert 'immutable' in resp.headers['Cache-Control']
+        etag = resp.headers['ETag']
+        assert not etag.startswith('W/')
+
+        assert client.get(image_url, headers={'If-None-Match': etag}).status_code == 304
+
+        partial = client.get(image_url, headers={'Range': 'bytes=0-99'})
+        assert partial.status_code == 206
+        assert len(partial.data) == 100
+
+    def test_path_traversal_rejected(self, client):
+        assert client.get('/api/gallery/images/../paintings.json').status_code == 404
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话校验缓存测试
+覆盖缓存命中、登出/禁用/角色变更失效、TTL 过期、容量上限与过期会话清理
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from models.auth_models import DatabaseManager, SessionCache, SessionManager, User
+
+
+@pytest.fixture
+def auth(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'users.db'))
+    cache = SessionCache(max_entries=100, ttl=60)
+    users = User(db, cache=cache)
+    sessions = SessionManager(db, cache=cache, purge_interval=0)
+    users.create_user('alice', 'alice@example.com', 'Test123456')
+    user_id = users.authenticate('alice', 'Test123456')[2]['id']
+    return db, cache, users, sessions, user_id
+
+
+def _count_queries(db):
+    """统计线程连接上执行的 SQL 条数"""
+    statements = []
+    db.get_thread_connection().set_trace_callback(statements.append)
+    return statements
+
+
+def test_wal_mode(auth):
+    db = auth[0]
+    assert db.get_thread_connection().execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_validate_hits_cache(auth):
+    db, cache, _, sessions, user_id = auth
+    token = sessions.create_session(user_id)
+
+    first = sessions.validate_session(token)
+    statements = _count_queries(db)
+    second = sessions.validate_session(token)
+
+    assert first == second
+    assert first['user_id'] == user_id and first['role'] == 'user'
+    assert statements == []
+    assert len(cache) == 1
+
+
+def test_cache_stores_token_hash_only(auth):
+    _, cache, _, sessions, user_id = auth
+    token = sessions.create_session(user_id)
+    sessions.validate_session(token)
+    assert token not in cache._entries
+
+
+def test_logout_invalidates(auth):
+    _, _, _, sessions, user_id = auth
+    token = sessions.create_session(user_id)
+    assert sessions.validate_session(token)
+
+    sessions.invalidate_session(token)
+    assert sessions.validate_session(token) is None
+
+
+def test_disable_and_role_change_invalidate(auth):
+    _, _, users, sessions, user_id = auth
+    token = sessions.create_session(user_id)
+    sessions.validate_session(token)
+
+    users.update_role(user_id, 'admin')
+    assert sessions.validate_session(token)['role'] == 'admin'
+
+    users.set_active(user_id, False)
+    assert sessions.validate_session(token)['is_active'] == 0
+
+
+def test_ttl_expiry(auth):
+    db, _, _, _, user_id = auth
+    cache = SessionCache(ttl=0.05)
+    sessions = SessionManager(db, cache=cache, purge_interval=0)
+    token = sessions.create_session(user_id)
+    sessions.validate_session(token)
+
+    time.sleep(0.1)
+    statements = _count_queries(db)
+    sessions.validate_session(token)
+    assert statements, 'TTL 过期后应重新查询数据库'
+
+
+def test_bounded_size():
+    cache = SessionCache(max_entries=3, ttl=60)
+    expires_at = datetime.now() + timedelta(hours=1)
+    for i in range(5):
+        cache.put(f'token-{i}', {'user_id': i}, expires_at)
+    assert len(cache) == 3
+    assert cache.get('token-0') is None
+    assert cache.get('token-4') == {'user_id': 4}
+
+
+def test_purge_expired_sessions(auth):
+    db, _, _, sessions, user_id = auth
+    live = sessions.create_session(user_id)
+    expired = sessions.create_session(user_id)
+    with db.get_thread_connection() as conn:
+        conn.execute('UPDATE sessions SET expires_at = ? WHERE session_token = ?',
+                     ((datetime.now() - timedelta(minutes=1)).isoformat(), expired))
+
+    assert sessions.purge_expired_sessions() == 1
+    assert sessions.validate_session(expired) is None
+    assert sessions.validate_session(live)
+
+
+def test_session_info(auth):
+    _, _, _, sessions, user_id = auth
+    token = sessions.create_session(user_id)
+    info = sessions.get_session_info(token)
+    assert info['created_at']
+    assert datetime.fromisoformat(info['expires_at']) > datetime.now() + timedelta(hours=23)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQL 生成器表结构目录测试：DDL / JSON 解析、按需求选表、本地校验、生成结果缓存与修正、宽表结构提示词基准
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+from flask import Flask
+
+import utils.ollama_client
+from routes.tools import sql_generator_routes
+from utils.sql_schema import SchemaCatalog, SchemaCatalogCache, SqlResultCache, split_statements, validate_sql
+
+DDL = """
+CREATE TABLE `users` (
+  `id` BIGINT NOT NULL AUTO_INCREMENT COMMENT '用户ID',
+  `user_name` VARCHAR(64) NOT NULL COMMENT '用户名',
+  `city` varchar(32) DEFAULT NULL COMMENT '所在城市',
+  PRIMARY KEY (`id`),
+  KEY idx_name (`user_name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='用户表';
+
+CREATE TABLE orders (
+  id BIGINT PRIMARY KEY,
+  user_id BIGINT,
+  amount DECIMAL(10,2) COMMENT '订单金额',
+  status ENUM('paid','refund') COMMENT '状态, 已支付/退款',
+  created_at DATETIME COMMENT '下单时间',
+  CONSTRAINT fk_user FOREIGN KEY (user_id) REFERENCES users (id)
+);
+
+CREATE TABLE audit_log (id INT, message TEXT);
+COMMENT ON TABLE audit_log IS '操作日志';
+COMMENT ON COLUMN audit_log.message IS '日志内容';
+"""
+
+GOOD_SQL = """```sql
+-- 最近 30 天每个用户的订单金额
+SELECT u.user_name, SUM(o.amount) AS total_amount
+FROM users u JOIN orders o ON o.user_id = u.id
+WHERE o.created_at >= DATE_SUB(NOW(), INTERVAL 30 DAY)
+GROUP BY u.user_name;
+```
+按用户汇总订单金额"""
+
+BAD_SQL = "```sql\nSELECT u.name, SUM(o.amount) FROM users u JOIN orders o ON o.user_id = u.id GROUP BY u.name;\n```"
+
+
+class FakeClient:
+    def __init__(self, replies, seconds_per_char=0.0):
+        self.replies = list(replies)
+        self.seconds_per_char = seconds_per_char
+        self.calls = []
+
+    def chat(self, messages, **kwargs):
+        self.calls.append(messages)
+        if self.seconds_per_char:
+            time.sleep(sum(len(message['content']) for message in messages) * self.seconds_per_char)
+        return self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(sql_generator_routes, 'schema_catalog_cache', SchemaCatalogCache())
+    monkeypatch.setattr(sql_generator_routes, 'sql_result_cache', SqlResultCache())
+    app = Flask(__name__)
+    app.register_blueprint(sql_generator_routes.sql_generator_bp)
+
+    def use(fake):
+        monkeypatch.setattr(utils.ollama_client, 'get_ollama_client', lambda: fake)
+        return app.test_client()
+
+    return use
+
+
+def test_parse_ddl_comments_and_keys():
+    catalog = SchemaCatalog.parse(DDL)
+    users, orders, audit = catalog.tables
+    assert (users['name'], users['comment'], users['primary_key']) == ('users', '用户表', ['id'])
+    assert [(column['name'], column['type'], column['comment']) for column in users['columns']] == [
+        ('id', 'BIGINT', '用户ID'), ('user_name', 'VARCHAR(64)', '用户名'), ('city', 'varchar(32)', '所在城市')]
+    assert orders['references'] == {'user_id': ('users', 'id')}
+    assert orders['columns'][3]['type'] == "ENUM('paid','refund')"
+    assert (audit['comment'], audit['columns'][1]['comment']) == ('操作日志', '日志内容')
+
+
+def test_parse_json_formats():
+    listed = SchemaCatalog.parse(json.dumps({'tables': [
+        {'name': 'dept', 'comment': '部门', 'columns': [{'name': 'id', 'type': 'INT', 'pk': True}, 'dept_name']}]}))
+    assert listed.tables[0]['primary_key'] == ['id']
+    assert [column['name'] for column in listed.tables[0]['columns']] == ['id', 'dept_name']
+
+    mapped = SchemaCatalog.parse(json.dumps({'emp': {'id': 'INT', 'dept_id': 'INT'}}, ensure_ascii=False))
+    assert [(column['name'], column['type']) for column in mapped.table('EMP')['columns']] == [
+        ('id', 'INT'), ('dept_id', 'INT')]
+
+    raw = SchemaCatalog.parse('用户表 users：id, name')
+    assert not raw.parsed and raw.digest('任意需求') == '用户表 users：id, name'
+
+
+def test_select_relevant_tables_and_columns():
+    noise = '\n'.join(
+        f"CREATE TABLE t_noise_{i} ({', '.join(f'field_{i}_{j} INT' for j in range(30))});" for i in range(50))
+    wide_users = ('CREATE TABLE users (id BIGINT PRIMARY KEY, user_name VARCHAR(64) COMMENT \'用户名\', '
+                  + ', '.join(f'attr_{j} INT' for j in range(30)) + ") COMMENT='用户表';")
+    orders_and_audit = 'CREATE TABLE orders' + DDL.split('CREATE TABLE orders', 1)[1]
+    catalog = SchemaCatalog.parse('\n'.join([noise, wide_users, orders_and_audit]))
+
+    selected = catalog.select('统计最近30天每个用户的订单金额')
+    names = [entry['table']['name'] for entry in selected]
+    assert set(names[:2]) == {'orders', 'users'}
+    assert not any(name.startswith('t_noise') for name in names)
+    users = next(entry for entry in selected if entry['table']['name'] == 'users')
+    assert [column['name'] for column in users['columns']] == ['id', 'user_name']
+    assert users['omitted'] == 30
+
+    digest = catalog.digest('统计最近30天每个用户的订单金额')
+    assert digest.startswith('-- 共 53 张表')
+    assert 'user_id BIGINT -> users.id' in digest and '...另有 30 列' in digest
+    assert len(digest) < len(catalog.raw_text) / 20
+
+    # 表名直接出现在需求中
+    assert catalog.select('t_noise_7 里 field_7_3 大于 10 的记录')[0]['table']['name'] == 't_noise_7'
+
+
+def test_validate_sql_against_sqlite_copy():
+    catalog = SchemaCatalog.parse(DDL)
+    assert validate_sql(catalog, sql_generator_routes.extract_sql_and_explanation(GOOD_SQL)['sql'], 'mysql')[
+        'status'] == 'ok'
+    assert validate_sql(catalog, "SELECT created_at::date, COUNT(*) FROM orders WHERE status ILIKE 'p%' GROUP BY 1",
+                        'postgresql')['status'] == 'ok'
+
+    missing = validate_sql(catalog, 'SELECT name FROM users', 'mysql')
+    assert (missing['status'], missing['error']) == ('error', 'no such column: name')
+    # SQLite 不认识的写法只记为未校验，不判定为错误
+    unchecked = validate_sql(catalog, 'SELEC * FROM users', 'mysql')
+    assert unchecked['status'] == 'skipped' and 'syntax error' in unchecked['error']
+    assert validate_sql(catalog, "SELECT * FROM users LOCK IN SHARE MODE; SELECT name FROM users",
+                        'mysql')['error'] == 'no such column: name'
+    assert validate_sql(catalog, 'SELECT * FROM orders; SELECT * FROM nope', 'sqlite')['error'] == 'no such table: nope'
+    assert validate_sql(catalog, 'SELECT * FROM users WHERE ROWNUM <= 10', 'oracle')['status'] == 'skipped'
+    assert split_statements("-- a;b\nSELECT ';' FROM users; SELECT 1;") == ["-- a;b\nSELECT ';' FROM users", 'SELECT 1']
+
+
+def test_generate_sql_cached_by_schema_and_requirement(client):
+    fake = FakeClient([GOOD_SQL])
+    http = client(fake)
+    payload = {'table_structure': DDL, 'requirement': '统计最近30天每个用户的订单金额', 'database_type': 'mysql'}
+
+    first = http.post('/api/generate-sql', json=payload).get_json()
+    assert first['success'] and not first['data']['cached']
+    assert first['data']['validation']['status'] == 'ok'
+    assert 'SUM(o.amount)' in first['data']['sql']
+    system_prompt, user_prompt = fake.calls[0][0]['content'], fake.calls[0][1]['content']
+    assert 'MySQL' in system_prompt and '达梦' not in system_prompt
+    assert 'audit_log' not in user_prompt and 'orders' in user_prompt
+
+    # 只差空白和结尾标点的需求命中缓存；换数据库类型不命中
+    second = http.post('/api/generate-sql', json=dict(payload, requirement='  统计最近30天每个用户的订单金额。')).get_json()
+    assert second['data']['cached'] and second['data']['sql'] == first['data']['sql']
+    assert len(fake.calls) == 1
+    http.post('/api/generate-sql', json=dict(payload, database_type='postgresql'))
+    assert len(fake.calls) == 2
+
+
+def test_invalid_sql_repaired_once_and_not_cached(client):
+    fake = FakeClient([BAD_SQL, GOOD_SQL])
+    http = client(fake)
+    payload = {'table_structure': DDL, 'requirement': '每个用户的订单金额', 'database_type': 'mysql'}
+    data = http.post('/api/generate-sql', json=payload).get_json()['data']
+    assert data['validation']['status'] == 'ok' and 'user_name' in data['sql']
+    assert 'no such column: u.name' in fake.calls[1][-1]['content']
+
+    # 修正后仍然失败：返回校验错误，不缓存
+    fake = FakeClient([BAD_SQL])
+    http = client(fake)
+    payload['requirement'] = '每个用户的订单总额'
+    for _ in range(2):
+        data = http.post('/api/generate-sql', json=payload).get_json()['data']
+        assert data['validation']['status'] == 'error' and not data['cached']
+    assert len(fake.calls) == 4
+
+
+@pytest.mark.slow
+def test_benchmark_wide_schema_prompt(client):
+    """300 张表 × 40 列的表结构：原提示词（整份 DDL） 与 精简摘要 + 结果缓存 的对比（模拟模型耗时与提示词长度成正比）"""
+    ddl = '\n'.join(
+        f"CREATE TABLE biz_table_{i} (id BIGINT PRIMARY KEY, "
+        + ', '.join(f"col_{i}_{j} VARCHAR(64) COMMENT '业务字段{i}-{j}'" for j in range(40))
+        + f") COMMENT='业务表{i}';" for i in range(300)) + '\n' + DDL
+    requirements = ['统计最近30天每个用户的订单金额', '查询每个城市的用户数', '按状态统计订单数量', '查询退款订单的用户名'] * 5
+
+    legacy_client = FakeClient([GOOD_SQL], seconds_per_char=5e-7)
+    started = time.perf_counter()
+    legacy_chars = []
+    for requirement in requirements:
+        prompt = sql_generator_routes.build_sql_generation_prompt(ddl, requirement, 'mysql', 'select', True)
+        legacy_client.chat([{'role': 'system', 'content': 'x' * 1200}, {'role': 'user', 'content': prompt}])
+        legacy_chars.append(1200 + len(prompt))
+    legacy_ms = (time.perf_counter() - started) * 1000
+
+    fake = FakeClient([GOOD_SQL], seconds_per_char=5e-7)
+    http = client(fake)
+    started = time.perf_counter()
+    compact_chars = []
+    for requirement in requirements:
+        data = http.post('/api/generate-sql', json={'table_structure': ddl, 'requirement': requirement,
+                                                    'database_type': 'mysql'}).get_json()['data']
+        if not data['cached']:
+            compact_chars.append(data['schema']['prompt_chars'])
+    compact_ms = (time.perf_counter() - started) * 1000
+
+    print(f"\n[SQL SCHEMA BENCH] ddl={len(ddl)} chars legacy prompt={legacy_chars[0]} chars "
+          f"compact prompt={max(compact_chars)} chars model calls {len(requirements)} -> {len(fake.calls)} "
+          f"legacy={legacy_ms:.0f}ms compact={compact_ms:.0f}ms")
+    assert len(fake.calls) == 4
+    assert max(compact_chars) * 50 < legacy_chars[0]
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文档转换结果缓存测试：缓存键、产物放置、重启后重建索引、容量上限 LRU 淘汰与下载文件互不影响、
+按未使用时长清理、Word 转 Markdown / COSMIC 接口命中缓存、大文档重复上传基准
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+from flask import Flask
+
+from test.cosmic.test_cosmic_parser import SAMPLE_ROWS, _write_split_table
+from test.tool_test.test_docx_reader import _build_large_document
+from utils.conversion_cache import META_FILE, ConversionCache, sha256_bytes
+
+
+def _artifact(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    return path
+
+
+def test_key_covers_converter_version_input_and_options(tmp_path):
+    cache = ConversionCache(root=tmp_path / 'cache')
+    digest = sha256_bytes(b'docx')
+    key = cache.key('word_to_md', 'v1', digest, {'template': 'a', 'lang': 'zh'})
+    assert key.digest == cache.key('word_to_md', 'v1', digest, {'lang': 'zh', 'template': 'a'}).digest
+    others = [
+        cache.key('word_to_excel', 'v1', digest, {'template': 'a', 'lang': 'zh'}),
+        cache.key('word_to_md', 'v2', digest, {'template': 'a', 'lang': 'zh'}),
+        cache.key('word_to_md', 'v1', sha256_bytes(b'other'), {'template': 'a', 'lang': 'zh'}),
+        cache.key('word_to_md', 'v1', digest, {'template': 'b', 'lang': 'zh'}),
+    ]
+    assert len({key.digest} | {other.digest for other in others}) == 5
+
+
+def test_put_get_places_artifacts_and_survives_restart(tmp_path):
+    root = tmp_path / 'cache'
+    cache = ConversionCache(root=root)
+    key = cache.key('cosmic', 'v1', sha256_bytes(b'excel'))
+    source = _artifact(tmp_path, 'out.docx', 1000)
+    assert cache.get(key, {'output.docx': str(tmp_path / 'a.docx')}) is None
+    assert cache.put(key, {'module_count': 3}, {'output.docx': str(source)})
+    source.unlink()  # 缓存保存的是自己的副本
+
+    dest = tmp_path / 'downloads' / 'b.docx'
+    assert cache.get(key, {'output.docx': str(dest)}) == {'module_count': 3}
+    assert dest.stat().st_size == 1000
+    # 未缓存的产物名：按未命中处理
+    assert cache.get(key, {'missing.docx': str(tmp_path / 'c.docx')}) is None
+    assert cache.stats()['converters']['cosmic'] == {'hits': 1, 'misses': 2, 'stores': 1}
+
+    restarted = ConversionCache(root=root)
+    assert restarted.get(key) == {'module_count': 3}
+    assert restarted.stats()['entries'] == 1 and restarted.stats()['bytes'] > 1000
+
+
+def test_lru_eviction_keeps_downloads_intact(tmp_path):
+    cache = ConversionCache(root=tmp_path / 'cache', max_bytes=2900)  # 每个条目约 1000 字节产物 + meta.json
+    keys = [cache.key('excel_to_word', 'v1', sha256_bytes(str(i))) for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, files={'output.docx': str(_artifact(tmp_path, f'{i}.docx', 1000))})
+
+    download = tmp_path / 'word_output' / 'result_1700000000000.docx'
+    assert cache.get(keys[0], {'output.docx': str(download)}) is not None  # keys[0] 变为最近使用
+    cache.put(keys[2], files={'output.docx': str(_artifact(tmp_path, '2.docx', 1000))})
+
+    assert cache.get(keys[1]) is None  # 最久未使用的被淘汰
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    assert cache.stats()['evictions'] == 1
+    # 淘汰 keys[0] 后，已经发出的下载文件仍然完整
+    cache.max_bytes = 1
+    cache.sweep()
+    assert cache.stats()['entries'] == 0
+    assert download.stat().st_size == 1000
+
+    # 超过上限的单个结果不缓存
+    assert not cache.put(keys[0], files={'output.docx': str(_artifact(tmp_path, 'big.docx', 5000))})
+    assert ConversionCache(root=tmp_path / 'off', max_bytes=0).get(keys[0]) is None
+
+
+def test_rewriting_download_in_place_keeps_cached_artifact(tmp_path):
+    cache = ConversionCache(root=tmp_path / 'cache')
+    key = cache.key('document', 'v1', sha256_bytes(b'a'))
+    cache.put(key, files={'output.docx': str(_artifact(tmp_path, 'a.docx', 1000))})
+    cached = (tmp_path / 'cache' / key.digest[:2] / key.digest / 'output.docx').read_bytes()
+
+    # 接口使用固定输出路径：命中后，下一次未命中的转换在同一路径上原地重写
+    download = tmp_path / 'uploads' / 'converted_demo.docx'
+    cache.get(key, {'output.docx': str(download)})
+    with open(download, 'r+b') as f:
+        f.write(b'B' * 1000)
+
+    again = tmp_path / 'again.docx'
+    assert cache.get(key, {'output.docx': str(again)}) is not None
+    assert again.read_bytes() == cached
+
+
+def test_sweep_removes_entries_unused_for_max_age(tmp_path):
+    root = tmp_path / 'cache'
+    cache = ConversionCache(root=root)
+    old, fresh = cache.key('word_to_md', 'v1', 'a'), cache.key('word_to_md', 'v1', 'b')
+    cache.put(old, {'markdown': '# 旧'})
+    cache.put(fresh, {'markdown': '# 新'})
+    stale = time.time() - 48 * 3600
+    os.utime(root / old.digest[:2] / old.digest / META_FILE, (stale, stale))
+
+    restarted = ConversionCache(root=root)
+    removed, freed = restarted.sweep(max_age_hours=24)
+    assert removed == 1 and freed > 0
+    assert restarted.get(old) is None and restarted.get(fresh) == {'markdown': '# 新'}
+    assert not (root / old.digest[:2] / old.digest).exists()
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    fresh = ConversionCache(root=tmp_path / 'cache')
+    for module in ('routes.document_convert.word_to_md_routes', 'routes.document_convert.cosmic_routes'):
+        monkeypatch.setattr(f'{module}.conversion_cache', fresh)
+    return fresh
+
+
+def test_word_to_md_endpoint_uses_cache(tmp_path, cache, monkeypatch):
+    import routes.document_convert.word_to_md_routes as word_to_md
+
+    calls = []
+    convert = word_to_md.docx_to_markdown
+    monkeypatch.setattr(word_to_md, 'docx_to_markdown', lambda path: calls.append(path) or convert(path))
+    path = str(tmp_path / 'spec.docx')
+    _build_large_document(path, 2)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    app = Flask(__name__)
+    app.register_blueprint(word_to_md.word_to_md_bp)
+    http = app.test_client()
+
+    def upload(name):
+        return http.post('/api/word-to-md/convert', data={'file': (io.BytesIO(data), name)},
+                         content_type='multipart/form-data').get_json()
+
+    first, second = upload('需求.docx'), upload('需求-副本.docx')
+    assert len(calls) == 1
+    assert second['cached'] and second['markdown'] == first['markdown']
+    assert second['filename'] == '需求-副本.md'
+    assert '功能模块1' in first['markdown']
+
+
+def test_cosmic_convert_uses_cache(tmp_path, cache, monkeypatch):
+    import routes.document_convert.cosmic_routes as cosmic_routes
+
+    monkeypatch.setattr(cosmic_routes, 'UPLOAD_FOLDER', tmp_path / 'uploads')
+    monkeypatch.setattr(cosmic_routes, 'OUTPUT_FOLDER', tmp_path / 'downloads')
+    (tmp_path / 'uploads').mkdir()
+    (tmp_path / 'downloads').mkdir()
+    conversions = []
+    convert = cosmic_routes.excel_to_word_conversion
+    monkeypatch.setattr(cosmic_routes, 'excel_to_word_conversion',
+                        lambda *args: conversions.append(args) or convert(*args))
+    _write_split_table(tmp_path / 'uploads' / 'a_1.xlsx', SAMPLE_ROWS)
+    _write_split_table(tmp_path / 'uploads' / 'a_2.xlsx', SAMPLE_ROWS)
+
+    app = Flask(__name__)
+    app.register_blueprint(cosmic_routes.cosmic_bp)
+    http = app.test_client()
+    first = http.post('/api/cosmic/convert', json={'filename': 'a_1.xlsx'}).get_json()
+    second = http.post('/api/cosmic/convert', json={'filename': 'a_2.xlsx'}).get_json()
+
+    assert len(conversions) == 1
+    assert (second['stats'], second['module_count']) == (first['stats'], first['module_count'])
+    assert second['output_filename'] == 'a_2_COSMIC.docx'
+    response = http.get('/api/cosmic/download/a_2_COSMIC.docx')
+    assert response.status_code == 200 and response.data.startswith(b'PK')
+    response.close()
+
+
+@pytest.mark.slow
+def test_benchmark_repeated_upload(tmp_path, cache):
+    """同一份约 200 页的规范书重复上传到 /api/word-to-md/convert：重新转换 vs 命中缓存"""
+    import routes.document_convert.word_to_md_routes as word_to_md
+
+    path = str(tmp_path / 'spec.docx')
+    _build_large_document(path, 200)
+    with open(path, 'rb') as f:
+        data = f.read()
+    app = Flask(__name__)
+    app.register_blueprint(word_to_md.word_to_md_bp)
+    http = app.test_client()
+
+    def upload():
+        started = time.perf_counter()
+        result = http.post('/api/word-to-md/convert', data={'file': (io.BytesIO(data), 'spec.docx')},
+                           content_type='multipart/form-data').get_json()
+        return result, time.perf_counter() - started
+
+    first, convert_seconds = upload()
+    timings = [upload() for _ in range(5)]
+    cached_seconds = min(seconds for _, seconds in timings)
+
+    print(f"\n[CONVERSION CACHE BENCH] {len(data) // 1024}KB docx: convert={convert_seconds * 1000:.0f}ms "
+          f"cached={cached_seconds * 1000:.1f}ms")
+    assert not first.get('cached')
+    assert all(result['cached'] and result['markdown'] == first['markdown'] for result, _ in timings)
+    assert cache.stats()['converters']['word_to_md'] == {'hits': 5, 'misses': 1, 'stores': 1}
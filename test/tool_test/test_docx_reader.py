@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+docx 流式读取器测试（含目录跳过、500 页文档基准）
+"""
+import os
+import sys
+import time
+import zipfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+from docx import Document
+
+from utils.docx_reader import (DocxReader, HEADING, LIST_ITEM, PARAGRAPH, TABLE, heading_level_from_style,
+                               iter_docx)
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+STYLES_XML = f'''<?xml version="1.0" encoding="UTF-8"?>
+<w:styles {W}>
+  <w:style w:type="paragraph" w:default="1" w:styleId="a"><w:name w:val="Normal"/></w:style>
+  <w:style w:type="paragraph" w:styleId="Outline2"><w:name w:val="章节标题"/><w:basedOn w:val="a"/>
+    <w:pPr><w:outlineLvl w:val="1"/></w:pPr></w:style>
+  <w:style w:type="paragraph" w:styleId="SubOutline"><w:name w:val="章节标题子样式"/><w:basedOn w:val="Outline2"/></w:style>
+  <w:style w:type="paragraph" w:styleId="Bullets"><w:name w:val="项目符号"/>
+    <w:pPr><w:numPr><w:numId w:val="2"/></w:numPr></w:pPr></w:style>
+</w:styles>'''
+
+NUMBERING_XML = f'''<?xml version="1.0" encoding="UTF-8"?>
+<w:numbering {W}>
+  <w:abstractNum w:abstractNumId="0"><w:lvl w:ilvl="0"><w:numFmt w:val="decimal"/></w:lvl>
+    <w:lvl w:ilvl="1"><w:numFmt w:val="lowerLetter"/></w:lvl></w:abstractNum>
+  <w:abstractNum w:abstractNumId="1"><w:lvl w:ilvl="0"><w:numFmt w:val="bullet"/></w:lvl></w:abstractNum>
+  <w:num w:numId="1"><w:abstractNumId w:val="0"/></w:num>
+  <w:num w:numId="2"><w:abstractNumId w:val="1"/></w:num>
+</w:numbering>'''
+
+
+def _para(text, style=None, extra_ppr='', runs=None):
+    ppr = (f'<w:pStyle w:val="{style}"/>' if style else '') + extra_ppr
+    body = runs if runs is not None else f'<w:r><w:t xml:space="preserve">{text}</w:t></w:r>'
+    return f'<w:p><w:pPr>{ppr}</w:pPr>{body}</w:p>'
+
+
+def _write_docx(path, body_xml, styles=STYLES_XML, numbering=NUMBERING_XML):
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('word/document.xml',
+                         f'<?xml version="1.0" encoding="UTF-8"?><w:document {W}><w:body>{body_xml}</w:body></w:document>')
+        if styles:
+            archive.writestr('word/styles.xml', styles)
+        if numbering:
+            archive.writestr('word/numbering.xml', numbering)
+    return str(path)
+
+
+def test_heading_level_from_style_names():
+    assert heading_level_from_style('Heading 3') == 3
+    assert heading_level_from_style('heading 2,H2,Heading 2 Hidden') == 2
+    assert heading_level_from_style('标题 4') == 4
+    assert heading_level_from_style('三级标题') == 3
+    assert heading_level_from_style('Title') == 1
+    assert heading_level_from_style('Normal') == 0
+
+
+def test_events_follow_body_order(tmp_path):
+    doc = Document()
+    doc.add_heading('概述', 1)
+    doc.add_paragraph('第一段。')
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = '字段'
+    table.cell(0, 1).text = '说明'
+    table.cell(1, 0).merge(table.cell(1, 1)).text = '合并'
+    doc.add_paragraph('表格之后。')
+    doc.add_paragraph('要点', style='List Bullet')
+    path = tmp_path / 'order.docx'
+    doc.save(path)
+
+    events = [event for event in iter_docx(str(path)) if event.text.strip()]
+    assert [event.kind for event in events] == [HEADING, PARAGRAPH, TABLE, PARAGRAPH, LIST_ITEM]
+    assert events[0].level == 1
+    assert events[2].rows == [['字段', '说明'], ['合并', '合并']]
+    assert [event.index for event in events] == sorted(event.index for event in events)
+
+
+def test_styles_and_numbering_resolved(tmp_path):
+    body = ''.join([
+        _para('继承大纲级别', 'SubOutline'),
+        _para('编号一', extra_ppr='<w:numPr><w:ilvl w:val="1"/><w:numId w:val="1"/></w:numPr>'),
+        _para('样式带项目符号', 'Bullets'),
+        _para('取消编号', 'Bullets', '<w:numPr><w:numId w:val="0"/></w:numPr>'),
+        _para('', runs='<w:r><w:rPr><w:b/><w:i w:val="0"/></w:rPr><w:t>粗</w:t></w:r>'
+                       '<w:hyperlink><w:r><w:t>链接</w:t></w:r></w:hyperlink>'),
+    ])
+    events = list(DocxReader(_write_docx(tmp_path / 'styles.docx', body)))
+
+    assert (events[0].kind, events[0].level, events[0].style) == (HEADING, 2, '章节标题子样式')
+    assert (events[1].kind, events[1].level, events[1].numbered) == (LIST_ITEM, 1, True)
+    assert (events[2].kind, events[2].numbered) == (LIST_ITEM, False)
+    assert events[3].kind == PARAGRAPH
+    assert events[4].style == 'Normal'
+    assert events[4].text == '粗链接'
+    assert (events[4].runs[0].bold, events[4].runs[0].italic) == (True, False)
+
+
+def test_textbox_and_nested_table_stay_inside_parent(tmp_path):
+    textbox = ('<w:r><w:pict><w:txbxContent>' + _para('文本框内') + '</w:txbxContent></w:pict></w:r>')
+    nested = '<w:tbl><w:tr><w:tc>' + _para('内层') + '</w:tc></w:tr></w:tbl>'
+    body = (_para('', runs='<w:r><w:t>正文</w:t></w:r>' + textbox)
+            + '<w:tbl><w:tr><w:tc>' + _para('外层') + nested + '</w:tc></w:tr></w:tbl>'
+            + _para('结尾'))
+    events = list(iter_docx(_write_docx(tmp_path / 'nested.docx', body, numbering=None)))
+
+    assert [event.kind for event in events] == [PARAGRAPH, TABLE, PARAGRAPH]
+    assert events[0].text == '正文'
+    assert events[1].rows == [['外层']]
+
+
+def _toc_entry(text, page, begin=False, end=False):
+    field_begin = ('<w:r><w:fldChar w:fldCharType="begin"/></w:r>'
+                   '<w:r><w:instrText xml:space="preserve"> TOC \\o "1-3" \\h \\z \\u </w:instrText></w:r>'
+                   '<w:r><w:fldChar w:fldCharType="separate"/></w:r>') if begin else ''
+    field_end = '<w:r><w:fldChar w:fldCharType="end"/></w:r>' if end else ''
+    entry = (f'<w:hyperlink w:anchor="_Toc1"><w:r><w:t>{text}</w:t></w:r><w:r><w:tab/></w:r>'
+             '<w:r><w:fldChar w:fldCharType="begin"/></w:r>'
+             '<w:r><w:instrText xml:space="preserve"> PAGEREF _Toc1 \\h </w:instrText></w:r>'
+             f'<w:r><w:fldChar w:fldCharType="separate"/></w:r><w:r><w:t>{page}</w:t></w:r>'
+             '<w:r><w:fldChar w:fldCharType="end"/></w:r></w:hyperlink>')
+    return _para('', runs=field_begin + entry + field_end)
+
+
+def test_table_of_contents_is_skipped(tmp_path):
+    toc_sdt = ('<w:sdt><w:sdtPr><w:docPartObj><w:docPartGallery w:val="Table of Contents"/>'
+               '<w:docPartUnique/></w:docPartObj></w:sdtPr><w:sdtContent>'
+               + _para('目录') + _toc_entry('1 概述', 3, begin=True) + _toc_entry('2 功能需求', 5, end=True)
+               + '</w:sdtContent></w:sdt>')
+    # 没有内容控件包裹的目录域：域结果跨段落
+    bare_toc = _toc_entry('1 概述', 3, begin=True) + _toc_entry('2 功能需求', 5, end=True)
+    other_sdt = '<w:sdt><w:sdtPr><w:alias w:val="项目名称"/></w:sdtPr><w:sdtContent>' + _para('综合运维平台') + \
+                '</w:sdtContent></w:sdt>'
+    path = _write_docx(tmp_path / 'toc.docx', toc_sdt + bare_toc + other_sdt + _para('概述', 'Outline2')
+                       + _para('', runs='<w:r><w:t>见第 </w:t></w:r><w:r><w:fldChar w:fldCharType="begin"/></w:r>'
+                                    '<w:r><w:instrText> PAGEREF _Toc1 </w:instrText></w:r>'
+                                    '<w:r><w:fldChar w:fldCharType="separate"/></w:r><w:r><w:t>3</w:t></w:r>'
+                                    '<w:r><w:fldChar w:fldCharType="end"/></w:r><w:r><w:t> 页</w:t></w:r>'))
+
+    events = list(iter_docx(path))
+    assert [(event.kind, event.text) for event in events] == [
+        (PARAGRAPH, '综合运维平台'), (HEADING, '概述'), (PARAGRAPH, '见第 3 页')]
+    assert [event.index for event in events] == [0, 1, 2]
+
+
+def test_markdown_keeps_tables_in_place(tmp_path):
+    from routes.document_convert.word_to_md_routes import docx_to_markdown
+
+    doc = Document()
+    doc.add_heading('接口说明', 2)
+    doc.add_paragraph('请求参数如下：')
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = '参数'
+    table.cell(0, 1).text = '类型'
+    table.cell(1, 0).text = 'id'
+    table.cell(1, 1).text = 'int'
+    doc.add_paragraph('返回值见下节。')
+    paragraph = doc.add_paragraph()
+    paragraph.add_run('强调').bold = True
+    paragraph.add_run('与普通文字。')
+    path = tmp_path / 'md.docx'
+    doc.save(path)
+
+    markdown = docx_to_markdown(str(path))
+    assert markdown.index('## 接口说明') < markdown.index('| 参数 | 类型 |') < markdown.index('返回值见下节')
+    assert '**强调**与普通文字。' in markdown
+
+
+def test_word_to_excel_attaches_table_by_position(tmp_path):
+    from utils.word_to_excel import WordDocumentParser
+
+    doc = Document()
+    doc.add_paragraph('监控管理应用', style='Heading 5')
+    doc.add_paragraph('分级调度管理', style='Heading 6')
+    doc.add_paragraph('故障派发', style='Heading 7')
+    doc.add_paragraph('动环专业派发规则', style='Heading 8')
+    doc.add_paragraph('传输专业派发规则', style='Heading 8')
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = '传输'
+    table.cell(0, 1).text = '按站点派发'
+    path = tmp_path / 'spec.docx'
+    doc.save(path)
+
+    rows = WordDocumentParser().parse(str(path))
+    assert [row['功能点名称'] for row in rows] == ['动环专业派发规则', '传输专业派发规则']
+    assert '按站点派发' in rows[1]['功能点描述']
+    assert rows[1]['一级分类'] == '监控管理应用'
+
+
+def test_document_processor_reads_headings_and_tables(tmp_path):
+    from utils.document_processor import DocumentProcessor
+
+    doc = Document()
+    doc.add_heading('常见问题', 1)
+    doc.add_paragraph('问：如何重置密码？')
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = '入口'
+    table.cell(0, 1).text = '个人中心'
+    path = tmp_path / 'faq.docx'
+    doc.save(path)
+
+    content = DocumentProcessor(upload_folder=str(tmp_path))._read_word_file(str(path))
+    assert content.splitlines() == ['# 常见问题', '问：如何重置密码？', '入口 | 个人中心']
+
+
+def _build_large_document(path, pages: int):
+    """生成约 pages 页的规范书：每页 1 个标题、8 段正文、1 个 5x4 表格"""
+    doc = Document()
+    for page in range(pages):
+        doc.add_heading(f'3.{page // 10}.{page % 10} 功能模块{page}', 2)
+        for i in range(8):
+            doc.add_paragraph(f'功能模块{page} 第 {i} 段说明：系统应支持按条件查询、导出与审计，'
+                              f'并在处理完成后通知相关人员，保证数据一致性与可追溯。')
+        table = doc.add_table(rows=5, cols=4)
+        for r in range(5):
+            for c in range(4):
+                table.cell(r, c).text = f'R{r}C{c}'
+        doc.add_page_break()
+    doc.save(path)
+
+
+@pytest.mark.slow
+def test_benchmark_500_pages(tmp_path):
+    """500 页文档：流式读取与 python-docx 对象模型（段落 + 表格两遍遍历）的耗时对比"""
+    path = str(tmp_path / 'bench.docx')
+    _build_large_document(path, 500)
+
+    start = time.perf_counter()
+    doc = Document(path)
+    legacy_paragraphs = sum(1 for para in doc.paragraphs if para.text.strip() and para.style.name)
+    legacy_cells = sum(len(row.cells) for table in doc.tables for row in table.rows)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    paragraphs = cells = 0
+    for event in iter_docx(path):
+        if event.kind == TABLE:
+            cells += sum(len(row) for row in event.rows)
+        elif event.text.strip():
+            paragraphs += 1
+    stream_seconds = time.perf_counter() - start
+
+    print(f"\n[DOCX BENCH] pages=500 python-docx={legacy_seconds:.3f}s stream={stream_seconds:.3f}s "
+          f"speedup={legacy_seconds / stream_seconds:.1f}x")
+    assert paragraphs == legacy_paragraphs == 500 * 9
+    assert cells == legacy_cells == 500 * 20
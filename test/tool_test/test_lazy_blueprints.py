@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+蓝图延迟加载测试
+覆盖首个命中请求时导入、运行中注册替换规则表、预热、功能组过滤、重叠前缀与导入失败
+"""
+import os
+import sys
+import textwrap
+
+import pytest
+from flask import Flask, url_for
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.lazy_blueprints import BlueprintSpec, LazyBlueprintRegistry, parse_group_list
+
+BLUEPRINT_MODULE = textwrap.dedent('''
+    from flask import Blueprint
+
+    INIT_CALLS = []
+    {name}_bp = Blueprint('{name}', __name__, url_prefix='{prefix}')
+
+    @{name}_bp.route('/ping')
+    def ping():
+        return '{name}'
+
+    @{name}_bp.after_request
+    def tag(response):
+        response.headers['X-Blueprint'] = '{name}'
+        return response
+
+    def init(app):
+        INIT_CALLS.append(app.name)
+''')
+
+
+@pytest.fixture
+def fake_modules(tmp_path, monkeypatch):
+    """在临时目录生成 lazy_alpha / lazy_beta / lazy_gamma 三个蓝图模块"""
+    for name, prefix in (('alpha', '/alpha'), ('beta', '/beta'), ('gamma', '/alpha/gamma')):
+        (tmp_path / f'lazy_{name}.py').write_text(BLUEPRINT_MODULE.format(name=name, prefix=prefix))
+    (tmp_path / 'lazy_broken.py').write_text('raise ImportError("missing heavy dependency")\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield
+    for name in ('alpha', 'beta', 'gamma', 'broken'):
+        sys.modules.pop(f'lazy_{name}', None)
+
+
+def _specs():
+    return [
+        BlueprintSpec('a', 'lazy_alpha', 'alpha_bp', ('/alpha',), init='lazy_alpha:init'),
+        BlueprintSpec('b', 'lazy_beta', 'beta_bp', ('/beta',)),
+        BlueprintSpec('c', 'lazy_gamma', 'gamma_bp', ('/alpha/gamma',)),
+        BlueprintSpec('broken', 'lazy_broken', 'broken_bp', ('/broken',)),
+    ]
+
+
+def test_parse_group_list():
+    assert parse_group_list('') is None
+    assert parse_group_list('all') is None
+    assert parse_group_list(' chatbot, auth ,') == ['chatbot', 'auth']
+
+
+def test_import_on_first_matching_request(fake_modules):
+    app = Flask(__name__)
+    registry = LazyBlueprintRegistry(_specs())
+    registry.init_app(app)
+    client = app.test_client()
+
+    assert 'lazy_beta' not in sys.modules
+    assert client.get('/alpha/ping').data == b'alpha'
+    # 首个请求之后仍可注册其他蓝图
+    assert client.get('/beta/ping').data == b'beta'
+    assert sys.modules['lazy_alpha'].INIT_CALLS == [app.name]
+
+    report = {item['blueprint']: item for item in registry.profile_report()}
+    assert report['lazy_beta:beta_bp']['trigger'] == 'request /beta/ping'
+    assert 'lazy_gamma:gamma_bp' in registry.pending
+
+
+def test_loading_while_serving_swaps_url_map(fake_modules):
+    app = Flask(__name__)
+    LazyBlueprintRegistry(_specs()).init_app(app)
+    client = app.test_client()
+    assert client.get('/alpha/ping').data == b'alpha'
+
+    serving_map = app.url_map
+    serving_rules = [rule.rule for rule in serving_map.iter_rules()]
+    response = client.get('/beta/ping')
+    assert response.data == b'beta' and response.headers['X-Blueprint'] == 'beta'
+    # 正在使用的规则表不被修改，新规则在替换后的表里
+    assert app.url_map is not serving_map
+    assert [rule.rule for rule in serving_map.iter_rules()] == serving_rules
+    assert app._got_first_request
+    with app.test_request_context():
+        assert url_for('beta.ping') == '/beta/ping' and url_for('alpha.ping') == '/alpha/ping'
+
+
+def test_overlapping_prefixes_all_loaded(fake_modules):
+    app = Flask(__name__)
+    LazyBlueprintRegistry(_specs()).init_app(app)
+    assert app.test_client().get('/alpha/gamma/ping').data == b'gamma'
+
+
+def test_warmup_and_feature_groups(fake_modules):
+    app = Flask(__name__)
+    registry = LazyBlueprintRegistry(_specs())
+    registry.init_app(app, enabled_groups='a,c', warmup='c')
+
+    assert registry.loaded_groups == ['c']
+    assert not registry.is_enabled('b')
+    assert app.test_client().get('/beta/ping').status_code == 404
+    assert 'lazy_beta' not in sys.modules
+
+
+def test_eager_mode(fake_modules):
+    app = Flask(__name__)
+    registry = LazyBlueprintRegistry(_specs())
+    registry.init_app(app, lazy=False)
+    assert registry.loaded_groups == ['a', 'b', 'c']
+    assert registry.pending == []
+
+
+def test_import_failure_reported_once(fake_modules):
+    app = Flask(__name__)
+    registry = LazyBlueprintRegistry(_specs())
+    registry.init_app(app)
+    client = app.test_client()
+
+    assert client.get('/broken/ping').status_code == 404
+    assert client.get('/broken/ping').status_code == 404
+    failed = [item for item in registry.profile_report() if item['error']]
+    assert [item['blueprint'] for item in failed] == ['lazy_broken:broken_bp']
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+前端静态资源服务测试
+覆盖哈希文件识别、immutable / ETag 缓存策略、构建后预压缩与协商、懒加载索引与重新构建后重建
+"""
+import gzip
+import os
+import sys
+
+import pytest
+from flask import Flask, request
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from utils.static_assets import IMMUTABLE_CACHE_CONTROL, StaticAssetIndex, is_hashed_filename
+
+BUNDLE = 'console.log("hello");\n' * 200
+
+
+@pytest.fixture
+def dist(tmp_path):
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'index.html').write_text('<html><script src="/assets/index-B4x9Qz1a.js"></script></html>')
+    (tmp_path / 'assets' / 'index-B4x9Qz1a.js').write_text(BUNDLE)
+    (tmp_path / 'assets' / 'logo-Dk2s8fLp.png').write_bytes(b'\x89PNG fake')
+    return tmp_path
+
+
+@pytest.fixture
+def client(dist):
+    StaticAssetIndex(str(dist), precompress=True).build()  # 构建后的预压缩步骤
+    assets = StaticAssetIndex(str(dist), check_seconds=3600)
+    app = Flask(__name__)
+
+    @app.route('/<path:filename>')
+    def serve(filename):
+        return assets.send(filename, request) or ('missing', 404)
+
+    return app.test_client()
+
+
+def test_hashed_filename_detection():
+    assert is_hashed_filename('assets/index-B4x9Qz1a.js')
+    assert is_hashed_filename('assets/vendor-a1b2c3d4.css')
+    assert not is_hashed_filename('assets/vendor-element.js')
+    assert not is_hashed_filename('index.html')
+    assert not is_hashed_filename('favicon-B4x9Qz1a.ico')
+
+
+def test_build_generates_gzip_siblings(dist):
+    # 运行时索引不压缩
+    assert StaticAssetIndex(str(dist)).build() == 3
+    assert not (dist / 'assets' / 'index-B4x9Qz1a.js.gz').exists()
+
+    assets = StaticAssetIndex(str(dist), precompress=True)
+    assert assets.build() == 3
+    gz_path = dist / 'assets' / 'index-B4x9Qz1a.js.gz'
+    assert gzip.decompress(gz_path.read_bytes()).decode() == BUNDLE
+    # 小文件与二进制文件不压缩
+    assert not (dist / 'index.html.gz').exists()
+    assert not (dist / 'assets' / 'logo-Dk2s8fLp.png.gz').exists()
+    # 重建时兄弟文件不会被当作独立条目
+    assert assets.build() == 3
+
+
+def test_hashed_asset_is_immutable(client):
+    response = client.get('/assets/index-B4x9Qz1a.js')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers.get('Content-Encoding') is None
+
+
+def test_gzip_negotiation(client):
+    response = client.get('/assets/index-B4x9Qz1a.js', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Content-Type'].startswith('text/javascript')
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data).decode() == BUNDLE
+
+    identity = client.get('/assets/index-B4x9Qz1a.js', headers={'Accept-Encoding': 'gzip;q=0'})
+    assert identity.headers.get('Content-Encoding') is None
+    assert identity.headers['ETag'] != response.headers['ETag']
+
+
+def test_index_revalidates_with_etag(client):
+    response = client.get('/index.html')
+    assert response.headers['Cache-Control'] == 'no-cache'
+    etag = response.headers['ETag']
+
+    revalidated = client.get('/index.html', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+
+
+def test_unknown_file_not_served(client):
+    assert client.get('/late.js').status_code == 404
+    assert client.get('/../secret').status_code == 404
+
+
+def _touch_later(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10 ** 9))
+
+
+def test_rebuild_detected_without_restart(tmp_path):
+    dist = tmp_path / 'dist'
+    assets = StaticAssetIndex(str(dist), check_seconds=3600)
+    app = Flask(__name__)
+    with app.test_request_context('/'):
+        assert assets.send('index.html', request) is None
+
+    # 启动后才构建：未命中时发现构建目录出现
+    (dist / 'assets').mkdir(parents=True)
+    (dist / 'index.html').write_text('<html>v1</html>')
+    with app.test_request_context('/'):
+        response = assets.send('index.html', request)
+        assert response.status_code == 200
+        response.close()
+    etag_v1 = assets.lookup('index.html')['etag']
+
+    # 重新构建：新的哈希文件名未命中时重建索引，index.html 的 ETag 随内容变化
+    (dist / 'index.html').write_text('<html>v2</html>')
+    (dist / 'assets' / 'index-C7y2Lm3p.js').write_text(BUNDLE)
+    _touch_later(dist / 'assets')
+    _touch_later(dist / 'index.html')
+    with app.test_request_context('/'):
+        response = assets.send('assets/index-C7y2Lm3p.js', request)
+        assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+        response.close()
+    assert len(assets) == 2
+    assert assets.lookup('index.html')['etag'] != etag_v1
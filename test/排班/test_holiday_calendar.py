@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+节假日日历测试：日期类型判断、离线数据集、重新加载、推送调度的节假日过滤、与逐日查库的对比基准
+"""
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+
+from utils import dingtalk_push_scheduler, holiday_calendar as calendar_module
+from utils.holiday_calendar import (
+    ADJUSTED_WORKDAY, HOLIDAY, WEEKEND, WORKDAY, HolidayCalendar, load_calendar_rows, load_dataset, save_dataset
+)
+
+ROWS = [
+    {'holiday_date': date(2026, 10, 1), 'is_working_day': 0, 'description': '国庆节'},
+    {'holiday_date': '2026-10-02', 'is_working_day': 0, 'description': '国庆节'},
+    {'holiday_date': date(2026, 10, 10), 'is_working_day': 1, 'description': '国庆节后补班'},  # 周六
+    {'holiday_date': date(2026, 10, 12), 'is_working_day': 1, 'description': ''},  # 周一
+]
+
+
+def _calendar(rows=ROWS, **kwargs):
+    kwargs.setdefault('today', lambda: date(2026, 10, 19))
+    return HolidayCalendar.from_rows(rows, **kwargs)
+
+
+def test_day_kinds_and_date_types():
+    calendar = _calendar()
+    assert calendar.day_kind(date(2026, 10, 1)) == HOLIDAY
+    assert calendar.day_kind(date(2026, 10, 2)) == HOLIDAY
+    assert calendar.day_kind(date(2026, 10, 10)) == ADJUSTED_WORKDAY
+    assert calendar.day_kind(date(2026, 10, 11)) == WEEKEND
+    assert calendar.day_kind(date(2026, 10, 12)) == WORKDAY
+    # 窗口外按周末规则
+    assert calendar.day_kind(date(2030, 1, 5)) == WEEKEND
+    assert calendar.day_kind(date(2030, 1, 7)) == WORKDAY
+
+    assert calendar.date_types(date(2026, 10, 1), date(2026, 10, 12)) == {
+        date(2026, 10, 1) + timedelta(days=i): ('日常' if i in (4, 5, 6, 7, 8, 9, 11) else '节假日') for i in range(12)}
+    assert calendar.is_statutory_holiday(date(2026, 10, 1))
+    assert not calendar.is_statutory_holiday(date(2026, 10, 11))
+    assert calendar.holiday_name(date(2026, 10, 10)) == '国庆节后补班'
+
+
+def test_range_queries():
+    calendar = _calendar()
+    assert calendar.workdays(date(2026, 10, 8), date(2026, 10, 12)) == [
+        date(2026, 10, 8), date(2026, 10, 9), date(2026, 10, 10), date(2026, 10, 12)]
+    assert calendar.next_workday(date(2026, 9, 30)) == date(2026, 10, 5)
+    assert calendar.next_workday(date(2026, 10, 12), include_today=True) == date(2026, 10, 12)
+    assert calendar.stats() == {'start': '2025-01-01', 'end': '2027-12-31', 'holidays': 2, 'adjusted_workdays': 1}
+
+
+def test_bundled_dataset_used_when_database_unavailable(monkeypatch):
+    def unavailable(start_date, end_date):
+        raise ConnectionError('数据库连接失败')
+
+    monkeypatch.setattr(calendar_module, 'load_holiday_rows', unavailable)
+    calendar = HolidayCalendar(loader=load_calendar_rows, today=lambda: date(2026, 3, 1))
+    assert not calendar.is_workday(date(2026, 10, 1))
+    assert calendar.is_workday(date(2026, 10, 10))  # 周六调休上班
+    assert calendar.is_workday(date(2026, 2, 14))
+    assert not calendar.is_workday(date(2026, 2, 17))
+
+
+def test_dataset_import_round_trip(tmp_path):
+    data = {'05-01': {'holiday': True, 'name': '劳动节', 'wage': 3, 'date': '2027-05-01'},
+            '05-08': {'holiday': False, 'name': '劳动节后补班', 'after': True, 'date': '2027-05-08'}}
+    save_dataset(2027, data, str(tmp_path))
+    assert load_dataset(2027, str(tmp_path)) == data
+    assert load_dataset(2028, str(tmp_path)) is None
+
+    rows = calendar_module.load_dataset_rows(date(2027, 1, 1), date(2027, 12, 31), str(tmp_path))
+    calendar = _calendar(rows, today=lambda: date(2027, 1, 1))
+    assert calendar.day_kind(date(2027, 5, 1)) == HOLIDAY
+    assert calendar.day_kind(date(2027, 5, 8)) == ADJUSTED_WORKDAY
+
+
+def test_loaded_once_then_reloaded_after_ttl_or_refresh():
+    calls = []
+    current = {'rows': ROWS}
+
+    def loader(start_date, end_date):
+        calls.append((start_date, end_date))
+        if current['rows'] is None:
+            raise ConnectionError('数据库连接失败')
+        return current['rows']
+
+    calendar = HolidayCalendar(loader=loader, ttl=3600, today=lambda: date(2026, 10, 19))
+    for day in range(1, 31):
+        calendar.is_workday(date(2026, 10, day))
+    assert calls == [(date(2025, 1, 1), date(2027, 12, 31))]
+
+    current['rows'] = []
+    calendar.refresh()  # holidaySys.batch_sync 同步后调用
+    assert calendar.is_workday(date(2026, 10, 1)) is True
+
+    # 重新加载失败时保留已有数据
+    current['rows'] = ROWS
+    calendar.refresh()
+    current['rows'] = None
+    calendar.ttl = 0.01
+    time.sleep(0.02)
+    assert calendar.is_workday(date(2026, 10, 1)) is False
+    assert len(calls) == 4
+
+
+def test_push_scheduler_skips_non_workdays(monkeypatch):
+    monkeypatch.setattr(dingtalk_push_scheduler, 'holiday_calendar', _calendar())
+    scheduler = dingtalk_push_scheduler.DingTalkPushScheduler()
+    excluded = {'type': 'daily', 'config': {'times': ['08:00'], 'weekdays': [1, 2, 3, 4, 5], 'exclude_holidays': True}}
+
+    assert scheduler._should_skip_holiday(excluded, today=date(2026, 10, 1))
+    assert scheduler._should_skip_holiday(excluded, today=date(2026, 10, 11))
+    assert not scheduler._should_skip_holiday(excluded, today=date(2026, 10, 10))
+    assert not scheduler._should_skip_holiday(excluded, today=date(2026, 10, 12))
+    assert not scheduler._should_skip_holiday({'config': {'exclude_holidays': False}}, today=date(2026, 10, 1))
+
+
+@pytest.mark.slow
+def test_benchmark_three_years_of_lookups(tmp_path):
+    """三年日期逐日判断：逐日查 holiday_config（SQLite 本地库，已建索引）与 内存日历 的对比"""
+    conn = sqlite3.connect(str(tmp_path / 'schedule.db'))
+    conn.execute('CREATE TABLE holiday_config (id INTEGER PRIMARY KEY, holiday_date TEXT, is_working_day INT)')
+    conn.execute('CREATE INDEX idx_holiday_date ON holiday_config (holiday_date)')
+    dataset = calendar_module.load_dataset_rows(date(2026, 1, 1), date(2026, 12, 31))
+    conn.executemany('INSERT INTO holiday_config (holiday_date, is_working_day) VALUES (?, ?)',
+                     [(row['holiday_date'].isoformat(), row['is_working_day']) for row in dataset])
+    conn.commit()
+    days = [date(2025, 1, 1) + timedelta(days=i) for i in range(365 * 3)]
+
+    started = time.perf_counter()
+    legacy = []
+    for day in days:
+        found = conn.execute('SELECT is_working_day FROM holiday_config WHERE holiday_date = ?',
+                             (day.isoformat(),)).fetchone()
+        legacy.append(('日常' if found[0] == 1 else '节假日') if found else ('节假日' if day.weekday() >= 5 else '日常'))
+    legacy_ms = (time.perf_counter() - started) * 1000
+    conn.close()
+
+    loads = []
+    calendar = _calendar(dataset)
+    loader = calendar.loader
+    calendar.loader = lambda start_date, end_date: loads.append(start_date) or loader(start_date, end_date)
+    calendar.date_type(days[0])  # 首次加载不计入
+    started = time.perf_counter()
+    cached = [calendar.date_type(day) for day in days]
+    calendar_ms = (time.perf_counter() - started) * 1000
+
+    print(f"\n[HOLIDAY CALENDAR BENCH] days={len(days)} per-day query={legacy_ms:.1f}ms calendar={calendar_ms:.2f}ms")
+    assert cached == legacy
+    assert len(loads) == 1  # 三年逐日判断只加载一次
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+排班读模型测试：窗口预取、排序、概况、Markdown 记忆化与失效
+"""
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+
+from utils.roster_read_model import RosterReadModel
+
+
+def _rows(start, days, slots=('13:30～17:30', '8:00～12:00', '17:30～21:30')):
+    rows = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        for slot in slots:
+            rows.append({'date': day, 'time_slot': slot, 'staff_name': f'辅{offset}', 'is_main': 0, 'staff_type': 'B'})
+            rows.append({'date': day, 'time_slot': slot, 'staff_name': f'主{offset}', 'is_main': 1, 'staff_type': 'A'})
+    return rows
+
+
+class CountingLoader:
+    """模拟数据库查询，记录调用次数"""
+
+    def __init__(self, rows, delay=0.0):
+        self.rows = rows
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, start, end):
+        self.calls.append((start, end))
+        time.sleep(self.delay)
+        return [row for row in self.rows if start <= row['date'].strftime('%Y-%m-%d') <= end]
+
+
+@pytest.fixture
+def loader():
+    return CountingLoader(_rows(date(2026, 3, 2), 14))
+
+
+def test_prefetch_serves_sub_ranges_from_one_query(loader):
+    model = RosterReadModel(loader, prefetch_days=7)
+    assert len(model.get_records('2026-03-02', '2026-03-02')) == 6
+    assert loader.calls == [('2026-03-02', '2026-03-08')]
+
+    assert len(model.get_records('2026-03-03', '2026-03-08')) == 36
+    assert len(loader.calls) == 1
+    assert model.stats()['window_hits'] == 1
+
+
+def test_records_sorted_by_slot_order_and_main_first(loader):
+    model = RosterReadModel(loader)
+    rows = model.get_records('2026-03-02', '2026-03-02')
+    assert [row['time_slot'] for row in rows[::2]] == ['8:00～12:00', '13:30～17:30', '17:30～21:30']
+    assert [row['is_main'] for row in rows[:2]] == [1, 0]
+
+
+def test_summary_counts_and_distinct_slots(loader):
+    model = RosterReadModel(loader)
+    count, details = model.summary('2026-03-02', '2026-03-03')
+    assert count == 12
+    assert len(details) == 6
+    assert details[0]['date'] == date(2026, 3, 2)
+    assert model.summary('2026-04-01', '2026-04-02') == (0, [])
+
+
+def test_render_markdown_memoized_per_range_and_slot_filter(loader):
+    model = RosterReadModel(loader)
+    first = model.render_markdown('2026-03-02', '2026-03-03', ['8:00～12:00'])
+    for _ in range(10):
+        assert model.render_markdown('2026-03-02', '2026-03-03', ('8:00～12:00',)) is first
+
+    assert model.stats()['renders'] == 1
+    assert first.count('- **8:00～12:00**: 主0、辅0') == 1
+    assert '13:30～17:30' not in first
+    assert '[查看完整排班](' in first
+
+    full = model.render_markdown('2026-03-02', '2026-03-03')
+    assert full.index('8:00～12:00') < full.index('13:30～17:30') < full.index('17:30～21:30')
+    assert model.render_markdown('2026-05-01', '2026-05-02') is None
+
+
+def test_relative_date_labels():
+    today = date.today()
+    model = RosterReadModel(CountingLoader(_rows(today - timedelta(days=1), 3)))
+    content = model.render_markdown(today - timedelta(days=1), today + timedelta(days=1))
+    assert '**昨天**' in content and '**今天**' in content and '**明天**' in content
+
+
+def test_invalidate_drops_only_overlapping_ranges(loader):
+    model = RosterReadModel(loader, prefetch_days=1)
+    model.render_markdown('2026-03-02', '2026-03-03')
+    model.render_markdown('2026-03-10', '2026-03-11')
+    assert len(loader.calls) == 2
+
+    model.invalidate('2026-03-03', '2026-03-04')
+    model.render_markdown('2026-03-10', '2026-03-11')
+    assert len(loader.calls) == 2
+    model.render_markdown('2026-03-02', '2026-03-03')
+    assert len(loader.calls) == 3
+
+    model.invalidate()
+    model.get_records('2026-03-10', '2026-03-11')
+    assert len(loader.calls) == 4
+
+
+def test_ttl_expires_windows(loader):
+    model = RosterReadModel(loader, ttl=-1)
+    model.get_records('2026-03-02', '2026-03-02')
+    model.get_records('2026-03-02', '2026-03-02')
+    assert len(loader.calls) == 2
+
+
+def test_ttl_expires_rendered_markdown():
+    # 其他进程写入的排班（包括原先为空的范围）在窗口过期后可见
+    loader = CountingLoader([])
+    model = RosterReadModel(loader, ttl=-1)
+    assert model.render_markdown('2026-03-02', '2026-03-03') is None
+    loader.rows = _rows(date(2026, 3, 2), 2)
+    content = model.render_markdown('2026-03-02', '2026-03-03')
+    assert content is not None and '主0' in content
+    loader.rows = [dict(row, staff_name='替班') if row['is_main'] else row for row in loader.rows]
+    assert '替班' in model.render_markdown('2026-03-02', '2026-03-03')
+    assert model.stats()['renders'] == 3
+
+
+def test_concurrent_misses_load_once():
+    loader = CountingLoader(_rows(date(2026, 3, 2), 7), delay=0.05)
+    model = RosterReadModel(loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(len(model.get_records('2026-03-02', '2026-03-08'))))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [42] * 8
+    assert len(loader.calls) == 1
+
+
+def test_loader_failure_is_not_cached(loader):
+    calls = []
+
+    def flaky(start, end):
+        calls.append(start)
+        if len(calls) == 1:
+            raise ConnectionError("数据库连接失败")
+        return loader(start, end)
+
+    model = RosterReadModel(flaky)
+    with pytest.raises(ConnectionError):
+        model.get_records('2026-03-02', '2026-03-02')
+    assert len(model.get_records('2026-03-02', '2026-03-02')) == 6
+
+
+@pytest.mark.slow
+def test_benchmark_push_and_page_reads():
+    """20 个推送配置推送同一周期 + 200 次页面查询：逐次查库 与 读模型 的查询次数对比"""
+    db_latency = 0.002
+    loader = CountingLoader(_rows(date(2026, 3, 2), 31), delay=db_latency)
+    model = RosterReadModel(loader)
+
+    start = time.perf_counter()
+    for _ in range(20):
+        model.render_markdown('2026-03-02', '2026-03-08', ['8:00～12:00', '13:30～17:30'])
+    for index in range(200):
+        day = f'2026-03-{2 + index % 5:02d}'
+        model.get_records(day, '2026-03-08')
+        model.summary(day, '2026-03-08')
+    seconds = time.perf_counter() - start
+
+    legacy_queries = 20 + 200 * 3  # 每次推送一次查询；页面查询 1 次 + 检查 2 次
+    print(f"\n[ROSTER BENCH] legacy_queries={legacy_queries} (≈{legacy_queries * db_latency:.2f}s) "
+          f"read_model_queries={len(loader.calls)} ({seconds:.3f}s) renders={model.stats()['renders']}")
+    assert len(loader.calls) <= 5
+    assert model.stats()['renders'] == 1
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+排班求解器测试：请假与连续值班约束、均衡目标、整段生成的查库次数、入库失败不推进轮换与基准
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, time as dt_time, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import pytest
+
+from routes.排班.paiBanNew_v2 import RosterGenerator
+from utils.holiday_calendar import HolidayCalendar
+from utils.roster_solver import LocalSearchRosterSolver, RosterProblem, get_solver, roster_metrics
+
+START = date(2026, 3, 2)  # 周一
+
+
+def _problem(days=28, staffs=5, leaves=None, history=None, max_consecutive=1):
+    names = [f'员工{i}' for i in range(staffs)]
+    day_list = [START + timedelta(days=i) for i in range(days)]
+    day_types = {day: '节假日' if day.weekday() >= 5 else '日常' for day in day_list}
+    leaves = leaves or {}
+    candidates = {day: [name for name in names if name not in leaves.get(day, ())] for day in day_list}
+    return RosterProblem(day_list, day_types, candidates, fallback='核心', history=history,
+                         max_consecutive=max_consecutive)
+
+
+def _solver(**kwargs):
+    kwargs.setdefault('time_budget', 2)
+    return LocalSearchRosterSolver(**kwargs)
+
+
+def test_balanced_horizon_reaches_lower_bound():
+    problem = _problem(days=28, staffs=4)
+    solution = _solver().solve(problem)
+
+    metrics = solution.metrics
+    assert metrics['optimal']
+    assert (metrics['load_min'], metrics['load_max']) == (7, 7)
+    assert (metrics['holiday_min'], metrics['holiday_max']) == (2, 2)
+    assert metrics['consecutive_violations'] == 0
+
+
+def test_leave_is_respected_and_load_rebalanced():
+    leave_days = {START + timedelta(days=i): {'员工0'} for i in range(10)}
+    problem = _problem(days=30, staffs=3, leaves=leave_days)
+    solution = _solver().solve(problem)
+
+    assert all(solution.assignment[day] != '员工0' for day in leave_days)
+    assert solution.metrics['load_max'] - solution.metrics['load_min'] <= 1
+    assert solution.metrics['consecutive_violations'] == 0
+
+
+def test_history_counts_towards_consecutive_days():
+    problem = _problem(days=7, staffs=3, history=['员工0'])
+    solution = _solver().solve(problem)
+    assert solution.assignment[START] != '员工0'
+
+    relaxed = _problem(days=6, staffs=2, max_consecutive=3)
+    metrics = _solver().solve(relaxed).metrics
+    assert metrics['consecutive_violations'] == 0
+    assert metrics['load_min'] == metrics['load_max'] == 3
+
+
+def test_day_without_candidates_falls_back_to_core_staff():
+    problem = _problem(days=3, staffs=2, leaves={START + timedelta(days=1): {'员工0', '员工1'}})
+    solution = _solver().solve(problem)
+    assert solution.assignment[START + timedelta(days=1)] == '核心'
+    assert solution.metrics['unassigned_days'] == 1
+
+
+def test_same_seed_and_iterations_are_deterministic():
+    problem = _problem(days=60, staffs=7, leaves={START + timedelta(days=i): {f'员工{i % 7}'} for i in range(0, 60, 3)})
+    first = _solver(max_iterations=2000, time_budget=30).solve(problem).assignment
+    second = _solver(max_iterations=2000, time_budget=30).solve(problem).assignment
+    assert first == second
+
+
+def test_unknown_solver_name():
+    assert isinstance(get_solver('local_search'), LocalSearchRosterSolver)
+    with pytest.raises(ValueError):
+        get_solver('ilp')
+
+
+class FakeRosterDB:
+    """按 SQL 片段返回固定数据的 RosterDB，记录查询与写入次数"""
+
+    def __init__(self, staffs, leaves=()):
+        self.staffs = staffs
+        self.leaves = list(leaves)
+        self.queries = []
+        self.executes = []
+        self.batches = []
+
+    def query(self, sql, params=()):
+        self.queries.append(sql)
+        if "staff_type = 'CORE'" in sql:
+            return [{'staff_name': '核心'}]
+        if "staff_type = 'TEST'" in sql:
+            return [{'staff_name': name} for name in self.staffs]
+        if 'FROM rotation_config' in sql:
+            order = ','.join(self.staffs + ['核心'])
+            return [{'time_slot_type': slot_type, 'rotation_order': order, 'current_index': 0}
+                    for slot_type in ('日常 8-9', '节假日')]
+        if 'FROM leave_record' in sql:
+            return self.leaves
+        return []
+
+    def execute(self, sql, params=()):
+        self.executes.append((sql, params))
+        return True
+
+    def execute_many(self, sql, params_list):
+        self.batches.append(list(params_list))
+        return True
+
+
+def test_generator_solves_whole_horizon_with_constant_queries():
+    staffs = ['甲', '乙', '丙', '丁']
+    leaves = [
+        {'staff_name': '甲', 'leave_date': START, 'is_full_day': 1, 'start_time': None, 'end_time': None},
+        {'staff_name': '乙', 'leave_date': START, 'is_full_day': 0,
+         'start_time': timedelta(hours=8), 'end_time': timedelta(hours=12)},
+    ]
+    holidays = [{'holiday_date': START + timedelta(days=2), 'is_working_day': 0}]
+    end = START + timedelta(days=27)
+
+    db = FakeRosterDB(staffs, leaves)
+    calendar = HolidayCalendar.from_rows(holidays, today=lambda: START)
+    generator = RosterGenerator(db, solver='local_search', calendar=calendar)
+    setup_queries = len(db.queries)
+    generator.generate_roster(START, end)
+
+    # 节假日读内存日历；请假、前一天排班各查一次（另有刷新人员与轮换配置），与天数无关
+    assert len(db.queries) - setup_queries <= 5
+    assert not [sql for sql in db.queries if 'holiday_config' in sql]
+    assert len(db.batches) == 1
+    rows = db.batches[0]
+    first_day = {(row[1], row[2]) for row in rows if row[0] == START}
+    # 与逐日生成一致：当天有任何请假记录的人员不参与当天排班
+    assert not {staff for _, staff in first_day} & {'甲', '乙'}
+    assert {staff for slot, staff in first_day if slot == '13:30～18:00'} == {'丙', '丁', '核心'}
+
+    holiday_rows = [row for row in rows if row[0] == START + timedelta(days=2)]
+    assert {row[1] for row in holiday_rows} == {'8:00～12:00', '13:30～17:30', '17:30～21:30'}
+    assert len({row[2] for row in holiday_rows}) == 1
+
+    duty = [next(row[2] for row in rows if row[0] == START + timedelta(days=i) and row[1] in ('8:00～9:00', '8:00～12:00'))
+            for i in range(28)]
+    assert all(duty[i] != duty[i + 1] for i in range(27))
+    assert [params for sql, params in db.executes if 'current_index' in sql]
+
+
+def test_solver_is_opt_in_and_leave_times_parsed():
+    assert RosterGenerator(FakeRosterDB(['甲'])).solver == 'queue'
+    assert [RosterGenerator._to_time(value) for value in ('9:00:00', '09:30', '9:00', timedelta(hours=18))] == [
+        dt_time(9, 0), dt_time(9, 30), dt_time(9, 0), dt_time(18, 0)]
+    with pytest.raises(ValueError):
+        RosterGenerator._to_time('上午')
+
+    # 字符串形式的 TIME（含秒、不补零）同样按时段匹配
+    leaves = [{'staff_name': '乙', 'leave_date': START, 'is_full_day': 0, 'start_time': '8:00:00', 'end_time': '9:00:00'},
+              {'staff_name': '丙', 'leave_date': START, 'is_full_day': 1, 'start_time': None, 'end_time': None}]
+    generator = RosterGenerator(FakeRosterDB(['甲', '乙', '丙'], leaves))
+    generator._leave_index = generator._load_leave_index(START, START)
+    assert generator._leave_staffs_from_index(START, '8:00～9:00') == {'乙', '丙'}
+    assert generator._leave_staffs_from_index(START, '9:00～12:00') == {'丙'}
+    assert generator._leave_staffs_from_index(START) == {'乙', '丙'}
+    # 当天没有请假记录时不回退查库
+    assert generator._get_leave_staffs(START + timedelta(days=1)) == set()
+
+
+def test_solver_and_queue_share_leave_rule():
+    """只请了下午假的人：逐日轮换与整段求解都不排当天值班"""
+    leaves = [{'staff_name': '甲', 'leave_date': START, 'is_full_day': 0,
+               'start_time': timedelta(hours=13, minutes=30), 'end_time': timedelta(hours=18)}]
+    calendar = HolidayCalendar.from_rows([], today=lambda: START)
+    duty = {}
+    for solver in ('queue', 'local_search'):
+        db = FakeRosterDB(['甲', '乙', '丙'], leaves)
+        RosterGenerator(db, solver=solver, calendar=calendar).generate_roster(START, START)
+        rows = db.batches[0] if db.batches else [params for sql, params in db.executes if 'INSERT INTO roster' in sql]
+        duty[solver] = next(row[2] for row in rows if row[1] == '8:00～9:00')
+    assert duty['queue'] != '甲' and duty['local_search'] != '甲'
+
+
+class FailingBatchDB(FakeRosterDB):
+    def execute_many(self, sql, params_list):
+        super().execute_many(sql, params_list)
+        return False
+
+
+def test_rotation_not_advanced_when_insert_fails():
+    db = FailingBatchDB(['甲', '乙', '丙'])
+    calendar = HolidayCalendar.from_rows([], today=lambda: START)
+    generator = RosterGenerator(db, solver='local_search', calendar=calendar)
+    generator.generate_roster(START, START + timedelta(days=6))
+
+    assert len(db.batches) == 1
+    assert not [params for sql, params in db.executes if 'current_index' in sql]
+    assert {config['index'] for config in generator.rotation_config.values()} == {0}
+
+
+def _rotation_queue(problem):
+    """原逐日轮换队列：从当前位置起选第一个可用且前一天没值班的人"""
+    order = sorted({staff for day in problem.days for staff in problem.candidates[day]})
+    index = 0
+    previous = problem.history[-1] if problem.history else None
+    assignment = {}
+    for day in problem.days:
+        available = problem.candidates[day]
+        chosen = None
+        for offset in range(len(order)):
+            staff = order[(index + offset) % len(order)]
+            if staff in available and staff != previous:
+                chosen, index = staff, (index + offset + 1) % len(order)
+                break
+        assignment[day] = chosen or (available[0] if available else problem.fallback)
+        previous = assignment[day]
+    return assignment
+
+
+@pytest.mark.slow
+def test_benchmark_fifty_staff_one_year():
+    """50 人 × 365 天（约 8% 人日请假，集中在部分人员）：轮换队列 与 整段求解 的公平性对比"""
+    rng = random.Random(7)
+    names = [f'员工{i}' for i in range(50)]
+    days = [date(2026, 1, 1) + timedelta(days=i) for i in range(365)]
+    leaves = {day: {name for name in names[:20] if rng.random() < 0.2} for day in days}
+    problem = RosterProblem(days, {day: '节假日' if day.weekday() >= 5 else '日常' for day in days},
+                            {day: [name for name in names if name not in leaves[day]] for day in days},
+                            fallback='核心')
+
+    baseline = roster_metrics(problem, _rotation_queue(problem))
+    start = time.perf_counter()
+    solution = LocalSearchRosterSolver(time_budget=5).solve(problem)
+    seconds = time.perf_counter() - start
+
+    metrics = solution.metrics
+    print(f"\n[ROSTER SOLVER BENCH] staff=50 days=365 solve={seconds:.2f}s iterations={metrics['iterations']} "
+          f"queue load={baseline['load_min']}~{baseline['load_max']} (σ={baseline['load_stddev']}) "
+          f"holiday={baseline['holiday_min']}~{baseline['holiday_max']} (σ={baseline['holiday_stddev']}) | "
+          f"solver load={metrics['load_min']}~{metrics['load_max']} (σ={metrics['load_stddev']}) "
+          f"holiday={metrics['holiday_min']}~{metrics['holiday_max']} (σ={metrics['holiday_stddev']})")
+    assert metrics['consecutive_violations'] == 0
+    assert metrics['load_max'] - metrics['load_min'] <= 1
+    assert metrics['holiday_stddev'] <= baseline['holiday_stddev']
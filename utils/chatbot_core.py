@@ -5,9 +5,13 @@
 包含问题解析、意图识别、答案生成等功能
 """
 import logging
-from typing import List, Dict, Optional, Tuple
+import time
+from typing import List, Dict, Optional, Tuple, Generator
 import json
 
+from utils.conversation_store import ConversationStore
+from utils.query_understanding import QueryUnderstanding
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,6 +37,12 @@ class ChatbotCore:
         if not knowledge_base:
             from models.knowledge_base import knowledge_base_manager
             self.knowledge_base = knowledge_base_manager
+        
+        # 问题理解：缓存 -> 规则词典 -> 大模型兜底
+        self.query_understanding = QueryUnderstanding(self.knowledge_base, self._parse_query_with_llm)
+        
+        # 会话历史：内存上下文窗口 + 批量异步写库
+        self.conversation_store = ConversationStore(self.knowledge_base)
     
     def process_query(self, query: str, session_id: str = None, 
                      context: List[Dict] = None, domain_id: int = None) -> Dict:
@@ -54,7 +64,7 @@ class ChatbotCore:
             # 1. 问题解析与意图识别
             logger.info(f"[CHATBOT_CORE] Step 1: 问题解析与意图识别")
             parsed_query = self._parse_query(query)
-            logger.info(f"[CHATBOT_CORE] 解析结果：topic={parsed_query.get('topic', 'unknown')}, keywords={parsed_query.get('keywords', [])}")
+            logger.info(f"[CHATBOT_CORE] 解析结果：topic={parsed_query.get('topic', 'unknown')}, keywords={parsed_query.get('keywords', [])}, parser={parsed_query.get('parser')}")
             
             # 2. 检索知识库（支持领域过滤）
             logger.info(f"[CHATBOT_CORE] Step 2: 检索知识库")
@@ -114,7 +124,7 @@ class ChatbotCore:
     
     def _parse_query(self, query: str) -> Dict:
         """
-        解析用户问题
+        解析用户问题（先查缓存与规则词典，置信度不足时才调用 AI）
         
         Args:
             query: 用户问题
@@ -122,7 +132,18 @@ class ChatbotCore:
         Returns:
             解析结果
         """
-        # 使用 AI 进行问题解析
+        return self.query_understanding.parse(query)
+    
+    def _parse_query_with_llm(self, query: str) -> Optional[Dict]:
+        """
+        使用 AI 解析用户问题
+        
+        Args:
+            query: 用户问题
+            
+        Returns:
+            解析结果，失败时返回 None
+        """
         prompt = f"""
 请分析以下的用户问题，提取关键信息：
 1. 问题的主题/领域
@@ -157,10 +178,10 @@ class ChatbotCore:
                 return parsed
             else:
                 logger.warning(f"[CHATBOT_PARSE] ⚠️ 未找到 JSON 格式")
-                return {'topic': 'unknown', 'keywords': [], 'question_type': 'general'}
+                return None
         except Exception as e:
             logger.warning(f"[CHATBOT_PARSE] ❌ 问题解析失败：{e}")
-            return {'topic': 'unknown', 'keywords': [], 'question_type': 'general'}
+            return None
     
     def _retrieve_knowledge(self, query: str, top_k: int = 5, domain_id: int = None) -> List[Dict]:
         """
@@ -205,6 +226,24 @@ class ChatbotCore:
         Returns:
             (答案，使用的上下文)
         """
+        messages = self._build_answer_messages(query, retrieved_faqs, context)
+        
+        logger.info(f"[CHATBOT_GEN] 正在调用 AI 生成答案...")
+        logger.info(f"[CHATBOT_GEN] 消息总数：{len(messages)}")
+        
+        try:
+            # 调用 AI 生成答案
+            answer = self.ollama_client.chat(messages)
+            logger.info(f"[CHATBOT_GEN] ✅ AI 响应长度：{len(answer)} 字符")
+            logger.info(f"[CHATBOT_GEN] AI 回答预览：{answer.strip()[:200]}..." if len(answer) > 200 else f"[CHATBOT_GEN] AI 回答：{answer.strip()}")
+            return answer.strip(), retrieved_faqs[:2]  # 返回使用的参考
+        except Exception as e:
+            logger.error(f"[CHATBOT_GEN] ❌ AI 生成答案失败：{e}", exc_info=True)
+            return "抱歉，我暂时无法回答这个问题。", []
+    
+    def _build_answer_messages(self, query: str, retrieved_faqs: List[Dict],
+                               context: List[Dict]) -> List[Dict]:
+        """构建生成答案的消息列表（系统提示 + 最近上下文 + 知识库参考 + 用户问题）"""
         # 构建提示词
         system_prompt = """你是一个专业的企业智能客服助手。请根据提供的知识库内容和对话上下文，为用户问题生成准确、简洁、友好的回答。
 
@@ -236,38 +275,95 @@ class ChatbotCore:
         # 添加用户问题
         user_message = f"用户问题：{query}{kb_context}"
         messages.append({"role": "user", "content": user_message})
+        return messages
+    
+    def stream_query(self, query: str, session_id: str = None, context: List[Dict] = None,
+                     domain_id: int = None, cancel_event=None) -> Generator[Tuple[str, Dict], None, None]:
+        """
+        流式处理用户查询，依次产生 (事件名, 数据)：
         
-        logger.info(f"[CHATBOT_GEN] 正在调用 AI 生成答案...")
-        logger.info(f"[CHATBOT_GEN] 消息总数：{len(messages)}")
+        - retrieval：问题解析与知识库检索结果，在模型开始生成之前发出
+        - queued：模型请求仍在排队（定期发出，调用方借此发现客户端断开）
+        - token：模型的增量文本（命中知识库时为完整答案）
+        - done：完整答案，对话历史在此时一次性写入
+        - error：处理失败
+        
+        调用方关闭生成器（客户端断开）或设置 cancel_event 时取消上游生成，本轮对话不写入历史。
         
+        Args:
+            query: 用户问题
+            session_id: 会话 ID
+            context: 对话上下文
+            domain_id: 专业领域 ID（可选）
+            cancel_event: threading.Event，置位后停止生成
+        """
+        started = time.perf_counter()
         try:
-            # 调用 AI 生成答案
-            answer = self.ollama_client.chat(messages)
-            logger.info(f"[CHATBOT_GEN] ✅ AI 响应长度：{len(answer)} 字符")
-            logger.info(f"[CHATBOT_GEN] AI 回答预览：{answer.strip()[:200]}..." if len(answer) > 200 else f"[CHATBOT_GEN] AI 回答：{answer.strip()}")
-            return answer.strip(), retrieved_faqs[:2]  # 返回使用的参考
+            parsed_query = self._parse_query(query)
+            retrieved_faqs = self._retrieve_knowledge(query, top_k=5, domain_id=domain_id)
         except Exception as e:
-            logger.error(f"[CHATBOT_GEN] ❌ AI 生成答案失败：{e}", exc_info=True)
-            return "抱歉，我暂时无法回答这个问题。", []
+            logger.error(f"[CHATBOT_STREAM] ❌ 检索失败：{e}", exc_info=True)
+            yield 'error', {'error': str(e), 'answer': "抱歉，处理您的请求时出现错误。"}
+            return
+        
+        best_faq = retrieved_faqs[0] if retrieved_faqs and retrieved_faqs[0].get('similarity_score', 0) > 0.8 else None
+        source = 'knowledge_base' if best_faq else 'ai_generated'
+        yield 'retrieval', {
+            'source': source,
+            'parsed_query': parsed_query,
+            'retrieved_faqs': retrieved_faqs[:3],
+            'domain_id': domain_id
+        }
+        
+        if best_faq:
+            answer = best_faq['answer']
+            self.knowledge_base.increment_faq_view(best_faq['id'])
+            yield 'token', {'text': answer}
+        else:
+            messages = self._build_answer_messages(query, retrieved_faqs, context or [])
+            parts = []
+            tokens = self.ollama_client.chat_stream(messages, cancel_event=cancel_event, heartbeat=True)
+            try:
+                for token in tokens:
+                    if not token:
+                        yield 'queued', {'waited_ms': round((time.perf_counter() - started) * 1000)}
+                        continue
+                    if not parts:
+                        logger.info(f"[CHATBOT_STREAM] 首个 token 耗时：{(time.perf_counter() - started) * 1000:.0f}ms")
+                    parts.append(token)
+                    yield 'token', {'text': token}
+            except Exception as e:
+                logger.error(f"[CHATBOT_STREAM] ❌ AI 生成答案失败：{e}")
+                yield 'error', {'error': str(e), 'answer': "抱歉，我暂时无法回答这个问题。"}
+                return
+            finally:
+                # 生成器被关闭（客户端断开）时同样会执行，断开上游连接
+                tokens.close()
+            
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info(f"[CHATBOT_STREAM] 生成已取消，已输出 {len(parts)} 段，不保存对话")
+                return
+            answer = ''.join(parts).strip()
+        
+        if session_id:
+            self._save_conversation(session_id, query, answer, retrieved_faqs, source)
+        
+        logger.info(f"[CHATBOT_STREAM] ✅ 流式回答完成，source={source}，总耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
+        yield 'done', {
+            'answer': answer,
+            'source': source,
+            'session_id': session_id
+        }
     
     def _save_conversation(self, session_id: str, query: str, answer: str,
                           retrieved_faqs: List[Dict], source: str) -> None:
-        """保存对话历史"""
+        """保存对话历史（进入上下文窗口，由后台批量写库）"""
         try:
-            # 保存用户问题
             related_ids = [faq['id'] for faq in retrieved_faqs] if retrieved_faqs else None
-            self.knowledge_base.add_conversation_message(
-                session_id=session_id,
-                message_role='user',
-                message_content=query,
-                related_faq_ids=None
-            )
-            
-            # 保存 AI 回答
-            self.knowledge_base.add_conversation_message(
+            self.conversation_store.append_turn(
                 session_id=session_id,
-                message_role='assistant',
-                message_content=answer,
+                question=query,
+                answer=answer,
                 related_faq_ids=related_ids
             )
         except Exception as e:
@@ -282,23 +378,13 @@ class ChatbotCore:
             max_turns: 最大轮数
             
         Returns:
-            格式化的对话历史
+            格式化的对话历史（活跃会话直接从内存读取）
         """
-        history = self.knowledge_base.get_conversation_history(session_id, limit=max_turns * 2)
-        
-        # 转换为 OpenAI 格式
-        messages = []
-        for msg in history:
-            messages.append({
-                "role": msg['role'],
-                "content": msg['content']
-            })
-        
-        return messages
+        return self.conversation_store.get_context(session_id, max_messages=max_turns * 2)
     
     def clear_session(self, session_id: str) -> bool:
         """清空会话"""
-        return self.knowledge_base.clear_conversation_history(session_id)
+        return self.conversation_store.clear(session_id)
 
 
 # 全局客服核心实例
@@ -9,6 +9,8 @@ from threading import Thread
 from flask import current_app
 import logging
 
+from utils.conversion_cache import conversion_cache
+
 # 配置日志
 logger = logging.getLogger(__name__)
 
@@ -89,4 +91,10 @@ def run_cleanup_loop(app, cleanup_interval: int = INTERVAL_SECONDS, retention_ho
 
             if in_del + out_del > 0:
                 logger.info(f"[CLEANUP_DONE] Excel: {in_del} files | Word: {out_del} files")
+
+        # 转换结果缓存：命中时产物是复制到下载目录的，这里只按未使用时长和容量上限淘汰缓存本身；
+        # 未使用时长不短于上传文件的保留时间
+        cache_del, cache_freed = conversion_cache.sweep(max(conversion_cache.max_age_hours, retention_hours))
+        if cache_del > 0:
+            logger.info(f"[CLEANUP_DONE] Conversion cache: {cache_del} entries | {cache_freed} bytes")
         time.sleep(cleanup_interval)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行时配置存储（内存快照 + 版本号 + 变更通知）
+
+- 配置第一次使用时从数据源（数据库表、JSON 文件）整体加载为内存快照，之后的读取是字典查找
+- 每次变更（本进程写入，或检测到其他进程改了数据源）版本号加一并生成新的快照（写时复制，
+  读取方拿到的快照不会被修改）；订阅者只在版本号变化且涉及其关心的键时收到通知
+- 批量更新由数据源在一次事务 / 一次文件替换中完成，失败时快照与版本号都不变
+- 其他进程的修改靠数据源的指纹（如行数 + 最后更新时间、文件修改时间）发现，
+  最多每 CONFIG_STORE_CHECK_SECONDS 秒检查一次
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 检查数据源是否被其他进程修改的间隔（秒），0 表示只在本进程写入或显式 refresh 时更新
+CONFIG_STORE_CHECK_SECONDS = float(os.getenv('CONFIG_STORE_CHECK_SECONDS', '10'))
+
+_MISSING = object()
+
+
+class JsonFileSource:
+    """
+    JSON 文件数据源
+
+    写入先写临时文件再 os.replace，读取方不会看到写了一半的文件
+    """
+
+    def __init__(self, path, defaults: Dict = None):
+        self.path = str(path)
+        self.defaults = dict(defaults or {})
+
+    def load(self) -> Dict:
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.warning(f"[CONFIG_STORE] 读取配置文件失败，使用默认配置：{self.path}，{e}")
+        return dict(self.defaults)
+
+    def save(self, changes: Dict, current: Dict, **kwargs) -> Dict:
+        merged = dict(current)
+        merged.update(changes)
+        directory = os.path.dirname(self.path) or '.'
+        fd, tmp_path = tempfile.mkstemp(prefix='.config_', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(merged, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return dict(changes)
+
+    def fingerprint(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+
+class ConfigStore:
+    """带版本号的配置快照"""
+
+    def __init__(self, name: str, source, check_seconds: float = CONFIG_STORE_CHECK_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            name: 名称（日志与统计用）
+            source: 数据源，提供 load() -> dict、save(changes, current, **kwargs) -> dict（返回写入后的值），
+                    可选 fingerprint()（用于发现其他进程的修改）
+            check_seconds: 检查数据源指纹的间隔
+        """
+        self.name = name
+        self.source = source
+        self.check_seconds = check_seconds
+        self._clock = clock
+        self._values: Optional[Dict] = None
+        self._fingerprint = None
+        self._next_check = 0.0
+        self._version = 0
+        self._lock = threading.RLock()
+        self._subscribers: List = []
+        self._stats = {'loads': 0, 'reloads': 0, 'updates': 0, 'failed_updates': 0, 'notifications': 0}
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, key, default=None):
+        """读取一个配置（字典查找）"""
+        values = self._values
+        if values is None or (self.check_seconds and self._clock() >= self._next_check):
+            values = self._current()
+        return values.get(key, default)
+
+    def snapshot(self) -> Dict:
+        """当前快照的副本"""
+        return dict(self._current())
+
+    def _current(self) -> Dict:
+        if self._values is None:
+            self.refresh()
+        elif self.check_seconds and self._clock() >= self._next_check:
+            self.refresh()
+        return self._values
+
+    def _load(self) -> None:
+        """首次加载（调用方持有锁）"""
+        fingerprint = self._source_fingerprint()
+        self._values = dict(self.source.load())
+        self._fingerprint = fingerprint
+        self._next_check = self._clock() + self.check_seconds
+        self._version += 1
+        self._stats['loads'] += 1
+        logger.info(f"[CONFIG_STORE] {self.name} 已加载 {len(self._values)} 项，版本 {self._version}")
+
+    def _source_fingerprint(self):
+        fingerprint = getattr(self.source, 'fingerprint', None)
+        return fingerprint() if fingerprint else None
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        首次加载，或数据源被其他进程修改时重新加载
+
+        Args:
+            force: 不比较指纹，直接重新加载
+
+        Returns:
+            版本号是否变化
+        """
+        with self._lock:
+            if self._values is None:
+                self._load()
+                new, changed, version = self._values, set(self._values), self._version
+            else:
+                self._next_check = self._clock() + self.check_seconds
+                try:
+                    fingerprint = self._source_fingerprint()
+                    if not force and (fingerprint is None or fingerprint == self._fingerprint):
+                        return False
+                    new = dict(self.source.load())
+                except Exception as e:
+                    # 数据源暂时不可用：继续使用当前快照，下个检查周期再试
+                    logger.warning(f"[CONFIG_STORE] {self.name} 检查数据源失败，继续使用版本 {self._version}：{e}")
+                    return False
+                self._fingerprint = fingerprint
+                changed = _changed_keys(self._values, new)
+                if not changed:
+                    return False
+                self._values = new
+                self._version += 1
+                self._stats['reloads'] += 1
+                version = self._version
+                logger.info(f"[CONFIG_STORE] {self.name} 数据源已变化，重新加载，版本 {version}，变化 {sorted(changed)}")
+        self._notify(new, changed, version)
+        return True
+
+    def update(self, changes: Dict, **kwargs) -> int:
+        """
+        批量更新（全部成功或全部不生效）
+
+        Args:
+            changes: 键 -> 新值
+            **kwargs: 传给数据源的附加参数（如 updated_by）
+
+        Returns:
+            更新后的版本号
+        """
+        if not changes:
+            return self._version
+        if self._values is None:
+            self.refresh()
+        with self._lock:
+            current = self._values
+            try:
+                saved = self.source.save(dict(changes), current, **kwargs)
+            except Exception as e:
+                self._stats['failed_updates'] += 1
+                logger.error(f"[CONFIG_STORE] {self.name} 更新失败，保持版本 {self._version}：{e}")
+                raise
+            new = dict(current)
+            new.update(saved)
+            changed = _changed_keys(current, new)
+            self._fingerprint = self._source_fingerprint()
+            self._values = new
+            self._version += 1
+            self._stats['updates'] += 1
+            version = self._version
+        logger.info(f"[CONFIG_STORE] {self.name} 已更新 {sorted(changed)}，版本 {version}")
+        self._notify(new, changed, version)
+        return version
+
+    def subscribe(self, callback: Callable[[Dict, set, int], None], keys: Iterable = None,
+                  replay: bool = False) -> Callable[[], None]:
+        """
+        订阅变更
+
+        Args:
+            callback: callback(快照, 变化的键, 版本号)，快照不可修改
+            keys: 只关心这些键（None 表示全部）
+            replay: 已加载时立即按当前快照调用一次（所有键都视为变化）
+
+        Returns:
+            取消订阅的函数
+        """
+        entry = (callback, frozenset(keys) if keys is not None else None)
+        with self._lock:
+            self._subscribers.append(entry)
+            values, version = self._values, self._version
+        if replay and values is not None:
+            callback(values, set(values), version)
+
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+
+        return unsubscribe
+
+    def _notify(self, values: Dict, changed: set, version: int) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback, keys in subscribers:
+            if keys is not None and not (keys & changed):
+                continue
+            try:
+                callback(values, changed, version)
+                self._stats['notifications'] += 1
+            except Exception as e:
+                logger.error(f"[CONFIG_STORE] {self.name} 变更通知失败：{e}", exc_info=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, name=self.name, version=self._version,
+                        keys=len(self._values) if self._values is not None else 0,
+                        subscribers=len(self._subscribers))
+
+
+def _changed_keys(old: Dict, new: Dict) -> set:
+    return {key for key in set(old) | set(new) if old.get(key, _MISSING) != new.get(key, _MISSING)}
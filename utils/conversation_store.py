@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话历史存储（内存上下文窗口 + 批量异步写库）
+
+- 每个会话在内存中保留最近若干条消息，组装下一轮提示词时直接读取，会话活跃期间不查库
+- 会话数超过上限时按最近使用淘汰，空闲超过 TTL 的会话定期清出内存；再次访问时从数据库加载一次
+- 新消息先进入待写队列，后台线程按间隔或批量大小合并为一次批量 INSERT；写失败保留重试，
+  队列有上限，超出时丢弃最旧的消息并记录告警
+- 进程退出时（atexit）写完剩余消息；数据库中的历史按保留天数定期清理
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 每个会话在内存中保留的消息数
+CONVERSATION_CONTEXT_MESSAGES = int(os.getenv('CONVERSATION_CONTEXT_MESSAGES', '20'))
+# 内存中最多保留的会话数
+CONVERSATION_MAX_SESSIONS = int(os.getenv('CONVERSATION_MAX_SESSIONS', '5000'))
+# 会话空闲多久后清出内存（秒）
+CONVERSATION_SESSION_TTL = int(os.getenv('CONVERSATION_SESSION_TTL', '1800'))
+# 写库间隔（秒）与每批最多条数
+CONVERSATION_FLUSH_INTERVAL = float(os.getenv('CONVERSATION_FLUSH_INTERVAL', '1.0'))
+CONVERSATION_FLUSH_BATCH = int(os.getenv('CONVERSATION_FLUSH_BATCH', '200'))
+# 待写队列上限（数据库长时间不可用时保护内存）
+CONVERSATION_MAX_PENDING = int(os.getenv('CONVERSATION_MAX_PENDING', '20000'))
+# 数据库中历史的保留天数，0 表示不清理
+CONVERSATION_RETENTION_DAYS = int(os.getenv('CONVERSATION_RETENTION_DAYS', '90'))
+# 过期历史清理间隔（秒）
+RETENTION_PURGE_INTERVAL = 3600
+# 写库失败后的重试间隔上限（秒）
+MAX_RETRY_BACKOFF = 30
+
+
+class _Session:
+    """内存中的会话上下文窗口"""
+
+    __slots__ = ('messages', 'touched_at')
+
+    def __init__(self, max_messages: int):
+        self.messages = deque(maxlen=max_messages)
+        self.touched_at = time.monotonic()
+
+
+class ConversationStore:
+    """会话历史存储"""
+
+    def __init__(self, backend=None, context_messages: int = CONVERSATION_CONTEXT_MESSAGES,
+                 max_sessions: int = CONVERSATION_MAX_SESSIONS, session_ttl: float = CONVERSATION_SESSION_TTL,
+                 flush_interval: float = CONVERSATION_FLUSH_INTERVAL, flush_batch: int = CONVERSATION_FLUSH_BATCH,
+                 max_pending: int = CONVERSATION_MAX_PENDING, retention_days: int = CONVERSATION_RETENTION_DAYS):
+        """
+        Args:
+            backend: 提供 add_conversation_messages / get_conversation_history /
+                     clear_conversation_history / delete_conversation_history_before 的知识库管理器
+            context_messages: 每个会话在内存中保留的消息数
+            max_sessions: 内存中最多保留的会话数
+            session_ttl: 会话空闲清出内存的时间（秒）
+            flush_interval: 写库间隔（秒）
+            flush_batch: 每批最多条数
+            max_pending: 待写队列上限
+            retention_days: 数据库历史保留天数，0 表示不清理
+        """
+        self.backend = backend
+        self.context_messages = context_messages
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.max_pending = max_pending
+        self.retention_days = retention_days
+
+        self._sessions: 'OrderedDict[str, _Session]' = OrderedDict()
+        self._pending: deque = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # 写库与冷会话加载互斥，保证加载时不存在"已出队但未提交"的消息
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._retry_delay = 0.0
+        self._last_purge = 0.0
+        self._stats = {'hot_reads': 0, 'cold_reads': 0, 'flushed': 0, 'batches': 0, 'failures': 0,
+                       'dropped': 0, 'evicted': 0}
+
+    # ---------- 写入 ----------
+
+    def append(self, session_id: str, role: str, content: str,
+               related_faq_ids: List[int] = None, user_id: int = None) -> None:
+        """追加一条消息：立即进入上下文窗口，稍后批量写库"""
+        self._append_many(session_id, [(role, content, related_faq_ids)], user_id)
+
+    def append_turn(self, session_id: str, question: str, answer: str,
+                    related_faq_ids: List[int] = None, user_id: int = None) -> None:
+        """追加一轮对话（用户问题 + 助手回答）"""
+        self._append_many(session_id, [('user', question, None), ('assistant', answer, related_faq_ids)], user_id)
+
+    def _append_many(self, session_id: str, messages, user_id: Optional[int]) -> None:
+        now = datetime.now()
+        dropped = 0
+        with self._lock:
+            # 不在内存中的会话只记录待写消息，读取上下文时与数据库历史合并
+            state = self._sessions.get(session_id)
+            for role, content, related_faq_ids in messages:
+                if state is not None:
+                    state.messages.append({'role': role, 'content': content})
+                self._pending.append({
+                    'session_id': session_id,
+                    'user_id': user_id,
+                    'role': role,
+                    'content': content,
+                    'related_faq_ids': related_faq_ids,
+                    'created_at': now,
+                })
+            if state is not None:
+                state.touched_at = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            while len(self._pending) > self.max_pending:
+                self._pending.popleft()
+                dropped += 1
+            self._stats['dropped'] += dropped
+            if len(self._pending) >= self.flush_batch:
+                self._wakeup.notify()
+        if dropped:
+            logger.warning(f"[CONVERSATION] 待写队列已满，丢弃最旧的 {dropped} 条消息")
+        self._ensure_thread()
+
+    # ---------- 读取 ----------
+
+    def get_context(self, session_id: str, max_messages: int = None) -> List[Dict]:
+        """
+        获取会话最近的消息（OpenAI 格式）
+
+        Args:
+            session_id: 会话 ID
+            max_messages: 最多返回条数（不超过内存窗口大小）
+
+        Returns:
+            [{'role': ..., 'content': ...}]
+        """
+        limit = min(max_messages or self.context_messages, self.context_messages)
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None:
+                state.touched_at = time.monotonic()
+                self._sessions.move_to_end(session_id)
+                self._stats['hot_reads'] += 1
+                return list(state.messages)[-limit:]
+
+        state = self._load_session(session_id)
+        return list(state.messages)[-limit:]
+
+    def _load_session(self, session_id: str) -> _Session:
+        """从数据库加载会话并合并尚未写库的消息"""
+        with self._flush_lock:
+            history = []
+            if self.backend is not None:
+                try:
+                    history = self.backend.get_conversation_history(session_id, limit=self.context_messages)
+                except Exception as e:
+                    logger.error(f"[CONVERSATION] 加载会话历史失败 {session_id}: {e}")
+            with self._lock:
+                state = self._sessions.get(session_id)
+                if state is not None:
+                    return state
+                state = _Session(self.context_messages)
+                for message in history:
+                    state.messages.append({'role': message['role'], 'content': message['content']})
+                for message in self._pending:
+                    if message['session_id'] == session_id:
+                        state.messages.append({'role': message['role'], 'content': message['content']})
+                self._sessions[session_id] = state
+                self._stats['cold_reads'] += 1
+                self._evict_locked()
+                return state
+
+    def clear(self, session_id: str) -> bool:
+        """清空会话：内存窗口、待写消息与数据库历史"""
+        with self._flush_lock:
+            with self._lock:
+                self._sessions.pop(session_id, None)
+                self._pending = deque(message for message in self._pending if message['session_id'] != session_id)
+            if self.backend is None:
+                return True
+            return self.backend.clear_conversation_history(session_id)
+
+    # ---------- 淘汰与写库 ----------
+
+    def _evict_locked(self) -> None:
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self._stats['evicted'] += 1
+
+    def evict_idle(self) -> int:
+        """清出空闲超过 TTL 的会话，返回清出数"""
+        cutoff = time.monotonic() - self.session_ttl
+        with self._lock:
+            idle = [session_id for session_id, state in self._sessions.items() if state.touched_at < cutoff]
+            for session_id in idle:
+                del self._sessions[session_id]
+            self._stats['evicted'] += len(idle)
+        return len(idle)
+
+    def flush(self, max_batches: int = None) -> int:
+        """
+        把待写消息批量写入数据库
+
+        Args:
+            max_batches: 最多写几批，None 表示写完为止
+
+        Returns:
+            写入条数；写库失败时消息放回队列
+        """
+        written = 0
+        batches = 0
+        with self._flush_lock:
+            while max_batches is None or batches < max_batches:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    batch = [self._pending.popleft() for _ in range(min(self.flush_batch, len(self._pending)))]
+                if self.backend is None:
+                    written += len(batch)
+                    batches += 1
+                    continue
+                try:
+                    inserted = self.backend.add_conversation_messages(batch)
+                except Exception as e:
+                    logger.error(f"[CONVERSATION] 批量写入异常：{e}")
+                    inserted = -1
+                if inserted < 0:
+                    with self._lock:
+                        self._pending.extendleft(reversed(batch))
+                        self._stats['failures'] += 1
+                    self._retry_delay = min(MAX_RETRY_BACKOFF, max(self.flush_interval, self._retry_delay * 2))
+                    logger.warning(f"[CONVERSATION] 批量写入失败，{len(batch)} 条消息 {self._retry_delay:.0f}s 后重试")
+                    break
+                self._retry_delay = 0.0
+                written += len(batch)
+                batches += 1
+                with self._lock:
+                    self._stats['flushed'] += len(batch)
+                    self._stats['batches'] += 1
+        if written:
+            logger.debug(f"[CONVERSATION] 写入 {written} 条消息，{batches} 批")
+        return written
+
+    def purge_expired(self) -> int:
+        """删除数据库中超过保留天数的历史"""
+        if self.retention_days <= 0 or self.backend is None:
+            return 0
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        try:
+            removed = self.backend.delete_conversation_history_before(cutoff)
+        except Exception as e:
+            logger.error(f"[CONVERSATION] 清理过期历史失败：{e}")
+            return 0
+        if removed:
+            logger.info(f"[CONVERSATION] 清理 {cutoff:%Y-%m-%d} 之前的历史 {removed} 条")
+        return max(removed, 0)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None or self._closed:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='conversation-flusher', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._closed and len(self._pending) < self.flush_batch:
+                    self._wakeup.wait(timeout=max(self.flush_interval, self._retry_delay))
+                if self._closed:
+                    return
+            try:
+                self.flush()
+                self.evict_idle()
+                if time.monotonic() - self._last_purge > RETENTION_PURGE_INTERVAL:
+                    self._last_purge = time.monotonic()
+                    self.purge_expired()
+            except Exception as e:
+                logger.error(f"[CONVERSATION] 后台写库异常：{e}", exc_info=True)
+
+    def close(self, timeout: float = 10) -> None:
+        """停止后台线程并写完剩余消息（进程退出时自动调用）"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        remaining = len(self._pending)
+        self.flush()
+        if self._pending:
+            logger.error(f"[CONVERSATION] 退出时仍有 {len(self._pending)} 条消息未写入数据库")
+        elif remaining:
+            logger.info(f"[CONVERSATION] 退出前写入剩余 {remaining} 条消息")
+
+    def stats(self) -> Dict:
+        """内存会话数、待写条数与读写统计"""
+        with self._lock:
+            return dict(self._stats, sessions=len(self._sessions), pending=len(self._pending))
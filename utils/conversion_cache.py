@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文档转换结果缓存（按内容哈希，磁盘存储，容量上限内 LRU 淘汰）
+
+- 缓存键 = (转换器名称, 转换器版本, 输入内容 SHA-256, 选项哈希)；同一文件以相同选项重复上传时直接返回上次的结果
+- 转换器版本默认取转换代码源文件的哈希（source_version），改了转换逻辑后旧结果自动失效；
+  模板、关键词配置等外部输入通过 file_fingerprint 放进选项
+- 每个条目是 CONVERSION_CACHE_DIR 下的一个目录（产物文件 + meta.json），写入先写临时目录再整体改名
+- 命中时产物复制一份放到各接口原有的下载位置（不用硬链接：接口之后在同一路径上原地重写输出文件时，
+  硬链接会把缓存里的产物一起改掉）；下载文件与缓存条目互相独立，缓存淘汰或 cleanup_thread
+  清理下载目录都不影响对方
+- 总大小超过 CONVERSION_CACHE_MAX_MB 时淘汰最久未使用的条目；cleanup_thread 每轮额外删除
+  超过 CONVERSION_CACHE_MAX_AGE_HOURS 未使用的条目（不短于上传文件的保留时间）
+"""
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 缓存目录
+CONVERSION_CACHE_DIR = os.getenv('CONVERSION_CACHE_DIR', 'uploads/conversion_cache')
+# 缓存总大小上限（MB），0 表示关闭缓存
+CONVERSION_CACHE_MAX_MB = float(os.getenv('CONVERSION_CACHE_MAX_MB', '512'))
+# 超过该时间未使用的条目在清理线程中删除（小时）
+CONVERSION_CACHE_MAX_AGE_HOURS = float(os.getenv('CONVERSION_CACHE_MAX_AGE_HOURS', '168'))
+
+META_FILE = 'meta.json'
+_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_bytes(data) -> str:
+    """计算内容的 SHA-256（str 按 UTF-8 编码）"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path) -> str:
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path) -> str:
+    """模板 / 配置文件的内容哈希，文件不存在时返回空串（用作转换选项）"""
+    try:
+        return sha256_file(path)
+    except OSError:
+        return ''
+
+
+def source_version(*modules: str) -> str:
+    """
+    转换器版本：转换代码源文件内容的哈希
+
+    Args:
+        modules: 模块名（如 'utils.word_to_excel'），只定位源文件，不导入模块本身
+
+    Returns:
+        12 位十六进制字符串
+    """
+    digest = hashlib.sha256()
+    for name in modules:
+        spec = importlib.util.find_spec(name)
+        origin = spec.origin if spec else None
+        digest.update(name.encode('utf-8'))
+        if origin and os.path.exists(origin):
+            with open(origin, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def _copy_to(src, dest) -> None:
+    """复制到目标路径（先写临时文件再改名），目标已存在时整体替换"""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f'.{dest.name}.{uuid.uuid4().hex[:8]}.tmp')
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    except BaseException:
+        if tmp.exists():
+            tmp.unlink()
+        raise
+
+
+class ConversionKey:
+    """缓存键"""
+
+    def __init__(self, converter: str, version: str, input_sha256: str, options_hash: str):
+        self.converter = converter
+        self.version = version
+        self.input_sha256 = input_sha256
+        self.options_hash = options_hash
+        self.digest = sha256_bytes(f'{converter}\0{version}\0{input_sha256}\0{options_hash}')
+
+    def __repr__(self):
+        return f'ConversionKey({self.converter}, {self.digest[:12]})'
+
+
+class ConversionCache:
+    """磁盘上的转换结果缓存（线程安全）"""
+
+    def __init__(self, root=CONVERSION_CACHE_DIR, max_bytes: int = int(CONVERSION_CACHE_MAX_MB * 1024 * 1024),
+                 max_age_hours: float = CONVERSION_CACHE_MAX_AGE_HOURS):
+        """
+        Args:
+            root: 缓存目录
+            max_bytes: 总大小上限，<= 0 表示关闭缓存（get 总是未命中，put 不写入）
+            max_age_hours: sweep 时删除超过该时间未使用的条目
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age_hours = max_age_hours
+        # digest -> {'size', 'accessed', 'result', 'files', 'converter'}，按最近使用排序
+        self._index: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, converter: str, version: str, input_sha256: str, options: Dict = None) -> ConversionKey:
+        """
+        生成缓存键
+
+        Args:
+            converter: 转换器名称
+            version: 转换器版本（通常为 source_version(...)）
+            input_sha256: 输入内容的 SHA-256
+            options: 影响输出的选项（可 JSON 序列化）
+        """
+        options_json = json.dumps(options or {}, sort_keys=True, ensure_ascii=False, default=str)
+        return ConversionKey(converter, version, input_sha256, sha256_bytes(options_json))
+
+    def get(self, key: ConversionKey, targets: Dict[str, str] = None) -> Optional[Dict]:
+        """
+        查找缓存的转换结果
+
+        Args:
+            key: 缓存键
+            targets: 产物文件名 -> 目标路径；命中时把产物放到这些位置
+
+        Returns:
+            转换结果字典（put 时传入的 result），未命中返回 None
+        """
+        if not self.enabled:
+            return None
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._index.get(key.digest)
+            if entry is not None:
+                self._index.move_to_end(key.digest)
+                entry['accessed'] = time.time()
+        if entry is None or not set(targets or {}) <= set(entry['files']):
+            self._count(key.converter, 'misses')
+            return None
+
+        directory = self._entry_dir(key.digest)
+        try:
+            for name, dest in (targets or {}).items():
+                _copy_to(directory / name, dest)
+            os.utime(directory / META_FILE)
+        except OSError as e:
+            # 条目刚被淘汰或被手工删除：按未命中处理
+            logger.warning(f"[CONVERSION_CACHE] {key} 读取产物失败，按未命中处理：{e}")
+            self._drop(key.digest)
+            self._count(key.converter, 'misses')
+            return None
+        self._count(key.converter, 'hits')
+        logger.info(f"[CONVERSION_CACHE] 命中 {key}")
+        return dict(entry['result'])
+
+    def put(self, key: ConversionKey, result: Dict = None, files: Dict[str, str] = None) -> bool:
+        """
+        保存转换结果
+
+        Args:
+            key: 缓存键
+            result: 可 JSON 序列化的结果字典（文本结果可直接放在这里）
+            files: 产物文件名 -> 源文件路径（复制进缓存，之后源文件可以随意删除）
+
+        Returns:
+            是否写入
+        """
+        if not self.enabled:
+            return False
+        self._ensure_loaded()
+        files = files or {}
+        staging = self.root / f'.tmp-{uuid.uuid4().hex}'
+        try:
+            staging.mkdir(parents=True)
+            for name, src in files.items():
+                shutil.copyfile(src, staging / name)
+            meta = {
+                'converter': key.converter,
+                'version': key.version,
+                'input_sha256': key.input_sha256,
+                'options_hash': key.options_hash,
+                'files': sorted(files),
+                'result': result or {},
+                'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            with open(staging / META_FILE, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            size = sum(path.stat().st_size for path in staging.iterdir())
+            if size > self.max_bytes:
+                logger.info(f"[CONVERSION_CACHE] {key} 结果 {size} 字节超过缓存上限，不缓存")
+                return False
+            directory = self._entry_dir(key.digest)
+            directory.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.replace(staging, directory)
+            except OSError:
+                # 并发请求已写入同一条目
+                return False
+        except Exception as e:
+            logger.warning(f"[CONVERSION_CACHE] {key} 写入失败：{e}")
+            return False
+        finally:
+            if staging.exists():
+                shutil.rmtree(staging, ignore_errors=True)
+
+        with self._lock:
+            previous = self._index.pop(key.digest, None)
+            if previous:
+                self._total_bytes -= previous['size']
+            self._index[key.digest] = {'size': size, 'accessed': time.time(), 'result': meta['result'],
+                                       'files': meta['files'], 'converter': key.converter}
+            self._total_bytes += size
+            victims = self._collect_victims(keep=key.digest)
+        self._count(key.converter, 'stores')
+        self._remove(victims)
+        return True
+
+    def sweep(self, max_age_hours: float = None) -> Tuple[int, int]:
+        """
+        删除长期未使用的条目并执行容量上限（由 cleanup_thread 定期调用）
+
+        Args:
+            max_age_hours: 未使用时长上限，默认 self.max_age_hours
+
+        Returns:
+            (删除条目数, 释放字节数)
+        """
+        if not self.enabled:
+            return 0, 0
+        self._ensure_loaded()
+        cutoff = time.time() - (max_age_hours if max_age_hours is not None else self.max_age_hours) * 3600
+        with self._lock:
+            victims = []
+            for digest, entry in list(self._index.items()):
+                if entry['accessed'] >= cutoff:
+                    break
+                victims.append((digest, self._index.pop(digest)))
+                self._total_bytes -= entry['size']
+            victims.extend(self._collect_victims())
+        return self._remove(victims)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._index.clear()
+            self._total_bytes = 0
+            self._counters.clear()
+            self.evictions = 0
+            self._loaded = True
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        """条目数、占用空间与各转换器的命中 / 未命中 / 写入次数"""
+        self._ensure_loaded()
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._index),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'converters': {name: dict(counter) for name, counter in self._counters.items()},
+            }
+
+    def _entry_dir(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def _count(self, converter: str, name: str) -> None:
+        with self._lock:
+            counter = self._counters.setdefault(converter, {'hits': 0, 'misses': 0, 'stores': 0})
+            counter[name] += 1
+
+    def _ensure_loaded(self) -> None:
+        """首次使用时扫描缓存目录重建索引（进程重启后缓存仍然有效）"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            entries = []
+            if self.root.exists():
+                for path in self.root.iterdir():
+                    if path.name.startswith('.tmp-'):
+                        shutil.rmtree(path, ignore_errors=True)
+                        continue
+                    if not path.is_dir():
+                        continue
+                    for directory in path.iterdir():
+                        entry = self._read_entry(directory)
+                        if entry is None:
+                            shutil.rmtree(directory, ignore_errors=True)
+                        else:
+                            entries.append((directory.name, entry))
+            entries.sort(key=lambda item: item[1]['accessed'])
+            self._index = OrderedDict(entries)
+            self._total_bytes = sum(entry['size'] for _, entry in entries)
+            self._loaded = True
+            if entries:
+                logger.info(f"[CONVERSION_CACHE] 载入 {len(entries)} 个缓存条目，共 {self._total_bytes} 字节")
+
+    @staticmethod
+    def _read_entry(directory: Path) -> Optional[Dict]:
+        try:
+            meta_path = directory / META_FILE
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            size = sum(path.stat().st_size for path in directory.iterdir())
+            return {'size': size, 'accessed': meta_path.stat().st_mtime, 'result': meta.get('result') or {},
+                    'files': meta.get('files') or [], 'converter': meta.get('converter', '')}
+        except (OSError, ValueError):
+            return None
+
+    def _collect_victims(self, keep: str = None):
+        """超过容量上限时按 LRU 取出要删除的条目（调用方持有锁）"""
+        victims = []
+        while self._total_bytes > self.max_bytes and self._index:
+            digest = next(iter(self._index))
+            if digest == keep:
+                break
+            entry = self._index.pop(digest)
+            self._total_bytes -= entry['size']
+            victims.append((digest, entry))
+        return victims
+
+    def _drop(self, digest: str) -> None:
+        with self._lock:
+            entry = self._index.pop(digest, None)
+            if entry is None:
+                return
+            self._total_bytes -= entry['size']
+        self._remove([(digest, entry)])
+
+    def _remove(self, victims) -> Tuple[int, int]:
+        freed = 0
+        for digest, entry in victims:
+            shutil.rmtree(self._entry_dir(digest), ignore_errors=True)
+            freed += entry['size']
+        if victims:
+            with self._lock:
+                self.evictions += len(victims)
+            logger.info(f"[CONVERSION_CACHE] 删除 {len(victims)} 个条目，释放 {freed} 字节")
+        return len(victims), freed
+
+
+# 全局转换结果缓存
+conversion_cache = ConversionCache()
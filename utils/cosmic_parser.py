@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+COSMIC 功能点拆分表解析器
+
+- 工作簿只打开一次（pd.ExcelFile + parse），不再对同一文件重复 read_excel
+- 模块层级 / 功能过程的向下填充使用向量化 ffill，替代逐行 iterrows
+- 解析结果按文件内容 SHA-256 缓存，/convert、/stats、/export-stats 共享同一次解析
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 数据行的固定列索引（基于 header=None 读取）
+MODULE_L1_COL = 1   # 一级模块
+MODULE_L2_COL = 2   # 二级模块
+MODULE_L3_COL = 3   # 三级模块
+FUNCTION_COL = 6    # 功能过程（列 5 是触发事件）
+SUBPROCESS_COL = 7  # 子过程描述
+
+COLUMN_NAMES = {
+    MODULE_L1_COL: '一级模块',
+    MODULE_L2_COL: '二级模块',
+    MODULE_L3_COL: '三级模块',
+    FUNCTION_COL: '功能过程',
+    SUBPROCESS_COL: '子过程描述',
+}
+
+UNCATEGORIZED = '未分类'
+SUBPROCESS_PREFIXES = ('输入-', '查询-', '呈现-', '校验-', '输出-')
+
+# 解析缓存容量（按文件内容哈希计）
+PARSE_CACHE_SIZE = 32
+
+
+def split_subprocess_description(text) -> List[str]:
+    """
+    拆分子过程描述字段
+
+    Args:
+        text: 子过程描述原文，按"输入-/查询-/呈现-/校验-/输出-"前缀切分
+
+    Returns:
+        子过程描述列表（去除尾部分号）
+    """
+    if not text or pd.isna(text):
+        return []
+
+    text = str(text).strip()
+    if not text:
+        return []
+
+    result = []
+    current_segment = []
+
+    i = 0
+    while i < len(text):
+        is_prefix = False
+        for prefix in SUBPROCESS_PREFIXES:
+            if text.startswith(prefix, i):
+                if current_segment:
+                    result.append(''.join(current_segment).strip())
+                    current_segment = []
+                current_segment.append(prefix)
+                i += len(prefix)
+                is_prefix = True
+                break
+
+        if not is_prefix:
+            current_segment.append(text[i])
+            i += 1
+
+    if current_segment:
+        result.append(''.join(current_segment).strip())
+
+    result = [seg.rstrip('；;').strip() for seg in result if seg]
+
+    if not result and text:
+        return [text]
+
+    return result
+
+
+def _clean_column(series: pd.Series) -> pd.Series:
+    """将单元格统一为去空白字符串，NaN / 'nan' 视为空串"""
+    cleaned = series.where(series.notna(), '').astype(str).str.strip()
+    return cleaned.mask(cleaned == 'nan', '')
+
+
+def _last_value(series: pd.Series) -> pd.Series:
+    """
+    空串取上方最近的非空值（前面没有值的为 pd.NA）
+
+    先转为 string 类型再填充：object 列整列为空时 ffill 会尝试向下转换类型并触发 FutureWarning
+    """
+    return series.astype('string').mask(series == '').ffill()
+
+
+def _ffill(series: pd.Series) -> pd.Series:
+    """空串向下填充（前面没有值的保持为空串）"""
+    return _last_value(series).fillna('').astype(object)
+
+
+class CosmicWorkbook:
+    """
+    COSMIC 拆分表的解析结果
+
+    rows 为原始数据行（已清洗为字符串），其余统计 / 层级结构在构造时一次算出，
+    之后只读，可在多个请求间安全共享。
+    """
+
+    def __init__(self, rows: pd.DataFrame, sheet_name: str = ''):
+        self.sheet_name = sheet_name
+        self.rows = rows
+        self.total_rows = len(rows)
+
+        l1 = rows['一级模块']
+        l2 = rows['二级模块']
+        l3 = rows['三级模块']
+        func = rows['功能过程']
+        subproc = rows['子过程描述']
+
+        l3_filled = _ffill(l3)
+        func_filled = _ffill(func)
+        valid = func_filled != ''
+
+        # 子过程只需拆分有效行，一次拆分供统计、导出、Word 共用
+        sub_items = subproc[valid].map(split_subprocess_description)
+        sub_counts = sub_items.map(len)
+
+        self.valid_rows = int(valid.sum())
+        self.skipped_rows = self.total_rows - self.valid_rows
+        self.stats = {
+            'l1_count': int(l1[l1 != ''].nunique()),
+            'l2_count': int(l2[l2 != ''].nunique()),
+            'l3_count': int(l3_filled[l3_filled != ''].nunique()),
+            'function_count': int(func_filled[valid].nunique()),
+            'subprocess_count': int(sub_counts.sum()),
+        }
+
+        self.module_details = self._build_module_details(
+            l1, l2, l3_filled[valid], valid, sub_counts
+        )
+        self.hierarchy = self._build_hierarchy(
+            _ffill(l1).mask(lambda s: s == '', UNCATEGORIZED)[valid],
+            _ffill(l2).mask(lambda s: s == '', UNCATEGORIZED)[valid],
+            l3_filled.mask(l3_filled == '', UNCATEGORIZED)[valid],
+            func_filled[valid],
+            sub_items,
+        )
+
+    @staticmethod
+    def _build_module_details(l1, l2, l3_valid, valid, sub_counts) -> List[Dict]:
+        """按三级模块汇总（用于统计导出），一级/二级取该三级模块首次出现时的最近值"""
+        l1_last = _last_value(l1)[valid]
+        l2_last = _last_value(l2)[valid]
+        frame = pd.DataFrame({
+            'l3': l3_valid,
+            'l1': l1_last,
+            'l2': l2_last,
+            'count': sub_counts,
+        })
+        first_rows = frame.drop_duplicates('l3')
+        counts = frame.groupby('l3', sort=False)['count'].sum()
+        return [
+            {
+                '一级模块': m1 if pd.notna(m1) else None,
+                '二级模块': m2 if pd.notna(m2) else None,
+                '三级模块': m3,
+                'subprocess_count': int(counts[m3]),
+            }
+            for m3, m1, m2 in zip(first_rows['l3'], first_rows['l1'], first_rows['l2'])
+        ]
+
+    @staticmethod
+    def _build_hierarchy(l1, l2, l3, func, sub_items) -> Dict:
+        """构建 {一级: {二级: {三级: {功能过程: [子过程]}}}}，保持首次出现顺序"""
+        hierarchy: Dict = {}
+        for m1, m2, m3, fn, items in zip(l1, l2, l3, func, sub_items):
+            functions = hierarchy.setdefault(m1, {}).setdefault(m2, {}).setdefault(m3, {})
+            functions.setdefault(fn, []).extend(items)
+        return hierarchy
+
+
+def locate_target_sheet(sheet_names: List[str]) -> str:
+    """优先选择名称包含"拆分表"或"功能点"的 Sheet，否则取第一个"""
+    for sheet in sheet_names:
+        if '拆分表' in sheet or '功能点' in sheet:
+            logger.info(f"使用 Sheet: {sheet}")
+            return sheet
+    logger.warning(f"未找到特定 Sheet，使用：{sheet_names[0]}")
+    return sheet_names[0]
+
+
+def parse_cosmic_workbook(excel_path) -> Optional[CosmicWorkbook]:
+    """
+    单次读取并解析 COSMIC 拆分表（不经过缓存）
+
+    Args:
+        excel_path: Excel 文件路径
+
+    Returns:
+        CosmicWorkbook，文件无法打开时返回 None
+    """
+    try:
+        xl = pd.ExcelFile(excel_path)
+    except Exception as e:
+        logger.error(f"无法打开 Excel 文件：{e}")
+        return None
+
+    with xl:
+        target_sheet = locate_target_sheet(xl.sheet_names)
+        df_raw = xl.parse(sheet_name=target_sheet, header=None)
+
+    # 查找"一级模块" | "二级模块" | "三级模块" 所在的表头行（默认第 3 行）
+    header_row_idx = 3
+    head = df_raw.iloc[:5].astype(str).where(df_raw.iloc[:5].notna(), '')
+    for idx, row_text in head.apply(' '.join, axis=1).items():
+        if '一级模块' in row_text and '二级模块' in row_text and '三级模块' in row_text:
+            header_row_idx = int(idx)
+            break
+    logger.info(f"定位到表头在第 {header_row_idx} 行")
+
+    df_data = df_raw.iloc[header_row_idx + 1:].reset_index(drop=True)
+    # 列数不足时补空列，保证固定列索引可用
+    df_data = df_data.reindex(columns=range(max(df_data.shape[1], SUBPROCESS_COL + 1)))
+
+    rows = pd.DataFrame({
+        name: _clean_column(df_data[col]) for col, name in COLUMN_NAMES.items()
+    })
+    return CosmicWorkbook(rows, sheet_name=target_sheet)
+
+
+def file_sha256(path, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CosmicParseCache:
+    """按文件内容哈希缓存解析结果的 LRU 容器（线程安全）"""
+
+    def __init__(self, max_entries: int = PARSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, CosmicWorkbook]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, excel_path) -> Optional[CosmicWorkbook]:
+        """
+        获取文件的解析结果，内容相同的文件只解析一次
+
+        Args:
+            excel_path: Excel 文件路径
+
+        Returns:
+            CosmicWorkbook，无法读取时返回 None
+        """
+        key = file_sha256(excel_path)
+        with self._lock:
+            workbook = self._entries.get(key)
+            if workbook is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return workbook
+            self.misses += 1
+
+        workbook = parse_cosmic_workbook(Path(excel_path))
+        if workbook is None:
+            return None
+
+        with self._lock:
+            self._entries[key] = workbook
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return workbook
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# 全局解析缓存实例
+cosmic_parse_cache = CosmicParseCache()
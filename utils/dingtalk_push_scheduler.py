@@ -1,33 +1,79 @@
 """
 钉钉推送系统 - 定时调度器
 使用 APScheduler 管理定时推送任务
+
+- 触发时只做去重与提交：每个任务（配置的一个时间点）只记录最近一次触发所在的分钟，
+  同一任务在同一分钟内重复触发跳过；相邻分钟的两个时间点即使触发时间抖动也不会互相吞掉
+- 推送交给有界线程池执行，不占用 APScheduler 的触发线程；同一配置上一次推送还在排队或执行时，
+  新的触发合并（跳过）；排队 + 执行中的任务超过上限时拒绝并告警
+- 任务排队超过 PUSH_MISFIRE_GRACE_SECONDS 秒才开始执行时视为错过，不再推送
+- 配置在内存中保留快照（加载启用配置时整体读取，reload_config / refresh_snapshot 时更新），
+  每次触发不再查库
 """
 import logging
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.date import DateTrigger
 
+from utils.holiday_calendar import holiday_calendar
+
 logger = logging.getLogger(__name__)
 
+# 推送线程数与最多排队的推送任务数
+PUSH_EXECUTOR_WORKERS = int(os.getenv('PUSH_EXECUTOR_WORKERS', '4'))
+PUSH_EXECUTOR_QUEUE = int(os.getenv('PUSH_EXECUTOR_QUEUE', '64'))
+# 触发后超过该时间仍未开始执行的推送视为错过（秒），同时作为 APScheduler 的 misfire_grace_time
+PUSH_MISFIRE_GRACE_SECONDS = int(os.getenv('PUSH_MISFIRE_GRACE_SECONDS', '60'))
+# 重复触发的汇总日志间隔（秒）：单次重复只记 DEBUG，每个间隔最多输出一条汇总
+PUSH_DUPLICATE_LOG_SECONDS = int(os.getenv('PUSH_DUPLICATE_LOG_SECONDS', '600'))
+
+CONFIG_SNAPSHOT_SQL = "SELECT * FROM dingtalk_push_config WHERE id = %s AND enabled = TRUE AND is_deleted = 0"
+
 
 class DingTalkPushScheduler:
     """钉钉推送定时调度器"""
     
-    def __init__(self, app=None):
+    def __init__(self, app=None, executor=None, push_func=None, clock=time.time,
+                 workers=PUSH_EXECUTOR_WORKERS, queue_size=PUSH_EXECUTOR_QUEUE):
+        """
+        Args:
+            app: Flask 应用
+            executor: 执行推送的线程池（需提供 submit），默认为 workers 个线程的 ThreadPoolExecutor
+            push_func: 执行一次推送的函数，参数为配置行，默认为 dingtalk_push_routes.execute_push_task
+            clock: 取当前时间戳（测试用）
+            workers / queue_size: 推送线程数与最多排队数
+        """
         self.app = app
         self.scheduler = BackgroundScheduler(
             timezone='Asia/Shanghai',
             job_defaults={
                 'max_instances': 1,  # 同一任务最多1个实例，避免重复执行
                 'coalesce': True,     # 错过的任务合并执行
-                'misfire_grace_time': 60  # 错过60秒内仍执行
+                'misfire_grace_time': PUSH_MISFIRE_GRACE_SECONDS  # 错过宽限时间内仍执行
             }
         )
         self._job_map = {}  # config_id -> job_id 映射
         self._initialized = False  # 防止重复初始化
+        
+        self._executor = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dingtalk-push')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)  # 排队 + 执行中的上限
+        self._push_func = push_func
+        self._clock = clock
+        self._state_lock = threading.Lock()
+        self._snapshots = {}  # config_id -> 配置行
+        self._last_fired = {}  # config_id -> {job_id: 最近一次触发所在的分钟}
+        self._in_flight = set()  # 排队或执行中的 config_id
+        self._duplicates_unlogged = 0  # 上次汇总日志之后跳过的重复触发次数
+        self._duplicate_logged_at = None
+        self._stats = {'fired': 0, 'submitted': 0, 'duplicate': 0, 'coalesced': 0,
+                       'rejected': 0, 'misfired': 0, 'skipped_holiday': 0, 'completed': 0, 'failed': 0}
     
     def init_app(self, app):
         """初始化应用"""
@@ -70,13 +116,16 @@ class DingTalkPushScheduler:
                 cursor = conn.cursor(dictionary=True)
                 
                 cursor.execute(
-                    "SELECT id, name, schedule_config FROM dingtalk_push_config WHERE enabled = TRUE"
+                    "SELECT * FROM dingtalk_push_config WHERE enabled = TRUE AND is_deleted = 0"
                 )
                 configs = cursor.fetchall()
                 
                 cursor.close()
                 conn.close()
                 
+                with self._state_lock:
+                    self._snapshots = {config['id']: config for config in configs}
+                
                 for config in configs:
                     try:
                         schedule_config = json.loads(config['schedule_config'])
@@ -91,11 +140,10 @@ class DingTalkPushScheduler:
     def register_job(self, config_id, schedule_config):
         """注册定时任务"""
         try:
-            # 移除旧任务（确保彻底清除）
-            self.remove_job(config_id)
+            # 移除旧任务（确保彻底清除，保留配置快照）
+            self.remove_job(config_id, forget=False)
             
             # 等待一小段时间，确保 APScheduler 完成清理
-            import time
             time.sleep(0.1)
             
             schedule_type = schedule_config.get('type')
@@ -111,6 +159,9 @@ class DingTalkPushScheduler:
                 times = config.get('times', ['08:00'])
                 weekdays = config.get('weekdays', [1, 2, 3, 4, 5])
                 
+                # 任务名使用配置快照中的名称（schedule_config 中没有名称）
+                config_name = (self._snapshots.get(config_id) or {}).get('name', config_id)
+                
                 # 为每个时间点创建任务
                 for time_str in times:
                     hour, minute = map(int, time_str.split(':'))
@@ -126,9 +177,9 @@ class DingTalkPushScheduler:
                     self.scheduler.add_job(
                         func=self._execute_push_task,
                         trigger=trigger,
-                        args=[config_id],
+                        args=[config_id, job_id],
                         id=job_id,
-                        name=f"钉钉推送-{config['name']}-{time_str}",
+                        name=f"钉钉推送-{config_name}-{time_str}",
                         replace_existing=True
                     )
                     
@@ -186,7 +237,7 @@ class DingTalkPushScheduler:
                         self.scheduler.add_job(
                             func=self._execute_push_task,
                             trigger=trigger,
-                            args=[config_id],
+                            args=[config_id, job_id],
                             id=job_id,
                             name=f"钉钉推送-{config_id}-{time_str}",
                             replace_existing=True
@@ -208,7 +259,7 @@ class DingTalkPushScheduler:
             self.scheduler.add_job(
                 func=self._execute_push_task,
                 trigger=trigger,
-                args=[config_id],
+                args=[config_id, job_id],
                 id=job_id,
                 name=f"钉钉推送-{config_id}",
                 replace_existing=True
@@ -221,8 +272,13 @@ class DingTalkPushScheduler:
             logger.error(f"❌ 注册定时任务失败 (ID: {config_id}): {e}")
             raise
     
-    def remove_job(self, config_id):
-        """移除定时任务"""
+    def remove_job(self, config_id, forget=True):
+        """
+        移除定时任务
+        
+        Args:
+            forget: 同时清除配置快照与最近触发记录（重新注册时为 False）
+        """
         try:
             # 查找并移除所有相关任务
             jobs_to_remove = []
@@ -253,120 +309,176 @@ class DingTalkPushScheduler:
             if removed_count > 0:
                 logger.info(f"✅ 已移除 {removed_count} 个定时任务 (ID: {config_id})")
             
+            # 清除该配置的快照与触发记录
+            if forget:
+                with self._state_lock:
+                    self._snapshots.pop(config_id, None)
+                    self._last_fired.pop(config_id, None)
+            
         except Exception as e:
             logger.error(f"❌ 移除定时任务失败 (ID: {config_id}): {e}")
     
-    def _execute_push_task(self, config_id):
-        """执行推送任务（由调度器调用）"""
+    def _execute_push_task(self, config_id, job_id=None):
+        """
+        定时触发（由调度器调用）：去重、合并后提交到推送线程池
+
+        Args:
+            config_id: 配置 ID
+            job_id: 触发的任务 ID（daily / cron 每个时间点一个任务），去重按任务 + 触发分钟
+        """
+        now = self._clock()
+        minute = int(now // 60)
+        job_id = job_id or str(config_id)
+        with self._state_lock:
+            self._stats['fired'] += 1
+            fired_minutes = self._last_fired.setdefault(config_id, {})
+            if fired_minutes.get(job_id) == minute:
+                self._stats['duplicate'] += 1
+                logger.debug(f"跳过重复执行 (ID: {config_id}, 任务: {job_id}, 同一分钟内已触发)")
+                self._log_duplicates(now)
+                return
+            fired_minutes[job_id] = minute
+            if config_id in self._in_flight:
+                self._stats['coalesced'] += 1
+                logger.warning(f"⚠️  上一次推送尚未完成，本次触发合并 (ID: {config_id})")
+                return
+            if not self._slots.acquire(blocking=False):
+                self._stats['rejected'] += 1
+                logger.error(f"❌ 推送队列已满，丢弃本次触发 (ID: {config_id})")
+                return
+            self._in_flight.add(config_id)
+            self._stats['submitted'] += 1
+        
+        logger.info(f"⏰ 触发定时推送任务 (ID: {config_id})")
         try:
-            # 防止同一配置在同一分钟内重复执行
-            import time
-            current_minute = int(time.time() // 60)
-            task_key = f"{config_id}_{current_minute}"
-            
-            if hasattr(self, '_last_execution') and task_key in self._last_execution:
-                last_time = self._last_execution[task_key]
-                if current_minute - last_time < 1:  # 1分钟内不重复执行
-                    logger.warning(f"⚠️  跳过重复执行 (ID: {config_id}, 上次执行: {last_time})")
-                    return
+            self._executor.submit(self._run_push, config_id, now)
+        except Exception as e:
+            self._finish(config_id)
+            logger.error(f"❌ 提交推送任务失败 (ID: {config_id}): {e}")
+    
+    def _log_duplicates(self, now):
+        """重复触发汇总日志（调用方持有 _state_lock）"""
+        self._duplicates_unlogged += 1
+        if self._duplicate_logged_at is not None and now - self._duplicate_logged_at < PUSH_DUPLICATE_LOG_SECONDS:
+            return
+        logger.info(f"跳过重复执行 {self._duplicates_unlogged} 次"
+                    f"（累计 {self._stats['duplicate']} 次，同一任务同一分钟只推送一次）")
+        self._duplicates_unlogged = 0
+        self._duplicate_logged_at = now
+    
+    def _finish(self, config_id):
+        with self._state_lock:
+            self._in_flight.discard(config_id)
+        self._slots.release()
+    
+    def _run_push(self, config_id, fired_at):
+        """在推送线程中执行一次推送"""
+        outcome = 'completed'
+        try:
+            lag = self._clock() - fired_at
+            if lag > PUSH_MISFIRE_GRACE_SECONDS:
+                outcome = 'misfired'
+                logger.warning(f"⚠️  推送排队 {lag:.0f} 秒，超过宽限时间，跳过 (ID: {config_id})")
+                return
             
-            if not hasattr(self, '_last_execution'):
-                self._last_execution = {}
-            self._last_execution[task_key] = current_minute
+            config = self.get_snapshot(config_id)
+            if not config:
+                outcome = 'failed'
+                logger.warning(f"配置不存在或已禁用 (ID: {config_id})")
+                return
             
-            logger.info(f"⏰ 触发定时推送任务 (ID: {config_id})")
+            # 检查节假日过滤
+            schedule_config = json.loads(config['schedule_config'])
+            if self._should_skip_holiday(schedule_config):
+                outcome = 'skipped_holiday'
+                logger.info(f"⏭️  跳过节假日推送 (ID: {config_id})")
+                return
             
-            if not self.app:
+            # 执行推送
+            if self._push_func:
+                self._push_func(config)
+            elif self.app:
+                with self.app.app_context():
+                    from routes.dingtalk_push.dingtalk_push_routes import execute_push_task
+                    execute_push_task(config)
+            else:
+                outcome = 'failed'
                 logger.error("应用未初始化")
                 return
             
-            with self.app.app_context():
-                # 导入执行函数
-                from routes.dingtalk_push.dingtalk_push_routes import (
-                    get_db_connection, execute_push_task
-                )
-                
-                # 获取配置
-                conn = get_db_connection()
-                cursor = conn.cursor(dictionary=True)
-                
-                cursor.execute(
-                    "SELECT * FROM dingtalk_push_config WHERE id = %s AND enabled = TRUE",
-                    (config_id,)
-                )
-                config = cursor.fetchone()
-                
-                cursor.close()
-                conn.close()
-                
-                if not config:
-                    logger.warning(f"配置不存在或已禁用 (ID: {config_id})")
-                    return
-                
-                # 检查节假日过滤
-                schedule_config = json.loads(config['schedule_config'])
-                if self._should_skip_holiday(schedule_config):
-                    logger.info(f"⏭️  跳过节假日推送 (ID: {config_id})")
-                    return
-                
-                # 执行推送
-                execute_push_task(config)
-                
-                logger.info(f"✅ 定时推送任务完成 (ID: {config_id})")
+            logger.info(f"✅ 定时推送任务完成 (ID: {config_id})")
         
         except Exception as e:
+            outcome = 'failed'
             logger.error(f"❌ 执行定时推送任务失败 (ID: {config_id}): {e}")
+        finally:
+            with self._state_lock:
+                self._stats[outcome] += 1
+            self._finish(config_id)
     
-    def _should_skip_holiday(self, schedule_config):
-        """判断是否应该跳过（节假日过滤）"""
+    def get_snapshot(self, config_id):
+        """配置快照（不在内存中时从数据库读取一次）"""
+        with self._state_lock:
+            config = self._snapshots.get(config_id)
+        if config is None:
+            config = self.refresh_snapshot(config_id)
+        return config
+    
+    def refresh_snapshot(self, config_id):
+        """从数据库重新读取配置快照（配置已禁用或删除时清除快照）"""
+        config = self._fetch_config(config_id)
+        with self._state_lock:
+            if config:
+                self._snapshots[config_id] = config
+            else:
+                self._snapshots.pop(config_id, None)
+        return config
+    
+    def _fetch_config(self, config_id):
+        """读取启用且未删除的配置行"""
+        if not self.app:
+            return None
+        with self.app.app_context():
+            from routes.dingtalk_push.dingtalk_push_routes import get_db_connection
+            
+            conn = get_db_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(CONFIG_SNAPSHOT_SQL, (config_id,))
+            config = cursor.fetchone()
+            cursor.close()
+            conn.close()
+            return config
+    
+    def stats(self):
+        """执行统计与内存中的状态规模"""
+        with self._state_lock:
+            return dict(self._stats, snapshots=len(self._snapshots), last_fired=len(self._last_fired),
+                        in_flight=len(self._in_flight))
+    
+    def _should_skip_holiday(self, schedule_config, today=None):
+        """判断是否应该跳过（节假日过滤：法定节假日与未调休的周末跳过，调休上班日照常推送）"""
         try:
             config = schedule_config.get('config', {})
             
             if not config.get('exclude_holidays'):
                 return False
             
-            # TODO: 集成节假日判断逻辑
-            # 当前简化实现：周末跳过
-            from datetime import datetime
-            today = datetime.now()
-            
-            # 如果配置了工作日过滤，且今天是周末
-            if config.get('weekdays'):
-                # weekday(): 0=周一, 6=周日
-                if today.weekday() >= 5:  # 周六或周日
-                    return True
-            
-            return False
+            return not holiday_calendar.is_workday(today or datetime.now().date())
         
         except Exception as e:
             logger.error(f"节假日判断失败: {e}")
             return False
     
     def reload_config(self, config_id):
-        """重新加载配置（配置更新后调用）"""
+        """重新加载配置（配置更新后调用）：更新快照并重新注册任务，配置已禁用或删除时移除任务"""
         try:
-            if not self.app:
-                return
-            
-            with self.app.app_context():
-                from routes.dingtalk_push.dingtalk_push_routes import get_db_connection
-                
-                conn = get_db_connection()
-                cursor = conn.cursor(dictionary=True)
-                
-                cursor.execute(
-                    "SELECT id, schedule_config FROM dingtalk_push_config WHERE id = %s",
-                    (config_id,)
-                )
-                config = cursor.fetchone()
-                
-                cursor.close()
-                conn.close()
-                
-                if config:
-                    schedule_config = json.loads(config['schedule_config'])
-                    self.register_job(config_id, schedule_config)
-                    logger.info(f"✅ 已重新加载配置 (ID: {config_id})")
+            config = self.refresh_snapshot(config_id)
+            if config:
+                schedule_config = json.loads(config['schedule_config'])
+                self.register_job(config_id, schedule_config)
+                logger.info(f"✅ 已重新加载配置 (ID: {config_id})")
+            else:
+                self.remove_job(config_id)
         
         except Exception as e:
             logger.error(f"❌ 重新加载配置失败 (ID: {config_id}): {e}")
@@ -376,6 +488,7 @@ class DingTalkPushScheduler:
         if self.scheduler.running:
             self.scheduler.shutdown(wait=False)
             logger.info("🛑 钉钉推送定时调度器已关闭")
+        self._executor.shutdown(wait=False)
 
 
 # 全局调度器实例
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+钉钉推送统计汇总（按 配置 × 天 预聚合）
+
+- dingtalk_push_stats_daily 每行是一个配置一天的计数：执行次数、成功/失败次数、耗时总和/条数、耗时分桶
+- 汇总表在应用启动时用独立连接建表（MySQL 的 DDL 会隐式提交，不能出现在推送历史的事务里）；
+  汇总表为空而历史表已有数据（升级后首次启动）时自动从历史重算一次
+- 推送历史写入时同一事务内增量更新：create_push_history 计执行次数，update_push_history 按
+  新旧记录的差值更新成功/失败与耗时，同一条记录多次更新不会重复计数
+- 汇总更新放在 SAVEPOINT 里：失败时只回滚到保存点并记录告警，推送历史照常提交；
+  保存点也无法回滚（整个事务已被数据库回滚，如死锁）时抛出原异常，由调用方按历史写入失败处理
+- rebuild 按 triggered_at 区间从历史表重算（补数据或修正）
+- 统计接口只读汇总表，读取行数为 配置数 × 天数，与历史表大小无关
+"""
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+STATS_TABLE = 'dingtalk_push_stats_daily'
+
+# 耗时分桶上限（毫秒），最后一个桶为超过最大上限的部分
+DURATION_BUCKETS = [
+    ('duration_le_1s', 1000),
+    ('duration_le_3s', 3000),
+    ('duration_le_10s', 10000),
+    ('duration_le_30s', 30000),
+    ('duration_gt_30s', None),
+]
+COUNTER_COLUMNS = (['runs', 'success_count', 'failed_count', 'duration_sum_ms', 'duration_count']
+                   + [column for column, _ in DURATION_BUCKETS])
+
+CREATE_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+        config_id INT NOT NULL COMMENT '配置ID',
+        stat_date DATE NOT NULL COMMENT '统计日期（按触发时间）',
+        runs INT NOT NULL DEFAULT 0 COMMENT '执行次数',
+        success_count INT NOT NULL DEFAULT 0 COMMENT '成功次数',
+        failed_count INT NOT NULL DEFAULT 0 COMMENT '失败次数',
+        duration_sum_ms BIGINT NOT NULL DEFAULT 0 COMMENT '耗时总和（毫秒）',
+        duration_count INT NOT NULL DEFAULT 0 COMMENT '有耗时的记录数',
+        duration_le_1s INT NOT NULL DEFAULT 0 COMMENT '耗时 <= 1s',
+        duration_le_3s INT NOT NULL DEFAULT 0 COMMENT '耗时 1s~3s',
+        duration_le_10s INT NOT NULL DEFAULT 0 COMMENT '耗时 3s~10s',
+        duration_le_30s INT NOT NULL DEFAULT 0 COMMENT '耗时 10s~30s',
+        duration_gt_30s INT NOT NULL DEFAULT 0 COMMENT '耗时 > 30s',
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+        PRIMARY KEY (config_id, stat_date),
+        INDEX idx_stat_date (stat_date)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='钉钉推送每日统计汇总'
+"""
+
+UPSERT_SQL = (
+    f"INSERT INTO {STATS_TABLE} (config_id, stat_date, {', '.join(COUNTER_COLUMNS)}) "
+    f"VALUES (%s, %s, {', '.join(['%s'] * len(COUNTER_COLUMNS))}) "
+    f"ON DUPLICATE KEY UPDATE {', '.join(f'{column} = {column} + VALUES({column})' for column in COUNTER_COLUMNS)}"
+)
+
+SAVEPOINT_NAME = 'push_stats'
+
+_table_ready = False
+
+
+def ensure_table(cursor) -> None:
+    """独立使用汇总表（重算、统计查询）前建表，不能在推送历史的事务里调用"""
+    global _table_ready
+    if not _table_ready:
+        cursor.execute(CREATE_TABLE_SQL)
+        _table_ready = True
+
+
+def _needs_backfill(cursor) -> bool:
+    """汇总表为空而推送历史已有记录"""
+    cursor.execute(f"SELECT 1 FROM {STATS_TABLE} LIMIT 1")
+    if cursor.fetchone():
+        return False
+    cursor.execute("SELECT 1 FROM dingtalk_push_history LIMIT 1")
+    return cursor.fetchone() is not None
+
+
+def init_table(conn=None) -> bool:
+    """
+    应用启动时建表（独立连接与事务），汇总表为空而已有推送历史时从历史重算一次
+
+    Args:
+        conn: 数据库连接，默认新建推送库连接（用完关闭）
+
+    Returns:
+        是否建表成功；失败只记录告警，汇总更新会跳过并记录告警，可在建表后用 rebuild 回填
+    """
+    own_conn = conn is None
+    try:
+        if own_conn:
+            from routes.dingtalk_push.dingtalk_push_routes import get_db_connection
+            conn = get_db_connection()
+        cursor = conn.cursor()
+        try:
+            ensure_table(cursor)
+            conn.commit()
+            backfill = _needs_backfill(cursor)
+        finally:
+            cursor.close()
+    except Exception as e:
+        logger.warning(f"[PUSH_STATS] 汇总表建表失败（统计汇总暂不可用）: {e}")
+        if own_conn and conn is not None:
+            conn.close()
+        return False
+
+    try:
+        if backfill:
+            logger.info("[PUSH_STATS] 汇总表为空，从推送历史重算")
+            rebuild(conn)
+    except Exception as e:
+        logger.warning(f"[PUSH_STATS] 从推送历史重算汇总失败（可稍后执行 rebuild）: {e}")
+    finally:
+        if own_conn:
+            conn.close()
+    return True
+
+
+def duration_bucket(duration_ms: int) -> str:
+    """耗时所在的分桶列"""
+    for column, upper in DURATION_BUCKETS:
+        if upper is None or duration_ms <= upper:
+            return column
+
+
+def contribution(status: Optional[str], duration_ms: Optional[int]) -> Dict[str, int]:
+    """一条历史记录对成功/失败与耗时计数的贡献（执行次数在创建时单独计）"""
+    counters = {}
+    if status == 'success':
+        counters['success_count'] = 1
+    elif status == 'failed':
+        counters['failed_count'] = 1
+    if duration_ms is not None:
+        counters['duration_sum_ms'] = int(duration_ms)
+        counters['duration_count'] = 1
+        counters[duration_bucket(int(duration_ms))] = 1
+    return counters
+
+
+def _apply(cursor, config_id: int, stat_date: date, delta: Dict[str, int]) -> None:
+    """在调用方的事务里用保存点更新汇总，失败时只撤销汇总更新"""
+    if not any(delta.values()):
+        return
+    cursor.execute(f"SAVEPOINT {SAVEPOINT_NAME}")
+    try:
+        cursor.execute(UPSERT_SQL, [config_id, stat_date] + [delta.get(column, 0) for column in COUNTER_COLUMNS])
+    except Exception as e:
+        try:
+            cursor.execute(f"ROLLBACK TO SAVEPOINT {SAVEPOINT_NAME}")
+        except Exception:
+            # 事务已被数据库整体回滚，推送历史也没有写入，不能当作汇总失败吞掉
+            raise e
+        logger.warning(f"[PUSH_STATS] 更新汇总失败（可通过 rebuild 修正）: {e}")
+        return
+    cursor.execute(f"RELEASE SAVEPOINT {SAVEPOINT_NAME}")
+
+
+def _stat_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def record_created(cursor, config_id: int, triggered_at: datetime) -> None:
+    """新建推送历史（pending）后调用：执行次数 +1"""
+    _apply(cursor, config_id, _stat_date(triggered_at), {'runs': 1})
+
+
+def record_updated(cursor, old_row: Dict, changes: Dict) -> None:
+    """
+    推送历史更新后调用：按新旧记录的差值更新计数
+
+    Args:
+        old_row: 更新前的记录（config_id, triggered_at, status, execution_duration_ms）
+        changes: 本次更新的字段
+    """
+    if not old_row:
+        return
+    old_status, old_duration = old_row.get('status'), old_row.get('execution_duration_ms')
+    new_status = changes.get('status', old_status)
+    new_duration = changes.get('execution_duration_ms', old_duration)
+    before = contribution(old_status, old_duration)
+    after = contribution(new_status, new_duration)
+    delta = {column: after.get(column, 0) - before.get(column, 0) for column in set(before) | set(after)}
+    _apply(cursor, old_row['config_id'], _stat_date(old_row['triggered_at']), delta)
+
+
+def rebuild(conn, start_date: date = None, end_date: date = None) -> int:
+    """
+    从推送历史重算汇总（含首尾两天；不传时重算全部）
+
+    Returns:
+        写入的汇总行数
+    """
+    bucket_sums = []
+    lower = None
+    for column, upper in DURATION_BUCKETS:
+        conditions = ['execution_duration_ms IS NOT NULL']
+        if lower is not None:
+            conditions.append(f'execution_duration_ms > {lower}')
+        if upper is not None:
+            conditions.append(f'execution_duration_ms <= {upper}')
+        bucket_sums.append(f"SUM(CASE WHEN {' AND '.join(conditions)} THEN 1 ELSE 0 END)")
+        lower = upper
+
+    where, params = [], []
+    if start_date:
+        where.append('triggered_at >= %s')
+        params.append(datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        where.append('triggered_at < %s')
+        params.append(datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    history_where = f"WHERE {' AND '.join(where)}" if where else ''
+    stats_where = ' AND '.join(
+        (['stat_date >= %s'] if start_date else []) + (['stat_date <= %s'] if end_date else [])) or '1 = 1'
+
+    cursor = conn.cursor()
+    try:
+        ensure_table(cursor)
+        cursor.execute(f"DELETE FROM {STATS_TABLE} WHERE {stats_where}", [d for d in (start_date, end_date) if d])
+        cursor.execute(
+            f"""INSERT INTO {STATS_TABLE} (config_id, stat_date, {', '.join(COUNTER_COLUMNS)})
+                SELECT config_id, DATE(triggered_at), COUNT(*),
+                       SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END),
+                       COALESCE(SUM(execution_duration_ms), 0),
+                       COUNT(execution_duration_ms),
+                       {', '.join(bucket_sums)}
+                FROM dingtalk_push_history {history_where}
+                GROUP BY config_id, DATE(triggered_at)""",
+            params
+        )
+        rows = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    logger.info(f"[PUSH_STATS] 重算汇总完成：{start_date or '最早'} ~ {end_date or '最新'}，{rows} 行")
+    return rows
+
+
+def query_statistics(cursor, start_date: date, config_id: int = None) -> Dict:
+    """
+    读取汇总（与原 /statistics 返回字段一致，另含耗时分桶）
+
+    Args:
+        cursor: 字典游标
+        start_date: 起始日期（含）
+        config_id: 只统计某个配置
+    """
+    ensure_table(cursor)
+    sql = (f"SELECT stat_date, {', '.join(f'SUM({column}) AS {column}' for column in COUNTER_COLUMNS)} "
+           f"FROM {STATS_TABLE} WHERE stat_date >= %s")
+    params = [start_date]
+    if config_id:
+        sql += " AND config_id = %s"
+        params.append(config_id)
+    sql += " GROUP BY stat_date ORDER BY stat_date ASC"
+    cursor.execute(sql, params)
+    days = cursor.fetchall()
+
+    totals = {column: sum(int(day[column] or 0) for day in days) for column in COUNTER_COLUMNS}
+    stats = {
+        'total_runs': totals['runs'],
+        'success_count': totals['success_count'],
+        'failed_count': totals['failed_count'],
+        'avg_execution_time_ms': (round(totals['duration_sum_ms'] / totals['duration_count'], 4)
+                                  if totals['duration_count'] else None),
+        'success_rate': round(totals['success_count'] / totals['runs'] * 100, 2) if totals['runs'] else 0,
+        'duration_histogram': [{'le_ms': upper, 'count': totals[column]} for column, upper in DURATION_BUCKETS],
+        'trend': [{'date': day['stat_date'], 'runs': int(day['runs'] or 0), 'success': int(day['success_count'] or 0)}
+                  for day in days],
+    }
+    return stats
+
+
+def _parse_date(value: str) -> date:
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+if __name__ == '__main__':
+    # 补数据：python -m utils.dingtalk_push_stats --start 2026-01-01 --end 2026-03-31
+    import os
+    import sys
+
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='从推送历史重算每日统计汇总')
+    parser.add_argument('--start', type=_parse_date, help='起始日期 YYYY-MM-DD')
+    parser.add_argument('--end', type=_parse_date, help='结束日期 YYYY-MM-DD')
+    args = parser.parse_args()
+
+    from routes.dingtalk_push.dingtalk_push_routes import get_db_connection
+
+    connection = get_db_connection()
+    try:
+        rebuild(connection, args.start, args.end)
+    finally:
+        connection.close()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+钉钉推送渲染缓存（编译模板缓存 + 数据源结果缓存）
+
+- 所有模板共用一个 SandboxedEnvironment，过滤器只注册一次；编译结果按（配置 ID, 模板内容哈希）缓存，
+  模板修改后哈希变化自然失效
+- 数据源结果按数据源定义的哈希缓存，多个配置使用同一数据源时共用；有效期取各配置的
+  data_source_config.cache_ttl（默认 DINGTALK_DATA_SOURCE_TTL 秒，默认 0 即不缓存）。
+  设置有效期后定时推送可能发出至多 cache_ttl 秒前的数据，只对能接受这一时效的数据源开启
+- 同一数据源并发未命中时只获取一次（single-flight），其余请求等待并共用结果或异常；失败不缓存。
+  不缓存时整点同时触发的推送仍然共用同一次获取
+- 返回结果的深拷贝，调用方修改结果（含嵌套的行数据）不会影响缓存和其他推送
+- api 数据源复用带连接池的 requests.Session，sql 数据源按库复用 mysql.connector 连接池
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from jinja2 import BaseLoader, Template, sandbox
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# 数据源结果默认有效期（秒），0 表示不缓存（定时推送总是发送最新数据）
+DINGTALK_DATA_SOURCE_TTL = int(os.getenv('DINGTALK_DATA_SOURCE_TTL', '0'))
+# 最多缓存的编译模板数与数据源结果数
+DINGTALK_TEMPLATE_CACHE_SIZE = int(os.getenv('DINGTALK_TEMPLATE_CACHE_SIZE', '512'))
+DINGTALK_DATA_SOURCE_CACHE_SIZE = int(os.getenv('DINGTALK_DATA_SOURCE_CACHE_SIZE', '256'))
+# sql 数据源连接池大小
+DINGTALK_SQL_POOL_SIZE = int(os.getenv('DINGTALK_SQL_POOL_SIZE', '4'))
+# 等待其他线程获取同一数据源的最长时间（秒）
+FLIGHT_WAIT_TIMEOUT = 60
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def format_datetime(dt, fmt='%Y-%m-%d %H:%M'):
+    """模板过滤器：格式化时间（支持 ISO 字符串）"""
+    if isinstance(dt, str):
+        dt = datetime.fromisoformat(dt)
+    return dt.strftime(fmt)
+
+
+# ==================== 编译模板缓存 ====================
+
+class TemplateCache:
+    """编译模板缓存"""
+
+    def __init__(self, max_size: int = DINGTALK_TEMPLATE_CACHE_SIZE):
+        self.max_size = max_size
+        self.env = sandbox.SandboxedEnvironment(loader=BaseLoader())
+        self.env.filters['format_datetime'] = format_datetime
+        self._templates: 'OrderedDict[tuple, Template]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'compiles': 0}
+
+    def get(self, template_content: str, config_id: Any = None) -> Template:
+        """获取编译好的模板（模板语法错误时抛出 TemplateSyntaxError）"""
+        key = (config_id, _digest(template_content or ''))
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                self._stats['hits'] += 1
+                return template
+
+        # 编译在锁外进行；并发编译同一模板结果相同，后写入的覆盖即可
+        template = self.env.from_string(template_content or '')
+        with self._lock:
+            self._templates[key] = template
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+            self._stats['compiles'] += 1
+        return template
+
+    def render(self, template_content: str, data: Dict, config_id: Any = None) -> str:
+        """
+        渲染模板
+
+        Args:
+            template_content: 模板内容
+            data: 模板变量（与内置变量同名时以 data 为准）
+            config_id: 推送配置 ID（预览时为空）
+        """
+        now = datetime.now()
+        context = {
+            'now': now.strftime('%Y-%m-%d %H:%M:%S'),  # 默认返回格式化字符串
+            'now_datetime': now,  # 返回 datetime 对象
+        }
+        context.update(data or {})
+        return self.get(template_content, config_id).render(**context)
+
+    def invalidate(self, config_id: Any = None) -> None:
+        """清除某个配置的编译模板；不传时清空全部"""
+        with self._lock:
+            if config_id is None:
+                self._templates.clear()
+                return
+            for key in [key for key in self._templates if key[0] == config_id]:
+                del self._templates[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, size=len(self._templates))
+
+
+# ==================== 数据源结果缓存 ====================
+
+class _Flight:
+    """一次进行中的数据源获取"""
+
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class DataSourceCache:
+    """数据源结果缓存"""
+
+    def __init__(self, max_size: int = DINGTALK_DATA_SOURCE_CACHE_SIZE, default_ttl: float = DINGTALK_DATA_SOURCE_TTL):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (value, fetched_at)
+        self._flights: Dict[str, _Flight] = {}
+        self._config_keys: Dict[Any, set] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'shared': 0, 'errors': 0}
+
+    @staticmethod
+    def source_key(data_source_config: Dict) -> str:
+        """数据源定义的哈希（不含缓存策略字段）"""
+        definition = {key: value for key, value in data_source_config.items() if key not in ('cache_ttl', 'actionCard')}
+        return _digest(json.dumps(definition, sort_keys=True, ensure_ascii=False, default=str))
+
+    def get(self, data_source_config: Dict, loader: Callable[[Dict], Any], config_id: Any = None) -> Any:
+        """
+        获取数据源结果
+
+        Args:
+            data_source_config: 数据源配置（cache_ttl 为该配置可接受的结果时效，秒）
+            loader: 实际获取数据的函数，参数为 data_source_config
+            config_id: 推送配置 ID，用于按配置失效
+
+        Returns:
+            结果的深拷贝（调用方可以修改结果或往里追加变量）
+        """
+        ttl = data_source_config.get('cache_ttl', self.default_ttl)
+        key = self.source_key(data_source_config)
+        now = time.monotonic()
+        with self._lock:
+            if config_id is not None:
+                self._config_keys.setdefault(config_id, set()).add(key)
+            entry = self._entries.get(key)
+            if entry is not None and ttl and now - entry[1] <= ttl:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return copy.deepcopy(entry[0])
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats['shared'] += 1
+
+        if not owner:
+            if not flight.event.wait(FLIGHT_WAIT_TIMEOUT):
+                raise TimeoutError("等待数据源结果超时")
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.value)
+
+        try:
+            flight.value = loader(data_source_config)
+            with self._lock:
+                self._stats['loads'] += 1
+                self._entries[key] = (flight.value, time.monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            return copy.deepcopy(flight.value)
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def invalidate(self, config_id: Any = None) -> None:
+        """清除某个配置用到的数据源结果；不传时清空全部"""
+        with self._lock:
+            if config_id is None:
+                self._entries.clear()
+                self._config_keys.clear()
+                return
+            for key in self._config_keys.pop(config_id, set()):
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), in_flight=len(self._flights))
+
+
+# ==================== 数据源连接复用 ====================
+
+_http_session: Optional[requests.Session] = None
+_sql_pools: Dict[str, Any] = {}
+_connection_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """带连接池的共享 Session（api 数据源）"""
+    global _http_session
+    if _http_session is None:
+        with _connection_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _http_session = session
+    return _http_session
+
+
+def get_sql_connection(database: str):
+    """从连接池获取 sql 数据源的连接（池满时退回单独连接）"""
+    from config import Config
+    import mysql.connector
+    from mysql.connector import errors, pooling
+
+    connect_args = {
+        'host': Config.MYSQL_HOST,
+        'port': Config.MYSQL_PORT,
+        'user': Config.MYSQL_USER,
+        'password': Config.MYSQL_PASSWORD,
+        'database': database,
+        'charset': 'utf8mb4',
+    }
+    with _connection_lock:
+        pool = _sql_pools.get(database)
+        if pool is None:
+            pool = _sql_pools[database] = pooling.MySQLConnectionPool(
+                pool_name=f"dingtalk_ds_{database}"[:64], pool_size=DINGTALK_SQL_POOL_SIZE, **connect_args)
+    try:
+        return pool.get_connection()
+    except errors.PoolError:
+        logger.warning(f"[DINGTALK_CACHE] {database} 连接池已满，使用单独连接")
+        return mysql.connector.connect(**connect_args)
+
+
+# 全局缓存实例
+template_cache = TemplateCache()
+data_source_cache = DataSourceCache()
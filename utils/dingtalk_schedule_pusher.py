@@ -18,6 +18,7 @@ from cryptography.fernet import Fernet
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from routes.排班.paiBanNew_v2 import DB_CONFIG, RosterDB
+from utils.roster_read_model import roster_read_model
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -95,101 +96,8 @@ class DingTalkSchedulePusher:
     def build_markdown_message(self, start_date, end_date, time_slots=None):
         """构建Markdown格式的排班消息"""
         try:
-            db = RosterDB(self.db_config)
-            if not db.connect():
-                return None
-            
-            # 查询指定日期范围的排班数据
-            sql = """
-            SELECT r.*
-            FROM roster r
-            WHERE r.date BETWEEN %s AND %s
-            ORDER BY r.date, r.time_slot, r.is_main DESC
-            """
-            
-            results = db.query(sql, (start_date, end_date))
-            db.close()
-            
-            if not results:
-                return None
-            
-            # 按日期和时段分组
-            grouped_data = {}
-            for record in results:
-                date_key = record['date'].strftime('%Y-%m-%d') if hasattr(record['date'], 'strftime') else str(record['date'])
-                time_slot = record['time_slot']
-                
-                # 如果指定了时段过滤，则只推送指定的时段
-                if time_slots and time_slot not in time_slots:
-                    continue
-                
-                if date_key not in grouped_data:
-                    grouped_data[date_key] = {}
-                
-                if time_slot not in grouped_data[date_key]:
-                    grouped_data[date_key][time_slot] = []
-                
-                grouped_data[date_key][time_slot].append(record)
-            
-            # 构建钉钉消息内容（优化后的Markdown格式）
-            today = datetime.now().date()
-            msg_content = "# 📅 排班信息推送\n\n"
-            
-            # 按日期排序
-            sorted_dates = sorted(grouped_data.keys())
-            
-            for date_str in sorted_dates:
-                day_data = grouped_data[date_str]
-                
-                # 计算星期和相对日期描述
-                date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-                weekday = ['周一', '周二', '周三', '周四', '周五', '周六', '周日'][date_obj.weekday()]
-                
-                # 判断是今天、明天还是其他日期
-                delta = (date_obj - today).days
-                if delta == 0:
-                    date_label = f"**今天** {date_str} ({weekday})"
-                elif delta == 1:
-                    date_label = f"**明天** {date_str} ({weekday})"
-                elif delta == -1:
-                    date_label = f"**昨天** {date_str} ({weekday})"
-                else:
-                    date_label = f"**{date_str}** ({weekday})"
-                
-                msg_content += f"### {date_label}\n\n"
-                
-                # 按时段排序（按时间顺序）
-                time_slot_order = [
-                    '8:00～9:00',
-                    '8:00～12:00',
-                    '9:00～12:00',
-                    '13:30～17:30',
-                    '13:30～18:00',
-                    '17:30～21:30',
-                    '18:00～21:00'
-                ]
-                
-                sorted_slots = sorted(day_data.keys(), 
-                                    key=lambda x: time_slot_order.index(x) if x in time_slot_order else 999)
-                
-                for time_slot in sorted_slots:
-                    staff_records = day_data[time_slot]
-                    
-                    # 提取主班和辅班
-                    main_staff = [r['staff_name'] for r in staff_records if r['is_main']]
-                    backup_staff = [r['staff_name'] for r in staff_records if not r['is_main']]
-                    
-                    staff_display = '、'.join(main_staff + backup_staff) if (main_staff + backup_staff) else '空闲'
-                    
-                    msg_content += f"- **{time_slot}**: {staff_display}\n"
-                
-                msg_content += "\n---\n\n"
-            
-            # 添加查看详情链接（Markdown格式）
-            schedule_view_url = "https://alidocs.dingtalk.com/i/nodes/20eMKjyp81LOavDgf46AORZwJxAZB1Gv?utm_scene=person_space&iframeQuery=viewId%3Drm8nwl6hqzo0v1952seh4%26sheetId%3Dhe1d5bovtjfxcies7i3fi"
-            msg_content += f"[查看完整排班]({schedule_view_url})\n"
-            
-            return msg_content
+            # 多个推送配置推送同一周期时共用一次查询与渲染
+            return roster_read_model.render_markdown(start_date, end_date, time_slots)
             
         except Exception as e:
             logger.error(f"构建消息失败: {e}", exc_info=True)
@@ -9,6 +9,10 @@ import logging
 from typing import Dict, List, Optional
 from pathlib import Path
 
+from utils.faq_chunker import PAGE_BREAK, chunk_document, faq_chunk_cache
+from utils.llm_admission import PRIORITY_BATCH
+from utils.progress_bus import progress_bus
+
 logger = logging.getLogger(__name__)
 
 
@@ -142,29 +146,33 @@ class DocumentProcessor:
     def _read_word_file(self, filepath: str) -> str:
         """读取 Word 文件"""
         try:
-            from docx import Document
+            from utils.docx_reader import DocxReader, HEADING, TABLE
 
-            doc = Document(filepath)
-            paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
+            paragraphs = []
+            for event in DocxReader(filepath):
+                if not event.text.strip():
+                    continue
+                if event.kind == HEADING:
+                    # 标题段落转为 Markdown 标题，保留章节结构供分段使用
+                    paragraphs.append(f"{'#' * min(6, event.level)} {event.text.strip()}")
+                elif event.kind == TABLE:
+                    # 表格按正文位置输出，每行一段，单元格以 | 分隔
+                    paragraphs.append('\n'.join(' | '.join(cell.strip() for cell in row) for row in event.rows))
+                else:
+                    paragraphs.append(event.text)
             return '\n'.join(paragraphs)
         except ImportError:
-            raise Exception("需要安装 python-docx 库：pip install python-docx")
+            raise Exception("需要安装 lxml 库：pip install lxml")
         except Exception as e:
             raise Exception(f"读取 Word 文件失败：{str(e)}")
 
     def _read_pdf_file(self, filepath: str) -> str:
-        """读取 PDF 文件"""
+        """读取 PDF 文件（进程池按页抽取，扫描页回退 OCR）"""
         try:
-            import pdfplumber
+            from utils.pdf_extractor import pdf_extraction_pool
 
-            text_content = []
-            with pdfplumber.open(filepath) as pdf:
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if text:
-                        text_content.append(text)
-
-            return '\n'.join(text_content)
+            # 页与页之间用分页符分隔，保留页边界供分段使用
+            return pdf_extraction_pool.extract_text(filepath, separator=f'\n{PAGE_BREAK}\n')
         except ImportError:
             raise Exception("需要安装 pdfplumber 库：pip install pdfplumber")
         except Exception as e:
@@ -173,15 +181,10 @@ class DocumentProcessor:
     def _read_image_file(self, filepath: str) -> str:
         """读取图片文件（OCR）"""
         try:
-            import pytesseract
-            from PIL import Image
+            from utils.pdf_extractor import pdf_extraction_pool
 
-            # 中文识别
-            text = pytesseract.image_to_string(
-                Image.open(filepath),
-                lang='chi_sim+eng'
-            )
-            return text
+            # 中文识别（结果按文件哈希缓存）
+            return pdf_extraction_pool.ocr_image(filepath)
         except ImportError:
             raise Exception("需要安装 pytesseract 和 Pillow：pip install pytesseract pillow")
         except Exception as e:
@@ -308,7 +311,8 @@ def extract_faq_from_content_with_progress(content: str, ollama_client=None, dom
                 options={
                     'temperature': 0.1,  # 降低温度，使输出更确定
                     'format': 'json' if not ollama_client.use_omlx else None  # Ollama 原生支持 JSON 格式
-                }
+                },
+                priority=PRIORITY_BATCH  # 文档导入让位于交互请求
             )
             logger.info(f"[FAQ_EXTRACT] Section {idx + 1}/{total_sections} AI response length: {len(response)}")
             
@@ -347,28 +351,55 @@ def extract_faq_from_content_with_progress(content: str, ollama_client=None, dom
 
 def update_progress(preview_id: str, processed_sections: int, faqs_extracted: int):
     """
-    更新数据库中的处理进度
+    推送处理进度到进度总线（SSE 订阅方实时收到），数据库只在里程碑写入
+    
+    Args:
+        preview_id: 预览 ID
+        processed_sections: 已处理的章节数
+        faqs_extracted: 已提取的 FAQ 数量
+    """
+    if progress_bus.publish(preview_id, processed=processed_sections, faqs_extracted=faqs_extracted):
+        persist_progress(preview_id, processed_sections, faqs_extracted)
+
+
+def persist_progress(preview_id: str, processed_sections: int, faqs_extracted: int,
+                     status: Optional[str] = None, error: Optional[str] = None):
+    """
+    更新数据库中的处理进度（供其他进程的进度查询兜底）
     
     Args:
         preview_id: 预览 ID
         processed_sections: 已处理的章节数
         faqs_extracted: 已提取的 FAQ 数量
+        status: 结束状态（completed / failed），不传时只更新进度
+        error: 失败原因
     """
     try:
         from models.knowledge_base import knowledge_base_manager
         conn = knowledge_base_manager.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            UPDATE faq_preview_cache 
-            SET processed_sections = %s,
-                faqs_extracted = %s
-            WHERE preview_id = %s
-        ''', (processed_sections, faqs_extracted, preview_id))
+        if status is None:
+            cursor.execute('''
+                UPDATE faq_preview_cache 
+                SET processed_sections = %s,
+                    faqs_extracted = %s
+                WHERE preview_id = %s
+            ''', (processed_sections, faqs_extracted, preview_id))
+        else:
+            cursor.execute('''
+                UPDATE faq_preview_cache 
+                SET processed_sections = %s,
+                    faqs_extracted = %s,
+                    status = %s,
+                    error_message = %s
+                WHERE preview_id = %s
+            ''', (processed_sections, faqs_extracted, status, error, preview_id))
         
         conn.commit()
         conn.close()
-        logger.info(f"[PROGRESS] Updated preview {preview_id}: {processed_sections} sections, {faqs_extracted} FAQs")
+        logger.info(f"[PROGRESS] Updated preview {preview_id}: {processed_sections} sections, {faqs_extracted} FAQs"
+                    + (f", status={status}" if status else ''))
     except Exception as e:
         logger.error(f"更新进度失败：{e}")
 
@@ -455,7 +486,8 @@ def extract_faq_from_content(content: str, ollama_client=None, domain_id: int =
                 options={
                     'temperature': 0.1,  # 降低温度，使输出更确定
                     'format': 'json' if not ollama_client.use_omlx else None  # Ollama 原生支持 JSON 格式
-                }
+                },
+                priority=PRIORITY_BATCH  # 文档导入让位于交互请求
             )
             logger.info(f"[FAQ_EXTRACT] Section {idx + 1}/{len(sections)} AI response length: {len(response)}")
             
@@ -838,17 +870,39 @@ def fix_common_json_errors(text: str) -> str:
     return json_str
 
 
-def extract_faq_parallel_with_progress(content: str, ollama_client=None, chunk_size: int = 2000, max_workers: int = 3, domain_id: int = None, preview_id: str = None) -> List[Dict]:
+def _extract_chunk_cached(process_chunk, chunk_info: Dict, ollama_client, domain_id: int = None) -> List[Dict]:
+    """
+    抽取单个分段的 FAQ，按 (模型, 分段 ID) 复用之前的抽取结果
+
+    分段 ID 是分段内容的哈希，同一文档重复上传时命中缓存，不再调用模型
+    """
+    cache_key = f"{getattr(ollama_client, 'model', '')}:{chunk_info['id']}"
+    faqs = faq_chunk_cache.get(cache_key)
+    if faqs is not None:
+        logger.info(f"[FAQ_PARALLEL] Chunk {chunk_info['index']} ({chunk_info['id']}) 命中缓存，{len(faqs)} 条")
+    else:
+        faqs = process_chunk(chunk_info)
+        faq_chunk_cache.put(cache_key, [{k: v for k, v in faq.items() if k != 'domain_id'} for faq in faqs])
+
+    for faq in faqs:
+        faq.pop('domain_id', None)
+        if domain_id:
+            faq['domain_id'] = domain_id
+    return faqs
+
+
+def extract_faq_parallel_with_progress(content: str, ollama_client=None, max_chunk_tokens: int = None, max_workers: int = 3, domain_id: int = None, preview_id: str = None, chunks: List[Dict] = None) -> List[Dict]:
     """
     从文档内容中抽取 FAQ 对（并行处理版本，带进度更新）
     
     Args:
         content: 文档内容
         ollama_client: Ollama 客户端实例
-        chunk_size: 每段文本的长度（默认 2000 字符）
+        max_chunk_tokens: 每段正文的 token 预算（默认按 FAQ_CHUNK_CONTEXT_TOKENS 推算）
         max_workers: 最大并发线程数（默认 3 个）
         domain_id: 专业领域 ID（可选）
         preview_id: 预览 ID（用于更新数据库进度）
+        chunks: 已切好的分段（chunk_document 的结果），为空时按 content 分段
         
     Returns:
         FAQ 列表
@@ -861,22 +915,12 @@ def extract_faq_parallel_with_progress(content: str, ollama_client=None, chunk_s
         from utils.ollama_client import get_ollama_client
         ollama_client = get_ollama_client()
 
-    # 分割文本
-    chunks = []
-    total_length = len(content)
-
-    for i in range(0, total_length, chunk_size):
-        chunk = content[i:i + chunk_size]
-        if chunk.strip():  # 跳过空段落
-            chunks.append({
-                'index': i // chunk_size,
-                'content': chunk,
-                'start': i,
-                'end': min(i + chunk_size, total_length)
-            })
+    # 按文档结构与 token 预算分段
+    if chunks is None:
+        chunks = chunk_document(content, max_tokens=max_chunk_tokens)
 
     total_chunks = len(chunks)
-    logger.info(f"[FAQ_PARALLEL] Document total length: {total_length}, split into {total_chunks} chunks")
+    logger.info(f"[FAQ_PARALLEL] Document total length: {len(content)}, split into {total_chunks} chunks")
 
     def process_chunk(chunk_info, retry_count: int = 3):
         """处理单个文本段（带重试机制）"""
@@ -908,7 +952,7 @@ def extract_faq_parallel_with_progress(content: str, ollama_client=None, chunk_s
 
         for attempt in range(retry_count + 1):
             try:
-                response = ollama_client.generate(prompt)
+                response = ollama_client.generate(prompt, priority=PRIORITY_BATCH)
 
                 logger.debug(f"第 {chunk_index} 段 AI 响应预览：{response[:200]}...")
 
@@ -1020,7 +1064,7 @@ def extract_faq_parallel_with_progress(content: str, ollama_client=None, chunk_s
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # 提交所有任务
         future_to_chunk = {
-            executor.submit(process_chunk, chunk): chunk
+            executor.submit(_extract_chunk_cached, process_chunk, chunk, ollama_client, domain_id): chunk
             for chunk in chunks
         }
 
@@ -1042,16 +1086,17 @@ def extract_faq_parallel_with_progress(content: str, ollama_client=None, chunk_s
     return all_faqs
 
 
-def extract_faq_parallel(content: str, ollama_client=None, chunk_size: int = 2000, max_workers: int = 3, domain_id: int = None) -> List[Dict]:
+def extract_faq_parallel(content: str, ollama_client=None, max_chunk_tokens: int = None, max_workers: int = 3, domain_id: int = None, chunks: List[Dict] = None) -> List[Dict]:
     """
     从文档内容中抽取 FAQ 对（并行处理版本）
     
     Args:
         content: 文档内容
         ollama_client: Ollama 客户端实例
-        chunk_size: 每段文本的长度（默认 2000 字符）
+        max_chunk_tokens: 每段正文的 token 预算（默认按 FAQ_CHUNK_CONTEXT_TOKENS 推算）
         max_workers: 最大并发线程数（默认 3 个）
         domain_id: 专业领域 ID（可选）
+        chunks: 已切好的分段（chunk_document 的结果），为空时按 content 分段
         
     Returns:
         FAQ 列表
@@ -1063,21 +1108,11 @@ def extract_faq_parallel(content: str, ollama_client=None, chunk_size: int = 200
         from utils.ollama_client import get_ollama_client
         ollama_client = get_ollama_client()
 
-    # 分割文本
-    chunks = []
-    total_length = len(content)
-
-    for i in range(0, total_length, chunk_size):
-        chunk = content[i:i + chunk_size]
-        if chunk.strip():  # 跳过空段落
-            chunks.append({
-                'index': i // chunk_size,
-                'content': chunk,
-                'start': i,
-                'end': min(i + chunk_size, total_length)
-            })
+    # 按文档结构与 token 预算分段
+    if chunks is None:
+        chunks = chunk_document(content, max_tokens=max_chunk_tokens)
 
-    logger.info(f"[FAQ_PARALLEL] Document total length: {total_length}, split into {len(chunks)} chunks")
+    logger.info(f"[FAQ_PARALLEL] Document total length: {len(content)}, split into {len(chunks)} chunks")
 
     def process_chunk(chunk_info, retry_count: int = 3):
         """处理单个文本段（带重试机制）"""
@@ -1109,7 +1144,7 @@ def extract_faq_parallel(content: str, ollama_client=None, chunk_size: int = 200
 
         for attempt in range(retry_count + 1):
             try:
-                response = ollama_client.generate(prompt)
+                response = ollama_client.generate(prompt, priority=PRIORITY_BATCH)
 
                 logger.debug(f"第 {chunk_index} 段 AI 响应预览：{response[:200]}...")
 
@@ -1220,7 +1255,7 @@ def extract_faq_parallel(content: str, ollama_client=None, chunk_size: int = 200
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # 提交所有任务
         future_to_chunk = {
-            executor.submit(process_chunk, chunk): chunk
+            executor.submit(_extract_chunk_cached, process_chunk, chunk, ollama_client, domain_id): chunk
             for chunk in chunks
         }
 
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Word（.docx）流式读取器
+
+- 直接解析 docx 内的 XML（lxml iterparse），按正文顺序逐个产出事件，段落与表格不再分两遍处理
+- 样式表（styles.xml）与编号定义（numbering.xml）只解析一次，段落的样式名、标题层级、列表格式查字典得到
+- 事件类型：heading / paragraph / list_item / table；每个正文元素处理完即释放，内存占用与文档长度无关
+- 目录不输出：目录内容控件（docPartGallery 为 Table of Contents）整体跳过，TOC 域的结果文本不计入段落
+- Word 转 Markdown、Word 转 Excel、FAQ 抽取（DocumentProcessor）共用
+"""
+import logging
+import re
+import zipfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_W = '{%s}' % W_NS
+
+
+def _w(tag: str) -> str:
+    return _W + tag
+
+
+P, R, T, TBL, TR, TC = _w('p'), _w('r'), _w('t'), _w('tbl'), _w('tr'), _w('tc')
+TXBX_CONTENT = _w('txbxContent')
+SDT = _w('sdt')
+_FLD_CHAR, _INSTR_TEXT, _FLD_SIMPLE = _w('fldChar'), _w('instrText'), _w('fldSimple')
+_TAB, _PTAB, _BR, _CR, _NO_BREAK_HYPHEN = _w('tab'), _w('ptab'), _w('br'), _w('cr'), _w('noBreakHyphen')
+VAL = _w('val')
+
+# 事件类型
+HEADING = 'heading'
+PARAGRAPH = 'paragraph'
+LIST_ITEM = 'list_item'
+TABLE = 'table'
+
+# 段落内可能包裹 run 的容器（超链接、修订插入、内容控件、域等），文本框内容不计入所在段落
+_RUN_CONTAINERS = {_w(tag) for tag in ('hyperlink', 'ins', 'smartTag', 'sdt', 'sdtContent', 'fldSimple',
+                                       'customXml', 'moveTo', 'dir', 'bdo')}
+_FALSE_VALUES = ('0', 'false', 'off', 'none')
+_TOC_GALLERY = 'table of contents'
+
+# python-docx 对内置样式显示名的转换（styles.xml 中为小写）
+_BUILTIN_STYLE_NAMES = {'caption': 'Caption', 'footer': 'Footer', 'header': 'Header', 'title': 'Title',
+                        'subtitle': 'Subtitle'}
+_BUILTIN_STYLE_NAMES.update({f'heading {i}': f'Heading {i}' for i in range(1, 10)})
+
+_HEADING_STYLE = re.compile(r'^(?:heading|标题)\s*([1-9])$', re.IGNORECASE)
+_CN_LEVEL_STYLE = re.compile(r'^([一二三四五六七八九])级标题$')
+_CN_DIGITS = '一二三四五六七八九'
+
+
+def heading_level_from_style(style_name: str) -> int:
+    """
+    根据样式名判断标题层级
+
+    支持 Heading 1-9 / 标题 1-9 / 一级标题 / Title / Subtitle，样式别名（"heading 2,H2"）取第一个名称
+
+    Returns:
+        标题层级（1 最高），非标题样式返回 0
+    """
+    name = (style_name or '').split(',')[0].strip()
+    lower = name.lower()
+    if lower in ('title', '标题'):
+        return 1
+    if lower == 'subtitle':
+        return 2
+    match = _HEADING_STYLE.match(name)
+    if match:
+        return int(match.group(1))
+    match = _CN_LEVEL_STYLE.match(name)
+    if match:
+        return _CN_DIGITS.index(match.group(1)) + 1
+    return 0
+
+
+def _attr(elem, path: str) -> Optional[str]:
+    """读取子元素的 w:val 属性，元素不存在返回 None"""
+    if elem is None:
+        return None
+    child = elem.find(path, {'w': W_NS})
+    return child.get(VAL) if child is not None else None
+
+
+def _toggle(rpr, tag: str) -> Optional[bool]:
+    """读取 run 的开关属性（w:b / w:i / w:strike），未设置返回 None，与 python-docx 一致"""
+    child = rpr.find(_w(tag))
+    if child is None:
+        return None
+    return child.get(VAL, 'true').lower() not in _FALSE_VALUES
+
+
+class ParagraphStyle:
+    """解析后的段落样式（已沿 basedOn 链合并）"""
+
+    __slots__ = ('style_id', 'name', 'heading_level', 'num_id', 'ilvl')
+
+    def __init__(self, style_id: str, name: str, heading_level: int = 0,
+                 num_id: Optional[str] = None, ilvl: Optional[int] = None):
+        self.style_id = style_id
+        self.name = name
+        self.heading_level = heading_level
+        self.num_id = num_id
+        self.ilvl = ilvl
+
+
+class StyleTable:
+    """
+    样式与编号定义（每个文档解析一次）
+
+    Args:
+        styles_xml: word/styles.xml 内容（可为 None）
+        numbering_xml: word/numbering.xml 内容（可为 None）
+    """
+
+    def __init__(self, styles_xml: Optional[bytes] = None, numbering_xml: Optional[bytes] = None):
+        self.styles: Dict[str, ParagraphStyle] = {}
+        self.default_style = ParagraphStyle('', 'Normal')
+        self._formats: Dict[Tuple[str, int], str] = {}
+        if styles_xml:
+            self._parse_styles(etree.fromstring(styles_xml, etree.XMLParser(huge_tree=True)))
+        if numbering_xml:
+            self._parse_numbering(etree.fromstring(numbering_xml, etree.XMLParser(huge_tree=True)))
+
+    def _parse_styles(self, root):
+        raw = {}
+        default_id = None
+        for style in root.iterchildren(_w('style')):
+            if style.get(_w('type')) != 'paragraph':
+                continue
+            style_id = style.get(_w('styleId'))
+            if style.get(_w('default')) in ('1', 'true'):
+                default_id = style_id
+            ppr = style.find(_w('pPr'))
+            outline = _attr(ppr, 'w:outlineLvl')
+            raw[style_id] = {
+                'name': _attr(style, 'w:name') or style_id,
+                'based_on': _attr(style, 'w:basedOn'),
+                'outline': int(outline) if outline and outline.isdigit() else None,
+                'num_id': _attr(ppr, 'w:numPr/w:numId'),
+                'ilvl': _attr(ppr, 'w:numPr/w:ilvl'),
+            }
+
+        def inherited(style_id, key):
+            seen = set()
+            while style_id in raw and style_id not in seen:
+                seen.add(style_id)
+                value = raw[style_id][key]
+                if value is not None:
+                    return value
+                style_id = raw[style_id]['based_on']
+            return None
+
+        for style_id, info in raw.items():
+            name = _BUILTIN_STYLE_NAMES.get(info['name'], info['name'])
+            level = heading_level_from_style(name)
+            if not level:
+                # 大纲级别 0-8 对应 1-9 级标题，9 为正文
+                outline = inherited(style_id, 'outline')
+                level = outline + 1 if outline is not None and outline < 9 else 0
+            ilvl = inherited(style_id, 'ilvl')
+            self.styles[style_id] = ParagraphStyle(
+                style_id, name, level, inherited(style_id, 'num_id'),
+                int(ilvl) if ilvl and ilvl.isdigit() else None
+            )
+        if default_id in self.styles:
+            self.default_style = self.styles[default_id]
+
+    def _parse_numbering(self, root):
+        abstract_formats: Dict[str, Dict[int, str]] = {}
+        for abstract in root.iterchildren(_w('abstractNum')):
+            levels = {}
+            for lvl in abstract.iterchildren(_w('lvl')):
+                ilvl = lvl.get(_w('ilvl'), '0')
+                levels[int(ilvl) if ilvl.isdigit() else 0] = _attr(lvl, 'w:numFmt') or 'decimal'
+            abstract_formats[abstract.get(_w('abstractNumId'))] = levels
+
+        for num in root.iterchildren(_w('num')):
+            num_id = num.get(_w('numId'))
+            levels = dict(abstract_formats.get(_attr(num, 'w:abstractNumId'), {}))
+            for override in num.iterchildren(_w('lvlOverride')):
+                fmt = _attr(override, 'w:lvl/w:numFmt')
+                ilvl = override.get(_w('ilvl'), '0')
+                if fmt:
+                    levels[int(ilvl) if ilvl.isdigit() else 0] = fmt
+            for ilvl, fmt in levels.items():
+                self._formats[(num_id, ilvl)] = fmt
+
+    def style(self, style_id: Optional[str]) -> ParagraphStyle:
+        """按样式 ID 查找段落样式，缺省为文档默认段落样式"""
+        if style_id is None:
+            return self.default_style
+        return self.styles.get(style_id) or self.default_style
+
+    def list_format(self, num_id: str, ilvl: int) -> Optional[str]:
+        """编号格式（decimal / bullet / lowerLetter ...），未定义返回 None"""
+        return self._formats.get((num_id, ilvl))
+
+
+class Run:
+    """带格式的文本片段（属性与 python-docx Run 同名，未设置为 None）"""
+
+    __slots__ = ('text', 'bold', 'italic', 'underline', 'strikethrough')
+
+    def __init__(self, text: str, bold=None, italic=None, underline=None, strikethrough=None):
+        self.text = text
+        self.bold = bold
+        self.italic = italic
+        self.underline = underline
+        self.strikethrough = strikethrough
+
+
+class DocxEvent:
+    """
+    正文事件
+
+    Attributes:
+        kind: heading / paragraph / list_item / table
+        index: 在正文中的顺序号（空段落同样占位）
+        text: 段落纯文本；表格为行内制表符、行间换行的文本
+        style: 段落样式显示名（表格为空）
+        level: 标题层级（1 起）或列表层级（0 起）
+        numbered: 列表是否为有序编号
+        runs: 段落的 Run 列表
+        rows: 表格单元格文本（合并单元格按网格展开）
+        space_after: 段后间距（磅），未设置为 None
+    """
+
+    __slots__ = ('kind', 'index', 'text', 'style', 'level', 'numbered', 'runs', 'rows', 'space_after')
+
+    def __init__(self, kind: str, index: int, text: str = '', style: str = '', level: int = 0,
+                 numbered: bool = False, runs: Optional[List[Run]] = None,
+                 rows: Optional[List[List[str]]] = None, space_after: Optional[float] = None):
+        self.kind = kind
+        self.index = index
+        self.text = text
+        self.style = style
+        self.level = level
+        self.numbered = numbered
+        self.runs = runs or []
+        self.rows = rows or []
+        self.space_after = space_after
+
+    def __repr__(self):
+        return f"DocxEvent({self.kind}, #{self.index}, {self.style!r}, {self.text[:30]!r})"
+
+
+def _is_toc_sdt(sdt) -> bool:
+    """内容控件是否为目录（sdtPr/docPartObj|docPartList/docPartGallery = Table of Contents）"""
+    sdt_pr = sdt.find(_w('sdtPr'))
+    if sdt_pr is None:
+        return False
+    for gallery in sdt_pr.iterfind('.//w:docPartGallery', {'w': W_NS}):
+        if (gallery.get(VAL) or '').lower() == _TOC_GALLERY:
+            return True
+    return False
+
+
+def _is_toc_instr(instr: str) -> bool:
+    return instr.split(None, 1)[:1] == ['TOC']
+
+
+def _iter_runs(paragraph) -> Iterator:
+    """段落内的 run（包括超链接、修订插入等容器内的），不进入文本框与目录内容控件"""
+    for child in paragraph:
+        if child.tag == R:
+            yield child
+        elif child.tag in _RUN_CONTAINERS:
+            if child.tag == SDT and _is_toc_sdt(child):
+                continue
+            if child.tag == _FLD_SIMPLE and _is_toc_instr(child.get(_w('instr'), '').strip()):
+                continue
+            yield from _iter_runs(child)
+
+
+class FieldState:
+    """
+    复杂域（fldChar begin / separate / end）的嵌套状态，目录域跨多个段落，需要在段落之间延续
+
+    域代码（instrText）本身不产生文本；处在 TOC 域内的 run（目录条目文本与页码）不计入段落
+    """
+
+    __slots__ = ('_stack',)
+
+    def __init__(self):
+        # 每层域已读到的域代码
+        self._stack: List[str] = []
+
+    @property
+    def in_toc(self) -> bool:
+        return any(_is_toc_instr(instr.strip()) for instr in self._stack)
+
+    def feed(self, run) -> bool:
+        """
+        处理一个 run 的域标记
+
+        Returns:
+            该 run 的文本是否应计入段落
+        """
+        keep = not self.in_toc
+        for child in run:
+            if child.tag == _FLD_CHAR:
+                kind = child.get(_w('fldCharType'))
+                if kind == 'begin':
+                    self._stack.append('')
+                elif kind == 'end' and self._stack:
+                    self._stack.pop()
+            elif child.tag == _INSTR_TEXT and self._stack:
+                self._stack[-1] += child.text or ''
+        return keep and not self.in_toc
+
+
+def _run_text(run) -> str:
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag == T:
+            parts.append(child.text or '')
+        elif tag in (_TAB, _PTAB):
+            parts.append('\t')
+        elif tag == _BR:
+            # 分页、分栏符不产生文本
+            parts.append('\n' if child.get(_w('type'), 'textWrapping') == 'textWrapping' else '')
+        elif tag == _CR:
+            parts.append('\n')
+        elif tag == _NO_BREAK_HYPHEN:
+            parts.append('-')
+    return ''.join(parts)
+
+
+def _paragraph_runs(paragraph, fields: Optional[FieldState] = None) -> Tuple[List[Run], bool]:
+    """
+    段落的 Run 列表
+
+    Returns:
+        (runs, 是否有 run 因处在目录域内被跳过)
+    """
+    runs = []
+    skipped = False
+    for run in _iter_runs(paragraph):
+        if fields is not None and not fields.feed(run):
+            skipped = True
+            continue
+        text = _run_text(run)
+        rpr = run.find(_w('rPr'))
+        if rpr is None:
+            runs.append(Run(text))
+            continue
+        underline = rpr.find(_w('u'))
+        if underline is not None:
+            underline = underline.get(VAL, 'single').lower() not in _FALSE_VALUES
+        runs.append(Run(text, _toggle(rpr, 'b'), _toggle(rpr, 'i'), underline, _toggle(rpr, 'strike')))
+    return runs, skipped
+
+
+def paragraph_text(paragraph) -> str:
+    """段落元素的纯文本"""
+    return ''.join(_run_text(run) for run in _iter_runs(paragraph))
+
+
+def _table_rows(table) -> List[List[str]]:
+    """表格单元格文本；横向合并（gridSpan）重复填充，纵向合并（vMerge）沿用上一行的值"""
+    rows: List[List[str]] = []
+    previous: List[str] = []
+    for tr in table.iterchildren(TR):
+        row: List[str] = []
+        for tc in tr.iterchildren(TC):
+            tcpr = tc.find(_w('tcPr'))
+            span = _attr(tcpr, 'w:gridSpan')
+            span = int(span) if span and span.isdigit() else 1
+            vmerge = tcpr.find(_w('vMerge')) if tcpr is not None else None
+            if vmerge is not None and vmerge.get(VAL, 'continue') == 'continue' and len(previous) > len(row):
+                text = previous[len(row)]
+            else:
+                text = '\n'.join(paragraph_text(p) for p in tc.iterchildren(P))
+            row.extend([text] * span)
+        rows.append(row)
+        previous = row
+    return rows
+
+
+class DocxReader:
+    """
+    docx 流式读取器
+
+    Args:
+        source: 文件路径或二进制文件对象
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.styles: Optional[StyleTable] = None
+        self._fields = FieldState()
+
+    def __iter__(self) -> Iterator[DocxEvent]:
+        return self.iter_events()
+
+    def iter_events(self) -> Iterator[DocxEvent]:
+        """按正文顺序产出事件"""
+        with zipfile.ZipFile(self.source) as archive:
+            names = set(archive.namelist())
+            self.styles = StyleTable(
+                archive.read('word/styles.xml') if 'word/styles.xml' in names else None,
+                archive.read('word/numbering.xml') if 'word/numbering.xml' in names else None,
+            )
+            with archive.open('word/document.xml') as document:
+                yield from self._iter_body(document)
+
+    def _iter_body(self, document) -> Iterator[DocxEvent]:
+        index = 0
+        table_depth = 0
+        textbox_depth = 0
+        # 所在的内容控件（段落结束时其 sdtPr 已解析完，可以判断是否为目录）
+        sdts = []
+        self._fields = FieldState()
+        context = etree.iterparse(document, events=('start', 'end'), tag=(P, TBL, TXBX_CONTENT, SDT),
+                                  huge_tree=True)
+        for action, elem in context:
+            tag = elem.tag
+            if tag == TXBX_CONTENT:
+                textbox_depth += 1 if action == 'start' else -1
+                continue
+            if tag == SDT:
+                if action == 'start':
+                    sdts.append(elem)
+                else:
+                    sdts.pop()
+                continue
+            if tag == TBL:
+                table_depth += 1 if action == 'start' else -1
+                if action == 'start' or table_depth or textbox_depth:
+                    continue
+            elif action == 'start' or table_depth or textbox_depth:
+                continue
+
+            if any(_is_toc_sdt(sdt) for sdt in sdts):
+                event = None
+            elif tag == TBL:
+                rows = _table_rows(elem)
+                event = DocxEvent(TABLE, index, '\n'.join('\t'.join(row) for row in rows), rows=rows)
+            else:
+                event = self._paragraph_event(elem, index)
+
+            if event is not None:
+                index += 1
+                yield event
+            # 释放已处理的正文元素
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    def _paragraph_event(self, paragraph, index: int) -> Optional[DocxEvent]:
+        """段落事件；整段都是目录条目时返回 None"""
+        ppr = paragraph.find(_w('pPr'))
+        style = self.styles.style(_attr(ppr, 'w:pStyle'))
+        runs, skipped = _paragraph_runs(paragraph, self._fields)
+        text = ''.join(run.text for run in runs)
+        if skipped and not text.strip():
+            return None
+
+        spacing = ppr.find(_w('spacing')) if ppr is not None else None
+        after = spacing.get(_w('after')) if spacing is not None else None
+        space_after = int(after) / 20 if after and after.lstrip('-').isdigit() else None
+
+        level = style.heading_level
+        outline = _attr(ppr, 'w:outlineLvl')
+        if outline is not None and outline.isdigit():
+            level = int(outline) + 1 if int(outline) < 9 else 0
+        if level:
+            return DocxEvent(HEADING, index, text, style.name, level, runs=runs, space_after=space_after)
+
+        num_id = _attr(ppr, 'w:numPr/w:numId') or style.num_id
+        ilvl = _attr(ppr, 'w:numPr/w:ilvl')
+        ilvl = int(ilvl) if ilvl and ilvl.isdigit() else (style.ilvl or 0)
+        if num_id and num_id != '0':
+            fmt = self.styles.list_format(num_id, ilvl)
+            return DocxEvent(LIST_ITEM, index, text, style.name, ilvl, numbered=fmt != 'bullet',
+                             runs=runs, space_after=space_after)
+        if 'list' in style.name.lower():
+            return DocxEvent(LIST_ITEM, index, text, style.name, ilvl, runs=runs, space_after=space_after)
+        return DocxEvent(PARAGRAPH, index, text, style.name, runs=runs, space_after=space_after)
+
+
+def iter_docx(source) -> Iterator[DocxEvent]:
+    """按正文顺序读取 docx 事件"""
+    return DocxReader(source).iter_events()
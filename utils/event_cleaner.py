@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件数据批量清洗（ES 导出 -> 推送消息）
+
+- 时间统一为 YYYY-MM-DD HH:MM:SS：批量时先按常见格式用 pandas 向量化解析，
+  剩余的（带 T、毫秒、缺分钟等）逐条用正则兜底，与单条清洗结果一致；无法识别的保留原值
+- 主单/子单按 DISPATCH_INFO.DISPATCH_REASON 整列判断
+- 按批处理（EVENT_CLEAN_BATCH_SIZE 条一批），每批只输出一条汇总日志；
+  逐条明细只在 DEBUG 级别按 EVENT_CLEAN_TRACE_RATE 抽样输出
+- iter_ndjson / ndjson_response 逐批输出 NDJSON，供接口流式返回或文件下载
+"""
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from flask import Response
+
+logger = logging.getLogger(__name__)
+
+# 每批处理条数
+EVENT_CLEAN_BATCH_SIZE = int(os.getenv('EVENT_CLEAN_BATCH_SIZE', '5000'))
+# DEBUG 级别下逐条明细的抽样比例
+EVENT_CLEAN_TRACE_RATE = float(os.getenv('EVENT_CLEAN_TRACE_RATE', '0.001'))
+
+MAIN_ORDER_REASON = '工单派发成功'
+ACTIVE_STATUS = '3'
+
+# 向量化解析依次尝试的格式（%m、%d、%H 等接受不补零的写法）
+VECTOR_TIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%Y/%m/%d %H:%M',
+    '%Y-%m-%d',
+    '%Y/%m/%d',
+]
+# 单条解析：日期必须完整，时间可缺省（缺秒补 00，只有小时视为 00:00:00）
+TIME_PATTERN = re.compile(r'^\s*(\d{4})[-/](\d{1,2})[-/](\d{1,2})(?:[ T](\d{1,2}):(\d{1,2})(?::(\d{1,2}))?)?')
+
+
+def normalize_event_time(value: str) -> str:
+    """
+    单条时间统一为 YYYY-MM-DD HH:MM:SS
+
+    Raises:
+        ValueError: 日期部分无法识别
+    """
+    match = TIME_PATTERN.match(value or '')
+    if not match:
+        raise ValueError("日期格式不正确")
+    year, month, day, hour, minute, second = match.groups()
+    return (f"{year}-{month.zfill(2)}-{day.zfill(2)} "
+            f"{(hour or '0').zfill(2)}:{(minute or '0').zfill(2)}:{(second or '0').zfill(2)}")
+
+
+def normalize_event_times(values: List) -> List:
+    """批量统一时间格式，无法识别的保留原值"""
+    if not values:
+        return []
+    series = pd.Series(values, dtype=object)
+    parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    pending = series.map(lambda value: isinstance(value, str))
+    for time_format in VECTOR_TIME_FORMATS:
+        if not pending.any():
+            break
+        attempt = pd.to_datetime(series[pending], format=time_format, errors='coerce')
+        hit = attempt.notna()
+        parsed[attempt.index[hit]] = attempt[hit]
+        pending[attempt.index[hit]] = False
+
+    formatted = np.char.replace(np.datetime_as_string(parsed.to_numpy(dtype='datetime64[s]'), unit='s'), 'T', ' ')
+    results = formatted.tolist()
+    for position in np.flatnonzero(parsed.isna().to_numpy()):
+        value = values[position]
+        try:
+            results[position] = normalize_event_time(value) if isinstance(value, str) else value
+        except ValueError:
+            results[position] = value
+    return results
+
+
+def classify_orders(reasons: List[str]) -> np.ndarray:
+    """按派发原因整列判断是否主单"""
+    return np.asarray(reasons, dtype=object) == MAIN_ORDER_REASON
+
+
+def _dispatch_reason(record: Dict) -> str:
+    dispatch_info = record.get('DISPATCH_INFO') or {}
+    return dispatch_info.get('DISPATCH_REASON', '') if isinstance(dispatch_info, dict) else ''
+
+
+def _trace(offset: int, records: List[Dict]) -> None:
+    """DEBUG 级别下按比例抽样输出逐条明细"""
+    if EVENT_CLEAN_TRACE_RATE <= 0 or not logger.isEnabledFor(logging.DEBUG):
+        return
+    step = max(1, int(round(1 / EVENT_CLEAN_TRACE_RATE)))
+    for index in range((-offset) % step, len(records), step):
+        logger.debug(f"[EVENT_CLEAN] 第 {offset + index + 1} 条：{records[index]}")
+
+
+def clean_batch(items: List[Dict], custom_event_time: str = None) -> Tuple[List[Dict], Dict]:
+    """
+    清洗一批 ES 数据为推送消息
+
+    Args:
+        items: [{"EVENT_FP": ..., "EVENT_TIME": ..., "DISPATCH_INFO": {...}}]
+        custom_event_time: 自定义事件时间，指定时覆盖所有消息的 EVENT_TIME
+
+    Returns:
+        (推送消息列表, {'total', 'main', 'sub', 'skipped'})
+    """
+    records = [item for item in items if isinstance(item, dict) and item.get('EVENT_FP')]
+    fps = [record['EVENT_FP'] for record in records]
+    reasons = [_dispatch_reason(record) for record in records]
+    if custom_event_time:
+        times = [custom_event_time] * len(records)
+    else:
+        times = normalize_event_times([record.get('EVENT_TIME', '') for record in records])
+    is_main = classify_orders(reasons)
+
+    messages = [
+        {
+            'ACTIVE_STATUS': ACTIVE_STATUS,
+            'CFP0_CFP1_CFP2_CFP3': fp,
+            'EVENT_TIME': event_time,
+            'FP0_FP1_FP2_FP3': fp,
+            'ORDER_TYPE': '主单' if main else '子单',
+            'IS_MAIN_ORDER': main,
+            'DISPATCH_REASON': reason,
+        }
+        for fp, event_time, reason, main in zip(fps, times, reasons, is_main.tolist())
+    ]
+    main_count = int(is_main.sum())
+    return messages, {
+        'total': len(messages),
+        'main': main_count,
+        'sub': len(messages) - main_count,
+        'skipped': len(items) - len(records),
+    }
+
+
+def iter_clean_batches(items: List[Dict], custom_event_time: str = None,
+                       batch_size: int = None) -> Iterator[Tuple[List[Dict], Dict]]:
+    """按批清洗，每批输出一条汇总日志"""
+    batch_size = batch_size or EVENT_CLEAN_BATCH_SIZE
+    if custom_event_time:
+        try:
+            custom_event_time = normalize_event_time(custom_event_time)
+        except ValueError:
+            pass
+    for batch_no, offset in enumerate(range(0, len(items), batch_size), start=1):
+        started = time.perf_counter()
+        messages, stats = clean_batch(items[offset:offset + batch_size], custom_event_time)
+        _trace(offset, messages)
+        logger.info(f"[EVENT_CLEAN] 批次 {batch_no}：{stats['total']} 条消息（{stats['main']} 主单，"
+                    f"{stats['sub']} 子单，跳过 {stats['skipped']}），"
+                    f"耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
+        yield messages, stats
+
+
+def clean_events(items: List[Dict], custom_event_time: str = None,
+                 batch_size: int = None) -> Tuple[List[Dict], Dict]:
+    """清洗全部数据，返回 (推送消息列表, 汇总统计)"""
+    messages = []
+    totals = {'total': 0, 'main': 0, 'sub': 0, 'skipped': 0}
+    for batch, stats in iter_clean_batches(items, custom_event_time, batch_size):
+        messages.extend(batch)
+        for key in totals:
+            totals[key] += stats[key]
+    return messages, totals
+
+
+def iter_hit_batches(hits: List[Dict], batch_size: int = None) -> Iterator[Tuple[List[Dict], Dict]]:
+    """ES hits 按批识别主单/子单并提取关键字段（parse-es 接口的返回格式）"""
+    batch_size = batch_size or EVENT_CLEAN_BATCH_SIZE
+    for batch_no, offset in enumerate(range(0, len(hits), batch_size), start=1):
+        started = time.perf_counter()
+        sources = [(hit.get('_source') or {}) if isinstance(hit, dict) else {}
+                   for hit in hits[offset:offset + batch_size]]
+        reasons = [_dispatch_reason(source) for source in sources]
+        is_main = classify_orders(reasons)
+        records = [
+            {
+                'order_type': '主单' if main else '子单',
+                'is_main_order': main,
+                'dispatch_reason': reason,
+                'event_id': source.get('EVENT_ID'),
+                'event_name': source.get('EVENT_NAME'),
+                'equipment_name': source.get('EQUIPMENT_NAME'),
+                'alarm_name': source.get('ALARM_NAME'),
+                'event_time': source.get('EVENT_TIME'),
+                'order_id': source.get('ORDER_ID'),
+                'full_source': source,
+            }
+            for source, reason, main in zip(sources, reasons, is_main.tolist())
+        ]
+        main_count = int(is_main.sum())
+        stats = {'total': len(records), 'main': main_count, 'sub': len(records) - main_count, 'skipped': 0}
+        _trace(offset, records)
+        logger.info(f"[EVENT_CLEAN] 解析批次 {batch_no}：{stats['total']} 条（{stats['main']} 主单，{stats['sub']} 子单），"
+                    f"耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
+        yield records, stats
+
+
+def iter_ndjson(batches: Iterable[Tuple[List[Dict], Dict]]) -> Iterator[str]:
+    """每批拼成一段 NDJSON 文本（每行一条记录）"""
+    for records, _ in batches:
+        if records:
+            yield ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+
+def ndjson_response(batches: Iterable[Tuple[List[Dict], Dict]], download_name: Optional[str] = None) -> Response:
+    """
+    流式返回 NDJSON
+
+    Args:
+        batches: iter_clean_batches / iter_hit_batches 的结果
+        download_name: 指定时作为附件下载（文件名前缀）
+    """
+    response = Response(iter_ndjson(batches), mimetype='application/x-ndjson')
+    response.headers['X-Accel-Buffering'] = 'no'
+    if download_name:
+        filename = f"{download_name}_{datetime.now().strftime('%Y%m%d%H%M%S')}.ndjson"
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
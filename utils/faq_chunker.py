@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FAQ 抽取用的结构化分段器
+
+- 按文档结构切分：Markdown / Word 标题层级、PDF 分页（\\f）与段落、问答标记（问：/答：/Q:/A:）、句末标点
+- 问答对、段落是最小单元，不会被切断；超长段落才按句子拆开
+- 按 token 预算装箱，每段尽量接近模型上下文可用长度，减少模型调用次数
+- 非标题开头的分段附带标题路径与上一段末尾句子作为衔接（少量重叠）
+- 结果确定：同一文档每次得到相同的分段与分段 ID（内容哈希），分段结果可跨重复上传复用
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# 模型上下文大小（token），可按部署的模型调整
+DEFAULT_CONTEXT_TOKENS = int(os.getenv('FAQ_CHUNK_CONTEXT_TOKENS', '8192'))
+# FAQ 提示词模板本身占用的 token
+PROMPT_TOKENS = 600
+# 输出（问答 JSON）相对输入的长度比例，答案需保留原文细节，按 1:1 预留
+OUTPUT_RATIO = 1.0
+# 分段衔接的重叠 token 上限
+DEFAULT_OVERLAP_TOKENS = 80
+# 标题之前的分段至少装到预算的该比例，才允许提前在一级/二级标题处断开
+HEADING_BREAK_FILL = 0.75
+
+PAGE_BREAK = '\f'
+CHUNK_ID_LENGTH = 16
+
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]')
+_MARKDOWN_HEADING = re.compile(r'^(#{1,6})\s+(.+)$')
+_CHAPTER_HEADING = re.compile(r'^第[一二三四五六七八九十百零\d]+[章节部分篇]\s*\S')
+_CN_NUMBERED_HEADING = re.compile(r'^[一二三四五六七八九十]+、\s*\S')
+# 1.2 / 1.2.3 这类短编号后接空白或顿号再接非数字正文；IP 地址、日期、版本号不算标题
+_DOTTED_HEADING = re.compile(r'^(\d{1,2}(?:\.\d{1,2}){1,2})\.?(?:\s+|、\s*)[^\d\s.]')
+_QUESTION_MARKER = re.compile(r'^(?:问题?\s*\d*\s*[:：]|Q\s*\d*\s*[:：.、]|Question\s*\d*\s*[:：])', re.IGNORECASE)
+# 区分大小写，A 后必须是冒号或编号（A: / A1. / A1、），普通的 a. / A. 列表项不算答案
+_ANSWER_MARKER = re.compile(r'^(?:答案?\s*[:：]|A\s*\d*\s*[:：]|A\s*\d+\s*[.、]|Answer\s*[:：])')
+_SENTENCE_END = re.compile(r'(?<=[。！？!?；;])|(?<=\.)\s+')
+_TERMINAL_PUNCTUATION = tuple('。！？!?；;：:.')
+
+# 单元类型
+HEADING = 'heading'
+PARAGRAPH = 'paragraph'
+QA = 'qa'
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算 token 数（不依赖具体分词器，结果确定）
+
+    中日韩字符按 1 个 token，其余非空白字符按 4 个字符 1 个 token
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = sum(1 for ch in text if not ch.isspace()) - cjk
+    return cjk + math.ceil(other / 4)
+
+
+def chunk_token_budget(context_tokens: int = DEFAULT_CONTEXT_TOKENS,
+                       prompt_tokens: int = PROMPT_TOKENS,
+                       output_ratio: float = OUTPUT_RATIO) -> int:
+    """根据模型上下文大小计算每段正文可用的 token 预算"""
+    return max(256, int((context_tokens - prompt_tokens) / (1 + output_ratio)))
+
+
+def _heading_level(line: str) -> Optional[int]:
+    """识别标题行，返回层级（1 最高），非标题返回 None"""
+    match = _MARKDOWN_HEADING.match(line)
+    if match:
+        return len(match.group(1))
+    if len(line) > 60 or line.endswith(_TERMINAL_PUNCTUATION[:-3]):
+        return None
+    if _CHAPTER_HEADING.match(line):
+        return 1
+    if _CN_NUMBERED_HEADING.match(line):
+        return 2
+    match = _DOTTED_HEADING.match(line)
+    if match:
+        return min(6, match.group(1).count('.') + 2)
+    return None
+
+
+class Unit:
+    """分段的最小单元：标题、段落或一组问答"""
+
+    __slots__ = ('kind', 'text', 'tokens', 'level', 'path', 'page')
+
+    def __init__(self, kind: str, text: str, path: Tuple[str, ...], page: int, level: int = 0):
+        self.kind = kind
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.level = level
+        self.path = path
+        self.page = page
+
+
+def parse_units(content: str) -> List[Unit]:
+    """
+    把文档文本解析为结构单元
+
+    - 标题行单独成单元，并维护标题路径
+    - 问题标记开始一组问答，直到下一个问题 / 标题 / 分页为止
+    - 普通行合并为段落，行尾是句末标点或遇到空行时结束段落（兼容 PDF 按版面折行）
+    """
+    units: List[Unit] = []
+    headings: List[Tuple[int, str]] = []
+    buffer: List[str] = []
+    buffer_kind = PARAGRAPH
+
+    def path():
+        return tuple(title for _, title in headings)
+
+    def flush(page):
+        nonlocal buffer, buffer_kind
+        text = '\n'.join(buffer).strip()
+        if text:
+            units.append(Unit(buffer_kind, text, path(), page))
+        buffer = []
+        buffer_kind = PARAGRAPH
+
+    for page_no, page_text in enumerate(content.split(PAGE_BREAK), start=1):
+        for raw_line in page_text.split('\n'):
+            line = raw_line.strip()
+            if not line:
+                if buffer_kind == PARAGRAPH:
+                    flush(page_no)
+                continue
+
+            level = _heading_level(line)
+            if level is not None:
+                flush(page_no)
+                headings[:] = [(lvl, title) for lvl, title in headings if lvl < level]
+                headings.append((level, line.lstrip('#').strip()))
+                units.append(Unit(HEADING, raw_line.rstrip(), path(), page_no, level))
+                continue
+
+            if _QUESTION_MARKER.match(line):
+                flush(page_no)
+                buffer_kind = QA
+                buffer.append(raw_line.rstrip())
+                continue
+
+            if buffer_kind == QA or _ANSWER_MARKER.match(line):
+                if buffer_kind != QA:
+                    flush(page_no)
+                    buffer_kind = QA
+                buffer.append(raw_line.rstrip())
+                continue
+
+            buffer.append(raw_line.rstrip())
+            if line.endswith(_TERMINAL_PUNCTUATION):
+                flush(page_no)
+        # 分页处结束段落，问答可跨页延续
+        if buffer_kind == PARAGRAPH:
+            flush(page_no)
+    flush(content.count(PAGE_BREAK) + 1)
+    return units
+
+
+def _split_sentences(text: str) -> List[str]:
+    return [part for part in _SENTENCE_END.split(text) if part and part.strip()]
+
+
+def _split_oversized(unit: Unit, budget: int) -> List[Unit]:
+    """超出预算的单元按句子拆分，单句仍超出时按字符硬切"""
+    pieces: List[str] = []
+    current = ''
+    for sentence in _split_sentences(unit.text):
+        if estimate_tokens(sentence) > budget:
+            if current:
+                pieces.append(current)
+                current = ''
+            step = max(1, budget)
+            pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+            continue
+        if current and estimate_tokens(current + sentence) > budget:
+            pieces.append(current)
+            current = ''
+        current += sentence
+    if current:
+        pieces.append(current)
+    return [Unit(unit.kind, piece.strip(), unit.path, unit.page, unit.level) for piece in pieces if piece.strip()]
+
+
+def _tail_sentences(text: str, max_tokens: int) -> str:
+    """取文本末尾不超过 max_tokens 的若干整句"""
+    tail: List[str] = []
+    used = 0
+    for sentence in reversed(_split_sentences(text)):
+        tokens = estimate_tokens(sentence)
+        if used + tokens > max_tokens:
+            break
+        tail.insert(0, sentence)
+        used += tokens
+    return ''.join(tail).strip()
+
+
+def _make_chunk(index: int, units: List[Unit], overlap: str) -> Dict:
+    body = '\n'.join(unit.text for unit in units)
+    first = units[0]
+    context_lines = []
+    if first.kind != HEADING and first.path:
+        context_lines.append(f"（所属章节：{' > '.join(first.path)}）")
+    if overlap and first.kind != HEADING:
+        context_lines.append(f"（接上文：{overlap}）")
+    content = '\n'.join(context_lines + [body])
+    return {
+        'id': hashlib.sha256(content.encode('utf-8')).hexdigest()[:CHUNK_ID_LENGTH],
+        'index': index,
+        'content': content,
+        'tokens': estimate_tokens(content),
+        'heading_path': list(first.path),
+        'pages': [units[0].page, units[-1].page],
+    }
+
+
+def chunk_document(content: str,
+                   context_tokens: int = DEFAULT_CONTEXT_TOKENS,
+                   max_tokens: Optional[int] = None,
+                   overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> List[Dict]:
+    """
+    按文档结构与 token 预算切分文档
+
+    Args:
+        content: 文档文本（标题为 Markdown 形式，PDF 分页以 \\f 分隔）
+        context_tokens: 模型上下文大小，用于推算每段预算
+        max_tokens: 直接指定每段正文预算（优先于 context_tokens）
+        overlap_tokens: 段间衔接重叠的 token 上限，0 表示不重叠
+
+    Returns:
+        分段列表：{'id', 'index', 'content', 'tokens', 'heading_path', 'pages'}
+    """
+    budget = max_tokens or chunk_token_budget(context_tokens)
+    overlap_tokens = min(overlap_tokens, budget // 8)
+
+    units: List[Unit] = []
+    for unit in parse_units(content):
+        units.extend(_split_oversized(unit, budget) if unit.tokens > budget else [unit])
+
+    chunks: List[Dict] = []
+    current: List[Unit] = []
+    used = 0
+    overlap = ''
+
+    def close():
+        nonlocal current, used, overlap
+        # 标题不能落在分段末尾，移到下一段开头
+        carried: List[Unit] = []
+        while current and current[-1].kind == HEADING and len(current) > 1:
+            carried.insert(0, current.pop())
+        if current:
+            chunks.append(_make_chunk(len(chunks), current, overlap))
+            last = current[-1]
+            overlap = _tail_sentences(last.text, overlap_tokens) if overlap_tokens and last.kind == PARAGRAPH else ''
+        current = carried
+        used = sum(unit.tokens for unit in carried)
+
+    for unit in units:
+        # 预留衔接文字与章节路径的开销
+        reserve = estimate_tokens(overlap) + sum(estimate_tokens(title) for title in unit.path) + 8
+        if current and used + unit.tokens + reserve > budget:
+            close()
+        elif (current and unit.kind == HEADING and unit.level <= 2
+              and used >= budget * HEADING_BREAK_FILL):
+            close()
+        current.append(unit)
+        used += unit.tokens
+    if current:
+        close()
+    return chunks
+
+
+class ChunkResultCache:
+    """按分段 ID 缓存 FAQ 抽取结果（LRU，线程安全），同一文档重复上传时不再调用模型"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, List[Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chunk_id: str) -> Optional[List[Dict]]:
+        """命中返回 FAQ 列表副本，未命中返回 None"""
+        with self._lock:
+            faqs = self._entries.get(chunk_id)
+            if faqs is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(chunk_id)
+            self.hits += 1
+            return [dict(faq) for faq in faqs]
+
+    def put(self, chunk_id: str, faqs: List[Dict]):
+        """写入缓存（空结果不缓存，留给下次重试）"""
+        if not faqs:
+            return
+        with self._lock:
+            self._entries[chunk_id] = [dict(faq) for faq in faqs]
+            self._entries.move_to_end(chunk_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# 全局分段结果缓存
+faq_chunk_cache = ChunkResultCache()
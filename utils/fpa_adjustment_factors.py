@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FPA 调整因子计算（编译后的因子表 + 纯函数计算）
+
+- fpa_adjustment_factor 整表读取一次，编译为（分类, 选项）/（因子名, 选项）-> 分值 的字典，
+  一次计算不再逐个因子查库
+- adjustment_routes 的增删改、Excel 导入以及 adjustment_calc_routes 中修改分值的接口调用
+  invalidate() 使版本号加一，下一次计算时重新编译；多进程部署时其他进程靠
+  FPA_FACTOR_CACHE_TTL 秒的有效期兜底
+- evaluate 与原 /adjustment-calc/api/calculate 的返回结构一致；evaluate_matrix 按笛卡尔积批量计算
+  多个选项组合（情景对比）
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 编译结果有效期（秒），0 表示只在 invalidate 后重新加载
+FPA_FACTOR_CACHE_TTL = int(os.getenv('FPA_FACTOR_CACHE_TTL', '300'))
+# 批量计算最多的组合数
+FPA_WHAT_IF_MAX_COMBINATIONS = int(os.getenv('FPA_WHAT_IF_MAX_COMBINATIONS', '20000'))
+
+FACTOR_ROWS_SQL = """
+    SELECT id, factor_name, factor_category, option_name, score_value
+    FROM fpa_adjustment_factor
+    ORDER BY id
+"""
+
+# 参与相乘的因子：(请求字段, 结果字段, 明细键, 名称, 分类, 默认选项, 未匹配时是否输出明细)
+FACTORS = [
+    ('scale_timing', 'scale_factor', 'scale', '规模变更调整因子', '规模变更调整系数', None, False),
+    ('application_type', 'application_factor', 'application', '应用类型调整因子', '应用类型', None, False),
+    ('language', 'language_factor', 'language', '开发语言调整因子', '开发语言', None, True),
+    ('team_background', 'team_factor', 'team', '开发团队背景调整因子', '开发团队背景', None, True),
+    ('reuse_level', 'reuse_factor', 'reuse', '重用程度调整因子', '重用程度调整系数', '低', True),
+    ('change_type', 'change_factor', 'change', '修改类型调整因子', '修改类型调整系数', '新增', True),
+]
+# 质量特性的子项（按因子名匹配，分值相加）：(请求字段, 因子名)
+QUALITY_ITEMS = [
+    ('distributed_processing', '分布式处理'),
+    ('performance', '性能'),
+    ('reliability', '可靠性'),
+    ('multi_site', '多重站点'),
+]
+INPUT_KEYS = [factor[0] for factor in FACTORS] + [item[0] for item in QUALITY_ITEMS]
+DEFAULTS = {factor[0]: factor[5] for factor in FACTORS if factor[5] is not None}
+
+TOTAL_FORMULA = '规模变更 × 应用类型 × 质量特性 × 开发语言 × 团队背景 × 重用程度 × 修改类型'
+
+
+def _score(value) -> float:
+    if isinstance(value, Decimal):
+        return float(value)
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def option_lookup(options: Iterable, scores: Iterable = None) -> Dict:
+    """
+    选项 -> 分值（对应 Excel 的 IF 嵌套：多个相同选项时取第一个）
+
+    Args:
+        options: 选项列表，或 [{'option_name', 'score_value'}] 行（此时不传 scores）
+        scores: 与 options 一一对应的分值
+    """
+    if scores is None:
+        pairs = ((row['option_name'], row['score_value']) for row in options)
+    else:
+        pairs = zip(options, scores)
+    lookup = {}
+    for option, score in pairs:
+        lookup.setdefault(option, _score(score))
+    return lookup
+
+
+class FactorTable:
+    """编译后的调整因子表"""
+
+    def __init__(self, rows: Iterable[Dict], version: int = 0):
+        self.version = version
+        self.by_category = {}
+        self.by_name = {}
+        self._options = {}
+        count = 0
+        for row in rows:
+            count += 1
+            score = _score(row.get('score_value'))
+            option = row.get('option_name')
+            # 与原逐条查询（SELECT ... LIMIT 1 语义）一致：同一键取第一条
+            self.by_category.setdefault((row.get('factor_category'), option), (option, score))
+            self.by_name.setdefault((row.get('factor_name'), option), (option, score))
+            for key in (('category', row.get('factor_category')), ('name', row.get('factor_name'))):
+                options = self._options.setdefault(key, [])
+                if option not in options:
+                    options.append(option)
+        self.row_count = count
+
+    def options(self, input_key: str) -> List:
+        """某个请求字段可选的全部选项（按表中顺序）"""
+        for key, _, _, _, category, _, _ in FACTORS:
+            if key == input_key:
+                return list(self._options.get(('category', category), []))
+        for key, factor_name in QUALITY_ITEMS:
+            if key == input_key:
+                return list(self._options.get(('name', factor_name), []))
+        raise KeyError(input_key)
+
+
+def _with_defaults(selection: Dict) -> Dict:
+    merged = dict(DEFAULTS)
+    merged.update({key: value for key, value in (selection or {}).items() if key in INPUT_KEYS})
+    for key, default in DEFAULTS.items():
+        if merged.get(key) is None:
+            merged[key] = default
+    return merged
+
+
+def evaluate(table: FactorTable, selection: Dict) -> Dict:
+    """
+    计算一组选择的调整因子（纯函数，不访问数据库）
+
+    Args:
+        table: 编译后的因子表
+        selection: 请求字段（scale_timing、application_type、质量特性四项、language 等）
+
+    Returns:
+        与 /adjustment-calc/api/calculate 相同的结构：各因子、total_factor 与 details
+    """
+    selection = _with_defaults(selection)
+    result = {'details': {}}
+    total = 1.0
+
+    for key, field, detail_key, label, category, _, detail_on_missing in FACTORS:
+        option = selection.get(key)
+        found = table.by_category.get((category, option))
+        value = found[1] if found else 0
+        result[field] = value
+        if found or detail_on_missing:
+            result['details'][detail_key] = {'name': label, 'option': found[0] if found else option, 'value': value}
+        total *= value
+
+    quality_total = 0
+    quality_details = []
+    for key, factor_name in QUALITY_ITEMS:
+        found = table.by_name.get((factor_name, selection.get(key)))
+        if found:
+            quality_total += found[1]
+            quality_details.append({'name': factor_name, 'option': found[0], 'value': found[1]})
+    result['quality_factor'] = quality_total
+    result['details']['quality'] = {'name': '质量特性调整因子', 'sub_items': quality_details, 'total': quality_total}
+
+    result['total_factor'] = total * quality_total
+    result['details']['total'] = {'name': '总调整因子', 'formula': TOTAL_FORMULA, 'value': result['total_factor']}
+    return result
+
+
+def _factor_values(table: FactorTable, selection: Dict) -> Dict:
+    """各因子分值与总调整因子（selection 已补全默认值）"""
+    values = {}
+    total = 1.0
+    for key, field, _, _, category, _, _ in FACTORS:
+        found = table.by_category.get((category, selection.get(key)))
+        values[field] = found[1] if found else 0
+        total *= values[field]
+    quality_total = 0
+    for key, factor_name in QUALITY_ITEMS:
+        found = table.by_name.get((factor_name, selection.get(key)))
+        if found:
+            quality_total += found[1]
+    values['quality_factor'] = quality_total
+    values['total_factor'] = total * quality_total
+    return values
+
+
+def evaluate_total(table: FactorTable, selection: Dict) -> float:
+    """只计算总调整因子"""
+    return _factor_values(table, _with_defaults(selection))['total_factor']
+
+
+def evaluate_matrix(table: FactorTable, base: Dict, vary: Dict, max_combinations: int = None) -> Dict:
+    """
+    批量计算选项组合（情景对比）
+
+    Args:
+        base: 固定不变的选择
+        vary: 请求字段 -> 选项列表，'*' 表示该字段的全部选项
+        max_combinations: 组合数上限（默认 FPA_WHAT_IF_MAX_COMBINATIONS）
+
+    Returns:
+        {'count', 'keys', 'results': [{'selection', 'total_factor', 各因子}], 'min', 'max'}
+    """
+    max_combinations = max_combinations or FPA_WHAT_IF_MAX_COMBINATIONS
+    unknown = [key for key in vary if key not in INPUT_KEYS]
+    if unknown:
+        raise ValueError(f"未知的调整因子字段：{', '.join(unknown)}")
+    keys = list(vary)
+    axes = [table.options(key) if vary[key] == '*' else list(vary[key]) for key in keys]
+    count = 1
+    for axis in axes:
+        count *= len(axis)
+    if count > max_combinations:
+        raise ValueError(f"组合数 {count} 超过上限 {max_combinations}")
+
+    selection = _with_defaults(base)
+    fixed = {key: selection.get(key) for key in INPUT_KEYS if key not in vary}
+
+    results = []
+    for combination in itertools.product(*axes):
+        option_by_key = dict(fixed)
+        option_by_key.update(zip(keys, combination))
+        results.append(dict(_factor_values(table, option_by_key), selection=dict(zip(keys, combination))))
+
+    totals = [item['total_factor'] for item in results]
+    return {
+        'count': len(results),
+        'keys': keys,
+        'base': fixed,
+        'results': results,
+        'min': min(totals) if totals else None,
+        'max': max(totals) if totals else None,
+    }
+
+
+class FactorTableCache:
+    """编译后因子表的缓存（按版本号失效）"""
+
+    def __init__(self, ttl: float = FPA_FACTOR_CACHE_TTL):
+        self.ttl = ttl
+        self._table: Optional[FactorTable] = None
+        self._loaded_version = -1
+        self._loaded_at = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'invalidations': 0}
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self) -> None:
+        """因子表被修改后调用"""
+        with self._lock:
+            self._version += 1
+            self._stats['invalidations'] += 1
+
+    def get(self, loader: Callable[[], Iterable[Dict]]) -> FactorTable:
+        """
+        获取编译后的因子表（版本变化或过期时用 loader 重新读取）
+
+        Args:
+            loader: 返回 fpa_adjustment_factor 全部行
+        """
+        with self._lock:
+            table = self._table
+            fresh = (table is not None and self._loaded_version == self._version
+                     and (not self.ttl or time.monotonic() - self._loaded_at < self.ttl))
+            if fresh:
+                self._stats['hits'] += 1
+                return table
+            version = self._version
+            # 加载在锁内进行：并发请求只读取一次（整表只有几十到几百行）
+            table = FactorTable(loader(), version)
+            self._table = table
+            self._loaded_version = version
+            self._loaded_at = time.monotonic()
+            self._stats['loads'] += 1
+        logger.info(f"[FPA_FACTOR] 调整因子表已编译：{table.row_count} 行，版本 {version}")
+        return table
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, version=self._version, loaded_version=self._loaded_version,
+                        rows=self._table.row_count if self._table else 0)
+
+
+# 全局缓存实例
+factor_table_cache = FactorTableCache()
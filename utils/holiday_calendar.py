@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+节假日日历（推送调度与排班共用的内存日历）
+
+- 按年份窗口（当前年份前后 HOLIDAY_CALENDAR_YEARS_BACK / HOLIDAY_CALENDAR_YEARS_AHEAD 年）一次加载
+  holiday_config，每天一个字节存日期类型（工作日 / 法定节假日 / 调休上班 / 周末），查询为数组下标访问
+- 窗口外的日期按周末规则判断；holiday_config 没有记录的日期同样按周末规则
+- 数据库不可用时使用离线数据集 data/holidays/<年份>.json（与节假日接口返回的 holiday 字段格式相同），
+  holidaySys 同步成功后会更新离线数据集
+- 加载结果 HOLIDAY_CALENDAR_TTL 秒后在下一次查询时重新加载（期间其他线程继续使用旧数据）；
+  holidaySys.batch_sync 同步后调用 refresh 立即生效
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 加载当前年份之前 / 之后几年
+HOLIDAY_CALENDAR_YEARS_BACK = int(os.getenv('HOLIDAY_CALENDAR_YEARS_BACK', '1'))
+HOLIDAY_CALENDAR_YEARS_AHEAD = int(os.getenv('HOLIDAY_CALENDAR_YEARS_AHEAD', '1'))
+# 重新加载间隔（秒）
+HOLIDAY_CALENDAR_TTL = int(os.getenv('HOLIDAY_CALENDAR_TTL', '21600'))
+# 离线数据集目录
+HOLIDAY_DATASET_DIR = os.getenv(
+    'HOLIDAY_DATASET_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'holidays')
+)
+
+# 日期类型
+WORKDAY = 0            # 普通工作日
+HOLIDAY = 1            # 法定节假日（含调休放假）
+ADJUSTED_WORKDAY = 2   # 调休上班（周末上班）
+WEEKEND = 3            # 普通周末
+
+HOLIDAY_SQL = """
+SELECT holiday_date, is_working_day, description
+FROM holiday_config
+WHERE holiday_date BETWEEN %s AND %s
+"""
+
+
+def _weekday_kind(day: date) -> int:
+    return WEEKEND if day.weekday() >= 5 else WORKDAY
+
+
+def _to_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def load_holiday_rows(start_date: date, end_date: date) -> List[Dict]:
+    """从 holiday_config 读取日期范围内的记录（查询失败抛出异常）"""
+    from routes.排班.paiBanNew_v2 import DB_CONFIG, RosterDB
+
+    db = RosterDB(DB_CONFIG)
+    if not db.connect():
+        raise ConnectionError("数据库连接失败")
+    try:
+        db.cursor.execute(HOLIDAY_SQL, (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
+        return list(db.cursor.fetchall())
+    finally:
+        db.close()
+
+
+def dataset_path(year: int, dataset_dir: str = None) -> str:
+    return os.path.join(dataset_dir or HOLIDAY_DATASET_DIR, f'{year}.json')
+
+
+def load_dataset(year: int, dataset_dir: str = None) -> Optional[Dict]:
+    """读取离线数据集（节假日接口的 holiday 字段：{"MM-DD": {"holiday": bool, "name": ..., "date": ...}}）"""
+    path = dataset_path(year, dataset_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_dataset(year: int, holiday_data: Dict, dataset_dir: str = None) -> str:
+    """导入 / 更新离线数据集"""
+    path = dataset_path(year, dataset_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(holiday_data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def dataset_rows(holiday_data: Dict) -> List[Dict]:
+    """离线数据集转为 holiday_config 行格式"""
+    return [
+        {
+            'holiday_date': _to_date(day_info['date']),
+            'is_working_day': 0 if day_info.get('holiday', False) else 1,
+            'description': day_info.get('name', ''),
+        }
+        for day_info in (holiday_data or {}).values()
+    ]
+
+
+def load_dataset_rows(start_date: date, end_date: date, dataset_dir: str = None) -> List[Dict]:
+    """从离线数据集读取日期范围内的记录"""
+    rows = []
+    for year in range(start_date.year, end_date.year + 1):
+        rows.extend(row for row in dataset_rows(load_dataset(year, dataset_dir))
+                    if start_date <= row['holiday_date'] <= end_date)
+    return rows
+
+
+def load_calendar_rows(start_date: date, end_date: date) -> List[Dict]:
+    """优先读数据库，失败时使用离线数据集"""
+    try:
+        return load_holiday_rows(start_date, end_date)
+    except Exception as e:
+        logger.warning(f"[HOLIDAY] 读取 holiday_config 失败，使用离线数据集: {e}")
+        return load_dataset_rows(start_date, end_date)
+
+
+class HolidayCalendar:
+    """节假日日历"""
+
+    def __init__(self, loader: Callable[[date, date], Iterable[Dict]] = None,
+                 years_back: int = HOLIDAY_CALENDAR_YEARS_BACK, years_ahead: int = HOLIDAY_CALENDAR_YEARS_AHEAD,
+                 ttl: float = HOLIDAY_CALENDAR_TTL, today: Callable[[], date] = None):
+        """
+        Args:
+            loader: (开始日期, 结束日期) -> holiday_config 行（holiday_date, is_working_day, description）
+            years_back / years_ahead: 加载当前年份之前 / 之后几年
+            ttl: 重新加载间隔（秒），0 表示只在 refresh 时加载
+            today: 取当前日期（测试用）
+        """
+        self.loader = loader or load_calendar_rows
+        self.years_back = years_back
+        self.years_ahead = years_ahead
+        self.ttl = ttl
+        self._today = today or date.today
+        # (窗口起始日期, 每天的日期类型, 日期 -> 节假日名称)，整体替换，查询时无需加锁
+        self._table = (None, bytearray(), {})
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict], **kwargs) -> 'HolidayCalendar':
+        """用给定的 holiday_config 行构建日历（不访问数据库）"""
+        rows = list(rows)
+        kwargs.setdefault('ttl', 0)
+        return cls(loader=lambda start_date, end_date: rows, **kwargs)
+
+    # ---------- 加载 ----------
+
+    def refresh(self) -> None:
+        """重新加载窗口内的数据（加载失败时保留旧数据）"""
+        year = self._today().year
+        start = date(year - self.years_back, 1, 1)
+        end = date(year + self.years_ahead, 12, 31)
+        try:
+            rows = list(self.loader(start, end))
+        except Exception as e:
+            logger.error(f"[HOLIDAY] 加载节假日日历失败: {e}")
+            self._loaded_at = time.monotonic()  # 保留旧数据（首次加载失败时按周末规则），TTL 后重试
+            return
+
+        kinds = bytearray(_weekday_kind(start + timedelta(days=offset)) for offset in range((end - start).days + 1))
+        names = {}
+        for row in rows:
+            day = _to_date(row['holiday_date'])
+            if not start <= day <= end:
+                continue
+            if int(row['is_working_day']) == 1:
+                kind = ADJUSTED_WORKDAY if day.weekday() >= 5 else WORKDAY
+            else:
+                kind = HOLIDAY
+            kinds[(day - start).days] = kind
+            if row.get('description'):
+                names[day] = row['description']
+
+        with self._lock:
+            self._table = (start, kinds, names)
+            self._loaded_at = time.monotonic()
+        logger.info(f"[HOLIDAY] 节假日日历已加载：{start} ~ {end}，{len(rows)} 条记录")
+
+    def _ensure_loaded(self) -> None:
+        loaded_at = self._loaded_at
+        if loaded_at is not None and (not self.ttl or time.monotonic() - loaded_at < self.ttl):
+            return
+        if loaded_at is None:
+            # 首次加载：其他线程等待加载完成
+            with self._load_lock:
+                if self._loaded_at is None:
+                    self.refresh()
+        elif self._load_lock.acquire(blocking=False):
+            # 过期重新加载：其他线程继续使用旧数据
+            try:
+                self.refresh()
+            finally:
+                self._load_lock.release()
+
+    # ---------- 查询 ----------
+
+    def day_kind(self, day: date) -> int:
+        """日期类型：WORKDAY / HOLIDAY / ADJUSTED_WORKDAY / WEEKEND"""
+        self._ensure_loaded()
+        start, kinds, _ = self._table
+        if start is not None:
+            offset = (day - start).days
+            if 0 <= offset < len(kinds):
+                return kinds[offset]
+        return _weekday_kind(day)
+
+    def is_workday(self, day: date) -> bool:
+        """是否上班（工作日或调休上班）"""
+        return self.day_kind(day) in (WORKDAY, ADJUSTED_WORKDAY)
+
+    def is_statutory_holiday(self, day: date) -> bool:
+        """是否为 holiday_config 中的放假日（不含普通周末）"""
+        return self.day_kind(day) == HOLIDAY
+
+    def date_type(self, day: date) -> str:
+        """排班用的日期类型：日常 / 节假日（节假日含周末）"""
+        return '日常' if self.is_workday(day) else '节假日'
+
+    def holiday_name(self, day: date) -> str:
+        self._ensure_loaded()
+        return self._table[2].get(day, '')
+
+    def date_types(self, start_date: date, end_date: date) -> Dict[date, str]:
+        """日期范围（含首尾）内每天的排班日期类型"""
+        return {day: self.date_type(day) for day in _date_range(start_date, end_date)}
+
+    def workdays(self, start_date: date, end_date: date) -> List[date]:
+        """日期范围（含首尾）内的上班日"""
+        return [day for day in _date_range(start_date, end_date) if self.is_workday(day)]
+
+    def next_workday(self, day: date, include_today: bool = False) -> date:
+        """下一个上班日"""
+        current = day if include_today else day + timedelta(days=1)
+        for _ in range(366):
+            if self.is_workday(current):
+                return current
+            current += timedelta(days=1)
+        return current
+
+    def stats(self) -> Dict:
+        self._ensure_loaded()
+        start, kinds, _ = self._table
+        return {
+            'start': start.isoformat() if start else None,
+            'end': (start + timedelta(days=len(kinds) - 1)).isoformat() if start else None,
+            'holidays': kinds.count(HOLIDAY),
+            'adjusted_workdays': kinds.count(ADJUSTED_WORKDAY),
+        }
+
+
+def _date_range(start_date: date, end_date: date) -> Iterable[date]:
+    current = start_date
+    while current <= end_date:
+        yield current
+        current += timedelta(days=1)
+
+
+# 全局日历实例（首次查询时加载）
+holiday_calendar = HolidayCalendar()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+蓝图延迟加载
+
+- 蓝图按 URL 前缀声明，所属模块（连同 pandas / cv2 / confluent_kafka 等重依赖）在第一次命中请求时才导入
+- 预热列表中的功能组在启动时导入，生产环境可把常用功能组放进预热列表
+- 按功能组启用：每个进程只注册配置中启用的功能组（如只跑智能客服的 worker）
+- 记录每个蓝图的导入耗时与新增模块数，生成导入耗时报告
+- 运行中加载的蓝图先注册到独立的暂存应用，再把路由、视图与钩子合并进主应用；URL 规则表整体替换，
+  正在匹配路由的请求不受影响
+"""
+import importlib
+import logging
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from flask import Flask
+
+logger = logging.getLogger(__name__)
+
+
+def parse_group_list(value) -> Optional[List[str]]:
+    """
+    解析功能组配置（逗号分隔字符串或列表）
+
+    Returns:
+        功能组列表；空值 / "all" / "*" 返回 None，表示全部启用
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    groups = [str(item).strip() for item in value if str(item).strip()]
+    if not groups or any(item in ('all', '*') for item in groups):
+        return None
+    return groups
+
+
+def _resolve(target: str):
+    """解析 "模块路径:属性" 字符串"""
+    module_path, _, attr = target.partition(':')
+    return getattr(importlib.import_module(module_path), attr)
+
+
+class BlueprintSpec:
+    """
+    蓝图声明
+
+    Args:
+        group: 功能组名称
+        module: 蓝图所在模块路径
+        attr: 蓝图变量名
+        prefixes: 蓝图处理的 URL 前缀（按路径段匹配）
+        preload: 注册前需要先导入的模块（向该蓝图追加路由的模块）
+        init: 注册后调用的初始化函数 "模块路径:函数名"，参数为 app
+    """
+
+    def __init__(self, group: str, module: str, attr: str, prefixes: Iterable[str],
+                 preload: Iterable[str] = (), init: Optional[str] = None):
+        self.group = group
+        self.module = module
+        self.attr = attr
+        self.prefixes = tuple(prefix.rstrip('/') or '/' for prefix in prefixes)
+        self.preload = tuple(preload)
+        self.init = init
+
+    @property
+    def name(self) -> str:
+        return f"{self.module}:{self.attr}"
+
+    def matches(self, path: str) -> bool:
+        """路径是否落在该蓝图的某个前缀下"""
+        for prefix in self.prefixes:
+            if path == prefix or path.startswith(prefix + '/'):
+                return True
+        return False
+
+    def import_modules(self):
+        """导入模块并返回蓝图对象"""
+        for module_path in self.preload:
+            importlib.import_module(module_path)
+        return getattr(importlib.import_module(self.module), self.attr)
+
+
+def profile_imports(specs: Iterable[BlueprintSpec]) -> List[Dict]:
+    """
+    依次导入各蓝图模块（不注册），统计导入耗时
+
+    先导入的模块会分摊共享依赖的耗时，报告反映的是按声明顺序的增量成本
+    """
+    report = []
+    for spec in specs:
+        modules_before = len(sys.modules)
+        start = time.perf_counter()
+        error = None
+        try:
+            spec.import_modules()
+        except Exception as e:
+            error = str(e)
+        report.append({
+            'group': spec.group,
+            'blueprint': spec.name,
+            'import_seconds': round(time.perf_counter() - start, 4),
+            'new_modules': len(sys.modules) - modules_before,
+            'error': error,
+        })
+    return report
+
+
+def format_profile_report(report: List[Dict]) -> str:
+    """把导入耗时报告格式化为按耗时降序的文本表格"""
+    lines = [f"{'耗时(s)':>9}  {'新增模块':>6}  {'功能组':<16}  蓝图"]
+    for item in sorted(report, key=lambda r: r['import_seconds'], reverse=True):
+        line = f"{item['import_seconds']:>9.3f}  {item['new_modules']:>8}  {item['group']:<16}  {item['blueprint']}"
+        if item.get('error'):
+            line += f"  [失败: {item['error']}]"
+        lines.append(line)
+    total = sum(item['import_seconds'] for item in report)
+    lines.append(f"{total:>9.3f}  合计")
+    return '\n'.join(lines)
+
+
+# 按蓝图名称保存的钩子（Flask 应用上与蓝图同名的键）
+_BLUEPRINT_HOOKS = ('before_request_funcs', 'after_request_funcs', 'teardown_request_funcs',
+                    'template_context_processors', 'url_value_preprocessors', 'url_default_functions',
+                    'error_handler_spec')
+
+
+def _rebuilt_map(url_map, extra_rules):
+    """复制 URL 规则表并追加规则（新表，原表不变）"""
+    return url_map.__class__(
+        [rule.empty() for rule in url_map.iter_rules()] + [rule.empty() for rule in extra_rules],
+        default_subdomain=url_map.default_subdomain,
+        strict_slashes=url_map.strict_slashes,
+        merge_slashes=url_map.merge_slashes,
+        redirect_defaults=url_map.redirect_defaults,
+        converters=url_map.converters,
+        sort_parameters=url_map.sort_parameters,
+        sort_key=url_map.sort_key,
+        host_matching=url_map.host_matching,
+    )
+
+
+class LazyBlueprintRegistry:
+    """
+    蓝图延迟注册器
+
+    init_app 之后，未加载的蓝图由 WSGI 中间件在第一次命中其 URL 前缀时导入并注册。
+    此时应用已在处理请求：蓝图先注册到一个不处理请求的暂存应用，构建完成后把视图函数与蓝图钩子
+    合并进主应用，再用包含新规则的 URL 规则表整体替换 app.url_map，不修改正在使用的规则表。
+    蓝图向应用级注册的钩子（before_app_request 等）与模板过滤器不支持运行中加载。
+    """
+
+    def __init__(self, specs: Iterable[BlueprintSpec]):
+        self.specs = list(specs)
+        self.app = None
+        self.enabled_groups = None
+        self._pending: List[BlueprintSpec] = []
+        self._loaded: Dict[str, Dict] = {}
+        self._failed: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        # init_app 完成后应用可能已在处理请求，之后的注册走暂存应用
+        self._serving = False
+
+    # ==================== 初始化 ====================
+    def init_app(self, app, enabled_groups=None, lazy: bool = True, warmup=()):
+        """
+        绑定应用并注册蓝图
+
+        Args:
+            app: Flask 应用
+            enabled_groups: 启用的功能组（None 表示全部）
+            lazy: False 时启动阶段全部导入（旧行为）
+            warmup: 延迟模式下启动时即导入的功能组
+        """
+        self.app = app
+        self.enabled_groups = parse_group_list(enabled_groups)
+        self._pending = [spec for spec in self.specs if self.is_enabled(spec.group)]
+        app.extensions['lazy_blueprints'] = self
+
+        warmup_groups = set(parse_group_list(warmup) or []) if lazy else None
+        for spec in list(self._pending):
+            if warmup_groups is None or spec.group in warmup_groups:
+                self.load(spec, trigger='startup')
+
+        if self._pending:
+            app.wsgi_app = self._middleware(app.wsgi_app)
+        self._serving = True
+
+        skipped = sorted({spec.group for spec in self.specs} - {spec.group for spec in self.specs
+                                                                 if self.is_enabled(spec.group)})
+        logger.info(
+            f"[BLUEPRINT] 已注册 {len(self._loaded)} 个蓝图，延迟加载 {len(self._pending)} 个"
+            + (f"，未启用功能组: {', '.join(skipped)}" if skipped else '')
+        )
+
+    def is_enabled(self, group: str) -> bool:
+        """功能组是否在本进程启用"""
+        return self.enabled_groups is None or group in self.enabled_groups
+
+    # ==================== 加载 ====================
+    def _middleware(self, wsgi_app):
+        def dispatch(environ, start_response):
+            if self._pending:
+                path = environ.get('PATH_INFO', '') or '/'
+                # 前缀可能重叠（如 /api/clean-event 与 /api/clean-event/process），命中的都加载
+                for spec in tuple(self._pending):
+                    if spec.matches(path):
+                        self.load(spec, trigger=f"request {path}")
+            return wsgi_app(environ, start_response)
+        return dispatch
+
+    def load_group(self, group: str, trigger: str = 'manual'):
+        """导入并注册某功能组的全部蓝图"""
+        for spec in [s for s in self._pending if s.group == group]:
+            self.load(spec, trigger=trigger)
+
+    def load_all(self, trigger: str = 'manual'):
+        """导入并注册全部已启用但尚未加载的蓝图"""
+        for spec in list(self._pending):
+            self.load(spec, trigger=trigger)
+
+    def load(self, spec: BlueprintSpec, trigger: str = 'manual') -> bool:
+        """
+        导入并注册单个蓝图（线程安全，重复调用无副作用）
+
+        Returns:
+            是否已注册成功
+        """
+        with self._lock:
+            if spec.name in self._loaded:
+                return True
+            if spec not in self._pending:
+                return False
+
+            modules_before = len(sys.modules)
+            start = time.perf_counter()
+            try:
+                blueprint = spec.import_modules()
+                import_seconds = time.perf_counter() - start
+                self._register(blueprint)
+            except Exception as e:
+                self._pending.remove(spec)
+                self._failed[spec.name] = str(e)
+                logger.error(f"[BLUEPRINT] 加载失败 {spec.name}: {e}", exc_info=True)
+                return False
+
+            init_seconds = 0.0
+            if spec.init:
+                init_start = time.perf_counter()
+                try:
+                    with self.app.app_context():
+                        _resolve(spec.init)(self.app)
+                    logger.info(f"[BLUEPRINT] ✅ {spec.group} 初始化完成 ({spec.init})")
+                except Exception as e:
+                    logger.error(f"[BLUEPRINT] ⚠️  {spec.group} 初始化失败 ({spec.init}): {e}")
+                init_seconds = time.perf_counter() - init_start
+
+            self._pending.remove(spec)
+            self._loaded[spec.name] = {
+                'group': spec.group,
+                'blueprint': spec.name,
+                'import_seconds': round(import_seconds, 4),
+                'init_seconds': round(init_seconds, 4),
+                'new_modules': len(sys.modules) - modules_before,
+                'trigger': trigger,
+                'error': None,
+            }
+            logger.info(
+                f"[BLUEPRINT] 注册 {spec.name} | 导入 {import_seconds:.3f}s"
+                f" | 新增模块 {len(sys.modules) - modules_before} | 触发: {trigger}"
+            )
+            return True
+
+    def _register(self, blueprint):
+        """注册蓝图（调用方持有 self._lock）"""
+        app = self.app
+        if not self._serving:
+            app.register_blueprint(blueprint)
+            return
+
+        staging = Flask(app.import_name, root_path=app.root_path, static_folder=None)
+        staging.config = app.config
+        staging.register_blueprint(blueprint)
+        names = [name for name in staging.blueprints if name not in app.blueprints]
+
+        for endpoint, view in staging.view_functions.items():
+            if endpoint in app.view_functions and app.view_functions[endpoint] is not view:
+                raise AssertionError(f"视图函数映射覆盖了已有端点: {endpoint}")
+        for attr in _BLUEPRINT_HOOKS:
+            hooks = getattr(staging, attr)
+            for name in names:
+                if name in hooks:
+                    getattr(app, attr)[name] = hooks[name]
+        app.view_functions.update(staging.view_functions)
+        for name in names:
+            app.blueprints[name] = staging.blueprints[name]
+        # 最后整体替换规则表：请求要么匹配旧表（新路由尚不存在），要么匹配完整的新表
+        app.url_map = _rebuilt_map(app.url_map, staging.url_map.iter_rules())
+
+    # ==================== 报告 ====================
+    @property
+    def loaded_groups(self) -> List[str]:
+        return sorted({item['group'] for item in self._loaded.values()})
+
+    @property
+    def pending(self) -> List[str]:
+        return [spec.name for spec in self._pending]
+
+    def profile_report(self) -> List[Dict]:
+        """已加载蓝图的导入耗时（含失败记录），按耗时降序"""
+        report = list(self._loaded.values())
+        report.extend({'group': '', 'blueprint': name, 'import_seconds': 0.0, 'init_seconds': 0.0,
+                       'new_modules': 0, 'trigger': '', 'error': error}
+                      for name, error in self._failed.items())
+        return sorted(report, key=lambda item: item['import_seconds'], reverse=True)
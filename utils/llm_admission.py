@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大模型请求准入控制（全局并发上限 + 优先级队列）
+
+- 所有 OllamaClient 共用一个准入控制器：同时发往模型服务的请求不超过 LLM_MAX_CONCURRENCY，
+  其余按优先级排队（interactive 先于 batch，同一优先级先来先服务）
+- batch 请求最多占用 LLM_BATCH_MAX_CONCURRENCY 个名额，留出的名额只给交互请求，
+  大批量 FAQ 导入期间聊天请求最多等一个正在执行的请求
+- 每个请求可带截止时间：排队超时或剩余时间不足时立即失败（LLMAdmissionError），
+  发往模型服务的超时同样按剩余时间收紧；交互请求另有最长排队时间 LLM_INTERACTIVE_MAX_WAIT
+- 排队中的请求可以取消（cancel_event 置位或流式生成器被关闭），取消后立即出队
+- stats() 提供各优先级的排队深度、执行中数量、等待时间分位数以及拒绝 / 超时 / 取消次数
+- LLM_MAX_CONCURRENCY=0 关闭准入控制（只统计，不限制）
+"""
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BATCH = 'batch'
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+_RANKS = {PRIORITY_INTERACTIVE: 0, PRIORITY_BATCH: 1}
+
+# 同时发往模型服务的请求数上限（本地模型服务的并行能力通常只有 1～2）
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '2'))
+# batch 请求可占用的名额，默认留一个名额给交互请求
+LLM_BATCH_MAX_CONCURRENCY = int(os.getenv('LLM_BATCH_MAX_CONCURRENCY', str(max(1, LLM_MAX_CONCURRENCY - 1))))
+# 排队请求数上限，超过后新请求直接拒绝
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '256'))
+# 默认截止时间（秒，含排队与生成），0 表示不限
+LLM_INTERACTIVE_DEADLINE = float(os.getenv('LLM_INTERACTIVE_DEADLINE', '300'))
+LLM_BATCH_DEADLINE = float(os.getenv('LLM_BATCH_DEADLINE', '0'))
+# 交互请求最长排队时间（秒），0 表示只受截止时间约束
+LLM_INTERACTIVE_MAX_WAIT = float(os.getenv('LLM_INTERACTIVE_MAX_WAIT', '60'))
+# 流式请求排队期间的心跳间隔（秒）
+LLM_QUEUE_HEARTBEAT = float(os.getenv('LLM_QUEUE_HEARTBEAT', '5'))
+
+DEFAULT_DEADLINES = {PRIORITY_INTERACTIVE: LLM_INTERACTIVE_DEADLINE, PRIORITY_BATCH: LLM_BATCH_DEADLINE}
+DEFAULT_MAX_WAITS = {PRIORITY_INTERACTIVE: LLM_INTERACTIVE_MAX_WAIT, PRIORITY_BATCH: 0}
+
+# 等待时间样本保留条数（用于分位数）
+_WAIT_SAMPLES = 1024
+# 轮询 cancel_event 的间隔（秒）
+_CANCEL_POLL = 0.05
+
+_WAITING, _GRANTED, _DONE = 'waiting', 'granted', 'done'
+
+
+class LLMAdmissionError(Exception):
+    """请求未获准入：reason 为 queue_full / deadline / cancelled"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class AdmissionTicket:
+    """一次模型请求的准入凭证"""
+
+    __slots__ = ('priority', 'seq', 'deadline', 'wait_until', 'enqueued_at', 'granted_at', 'state', '_clock')
+
+    def __init__(self, priority: str, seq: int, now: float, deadline: Optional[float],
+                 wait_until: Optional[float], clock):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = now
+        self.deadline = deadline
+        self.wait_until = wait_until
+        self.granted_at = None
+        self.state = _WAITING
+        self._clock = clock
+
+    def __lt__(self, other: 'AdmissionTicket') -> bool:
+        return (_RANKS[self.priority], self.seq) < (_RANKS[other.priority], other.seq)
+
+    @property
+    def waited(self) -> float:
+        """排队时长（秒）"""
+        return (self.granted_at or self._clock()) - self.enqueued_at
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的剩余秒数，无截止时间时返回 None"""
+        if self.deadline is None:
+            return None
+        return self.deadline - self._clock()
+
+    def timeout(self, default: float) -> float:
+        """
+        发往模型服务的超时：不超过剩余时间
+
+        Raises:
+            LLMAdmissionError: 已过截止时间
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if remaining <= 0:
+            raise LLMAdmissionError('deadline', 'AI 请求已超过截止时间')
+        return min(default, remaining)
+
+    def check_sleep(self, seconds: float) -> None:
+        """重试前检查：等待后会超过截止时间则立即失败"""
+        remaining = self.remaining()
+        if remaining is not None and remaining <= seconds:
+            raise LLMAdmissionError('deadline', f'AI 请求剩余 {max(remaining, 0):.0f} 秒，不足以等待 {seconds} 秒后重试')
+
+
+class LLMAdmission:
+    """模型请求准入控制器"""
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 batch_max_concurrency: int = None,
+                 max_queue: int = LLM_MAX_QUEUE,
+                 deadlines: Dict[str, float] = None,
+                 max_waits: Dict[str, float] = None,
+                 clock=time.monotonic):
+        """
+        Args:
+            max_concurrency: 同时执行的请求上限，<= 0 表示不限制
+            batch_max_concurrency: batch 请求可占用的名额（默认 LLM_BATCH_MAX_CONCURRENCY，不超过 max_concurrency）
+            max_queue: 排队请求数上限
+            deadlines: 各优先级的默认截止时间（秒），0 表示不限
+            max_waits: 各优先级的最长排队时间（秒），0 表示不限
+        """
+        self.max_concurrency = max_concurrency
+        # 配置的 batch 名额；生效值见 batch_max_concurrency（不超过 max_concurrency）
+        self.batch_limit = LLM_BATCH_MAX_CONCURRENCY if batch_max_concurrency is None else batch_max_concurrency
+        self.max_queue = max_queue
+        self.deadlines = dict(DEFAULT_DEADLINES, **(deadlines or {}))
+        self.max_waits = dict(DEFAULT_MAX_WAITS, **(max_waits or {}))
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._queued = {priority: 0 for priority in PRIORITIES}
+        self._running = {priority: 0 for priority in PRIORITIES}
+        self._counters = {priority: {'admitted': 0, 'rejected': 0, 'timeouts': 0, 'cancelled': 0}
+                          for priority in PRIORITIES}
+        self._waits = {priority: deque(maxlen=_WAIT_SAMPLES) for priority in PRIORITIES}
+        self._wait_max = {priority: 0.0 for priority in PRIORITIES}
+        self._peak_queued = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    @property
+    def batch_max_concurrency(self) -> int:
+        """生效的 batch 名额：配置值，不超过 max_concurrency"""
+        if self.max_concurrency > 0:
+            return min(self.batch_limit, self.max_concurrency)
+        return self.batch_limit
+
+    def configure(self, max_concurrency: int = None, batch_max_concurrency: int = None,
+                  max_queue: int = None) -> None:
+        """
+        运行中调整并发上限与队列长度（配置变更时调用）
+
+        上限调小时执行中的请求不受影响，只是暂停放行直到降到新上限以下；调大时立即放行排队请求。
+        batch 名额保存配置值，总上限调小时只是暂时被压低，调回后恢复
+        """
+        with self._cond:
+            if max_concurrency is not None:
+                self.max_concurrency = max_concurrency
+            if batch_max_concurrency is not None:
+                self.batch_limit = batch_max_concurrency
+            if max_queue is not None:
+                self.max_queue = max_queue
+            logger.info(f"[LLM_ADMISSION] 并发上限 {self.max_concurrency}，batch 名额 {self.batch_max_concurrency}，"
+                        f"排队上限 {self.max_queue}")
+            self._dispatch()
+
+    def enqueue(self, priority: str = PRIORITY_INTERACTIVE, deadline: float = None) -> AdmissionTicket:
+        """
+        登记一个请求；有空闲名额时直接获准，否则进入队列
+
+        Args:
+            priority: interactive 或 batch
+            deadline: 截止时间（距现在的秒数），None 使用该优先级的默认值，0 表示不限
+
+        Raises:
+            LLMAdmissionError: 队列已满
+        """
+        if priority not in _RANKS:
+            raise ValueError(f"未知的优先级：{priority}")
+        if deadline is None:
+            deadline = self.deadlines.get(priority) or 0
+        max_wait = self.max_waits.get(priority) or 0
+
+        with self._cond:
+            now = self._clock()
+            absolute = now + deadline if deadline > 0 else None
+            wait_until = absolute
+            if max_wait > 0:
+                wait_until = min(absolute, now + max_wait) if absolute is not None else now + max_wait
+            ticket = AdmissionTicket(priority, next(self._seq), now, absolute, wait_until, self._clock)
+
+            # 队首请求总是无法执行（否则已被放行），因此能执行就不会越过排在前面的同级请求
+            if self._can_run(priority):
+                self._grant(ticket, now)
+                return ticket
+            if len(self._heap) >= self.max_queue:
+                self._counters[priority]['rejected'] += 1
+                logger.warning(f"[LLM_ADMISSION] 排队请求已达上限 {self.max_queue}，拒绝 {priority} 请求")
+                raise LLMAdmissionError('queue_full', f'AI 服务繁忙：排队请求已达上限 {self.max_queue}')
+            heapq.heappush(self._heap, ticket)
+            self._queued[priority] += 1
+            self._peak_queued = max(self._peak_queued, len(self._heap))
+            return ticket
+
+    def wait(self, ticket: AdmissionTicket, timeout: float = None, cancel_event=None) -> bool:
+        """
+        等待获准
+
+        Args:
+            ticket: enqueue 返回的凭证
+            timeout: 本次最多等待的秒数（到时返回 False，仍在队列中）
+            cancel_event: threading.Event，置位后出队
+
+        Returns:
+            是否已获准
+
+        Raises:
+            LLMAdmissionError: 已取消或排队超过截止时间（均已出队）
+        """
+        with self._cond:
+            now = self._clock()
+            until = now + timeout if timeout is not None else None
+            while ticket.state == _WAITING:
+                if cancel_event is not None and cancel_event.is_set():
+                    self._abandon(ticket, 'cancelled')
+                    raise LLMAdmissionError('cancelled', 'AI 请求已取消')
+                if ticket.wait_until is not None and now >= ticket.wait_until:
+                    self._abandon(ticket, 'timeouts')
+                    raise LLMAdmissionError(
+                        'deadline', f'AI 服务繁忙：排队 {now - ticket.enqueued_at:.1f} 秒仍未轮到，请稍后重试')
+                if until is not None and now >= until:
+                    return False
+                limits = [t for t in (until, ticket.wait_until) if t is not None]
+                step = min(limits) - now if limits else None
+                if cancel_event is not None:
+                    step = _CANCEL_POLL if step is None else min(step, _CANCEL_POLL)
+                self._cond.wait(step)
+                now = self._clock()
+            if ticket.state == _DONE:
+                raise LLMAdmissionError('cancelled', 'AI 请求已取消')
+            return True
+
+    def acquire(self, priority: str = PRIORITY_INTERACTIVE, deadline: float = None,
+                cancel_event=None) -> AdmissionTicket:
+        """登记并等待获准"""
+        ticket = self.enqueue(priority, deadline)
+        try:
+            self.wait(ticket, cancel_event=cancel_event)
+        except BaseException:
+            self.release(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        """请求结束（获准后释放名额；仍在排队时视为取消并出队）"""
+        with self._cond:
+            if ticket.state == _WAITING:
+                self._abandon(ticket, 'cancelled')
+            elif ticket.state == _GRANTED:
+                ticket.state = _DONE
+                self._running[ticket.priority] -= 1
+                self._dispatch()
+
+    @contextmanager
+    def slot(self, priority: str = PRIORITY_INTERACTIVE, deadline: float = None, cancel_event=None):
+        """with 语句形式：获准后执行，结束时释放"""
+        ticket = self.acquire(priority, deadline, cancel_event)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _can_run(self, priority: str) -> bool:
+        if not self.enabled:
+            return True
+        if sum(self._running.values()) >= self.max_concurrency:
+            return False
+        return priority != PRIORITY_BATCH or self._running[PRIORITY_BATCH] < self.batch_max_concurrency
+
+    def _grant(self, ticket: AdmissionTicket, now: float) -> None:
+        ticket.state = _GRANTED
+        ticket.granted_at = now
+        priority = ticket.priority
+        self._running[priority] += 1
+        self._counters[priority]['admitted'] += 1
+        waited = now - ticket.enqueued_at
+        self._waits[priority].append(waited)
+        self._wait_max[priority] = max(self._wait_max[priority], waited)
+
+    def _dispatch(self) -> None:
+        """按优先级放行队首请求（调用方持有锁）"""
+        granted = False
+        now = self._clock()
+        while self._heap and self._can_run(self._heap[0].priority):
+            ticket = heapq.heappop(self._heap)
+            self._queued[ticket.priority] -= 1
+            self._grant(ticket, now)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _abandon(self, ticket: AdmissionTicket, counter: str) -> None:
+        """排队中的请求出队（调用方持有锁）"""
+        ticket.state = _DONE
+        self._heap.remove(ticket)
+        heapq.heapify(self._heap)
+        self._queued[ticket.priority] -= 1
+        self._counters[ticket.priority][counter] += 1
+        logger.info(f"[LLM_ADMISSION] {ticket.priority} 请求出队（{counter}），已排队 {ticket.waited:.2f}s")
+        # 出队的可能是挡在 batch 前面的交互请求
+        self._dispatch()
+
+    def stats(self) -> Dict:
+        """排队深度、执行中数量、等待时间（毫秒）与拒绝 / 超时 / 取消次数"""
+        with self._cond:
+            result = {
+                'enabled': self.enabled,
+                'max_concurrency': self.max_concurrency,
+                'batch_max_concurrency': self.batch_max_concurrency,
+                'batch_limit': self.batch_limit,
+                'max_queue': self.max_queue,
+                'in_flight': sum(self._running.values()),
+                'queued': len(self._heap),
+                'peak_queued': self._peak_queued,
+                'priorities': {},
+            }
+            for priority in PRIORITIES:
+                waits = sorted(self._waits[priority])
+                result['priorities'][priority] = dict(
+                    self._counters[priority],
+                    in_flight=self._running[priority],
+                    queued=self._queued[priority],
+                    wait_ms={
+                        'samples': len(waits),
+                        'avg': round(sum(waits) / len(waits) * 1000, 1) if waits else 0,
+                        'p50': round(_percentile(waits, 0.5) * 1000, 1),
+                        'p95': round(_percentile(waits, 0.95) * 1000, 1),
+                        'max': round(self._wait_max[priority] * 1000, 1),
+                    })
+            return result
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+# 全局准入控制器（所有 OllamaClient 共用）
+llm_admission = LLMAdmission()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大模型准入控制参数跟随部署配置（deploy_config 表）
+
+- 应用启动时加载部署配置快照，按 llm_max_concurrency / llm_batch_max_concurrency / llm_max_queue
+  调整 llm_admission
+- 后台线程每 CONFIG_STORE_CHECK_SECONDS 秒检查一次数据源指纹：其他进程或直接改表的修改在一个检查周期内生效，
+  不依赖是否有请求读取部署配置
+"""
+import logging
+import threading
+
+from models.deploy_config import deploy_config_store
+from utils.config_store import CONFIG_STORE_CHECK_SECONDS
+from utils.llm_admission import llm_admission
+
+logger = logging.getLogger(__name__)
+
+# 大模型准入控制参数对应的配置键
+LLM_ADMISSION_CONFIG_KEYS = {
+    'llm_max_concurrency': 'max_concurrency',
+    'llm_batch_max_concurrency': 'batch_max_concurrency',
+    'llm_max_queue': 'max_queue',
+}
+
+
+def apply_llm_admission_config(values, version, admission=None):
+    """按部署配置快照调整准入控制器（快照中没有的参数保持不变）"""
+    admission = admission or llm_admission
+    limits = {param: int(values[key]['typed_value']) for key, param in LLM_ADMISSION_CONFIG_KEYS.items()
+              if key in values}
+    if limits:
+        admission.configure(**limits)
+        logger.info(f"[LLM_ADMISSION] 部署配置版本 {version}：准入控制参数 {limits}")
+
+
+class LLMAdmissionConfigThread(threading.Thread):
+    """加载并定时检查部署配置的后台线程"""
+
+    def __init__(self, app, store=None, admission=None, interval: float = CONFIG_STORE_CHECK_SECONDS):
+        """
+        Args:
+            app: Flask 应用（数据源查询需要应用上下文）
+            store: 部署配置快照，默认 deploy_config_store
+            admission: 准入控制器，默认 llm_admission
+            interval: 检查间隔（秒），<= 0 表示只在启动时加载一次
+        """
+        super().__init__(name='llm-admission-config', daemon=True)
+        self.app = app
+        self.store = store or deploy_config_store
+        self.admission = admission or llm_admission
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._unsubscribe = self.store.subscribe(self._apply, keys=LLM_ADMISSION_CONFIG_KEYS, replay=True)
+
+    def _apply(self, values, changed, version):
+        apply_llm_admission_config(values, version, self.admission)
+
+    def check(self) -> bool:
+        """
+        加载或检查一次部署配置（加载失败时保持当前参数，下个周期再试）
+
+        Returns:
+            配置版本号是否变化
+        """
+        try:
+            with self.app.app_context():
+                return self.store.refresh()
+        except Exception as e:
+            logger.warning(f"[LLM_ADMISSION] 读取部署配置失败，保持当前准入控制参数：{e}")
+            return False
+
+    def run(self):
+        self.check()
+        if self.interval <= 0:
+            return
+        while not self._stop_event.wait(self.interval):
+            self.check()
+
+    def stop(self):
+        self._stop_event.set()
+        self._unsubscribe()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大模型调用遥测（替代逐次 INFO 打印完整请求）
+
+- 每次 generate / chat / chat_stream 记录一条结构化指标：模型、优先级、结果状态、prompt / 回复 token 数、
+  排队耗时、首 token 耗时、总耗时；token 数优先取模型服务返回的计数，没有时按字符数粗估
+- 指标按（调用方式, 模型）汇总到固定分桶的直方图，序列数与最近调用记录条数都有上限，内存占用恒定
+- 完整请求 / 回复的落盘默认关闭：LLM_PAYLOAD_CAPTURE_RATE 设为 0～1 的采样率后，被采样的调用
+  放入有界队列，由后台线程序列化写入按大小滚动的 JSONL 文件；队列满时丢弃并计数，不阻塞调用方
+- 热路径上只做计时与计数，不格式化 prompt 文本
+"""
+import bisect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 直方图分桶上界（毫秒），最后一个桶收纳更大的值
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000, 300000)
+_BUCKET_LABELS = [f'<={bound}' for bound in LATENCY_BUCKETS_MS] + [f'>{LATENCY_BUCKETS_MS[-1]}']
+# 汇总序列数上限（调用方式 × 模型），超出的归入 other
+LLM_TELEMETRY_MAX_SERIES = int(os.getenv('LLM_TELEMETRY_MAX_SERIES', '32'))
+# 保留的最近调用记录条数（不含请求内容）
+LLM_TELEMETRY_RECENT = int(os.getenv('LLM_TELEMETRY_RECENT', '200'))
+# 完整请求采样率（0 关闭）与落盘文件
+LLM_PAYLOAD_CAPTURE_RATE = float(os.getenv('LLM_PAYLOAD_CAPTURE_RATE', '0'))
+LLM_PAYLOAD_CAPTURE_FILE = os.getenv('LLM_PAYLOAD_CAPTURE_FILE', os.path.join('logs', 'llm_payloads.jsonl'))
+LLM_PAYLOAD_CAPTURE_MAX_BYTES = int(os.getenv('LLM_PAYLOAD_CAPTURE_MAX_BYTES', str(20 * 1024 * 1024)))
+LLM_PAYLOAD_CAPTURE_BACKUPS = int(os.getenv('LLM_PAYLOAD_CAPTURE_BACKUPS', '3'))
+LLM_PAYLOAD_CAPTURE_QUEUE = int(os.getenv('LLM_PAYLOAD_CAPTURE_QUEUE', '100'))
+
+OTHER_SERIES = 'other'
+
+
+def estimate_tokens(chars: int) -> int:
+    """按字符数粗估 token 数（中文约 1 字 1 token、英文约 4 字符 1 token，取中间值）"""
+    return (chars + 1) // 2
+
+
+def usage_tokens(result: Dict):
+    """
+    从模型服务的非流式响应中取 token 计数
+
+    兼容 Ollama 原生（prompt_eval_count / eval_count）、OpenAI（usage.prompt_tokens / completion_tokens）
+    与 Anthropic（usage.input_tokens / output_tokens）格式
+
+    Returns:
+        (prompt_tokens, response_tokens)，取不到时为 (None, None)
+    """
+    if not isinstance(result, dict):
+        return None, None
+    if 'eval_count' in result or 'prompt_eval_count' in result:
+        return result.get('prompt_eval_count'), result.get('eval_count')
+    usage = result.get('usage')
+    if isinstance(usage, dict):
+        prompt = usage.get('prompt_tokens', usage.get('input_tokens'))
+        completion = usage.get('completion_tokens', usage.get('output_tokens'))
+        return prompt, completion
+    return None, None
+
+
+class LatencyHistogram:
+    """固定分桶的耗时直方图"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value_ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, q: float) -> float:
+        """分位数（取所在分桶的上界，最后一个桶取最大值）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return float(LATENCY_BUCKETS_MS[index]) if index < len(LATENCY_BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'avg': round(self.total / self.count, 1) if self.count else 0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'max': round(self.max, 1),
+            'buckets': {label: count for label, count in zip(_BUCKET_LABELS, self.counts) if count},
+        }
+
+
+class _Series:
+    """一个（调用方式, 模型）的汇总"""
+
+    __slots__ = ('calls', 'statuses', 'prompt_tokens', 'response_tokens', 'estimated', 'latency', 'ttft', 'queue')
+
+    def __init__(self):
+        self.calls = 0
+        self.statuses = {}
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.estimated = 0
+        self.latency = LatencyHistogram()
+        self.ttft = LatencyHistogram()
+        self.queue = LatencyHistogram()
+
+    def to_dict(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'statuses': dict(self.statuses),
+            'prompt_tokens': self.prompt_tokens,
+            'response_tokens': self.response_tokens,
+            'estimated_token_calls': self.estimated,
+            'latency_ms': self.latency.to_dict(),
+            'ttft_ms': self.ttft.to_dict(),
+            'queue_ms': self.queue.to_dict(),
+        }
+
+
+class PayloadCapture:
+    """采样的完整请求 / 回复，由后台线程写入滚动文件"""
+
+    def __init__(self, rate: float = LLM_PAYLOAD_CAPTURE_RATE, path: str = LLM_PAYLOAD_CAPTURE_FILE,
+                 max_bytes: int = LLM_PAYLOAD_CAPTURE_MAX_BYTES, backups: int = LLM_PAYLOAD_CAPTURE_BACKUPS,
+                 queue_size: int = LLM_PAYLOAD_CAPTURE_QUEUE):
+        self.rate = rate
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._writer = None
+        self._handler = None
+        self._stats = {'sampled': 0, 'written': 0, 'dropped': 0, 'failed': 0}
+
+    def should_sample(self) -> bool:
+        return self.rate > 0 and (self.rate >= 1 or random.random() < self.rate)
+
+    def submit(self, record: Dict) -> bool:
+        """放入写入队列（只传引用，序列化在后台线程进行）；队列满时丢弃"""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            return False
+        with self._lock:
+            self._stats['sampled'] += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待队列中的记录写完（测试与退出时使用）"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='llm-payload-capture', daemon=True)
+                self._writer.start()
+
+    def _open(self) -> RotatingFileHandler:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups,
+                                      encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        return handler
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            try:
+                if self._handler is None:
+                    self._handler = self._open()
+                line = json.dumps(record, ensure_ascii=False, default=str)
+                self._handler.emit(logging.makeLogRecord({'msg': line, 'levelno': logging.INFO}))
+                with self._lock:
+                    self._stats['written'] += 1
+            except Exception as e:
+                with self._lock:
+                    self._stats['failed'] += 1
+                logger.warning(f"[LLM_TELEMETRY] 请求内容落盘失败：{e}")
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, rate=self.rate, path=self.path if self.rate > 0 else None,
+                        pending=self._queue.qsize())
+
+
+class LLMCall:
+    """
+    一次模型调用的计量（with 语句包裹整个调用）
+
+    退出时按异常类型确定状态：正常结束为 ok，LLMAdmissionError 取其 reason，
+    生成器被提前关闭为 cancelled，其余异常为 error
+    """
+
+    __slots__ = ('telemetry', 'operation', 'model', 'priority', 'prompt_chars', 'payload', 'started',
+                 'queue_ms', 'ttft_ms', 'prompt_tokens', 'response_tokens', 'response_chars', 'response',
+                 'status')
+
+    def __init__(self, telemetry: 'LLMTelemetry', operation: str, model: str, priority: str,
+                 prompt_chars: int, payload=None):
+        self.telemetry = telemetry
+        self.operation = operation
+        self.model = model
+        self.priority = priority
+        self.prompt_chars = prompt_chars
+        self.payload = payload
+        self.started = time.perf_counter()
+        self.queue_ms = 0.0
+        self.ttft_ms = None
+        self.prompt_tokens = None
+        self.response_tokens = None
+        self.response_chars = 0
+        self.response = None
+        self.status = None
+
+    def admitted(self, waited: float) -> None:
+        """获准执行（waited：排队秒数）"""
+        self.queue_ms = waited * 1000
+
+    def first_token(self) -> None:
+        if self.ttft_ms is None:
+            self.ttft_ms = (time.perf_counter() - self.started) * 1000
+
+    def usage(self, result: Dict) -> None:
+        """记录模型服务返回的 token 计数"""
+        self.prompt_tokens, self.response_tokens = usage_tokens(result)
+
+    def done(self, response: Optional[str], status: str = None) -> None:
+        self.response = response
+        self.response_chars = len(response or '')
+        if status:
+            self.status = status
+
+    def __enter__(self) -> 'LLMCall':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            status = self.status or 'ok'
+        elif exc_type is GeneratorExit:
+            status = 'cancelled'
+        else:
+            status = getattr(exc, 'reason', None) or 'error'
+        self.telemetry.record(self, status, (time.perf_counter() - self.started) * 1000,
+                              error=str(exc) if exc is not None and status != 'cancelled' else None)
+        return False
+
+
+class LLMTelemetry:
+    """模型调用指标汇总"""
+
+    def __init__(self, max_series: int = LLM_TELEMETRY_MAX_SERIES, recent: int = LLM_TELEMETRY_RECENT,
+                 capture: PayloadCapture = None):
+        self.max_series = max_series
+        self.capture = capture or PayloadCapture()
+        self._series: Dict[str, _Series] = {}
+        self._recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def call(self, operation: str, model: str, priority: str = None, prompt_chars: int = 0,
+             payload=None) -> LLMCall:
+        """
+        开始计量一次调用
+
+        Args:
+            operation: generate / chat / chat_stream
+            model: 模型名称
+            priority: 准入优先级
+            prompt_chars: 请求文本的字符数（用于无 token 计数时粗估）
+            payload: 请求体（仅在被采样落盘时由后台线程序列化）
+        """
+        return LLMCall(self, operation, model, priority, prompt_chars, payload)
+
+    def record(self, call: LLMCall, status: str, latency_ms: float, error: str = None) -> None:
+        estimated = call.prompt_tokens is None or call.response_tokens is None
+        prompt_tokens = call.prompt_tokens if call.prompt_tokens is not None else estimate_tokens(call.prompt_chars)
+        response_tokens = (call.response_tokens if call.response_tokens is not None
+                           else estimate_tokens(call.response_chars))
+        key = f'{call.operation}:{call.model}'
+        entry = {
+            'at': time.time(),
+            'operation': call.operation,
+            'model': call.model,
+            'priority': call.priority,
+            'status': status,
+            'latency_ms': round(latency_ms, 1),
+            'queue_ms': round(call.queue_ms, 1),
+            'ttft_ms': round(call.ttft_ms, 1) if call.ttft_ms is not None else None,
+            'prompt_tokens': prompt_tokens,
+            'response_tokens': response_tokens,
+            'tokens_estimated': estimated,
+        }
+        if error:
+            entry['error'] = error[:200]
+
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                if len(self._series) >= self.max_series:
+                    key = OTHER_SERIES
+                series = self._series.setdefault(key, _Series())
+            series.calls += 1
+            series.statuses[status] = series.statuses.get(status, 0) + 1
+            series.prompt_tokens += prompt_tokens
+            series.response_tokens += response_tokens
+            series.estimated += estimated
+            series.latency.add(latency_ms)
+            series.queue.add(call.queue_ms)
+            if call.ttft_ms is not None:
+                series.ttft.add(call.ttft_ms)
+            self._recent.append(entry)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[LLM_TELEMETRY] {entry}")
+        if call.payload is not None and self.capture.should_sample():
+            self.capture.submit(dict(entry, request=call.payload, response=call.response))
+
+    def recent(self, limit: int = 50) -> List[Dict]:
+        with self._lock:
+            items = list(self._recent)
+        return items[-limit:][::-1] if limit else []
+
+    def stats(self) -> Dict:
+        with self._lock:
+            series = {key: value.to_dict() for key, value in self._series.items()}
+        return {
+            'series': series,
+            'calls': sum(item['calls'] for item in series.values()),
+            'capture': self.capture.stats(),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+            self._recent.clear()
+
+
+# 全局遥测实例
+llm_telemetry = LLMTelemetry()
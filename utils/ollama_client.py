@@ -3,22 +3,31 @@
 """
 Ollama AI 客户端工具类
 封装本地 Ollama AI 模型的 API 调用
+
+- generate / chat / chat_stream 先经过准入控制（utils.llm_admission）：全局并发上限，
+  交互请求优先于批量请求（FAQ 导入、FPA 扩展传 priority='batch'），可带截止时间与 cancel_event
+- 每次调用的耗时、token 数与排队情况记入 utils.llm_telemetry，不再按 INFO 打印完整请求
 """
 import os
 import requests
 import json
 import logging
 from pathlib import Path
-from typing import List, Dict, Optional, Generator
+from typing import List, Dict, Optional, Generator, Tuple
 from dotenv import load_dotenv
 
+from utils.llm_admission import (LLM_QUEUE_HEARTBEAT, PRIORITY_INTERACTIVE, AdmissionTicket, LLMAdmission,
+                                 llm_admission)
+from utils.llm_telemetry import LLMCall, llm_telemetry
+
 logger = logging.getLogger(__name__)
 
 
 class OllamaClient:
     """Ollama AI 客户端"""
     
-    def __init__(self, base_url: str = None, model: str = None, use_omlx: bool = False, use_lmstudio: bool = False):
+    def __init__(self, base_url: str = None, model: str = None, use_omlx: bool = False, use_lmstudio: bool = False,
+                 admission: LLMAdmission = None):
         """
         初始化 Ollama 客户端
         
@@ -27,6 +36,7 @@ class OllamaClient:
             model: 默认使用的模型名称（如果为 None 则从.env 读取）
             use_omlx: 是否使用 OMLX 模型（Qwen3.5-4B-OptiQ-4bit）
             use_lmstudio: 是否使用 LM Studio Bridge（OpenAI 兼容接口）
+            admission: 准入控制器（默认全局共用的 llm_admission）
         """
         # 显式加载 .env 文件
         env_path = Path('.env')
@@ -61,6 +71,7 @@ class OllamaClient:
         # 保存模式参数
         self.use_omlx = use_omlx
         self.use_lmstudio = use_lmstudio
+        self.admission = admission or llm_admission
         
         # 根据模式选择 API 端点
         if use_lmstudio:
@@ -146,7 +157,10 @@ class OllamaClient:
                  system: Optional[str] = None,
                  stream: bool = False,
                  options: Optional[Dict] = None,
-                 retry: int = None) -> str:
+                 retry: int = None,
+                 priority: str = PRIORITY_INTERACTIVE,
+                 deadline: float = None,
+                 cancel_event=None) -> str:
         """
         生成文本回复（支持 Ollama 和 OMLX 两种 API）
         
@@ -157,10 +171,28 @@ class OllamaClient:
             stream: 是否流式输出
             options: 其他配置选项
             retry: 重试次数（默认从环境变量 OLLAMA_MAX_RETRIES 读取，默认 3 次）
+            priority: 'interactive'（默认）或 'batch'
+            deadline: 截止时间（秒，含排队与重试），None 使用该优先级的默认值
+            cancel_event: threading.Event，排队期间置位则放弃请求
             
         Returns:
             生成的文本内容
+            
+        Raises:
+            LLMAdmissionError: 队列已满、超过截止时间或已取消
         """
+        call = llm_telemetry.call('generate', model or self.model, priority, len(prompt) + len(system or ''),
+                                  payload={'prompt': prompt, 'system': system, 'options': options})
+        with call, self.admission.slot(priority, deadline, cancel_event) as ticket:
+            call.admitted(ticket.waited)
+            text = self._generate(prompt, model, system, stream, options, retry, ticket, call)
+            call.done(text)
+            return text
+    
+    def _generate(self, prompt: str, model: Optional[str], system: Optional[str], stream: bool,
+                  options: Optional[Dict], retry: Optional[int], ticket: AdmissionTicket,
+                  call: LLMCall = None) -> str:
+        """generate 的实际请求（已获准入）"""
         # 从环境变量读取重试次数，如果未传入
         if retry is None:
             retry = int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
@@ -196,36 +228,10 @@ class OllamaClient:
                     if options:
                         payload["options"] = options
                 
-                # 添加详细日志，诊断问题
-                logger.info(f"[OLLAMA_REQUEST] URL: {self.api_endpoint}")
-                logger.info(f"[OLLAMA_REQUEST] Model: {model or self.model}")
-                logger.info(f"[OLLAMA_REQUEST] Prompt length: {len(prompt)} chars")
-                logger.info(f"[OLLAMA_REQUEST] Attempt: {attempt + 1}/{retry + 1}")
-                
-                # 根据模式输出不同的日志
-                if self.use_lmstudio:
-                    logger.info(f"[LMSTUDIO_REQUEST] 🚀 正在请求 LM Studio Bridge...")
-                    logger.info(f"[LMSTUDIO_REQUEST]    - Base URL: {self.base_url}")
-                    logger.info(f"[LMSTUDIO_REQUEST]    - Model: {self.model}")
-                    logger.info(f"[LMSTUDIO_REQUEST]    - Endpoint: /v1/chat/completions (OpenAI compatible)")
-                elif self.use_omlx:
-                    logger.info(f"[OMLX_REQUEST] 🌐 正在请求 OMLX 在线模型...")
-                    logger.info(f"[OMLX_REQUEST]    - Base URL: {self.base_url}")
-                    logger.info(f"[OMLX_REQUEST]    - Model: {self.model}")
-                    logger.info(f"[OMLX_REQUEST]    - Endpoint: /v1/chat/completions (OpenAI compatible)")
-                else:
-                    logger.info(f"[OLLAMA_LOCAL] 💻 正在请求本地 Ollama 模型...")
-                    logger.info(f"[OLLAMA_LOCAL]    - Endpoint: /api/generate (Ollama native)")
-                
-                # 生成对应的 CURL 命令用于调试
-                import json as json_module
-                curl_cmd = f'curl -X POST "{self.api_endpoint}" \\'
-                curl_cmd += f'\n  -H "Content-Type: application/json" \\'
-                if self.use_omlx:
-                    curl_cmd += f'\n  -H "Authorization: Bearer 666666" \\'
-                json_payload = json_module.dumps(payload, ensure_ascii=False)
-                curl_cmd += f'\n  -d \'{json_payload}\''
-                logger.info(f"[OLLAMA_CURL]\n{curl_cmd}")
+                # 完整请求不再写日志：指标由 llm_telemetry 记录，请求内容按采样率异步落盘
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"[OLLAMA_REQUEST] {self.api_endpoint} model={model or self.model} "
+                                 f"prompt={len(prompt)} chars attempt={attempt + 1}/{retry + 1}")
                 
                 # 实际请求时添加 API Key
                 headers = {}
@@ -239,7 +245,7 @@ class OllamaClient:
                     json=payload,
                     headers=headers,
                     stream=stream,
-                    timeout=1200  # 增加到 20 分钟超时，避免大文档处理超时
+                    timeout=ticket.timeout(1200)  # 20 分钟超时（避免大文档处理超时），不超过截止时间
                 )
                 
                 # 如果是 404，记录详细信息
@@ -254,6 +260,8 @@ class OllamaClient:
                     return self._parse_stream_response(response)
                 else:
                     result = response.json()
+                    if call is not None:
+                        call.usage(result)
                     # 根据 API 类型解析不同的响应格式
                     if self.use_lmstudio:
                         # LM Studio Bridge 使用 Anthropic 格式
@@ -275,6 +283,7 @@ class OllamaClient:
                 attempt += 1
                 if attempt <= retry:
                     wait_time = 2 ** attempt * 3  # 指数退避：6, 12, 24, 48, 96 秒
+                    ticket.check_sleep(wait_time)
                     logger.warning(f"[OLLAMA_CONNECTION_ERROR] 连接失败，{wait_time}秒后重试 (Attempt {attempt}/{retry + 1}): {e}")
                     import time
                     time.sleep(wait_time)
@@ -305,6 +314,7 @@ class OllamaClient:
                 
                 if attempt <= retry:
                     wait_time = 2 ** attempt * 3  # 指数退避：6, 12, 24, 48, 96 秒
+                    ticket.check_sleep(wait_time)
                     logger.warning(f"[OLLAMA_HTTP_ERROR] {wait_time}秒后重试 (Attempt {attempt}/{retry + 1})")
                     import time
                     time.sleep(wait_time)
@@ -327,7 +337,10 @@ class OllamaClient:
              model: Optional[str] = None,
              stream: bool = False,
              options: Optional[Dict] = None,
-             retry: int = None) -> str:
+             retry: int = None,
+             priority: str = PRIORITY_INTERACTIVE,
+             deadline: float = None,
+             cancel_event=None) -> str:
         """
         聊天对话（支持多轮对话）
         
@@ -338,10 +351,28 @@ class OllamaClient:
             stream: 是否流式输出
             options: 其他配置选项
             retry: 重试次数（默认从环境变量 OLLAMA_MAX_RETRIES 读取，默认 3 次）
+            priority: 'interactive'（默认）或 'batch'
+            deadline: 截止时间（秒，含排队与重试），None 使用该优先级的默认值
+            cancel_event: threading.Event，排队期间置位则放弃请求
             
         Returns:
             AI 助手的回复内容
+            
+        Raises:
+            LLMAdmissionError: 队列已满、超过截止时间或已取消
         """
+        call = llm_telemetry.call('chat', model or self.model, priority, _messages_chars(messages),
+                                  payload={'messages': messages, 'options': options})
+        with call, self.admission.slot(priority, deadline, cancel_event) as ticket:
+            call.admitted(ticket.waited)
+            text = self._chat(messages, model, stream, options, retry, ticket, call)
+            call.done(text)
+            return text
+    
+    def _chat(self, messages: List[Dict[str, str]], model: Optional[str], stream: bool,
+              options: Optional[Dict], retry: Optional[int], ticket: AdmissionTicket,
+              call: LLMCall = None) -> str:
+        """chat 的实际请求（已获准入）"""
         # 从环境变量读取重试次数，如果未传入
         if retry is None:
             retry = int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
@@ -360,10 +391,9 @@ class OllamaClient:
         
         while attempt <= retry:
             try:
-                logger.info(f"[OLLAMA_CHAT] URL: {self.chat_endpoint}")
-                logger.info(f"[OLLAMA_CHAT] Model: {model or self.model}")
-                logger.info(f"[OLLAMA_CHAT] Messages: {len(messages)}条")
-                logger.info(f"[OLLAMA_CHAT] Attempt: {attempt + 1}/{retry + 1}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"[OLLAMA_CHAT] {self.chat_endpoint} model={model or self.model} "
+                                 f"messages={len(messages)} attempt={attempt + 1}/{retry + 1}")
                 
                 # 添加认证头
                 headers = {}
@@ -377,26 +407,22 @@ class OllamaClient:
                     json=payload,
                     headers=headers,
                     stream=stream,
-                    timeout=300  # 增加到 5 分钟
+                    timeout=ticket.timeout(300)  # 5 分钟，不超过截止时间
                 )
                 
                 # 如果是 404 错误，尝试切换到 generate API
                 if response.status_code == 404 and 'messages' in payload:
                     logger.warning(f"[OLLAMA_CHAT_404] /api/chat not found, trying /api/generate")
-                    return self._chat_via_generate(messages, model)
+                    return self._chat_via_generate(messages, model, ticket, call)
                 
                 response.raise_for_status()
                 
-                # 记录响应内容用于调试
-                response_text = response.text
-                logger.info(f"[OLLAMA_CHAT_RESPONSE] 响应长度: {len(response_text)} 字符")
-                logger.info(f"[OLLAMA_CHAT_RESPONSE] 响应内容（前500字符）: {response_text[:500]}")
-                
                 if stream:
                     return self._parse_stream_response(response)
                 else:
                     result = response.json()
-                    logger.info(f"[OLLAMA_CHAT_PARSED] 解析后的 JSON 结构: {json.dumps({k: type(v).__name__ for k, v in result.items()}, ensure_ascii=False)}")
+                    if call is not None:
+                        call.usage(result)
                     
                     # 根据模式解析不同的响应格式
                     if self.use_lmstudio:
@@ -406,17 +432,14 @@ class OllamaClient:
                         for part in content_list:
                             if part.get("type") == "text":
                                 content += part.get("text", "")
-                        logger.info(f"[OLLAMA_CHAT_CONTENT] 提取的内容长度: {len(content) if content else 0}")
                         return content
                     elif self.use_omlx:
                         # OMLX 使用 OpenAI 兼容格式
                         content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-                        logger.info(f"[OLLAMA_CHAT_CONTENT] 提取的内容长度: {len(content) if content else 0}")
                         return content
                     else:
                         # 本地 Ollama 使用原生格式
                         content = result.get("message", {}).get("content", "")
-                        logger.info(f"[OLLAMA_CHAT_CONTENT] 提取的内容长度: {len(content) if content else 0}")
                         return content
                     
             except requests.exceptions.ConnectionError as e:
@@ -424,6 +447,7 @@ class OllamaClient:
                 attempt += 1
                 if attempt <= retry:
                     wait_time = 2 ** attempt  # 指数退避
+                    ticket.check_sleep(wait_time)
                     logger.warning(f"[OLLAMA_CHAT_CONNECTION_ERROR] 连接失败，{wait_time}秒后重试 (Attempt {attempt}/{retry + 1}): {e}")
                     import time
                     time.sleep(wait_time)
@@ -435,6 +459,7 @@ class OllamaClient:
                 logger.warning(f"[OLLAMA_CHAT_RETRY] Attempt {attempt + 1}/{retry + 1} failed: {e}")
                 attempt += 1
                 if attempt <= retry:
+                    ticket.check_sleep(2 ** attempt)
                     import time
                     time.sleep(2 ** attempt)  # 指数退避
                 continue
@@ -445,9 +470,10 @@ class OllamaClient:
         logger.error(f"[OLLAMA_CHAT_FAILED] Max retries ({retry}) exceeded: {last_error}")
         raise Exception(f"AI 服务不可用：{str(last_error)}")
     
-    def _chat_via_generate(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> str:
+    def _chat_via_generate(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+                           ticket: AdmissionTicket = None, call: LLMCall = None) -> str:
         """
-        通过 generate API 实现 chat 功能（备用方案）
+        通过 generate API 实现 chat 功能（备用方案，沿用 chat 已获得的准入名额）
         """
         # 将 messages 转换为单个 prompt
         prompt_parts = []
@@ -468,20 +494,154 @@ class OllamaClient:
         if system_prompt:
             full_prompt = f"{system_prompt}\n\n{full_prompt}"
         
-        return self.generate(full_prompt, model=model)
+        if ticket is None:
+            return self.generate(full_prompt, model=model)
+        return self._generate(full_prompt, model, None, False, None, None, ticket, call)
+    
+    def _auth_headers(self) -> Dict[str, str]:
+        """按服务类型生成认证请求头"""
+        if self.use_lmstudio:
+            return {'Authorization': f'Bearer {self.api_key}'}
+        if self.use_omlx:
+            return {'Authorization': 'Bearer 666666'}
+        return {}
+    
+    @staticmethod
+    def _parse_stream_line(line) -> Tuple[str, bool]:
+        """
+        解析流式响应的一行
+        
+        兼容 Ollama 原生 NDJSON、OpenAI 兼容 SSE（data: {...} / data: [DONE]）
+        以及 Anthropic 格式的 content_block_delta 事件
+        
+        Returns:
+            (增量文本, 是否结束)
+        """
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.strip()
+        if not line or line.startswith(':') or line.startswith('event:'):
+            return '', False
+        if line.startswith('data:'):
+            line = line[5:].strip()
+            if line == '[DONE]':
+                return '', True
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            return '', False
+        if not isinstance(data, dict):
+            return '', False
+        
+        if 'choices' in data:
+            choice = (data.get('choices') or [{}])[0]
+            delta = choice.get('delta') or choice.get('message') or {}
+            return delta.get('content') or '', choice.get('finish_reason') is not None
+        if data.get('type') == 'content_block_delta':
+            return (data.get('delta') or {}).get('text', ''), False
+        if data.get('type') == 'message_stop':
+            return '', True
+        content = data.get("response", "") or (data.get("message") or {}).get("content", "")
+        return content or '', bool(data.get('done'))
+    
+    def _iter_stream_tokens(self, response, cancel_event=None) -> Generator[str, None, None]:
+        """逐段产出流式响应的文本；结束、取消或生成器被关闭时关闭连接"""
+        try:
+            for line in response.iter_lines():
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info(f"[OLLAMA_STREAM] 调用方已取消，关闭上游连接")
+                    break
+                token, done = self._parse_stream_line(line)
+                if token:
+                    yield token
+                if done:
+                    break
+        finally:
+            response.close()
     
     def _parse_stream_response(self, response) -> str:
         """解析流式响应"""
-        full_content = ""
-        for line in response.iter_lines():
-            if line:
-                try:
-                    data = json.loads(line)
-                    content = data.get("response", "") or data.get("message", {}).get("content", "")
-                    full_content += content
-                except json.JSONDecodeError:
-                    continue
-        return full_content
+        return ''.join(self._iter_stream_tokens(response))
+    
+    def chat_stream(self,
+                    messages: List[Dict[str, str]],
+                    model: Optional[str] = None,
+                    options: Optional[Dict] = None,
+                    cancel_event=None,
+                    timeout: int = 300,
+                    priority: str = PRIORITY_INTERACTIVE,
+                    deadline: float = None,
+                    heartbeat: bool = False) -> Generator[str, None, None]:
+        """
+        流式聊天：模型每产生一段文本就返回一段
+        
+        调用方关闭生成器或设置 cancel_event 时立即断开与模型服务的连接，模型服务随之停止生成；
+        仍在排队时则直接出队。已开始输出后不再重试，失败直接抛出异常。
+        
+        Args:
+            messages: 消息列表
+            model: 模型名称
+            options: 其他配置选项
+            cancel_event: threading.Event，置位后停止读取并断开连接
+            timeout: 连接与两次数据之间的最长等待时间（秒）
+            priority: 'interactive'（默认）或 'batch'
+            deadline: 截止时间（秒），None 使用该优先级的默认值
+            heartbeat: 排队期间每隔 LLM_QUEUE_HEARTBEAT 秒产出一个空字符串，
+                       调用方借此向客户端写心跳，客户端断开时即可关闭生成器出队
+            
+        Yields:
+            增量文本
+        """
+        call = llm_telemetry.call('chat_stream', model or self.model, priority, _messages_chars(messages),
+                                  payload={'messages': messages, 'options': options})
+        with call:
+            ticket = self.admission.enqueue(priority, deadline)
+            try:
+                while not self.admission.wait(ticket, LLM_QUEUE_HEARTBEAT, cancel_event):
+                    if heartbeat:
+                        yield ''
+                call.admitted(ticket.waited)
+                parts = []
+                for token in self._chat_stream(messages, model, options, cancel_event, ticket.timeout(timeout)):
+                    if not parts:
+                        call.first_token()
+                    parts.append(token)
+                    yield token
+                cancelled = cancel_event is not None and cancel_event.is_set()
+                call.done(''.join(parts), 'cancelled' if cancelled else None)
+            finally:
+                self.admission.release(ticket)
+    
+    def _chat_stream(self, messages: List[Dict[str, str]], model: Optional[str], options: Optional[Dict],
+                     cancel_event, timeout: float) -> Generator[str, None, None]:
+        """chat_stream 的实际请求（已获准入）"""
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "stream": True
+        }
+        if options:
+            payload["options"] = options
+        
+        logger.debug(f"[OLLAMA_STREAM] URL: {self.chat_endpoint}, Model: {model or self.model}, Messages: {len(messages)}条")
+        try:
+            response = self.session.post(
+                self.chat_endpoint,
+                json=payload,
+                headers=self._auth_headers(),
+                stream=True,
+                timeout=timeout
+            )
+        except requests.exceptions.RequestException as e:
+            logger.error(f"[OLLAMA_STREAM] 连接失败：{e}")
+            raise Exception(f"AI 服务连接失败：{str(e)}")
+        
+        if response.status_code >= 400:
+            logger.error(f"[OLLAMA_STREAM] HTTP 错误 {response.status_code}: {response.text[:500]}")
+            response.close()
+            raise Exception(f"AI 服务不可用：HTTP {response.status_code}")
+        
+        yield from self._iter_stream_tokens(response, cancel_event)
     
     def list_models(self) -> List[str]:
         """获取可用的模型列表"""
@@ -530,6 +690,10 @@ _omlx_client = None  # OMLX 专用客户端
 _lmstudio_client = None  # LM Studio 专用客户端
 
 
+def _messages_chars(messages: List[Dict[str, str]]) -> int:
+    return sum(len(message.get('content') or '') for message in messages)
+
+
 def init_ollama_service(use_omlx: bool = None) -> OllamaClient:
     """
     初始化 OMLX/Ollama 服务（在应用启动时调用）
@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF 按页并行抽取（文本层 + OCR）
+
+- 常驻进程池按页范围抽取，吞吐随 CPU 核数扩展，请求线程只负责分发与按页码合并
+- 每页先取文本层，只有文本层为空（扫描页）时才渲染图片做 OCR
+- 工作进程用 spawn 启动（不继承 Web 进程的线程与锁），以 utils.pdf_worker 作为 __main__，
+  不会重新导入 app.py；启动时预加载 pdfplumber / pytesseract
+- 待抽取页按工作进程数切成连续的页范围，每个范围任务只打开一次 PDF，任务之间不共享文件句柄
+- 单页抽取失败只跳过该页（记为 failed，不写缓存），其余页照常合并
+- 每页结果按（文件内容哈希, 页码, 引擎设置）落盘缓存，重复上传与失败重试跳过已完成的页
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 抽取逻辑变更时递增，使旧的页缓存失效
+ENGINE_VERSION = 1
+# 工作进程数（默认 CPU 核数）
+PDF_POOL_WORKERS = int(os.getenv('PDF_POOL_WORKERS', '0')) or (os.cpu_count() or 2)
+# 进程启动方式：Web 进程里已有调度器等后台线程，fork 会把持有中的锁复制到子进程，因此默认 spawn
+PDF_POOL_START_METHOD = os.getenv('PDF_POOL_START_METHOD', 'spawn')
+# 页缓存目录与保留时间
+PDF_PAGE_CACHE_DIR = os.getenv('PDF_PAGE_CACHE_DIR', os.path.join('uploads', 'pdf_page_cache'))
+PAGE_CACHE_RETENTION_SECONDS = 7 * 24 * 3600
+PAGE_CACHE_PRUNE_INTERVAL = 3600
+# 待抽取页数不超过该值时在当前进程直接处理，省去进程间传输
+INLINE_PAGE_LIMIT = 1
+# 子进程的 __main__ 模块（不导入 Web 应用）
+WORKER_MAIN_MODULE = 'utils.pdf_worker'
+
+DEFAULT_SETTINGS = {
+    'ocr': True,
+    'ocr_lang': 'chi_sim+eng',
+    'ocr_dpi': 300,
+    # 文本层去除空白后少于该字符数视为扫描页
+    'min_text_chars': 1,
+}
+
+# 抽取方式
+METHOD_TEXT = 'text'
+METHOD_OCR = 'ocr'
+METHOD_EMPTY = 'empty'
+METHOD_FAILED = 'failed'
+
+
+def build_settings(**overrides) -> Dict:
+    """合并默认引擎设置"""
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    return settings
+
+
+def settings_key(settings: Dict) -> str:
+    """引擎设置的稳定哈希（含 ENGINE_VERSION）"""
+    payload = json.dumps(dict(settings, engine_version=ENGINE_VERSION), sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    """文件内容 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageCache:
+    """
+    按页的磁盘缓存（每页一个 JSON 文件，原子写入，多进程共享）
+
+    Args:
+        directory: 缓存目录
+        retention_seconds: 超过该时间未写入的条目在清理时删除
+    """
+
+    def __init__(self, directory: str = PDF_PAGE_CACHE_DIR,
+                 retention_seconds: int = PAGE_CACHE_RETENTION_SECONDS):
+        self.directory = directory
+        self.retention_seconds = retention_seconds
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, file_hash: str, page_no: int, key: str) -> str:
+        return os.path.join(self.directory, file_hash[:2], f"{file_hash}_{key}_{page_no}.json")
+
+    def get(self, file_hash: str, page_no: int, key: str) -> Optional[Dict]:
+        """命中返回 {'text', 'method'}，未命中返回 None"""
+        try:
+            with open(self._path(file_hash, page_no, key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, file_hash: str, page_no: int, key: str, result: Dict):
+        """写入缓存（失败只记日志，不影响抽取）"""
+        path = self._path(file_hash, page_no, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'text': result['text'], 'method': result['method']}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"[PDF_POOL] 写入页缓存失败 {path}: {e}")
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_prune < PAGE_CACHE_PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+        self.prune()
+
+    def prune(self, max_age_seconds: Optional[int] = None) -> int:
+        """删除过期条目，返回删除数"""
+        cutoff = time.time() - (self.retention_seconds if max_age_seconds is None else max_age_seconds)
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return removed
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    if os.stat(path).st_mtime < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    continue
+        if removed:
+            logger.info(f"[PDF_POOL] 清理过期页缓存 {removed} 个")
+        return removed
+
+
+# ==================== 工作进程 ====================
+_main_swap_lock = threading.Lock()
+
+
+@contextmanager
+def _worker_main():
+    """启动子进程期间把 __main__ 换成 WORKER_MAIN_MODULE，子进程据此导入入口模块而不是 app.py"""
+    import importlib
+
+    worker_main = importlib.import_module(WORKER_MAIN_MODULE)
+    with _main_swap_lock:
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = worker_main
+        try:
+            yield
+        finally:
+            sys.modules['__main__'] = main
+
+
+class _WorkerProcess(multiprocessing.context.SpawnProcess):
+    """以 WORKER_MAIN_MODULE 为 __main__ 启动的 spawn 进程（准备数据在 _Popen 中同步生成）"""
+
+    @staticmethod
+    def _Popen(process_obj):
+        with _worker_main():
+            return multiprocessing.context.SpawnProcess._Popen(process_obj)
+
+
+class _WorkerContext(multiprocessing.context.SpawnContext):
+    Process = _WorkerProcess
+
+
+def _pool_context():
+    """进程池上下文：spawn 时使用 _WorkerContext，fork 等其他方式按原样"""
+    if PDF_POOL_START_METHOD == 'spawn':
+        return _WorkerContext()
+    return multiprocessing.get_context(PDF_POOL_START_METHOD)
+
+
+def _init_worker():
+    """工作进程启动时预加载抽取库，首个任务不再承担导入耗时"""
+    try:
+        import pdfplumber  # noqa: F401
+        import pytesseract  # noqa: F401
+    except ImportError:
+        pass
+
+
+def _ocr_available() -> bool:
+    try:
+        import pytesseract  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _ocr(image, settings: Dict) -> Optional[str]:
+    """OCR 识别，未安装 pytesseract 时返回 None"""
+    if not _ocr_available():
+        return None
+    import pytesseract
+
+    return pytesseract.image_to_string(image, lang=settings['ocr_lang'])
+
+
+def count_pages(path: str) -> int:
+    """PDF 页数"""
+    import pdfplumber
+
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def open_pdf(path: str):
+    """打开 PDF（上下文管理器）"""
+    import pdfplumber
+
+    return pdfplumber.open(path)
+
+
+def extract_page(pdf, page_no: int, settings: Dict) -> Dict:
+    """
+    抽取单页：文本层为空时回退到 OCR
+
+    Args:
+        pdf: 已打开的 PDF（open_pdf 的结果）
+        page_no: 页码（从 1 开始）
+        settings: 引擎设置
+
+    Returns:
+        {'page', 'text', 'method', 'seconds'}
+    """
+    start = time.perf_counter()
+    page = pdf.pages[page_no - 1]
+    text = page.extract_text() or ''
+    method = METHOD_TEXT
+    if len(''.join(text.split())) < settings['min_text_chars']:
+        text, method = '', METHOD_EMPTY
+        if settings['ocr'] and _ocr_available():
+            try:
+                image = page.to_image(resolution=settings['ocr_dpi']).original
+                ocr_text = _ocr(image, settings)
+            except Exception as e:
+                logger.warning(f"[PDF_POOL] 第 {page_no} 页 OCR 失败: {e}")
+                ocr_text = None
+            if ocr_text is not None:
+                text, method = ocr_text, METHOD_OCR
+    return {'page': page_no, 'text': text, 'method': method, 'seconds': time.perf_counter() - start}
+
+
+def failed_page(page_no: int, error: Exception) -> Dict:
+    """抽取失败的页结果"""
+    logger.warning(f"[PDF_POOL] 第 {page_no} 页抽取失败，已跳过: {error}")
+    return {'page': page_no, 'text': '', 'method': METHOD_FAILED, 'seconds': 0.0, 'error': str(error)}
+
+
+def extract_pages(path: str, page_numbers: List[int], settings: Dict, skip_failed: bool = True,
+                  page_extractor: Callable = extract_page, opener: Callable = open_pdf) -> List[Dict]:
+    """
+    抽取一个页范围：只打开一次 PDF，逐页调用 page_extractor
+
+    Args:
+        path: PDF 路径
+        page_numbers: 页码列表
+        settings: 引擎设置
+        skip_failed: 单页失败时记为 failed 并继续；False 时直接抛出
+        page_extractor: 单页抽取函数 (已打开的文档, page_no, settings) -> dict
+        opener: 打开文档的函数 (path) -> 上下文管理器
+
+    Returns:
+        按 page_numbers 顺序的页结果
+    """
+    results = []
+    with opener(path) as document:
+        for page_no in page_numbers:
+            try:
+                results.append(page_extractor(document, page_no, settings))
+            except Exception as e:
+                if not skip_failed:
+                    raise
+                results.append(failed_page(page_no, e))
+    return results
+
+
+def ocr_image(path: str, page_no: int, settings: Dict) -> Dict:
+    """图片文件 OCR（作为只有一页的文档处理）"""
+    from PIL import Image
+
+    start = time.perf_counter()
+    with Image.open(path) as image:
+        text = _ocr(image, settings)
+    if text is None:
+        raise ImportError("需要安装 pytesseract：pip install pytesseract")
+    return {'page': page_no, 'text': text, 'method': METHOD_OCR, 'seconds': time.perf_counter() - start}
+
+
+# ==================== 进程池 ====================
+class PdfExtractionPool:
+    """
+    按页抽取的常驻进程池
+
+    Args:
+        max_workers: 工作进程数
+        cache: 页缓存（None 表示不缓存）
+        page_extractor: 单页抽取函数 (已打开的文档, page_no, settings) -> dict，需可被子进程导入
+        page_counter: 页数统计函数 (path) -> int
+        opener: 打开文档的函数 (path) -> 上下文管理器，需可被子进程导入
+    """
+
+    def __init__(self, max_workers: int = PDF_POOL_WORKERS, cache: Optional[PageCache] = None,
+                 page_extractor: Callable = extract_page, page_counter: Callable = count_pages,
+                 opener: Callable = open_pdf):
+        self.max_workers = max(1, max_workers)
+        self.cache = cache
+        self.page_extractor = page_extractor
+        self.page_counter = page_counter
+        self.opener = opener
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=_pool_context(),
+                    initializer=_init_worker,
+                )
+                logger.info(f"[PDF_POOL] 启动进程池: {self.max_workers} 个工作进程 ({PDF_POOL_START_METHOD})")
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def warmup(self):
+        """预先拉起全部工作进程"""
+        executor = self._get_executor()
+        for future in [executor.submit(_init_worker) for _ in range(self.max_workers)]:
+            future.result()
+
+    def shutdown(self):
+        self._reset_executor()
+
+    def extract(self, path: str, settings: Optional[Dict] = None,
+                progress_callback: Optional[Callable[[int, int], None]] = None,
+                file_hash: Optional[str] = None) -> List[Dict]:
+        """
+        抽取全部页面，按页码顺序返回
+
+        Args:
+            path: 文件路径
+            settings: 引擎设置（默认 DEFAULT_SETTINGS）
+            progress_callback: 每完成一个页范围回调 (已完成页数, 总页数)
+            file_hash: 已知的文件哈希（省去重复计算）
+
+        Returns:
+            [{'page', 'text', 'method', 'cached'}, ...]，抽取失败的页 method 为 failed、text 为空
+        """
+        settings = settings or build_settings()
+        key = settings_key(settings)
+        total = self.page_counter(path)
+        file_hash = file_hash or (file_sha256(path) if self.cache else '')
+
+        results: List[Optional[Dict]] = [None] * total
+        pending = []
+        for page_no in range(1, total + 1):
+            cached = self.cache.get(file_hash, page_no, key) if self.cache else None
+            if cached is not None:
+                results[page_no - 1] = dict(cached, page=page_no, cached=True)
+            else:
+                pending.append(page_no)
+
+        done = total - len(pending)
+        if progress_callback and done:
+            progress_callback(done, total)
+
+        start = time.perf_counter()
+        for chunk_results in self._run(path, pending, settings):
+            for result in chunk_results:
+                result['cached'] = False
+                results[result['page'] - 1] = result
+                if self.cache and result['method'] != METHOD_FAILED:
+                    self.cache.put(file_hash, result['page'], key, result)
+            done += len(chunk_results)
+            if progress_callback:
+                progress_callback(done, total)
+
+        methods = [result['method'] for result in results]
+        if total and methods.count(METHOD_FAILED) == total:
+            raise RuntimeError(f"全部 {total} 页抽取失败: {results[0]['error']}")
+        logger.info(
+            f"[PDF_POOL] {os.path.basename(path)}: {total} 页 | 缓存命中 {total - len(pending)}"
+            f" | 文本层 {methods.count(METHOD_TEXT)} | OCR {methods.count(METHOD_OCR)}"
+            f" | 空白 {methods.count(METHOD_EMPTY)} | 失败 {methods.count(METHOD_FAILED)}"
+            f" | 耗时 {time.perf_counter() - start:.2f}s"
+        )
+        return results
+
+    def _chunks(self, pages: List[int]) -> List[List[int]]:
+        """把待抽取页切成不超过工作进程数的连续页范围"""
+        count = min(self.max_workers, len(pages))
+        size = -(-len(pages) // count)
+        return [pages[i:i + size] for i in range(0, len(pages), size)]
+
+    def _run_inline(self, path: str, pages: List[int], settings: Dict) -> List[Dict]:
+        try:
+            return extract_pages(path, pages, settings, page_extractor=self.page_extractor, opener=self.opener)
+        except Exception as e:
+            # 文档本身打不开：整个范围记为失败
+            return [failed_page(page_no, e) for page_no in pages]
+
+    def _run(self, path: str, pages: List[int], settings: Dict):
+        """按完成顺序产出各页范围的结果列表；进程池异常时剩余页在当前进程处理"""
+        if not pages:
+            return
+        if len(pages) <= INLINE_PAGE_LIMIT:
+            yield self._run_inline(path, pages, settings)
+            return
+
+        remaining = {}
+        try:
+            executor = self._get_executor()
+            futures = {}
+            for chunk in self._chunks(pages):
+                future = executor.submit(extract_pages, path, chunk, settings,
+                                         page_extractor=self.page_extractor, opener=self.opener)
+                futures[future] = chunk
+                remaining[future] = chunk
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    chunk_results = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    chunk_results = [failed_page(page_no, e) for page_no in chunk]
+                del remaining[future]
+                yield chunk_results
+        except BrokenProcessPool as e:
+            pending = sorted(page_no for chunk in remaining.values() for page_no in chunk)
+            logger.error(f"[PDF_POOL] 进程池异常，剩余 {len(pending)} 页改为当前进程处理: {e}")
+            self._reset_executor()
+            yield self._run_inline(path, pending, settings)
+
+    def extract_text(self, path: str, settings: Optional[Dict] = None,
+                     separator: str = '\n', **kwargs) -> str:
+        """抽取并按页码顺序合并非空页文本"""
+        pages = self.extract(path, settings, **kwargs)
+        return separator.join(page['text'] for page in pages if page['text'].strip())
+
+    def ocr_image(self, path: str, settings: Optional[Dict] = None) -> str:
+        """图片 OCR（同样走页缓存，在当前进程执行）"""
+        settings = settings or build_settings()
+        key = settings_key(settings)
+        file_hash = file_sha256(path) if self.cache else ''
+        cached = self.cache.get(file_hash, 1, key) if self.cache else None
+        if cached is not None:
+            return cached['text']
+        result = ocr_image(path, 1, settings)
+        if self.cache:
+            self.cache.put(file_hash, 1, key, result)
+        return result['text']
+
+
+# 全局 PDF 抽取进程池（工作进程在首次使用时启动）
+pdf_extraction_pool = PdfExtractionPool(cache=PageCache())
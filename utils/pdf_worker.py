@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+PDF 抽取工作进程的入口模块
+
+spawn 方式启动的子进程会把父进程的 __main__ 重新导入一遍；Web 进程的 __main__ 是 app.py，
+重新导入会再做一次日志初始化、建表、蓝图注册与预热。进程池启动子进程时以本模块代替 __main__，
+子进程只导入本模块与抽取函数所在的 utils.pdf_extractor。
+
+本模块不要导入 app、routes 或数据库相关模块。
+"""
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内任务进度总线
+
+- 每个任务一个频道，保存最新进度快照与递增序号；订阅方只拿最新快照，中间的高频更新自然合并
+- 订阅方阻塞等待新序号（SSE 推送），带 Last-Event-ID 重连时直接补发最新快照
+- publish 返回是否跨过里程碑（开始 / 每 N% / 完成 / 失败），调用方只在里程碑写数据库
+- 结束的频道保留一段时间供晚到的订阅方读取，之后自动清理
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+# 每跨过多少百分比写一次数据库
+MILESTONE_STEP_PERCENT = 10
+# 结束后的频道保留时间（秒）
+FINISHED_RETENTION_SECONDS = 600
+# 未结束但长时间无更新的频道保留时间（秒）
+IDLE_RETENTION_SECONDS = 24 * 3600
+
+STATUS_PROCESSING = 'processing'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+TERMINAL_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+
+class ProgressChannel:
+    """单个任务的进度频道"""
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.seq = 0
+        self.state: Dict = {'status': STATUS_PROCESSING, 'total': 0, 'processed': 0, 'progress_percent': 0}
+        self.milestone = -1
+        self.updated_at = time.monotonic()
+        self.condition = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.state['status'] in TERMINAL_STATUSES
+
+    def snapshot(self) -> Dict:
+        return dict(self.state, task_id=self.task_id, seq=self.seq)
+
+
+class ProgressBus:
+    """
+    任务进度总线
+
+    Args:
+        milestone_step: 里程碑间隔（百分比）
+    """
+
+    def __init__(self, milestone_step: int = MILESTONE_STEP_PERCENT):
+        self.milestone_step = milestone_step
+        self._channels: Dict[str, ProgressChannel] = {}
+        self._lock = threading.Lock()
+
+    # ==================== 发布 ====================
+    def start(self, task_id: str, total: int = 0, **fields) -> Dict:
+        """创建（或重置）任务频道，返回初始快照"""
+        self._purge()
+        channel = self._get_or_create(task_id)
+        with channel.condition:
+            # 同一任务重新开始时沿用频道与序号，已订阅的客户端不会错过更新
+            channel.state = {'status': STATUS_PROCESSING, 'total': 0, 'processed': 0, 'progress_percent': 0}
+            channel.milestone = -1
+        self.publish(task_id, total=total, **fields)
+        return channel.snapshot()
+
+    def publish(self, task_id: str, **fields) -> bool:
+        """
+        合并更新任务状态并通知订阅方
+
+        Args:
+            task_id: 任务 ID
+            **fields: 状态字段（total / processed / status 及任意附加字段）
+
+        Returns:
+            是否为里程碑（开始、跨过新的 N% 区间、完成或失败），调用方据此决定是否落库
+        """
+        channel = self._get_or_create(task_id)
+        with channel.condition:
+            channel.state.update(fields)
+            total = channel.state.get('total') or 0
+            processed = channel.state.get('processed') or 0
+            if channel.state['status'] == STATUS_COMPLETED:
+                percent = 100
+            else:
+                percent = min(100, int(processed * 100 / total)) if total > 0 else 0
+            channel.state['progress_percent'] = percent
+
+            bucket = percent // self.milestone_step if self.milestone_step > 0 else percent
+            milestone = channel.finished or bucket > channel.milestone
+            if milestone:
+                channel.milestone = bucket
+
+            channel.seq += 1
+            channel.updated_at = time.monotonic()
+            channel.condition.notify_all()
+        return milestone
+
+    def finish(self, task_id: str, **fields) -> bool:
+        """标记任务完成"""
+        return self.publish(task_id, status=STATUS_COMPLETED, **fields)
+
+    def fail(self, task_id: str, error: str = '', **fields) -> bool:
+        """标记任务失败"""
+        return self.publish(task_id, status=STATUS_FAILED, error=error, **fields)
+
+    # ==================== 订阅 ====================
+    def get(self, task_id: str) -> Optional[Dict]:
+        """当前快照，频道不存在返回 None"""
+        channel = self._channels.get(task_id)
+        return channel.snapshot() if channel is not None else None
+
+    def wait(self, task_id: str, last_seq: int = 0, timeout: float = 15.0) -> Optional[Dict]:
+        """
+        等待序号大于 last_seq 的新快照
+
+        Args:
+            task_id: 任务 ID
+            last_seq: 客户端已收到的最后序号（重连时来自 Last-Event-ID）
+            timeout: 最长等待秒数
+
+        Returns:
+            新快照；超时或频道不存在返回 None
+        """
+        channel = self._channels.get(task_id)
+        if channel is None:
+            return None
+        with channel.condition:
+            if channel.seq <= last_seq:
+                channel.condition.wait_for(lambda: channel.seq > last_seq, timeout=timeout)
+            if channel.seq <= last_seq:
+                return None
+            return channel.snapshot()
+
+    # ==================== 内部 ====================
+    def _get_or_create(self, task_id: str) -> ProgressChannel:
+        with self._lock:
+            channel = self._channels.get(task_id)
+            if channel is None:
+                channel = self._channels[task_id] = ProgressChannel(task_id)
+            return channel
+
+    def _purge(self):
+        """清理过期频道"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                task_id for task_id, channel in self._channels.items()
+                if now - channel.updated_at > (FINISHED_RETENTION_SECONDS if channel.finished
+                                               else IDLE_RETENTION_SECONDS)
+            ]
+            for task_id in expired:
+                del self._channels[task_id]
+
+    def __len__(self):
+        return len(self._channels)
+
+
+# 全局进度总线实例
+progress_bus = ProgressBus()
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+问题理解分层处理
+
+- 第一层：归一化问题缓存。全角半角、大小写、标点与空白折叠，常见同义词映射到同一写法
+- 第二层：规则与词典分类。词典来自 FAQ 标签、分类、专业领域名称以及 FAQ 问题本身，
+  问题类型与情感倾向用固定规则判断，按覆盖率给出置信度
+- 第三层：置信度不足时才调用大模型解析，结果同样写入缓存
+- 统计各层命中次数与耗时（平均 / P95 / 最大），供接口查看
+"""
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TIER_CACHE = 'cache'
+TIER_RULE = 'rule'
+TIER_LLM = 'llm'
+TIERS = (TIER_CACHE, TIER_RULE, TIER_LLM)
+
+# 规则结果的置信度不低于该值时不再调用大模型
+RULE_CONFIDENCE_THRESHOLD = 0.6
+# 缓存容量与有效期（秒）
+QUERY_CACHE_SIZE = 2048
+QUERY_CACHE_TTL = 3600
+# 词典自动重建间隔（秒）
+CLASSIFIER_REFRESH_SECONDS = 300
+# 每层保留的耗时样本数
+LATENCY_SAMPLES = 1000
+
+# 同义词：归一化时替换为右侧写法（按长度优先匹配，与自身相同的条目用于保护更长的词）
+SYNONYMS = {
+    '登陆': '登录',
+    '登入': '登录',
+    '口令': '密码',
+    '帐号': '账号',
+    '帐户': '账号',
+    '账户': '账号',
+    '怎么办': '怎么办',
+    '怎么样': '如何',
+    '怎么': '如何',
+    '怎样': '如何',
+    '咋': '如何',
+    '为啥': '为什么',
+    '啥是': '什么是',
+    '啥': '什么',
+    '哪儿': '哪里',
+    '在哪里': '在哪里',
+    '在哪': '在哪里',
+    '重设': '重置',
+    '忘记密码': '重置密码',
+    '报错': '错误',
+    '出错': '错误',
+}
+
+# 问题类型规则（按顺序匹配，先命中者优先），规则本身覆盖的字符计入覆盖率
+QUESTION_TYPE_RULES: List[Tuple[str, str]] = [
+    ('问候', r'^(你好|您好|hi|hello|在吗|早上好|下午好|晚上好)'),
+    ('为什么', r'为什么|为何|什么原因|原因是'),
+    ('怎么做', r'如何|怎么办|步骤|方法|流程|教程|操作'),
+    ('在哪里', r'在哪里|哪里|入口|位置|地址'),
+    ('多少', r'多少|几个|几天|多久|多长时间|费用|价格'),
+    ('是否', r'是否|能否|可否|可以|能不能|支持吗|有没有'),
+    ('是什么', r'什么是|是什么|什么叫|含义|定义|介绍'),
+]
+
+NEGATIVE_WORDS = ('错误', '失败', '无法', '不能', '不了', '异常', '崩溃', '投诉', '太慢', '卡顿', '不行', '垃圾')
+POSITIVE_WORDS = ('谢谢', '感谢', '很好', '满意', '不错', '好用', '赞')
+
+# 不携带语义的字，计入覆盖率但不作为关键词
+FILLER_CHARS = set('的了吗呢吧啊呀么嘛我你您请问要想让把被在是有和与及或一下个这那')
+FILLER_WORDS = ('请问', '一下', '我想', '我要', '需要', '可以')
+
+_PUNCT_CATEGORIES = ('P', 'S', 'Z', 'C')
+_SYNONYM_PATTERN = re.compile('|'.join(re.escape(word) for word in sorted(SYNONYMS, key=len, reverse=True)))
+_QUESTION_TYPE_PATTERNS = [(name, re.compile(pattern)) for name, pattern in QUESTION_TYPE_RULES]
+
+
+def _fold_char(char: str) -> str:
+    if unicodedata.category(char)[0] in _PUNCT_CATEGORIES:
+        return ''
+    return char
+
+
+def normalize_query(query: str) -> str:
+    """
+    归一化问题文本：NFKC、小写、去标点与空白、同义词映射
+
+    Args:
+        query: 原始问题
+
+    Returns:
+        归一化后的文本（可作为缓存键）
+    """
+    if not query:
+        return ''
+    text = unicodedata.normalize('NFKC', query).lower()
+    text = ''.join(_fold_char(char) for char in text)
+    return _SYNONYM_PATTERN.sub(lambda match: SYNONYMS[match.group(0)], text)
+
+
+class QueryCache:
+    """归一化问题 -> 解析结果的 LRU 缓存（带有效期）"""
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: 'OrderedDict[str, Tuple[float, Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            stored_at, value = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Dict) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class QueryUnderstandingMetrics:
+    """各层命中次数与耗时统计"""
+
+    def __init__(self, samples: int = LATENCY_SAMPLES):
+        self._lock = threading.Lock()
+        self._counts = {tier: 0 for tier in TIERS}
+        self._totals = {tier: 0.0 for tier in TIERS}
+        self._maxima = {tier: 0.0 for tier in TIERS}
+        self._latencies = {tier: deque(maxlen=samples) for tier in TIERS}
+        self.llm_failures = 0
+
+    def record(self, tier: str, seconds: float) -> None:
+        with self._lock:
+            self._counts[tier] += 1
+            self._totals[tier] += seconds
+            self._maxima[tier] = max(self._maxima[tier], seconds)
+            self._latencies[tier].append(seconds)
+
+    def record_llm_failure(self) -> None:
+        with self._lock:
+            self.llm_failures += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            for tier in TIERS:
+                self._counts[tier] = 0
+                self._totals[tier] = 0.0
+                self._maxima[tier] = 0.0
+                self._latencies[tier].clear()
+            self.llm_failures = 0
+
+    def snapshot(self) -> Dict:
+        """返回统计快照，耗时单位为毫秒"""
+        with self._lock:
+            total = sum(self._counts.values())
+            tiers = {}
+            for tier in TIERS:
+                count = self._counts[tier]
+                samples = sorted(self._latencies[tier])
+                p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0
+                tiers[tier] = {
+                    'count': count,
+                    'avg_ms': round(self._totals[tier] / count * 1000, 3) if count else 0.0,
+                    'p95_ms': round(p95 * 1000, 3),
+                    'max_ms': round(self._maxima[tier] * 1000, 3),
+                }
+            return {
+                'total': total,
+                'cache_hit_rate': round(self._counts[TIER_CACHE] / total, 4) if total else 0.0,
+                'rule_rate': round(self._counts[TIER_RULE] / total, 4) if total else 0.0,
+                'model_call_rate': round(self._counts[TIER_LLM] / total, 4) if total else 0.0,
+                'llm_failures': self.llm_failures,
+                'tiers': tiers,
+            }
+
+
+def _strip_question_words(text: str) -> str:
+    for _, pattern in _QUESTION_TYPE_PATTERNS:
+        text = pattern.sub(' ', text)
+    for word in FILLER_WORDS:
+        text = text.replace(word, ' ')
+    return ''.join(' ' if char in FILLER_CHARS else char for char in text)
+
+
+class RuleClassifier:
+    """基于 FAQ 词典与固定规则的问题分类器"""
+
+    MIN_TERM_LENGTH = 2
+    MAX_TERM_LENGTH = 12
+
+    def __init__(self):
+        # 词条 -> {主题: 权重}
+        self.terms: Dict[str, Dict[str, int]] = {}
+        # 归一化的 FAQ 问题 -> 主题
+        self.questions: Dict[str, str] = {}
+        self._lengths: List[int] = []
+
+    @classmethod
+    def build(cls, faqs: Iterable[Dict], domains: Iterable[Dict] = ()) -> 'RuleClassifier':
+        """
+        从 FAQ 与专业领域构建词典
+
+        Args:
+            faqs: FAQ 列表（question / category / tags / domain_id）
+            domains: 专业领域列表（id / name）
+
+        Returns:
+            分类器实例
+        """
+        classifier = cls()
+        domain_names = {}
+        for domain in domains or ():
+            name = (domain.get('name') or '').strip()
+            if name:
+                domain_names[domain.get('id')] = name
+                classifier._add_term(name, name)
+
+        for faq in faqs or ():
+            topic = domain_names.get(faq.get('domain_id')) or (faq.get('category') or '').strip() or 'general'
+            if faq.get('category'):
+                classifier._add_term(faq['category'], topic)
+            for tag in faq.get('tags') or ():
+                classifier._add_term(tag, topic)
+
+            question = normalize_query(faq.get('question') or '')
+            if not question:
+                continue
+            classifier.questions.setdefault(question, topic)
+            # 去掉疑问词与虚词后的片段作为关键词
+            for fragment in _strip_question_words(question).split():
+                classifier._add_term(fragment, topic)
+
+        classifier._lengths = sorted({len(term) for term in classifier.terms}, reverse=True)
+        return classifier
+
+    def _add_term(self, term: str, topic: str) -> None:
+        term = normalize_query(term)
+        if not self.MIN_TERM_LENGTH <= len(term) <= self.MAX_TERM_LENGTH:
+            return
+        topics = self.terms.setdefault(term, {})
+        topics[topic] = topics.get(topic, 0) + 1
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def _match_terms(self, text: str) -> List[Tuple[int, str]]:
+        """从左到右取最长匹配，返回 (起始位置, 词条)"""
+        matches = []
+        position = 0
+        while position < len(text):
+            for length in self._lengths:
+                term = text[position:position + length]
+                if len(term) == length and term in self.terms:
+                    matches.append((position, term))
+                    position += length
+                    break
+            else:
+                position += 1
+        return matches
+
+    def classify(self, normalized: str) -> Tuple[Dict, float]:
+        """
+        对归一化后的问题分类
+
+        Args:
+            normalized: normalize_query 的结果
+
+        Returns:
+            (解析结果, 置信度 0~1)
+        """
+        if not normalized:
+            return {'topic': 'unknown', 'keywords': [], 'question_type': 'general', 'sentiment': '中性'}, 0.0
+
+        covered = [False] * len(normalized)
+
+        question_type = 'general'
+        for name, pattern in _QUESTION_TYPE_PATTERNS:
+            found = list(pattern.finditer(normalized))
+            if not found:
+                continue
+            if question_type == 'general':
+                question_type = name
+            for match in found:
+                covered[match.start():match.end()] = [True] * (match.end() - match.start())
+
+        votes: Dict[str, int] = {}
+        keywords = []
+        for start, term in self._match_terms(normalized):
+            covered[start:start + len(term)] = [True] * len(term)
+            if term not in keywords:
+                keywords.append(term)
+            for topic, weight in self.terms[term].items():
+                votes[topic] = votes.get(topic, 0) + weight * len(term)
+
+        for index, char in enumerate(normalized):
+            if char in FILLER_CHARS:
+                covered[index] = True
+
+        sentiment = '中性'
+        if any(word in normalized for word in NEGATIVE_WORDS):
+            sentiment = '消极'
+        elif any(word in normalized for word in POSITIVE_WORDS):
+            sentiment = '积极'
+
+        exact_topic = self.questions.get(normalized)
+        if exact_topic:
+            topic = exact_topic
+        elif votes:
+            topic = max(votes.items(), key=lambda item: (item[1], item[0]))[0]
+        elif question_type == '问候':
+            topic = 'greeting'
+        else:
+            topic = 'unknown'
+
+        if exact_topic or (question_type == '问候' and all(covered)):
+            confidence = 1.0
+        else:
+            coverage = sum(covered) / len(normalized)
+            confidence = 0.7 * coverage + 0.15 * (question_type != 'general') + 0.15 * bool(votes)
+
+        return {
+            'topic': topic,
+            'keywords': keywords,
+            'question_type': question_type,
+            'sentiment': sentiment,
+        }, round(confidence, 3)
+
+
+class QueryUnderstanding:
+    """
+    问题理解入口：缓存 -> 规则 -> 大模型
+
+    返回的解析结果附带 parser（命中的层）与 confidence 字段
+    """
+
+    def __init__(self, knowledge_base=None, llm_parser: Callable[[str], Optional[Dict]] = None,
+                 threshold: float = RULE_CONFIDENCE_THRESHOLD,
+                 cache: QueryCache = None, refresh_seconds: float = CLASSIFIER_REFRESH_SECONDS):
+        """
+        Args:
+            knowledge_base: 提供 list_faq_terms / list_categories 的知识库管理器
+            llm_parser: 大模型解析函数，失败时返回 None
+            threshold: 规则结果的置信度阈值
+            cache: 问题缓存
+            refresh_seconds: 词典自动重建间隔
+        """
+        self.knowledge_base = knowledge_base
+        self.llm_parser = llm_parser
+        self.threshold = threshold
+        self.cache = cache or QueryCache()
+        self.refresh_seconds = refresh_seconds
+        self.metrics = QueryUnderstandingMetrics()
+        self._classifier: Optional[RuleClassifier] = None
+        self._built_at = 0.0
+        self._build_lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """FAQ 或专业领域变更后调用：清空缓存并在下次请求时重建词典"""
+        self.cache.clear()
+        self._built_at = 0.0
+        logger.info("[QUERY_UNDERSTANDING] 缓存已清空，词典将重建")
+
+    def _load_classifier(self) -> RuleClassifier:
+        faqs, domains = [], []
+        try:
+            if hasattr(self.knowledge_base, 'list_faq_terms'):
+                faqs = self.knowledge_base.list_faq_terms()
+            if hasattr(self.knowledge_base, 'list_categories'):
+                domains = self.knowledge_base.list_categories()
+        except Exception as e:
+            logger.warning(f"[QUERY_UNDERSTANDING] 加载 FAQ 词典失败：{e}")
+        start = time.perf_counter()
+        classifier = RuleClassifier.build(faqs, domains)
+        logger.info(f"[QUERY_UNDERSTANDING] 词典已构建：{len(faqs)} 条 FAQ，{len(domains)} 个领域，"
+                    f"{len(classifier)} 个词条，耗时 {(time.perf_counter() - start) * 1000:.1f}ms")
+        return classifier
+
+    @property
+    def classifier(self) -> RuleClassifier:
+        """当前词典；过期时由一个线程重建，其余线程继续使用旧词典"""
+        stale = time.monotonic() - self._built_at > self.refresh_seconds
+        if self._classifier is not None and not stale:
+            return self._classifier
+        blocking = self._classifier is None
+        if self._build_lock.acquire(blocking=blocking):
+            try:
+                if self._classifier is None or time.monotonic() - self._built_at > self.refresh_seconds:
+                    self._classifier = self._load_classifier()
+                    self._built_at = time.monotonic()
+            finally:
+                self._build_lock.release()
+        return self._classifier
+
+    def parse(self, query: str) -> Dict:
+        """
+        解析用户问题
+
+        Args:
+            query: 用户问题
+
+        Returns:
+            {topic, keywords, question_type, sentiment, parser, confidence}
+        """
+        start = time.perf_counter()
+        key = normalize_query(query)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.metrics.record(TIER_CACHE, time.perf_counter() - start)
+            return dict(cached, keywords=list(cached.get('keywords', [])), parser=TIER_CACHE)
+
+        parsed, confidence = self.classifier.classify(key)
+        tier = TIER_RULE
+        if confidence < self.threshold and self.llm_parser is not None:
+            llm_parsed = self.llm_parser(query)
+            if isinstance(llm_parsed, dict) and llm_parsed:
+                parsed = dict(llm_parsed)
+                tier = TIER_LLM
+            else:
+                self.metrics.record_llm_failure()
+
+        parsed['parser'] = tier
+        parsed['confidence'] = confidence
+        # 大模型失败时的低置信度规则结果不缓存，下次仍会尝试大模型
+        if tier == TIER_LLM or confidence >= self.threshold or self.llm_parser is None:
+            self.cache.put(key, parsed)
+        self.metrics.record(tier, time.perf_counter() - start)
+        return dict(parsed, keywords=list(parsed.get('keywords', [])))
+
+    def stats(self) -> Dict:
+        """命中率、各层耗时与缓存 / 词典规模"""
+        snapshot = self.metrics.snapshot()
+        snapshot['cache_size'] = len(self.cache)
+        snapshot['dictionary_terms'] = len(self._classifier) if self._classifier is not None else 0
+        snapshot['threshold'] = self.threshold
+        return snapshot
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+排班读模型（按日期窗口缓存 + Markdown 渲染记忆化）
+
+- 按日期窗口一次查询 roster（含 staff_config.staff_type），请求的范围不足 ROSTER_PREFETCH_DAYS 天时
+  向后预取，之后落在窗口内的子范围直接切片返回
+- 行在加载时按（日期, 时段顺序, 主班优先）排好，时段顺序用预先计算的字典查询
+- 渲染好的 Markdown 按（范围, 时段过滤, 今天日期）缓存，并记下渲染所用窗口的加载时间：窗口过期重新加载后
+  重新渲染，多个推送配置推送同一周期时只渲染一次
+- 生成排班、导入排班、删除排班后调用 invalidate 清除重叠的窗口与渲染结果；
+  其他进程写入的数据最多在 ROSTER_CACHE_TTL 秒后可见
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 窗口缓存有效期（秒）
+ROSTER_CACHE_TTL = int(os.getenv('ROSTER_CACHE_TTL', '60'))
+# 查询范围不足该天数时向后预取
+ROSTER_PREFETCH_DAYS = int(os.getenv('ROSTER_PREFETCH_DAYS', '7'))
+# 最多缓存的窗口数与渲染结果数
+MAX_WINDOWS = 32
+MAX_RENDERS = 256
+
+# 时段展示顺序（未列出的时段排在最后，按名称排序）
+TIME_SLOT_ORDER = [
+    '8:00～9:00',
+    '8:00～12:00',
+    '9:00～12:00',
+    '13:30～17:30',
+    '13:30～18:00',
+    '17:30～21:30',
+    '18:00～21:00'
+]
+_SLOT_RANK = {slot: rank for rank, slot in enumerate(TIME_SLOT_ORDER)}
+WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+SCHEDULE_VIEW_URL = "https://alidocs.dingtalk.com/i/nodes/20eMKjyp81LOavDgf46AORZwJxAZB1Gv?utm_scene=person_space&iframeQuery=viewId%3Drm8nwl6hqzo0v1952seh4%26sheetId%3Dhe1d5bovtjfxcies7i3fi"
+
+ROSTER_SQL = """
+SELECT r.*, sc.staff_type
+FROM roster r
+LEFT JOIN staff_config sc ON r.staff_name = sc.staff_name
+WHERE r.date BETWEEN %s AND %s
+"""
+
+
+def slot_rank(time_slot: str) -> int:
+    """时段排序序号"""
+    return _SLOT_RANK.get(time_slot, len(TIME_SLOT_ORDER))
+
+
+def date_key(value) -> str:
+    """日期统一为 YYYY-MM-DD 字符串"""
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)[:10]
+
+
+def load_roster_rows(start_date: str, end_date: str) -> List[Dict]:
+    """从数据库读取日期范围内的排班（查询失败抛出异常，避免把空结果写入缓存）"""
+    from routes.排班.paiBanNew_v2 import DB_CONFIG, RosterDB
+
+    db = RosterDB(DB_CONFIG)
+    if not db.connect():
+        raise ConnectionError("数据库连接失败")
+    try:
+        db.cursor.execute(ROSTER_SQL, (start_date, end_date))
+        return list(db.cursor.fetchall())
+    finally:
+        db.close()
+
+
+class _Window:
+    """一段连续日期的排班：日期 -> 已排序的行"""
+
+    __slots__ = ('start', 'end', 'days', 'loaded_at')
+
+    def __init__(self, start: str, end: str, rows: Iterable[Dict]):
+        self.start = start
+        self.end = end
+        self.loaded_at = time.monotonic()
+        days: Dict[str, List[Dict]] = {}
+        for row in rows:
+            days.setdefault(date_key(row['date']), []).append(row)
+        self.days = {
+            day: sorted(day_rows, key=lambda row: (slot_rank(row['time_slot']), row['time_slot'], not row['is_main']))
+            for day, day_rows in sorted(days.items())
+        }
+
+    def covers(self, start: str, end: str) -> bool:
+        return self.start <= start and end <= self.end
+
+    def overlaps(self, start: str, end: str) -> bool:
+        return self.start <= end and start <= self.end
+
+    def slice(self, start: str, end: str) -> List[Tuple[str, List[Dict]]]:
+        return [(day, rows) for day, rows in self.days.items() if start <= day <= end]
+
+
+class RosterReadModel:
+    """排班读模型"""
+
+    def __init__(self, loader: Callable[[str, str], List[Dict]] = None, ttl: float = ROSTER_CACHE_TTL,
+                 prefetch_days: int = ROSTER_PREFETCH_DAYS):
+        """
+        Args:
+            loader: (start_date, end_date) -> 行列表，默认查询 MySQL
+            ttl: 窗口缓存有效期（秒）
+            prefetch_days: 查询范围不足该天数时向后预取
+        """
+        self.loader = loader or load_roster_rows
+        self.ttl = ttl
+        self.prefetch_days = prefetch_days
+        self._windows: List[_Window] = []
+        self._renders: 'OrderedDict[tuple, Tuple[float, Optional[str]]]' = OrderedDict()  # 键 -> (窗口加载时间, 内容)
+        self._loading: Dict[Tuple[str, str], threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stats = {'window_hits': 0, 'window_loads': 0, 'render_hits': 0, 'renders': 0, 'invalidations': 0}
+
+    # ---------- 窗口 ----------
+
+    def _find_window(self, start: str, end: str) -> Optional[_Window]:
+        now = time.monotonic()
+        self._windows = [window for window in self._windows if now - window.loaded_at <= self.ttl]
+        for window in self._windows:
+            if window.covers(start, end):
+                return window
+        return None
+
+    def _window_for(self, start: str, end: str) -> _Window:
+        """返回覆盖 [start, end] 的窗口；同一窗口并发未命中时只查询一次"""
+        load_end = max(end, date_key(datetime.strptime(start, '%Y-%m-%d').date()
+                                     + timedelta(days=self.prefetch_days - 1)))
+        while True:
+            with self._lock:
+                window = self._find_window(start, end)
+                if window is not None:
+                    self._stats['window_hits'] += 1
+                    return window
+                pending = self._loading.get((start, load_end))
+                if pending is None:
+                    pending = self._loading[(start, load_end)] = threading.Event()
+                    break
+            pending.wait(timeout=30)
+
+        try:
+            rows = self.loader(start, load_end)
+            window = _Window(start, load_end, rows)
+            with self._lock:
+                self._windows.append(window)
+                del self._windows[:-MAX_WINDOWS]
+                self._stats['window_loads'] += 1
+            logger.debug(f"[ROSTER_CACHE] 加载 {start} ~ {load_end}：{len(rows)} 条")
+            return window
+        finally:
+            with self._lock:
+                self._loading.pop((start, load_end), None)
+            pending.set()
+
+    def get_days(self, start_date, end_date) -> List[Tuple[str, List[Dict]]]:
+        """按日期分组的排班 [(日期, 已排序的行)]"""
+        start, end = date_key(start_date), date_key(end_date)
+        return self._window_for(start, end).slice(start, end)
+
+    def get_records(self, start_date, end_date) -> List[Dict]:
+        """日期范围内的排班行，按日期、时段顺序、主班优先排序"""
+        return [row for _, rows in self.get_days(start_date, end_date) for row in rows]
+
+    def summary(self, start_date, end_date) -> Tuple[int, List[Dict]]:
+        """
+        排班概况
+
+        Returns:
+            (记录数, 去重后的 [{date, time_slot}]，按日期、时段名称排序)
+        """
+        count = 0
+        details = []
+        for _, rows in self.get_days(start_date, end_date):
+            count += len(rows)
+            seen = {}
+            for row in rows:
+                seen.setdefault(row['time_slot'], row['date'])
+            details.extend({'date': seen[slot], 'time_slot': slot} for slot in sorted(seen))
+        return count, details
+
+    # ---------- 渲染 ----------
+
+    def render_markdown(self, start_date, end_date, time_slots: Iterable[str] = None) -> Optional[str]:
+        """
+        渲染钉钉推送用的排班 Markdown
+
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期
+            time_slots: 只推送的时段，为空表示全部
+
+        Returns:
+            Markdown 文本；范围内没有排班时返回 None
+        """
+        start, end = date_key(start_date), date_key(end_date)
+        slots = tuple(sorted(set(time_slots))) if time_slots else None
+        today = date.today()
+        key = (start, end, slots, today)
+        window = self._window_for(start, end)
+        with self._lock:
+            cached = self._renders.get(key)
+            if cached is not None and cached[0] == window.loaded_at:
+                self._renders.move_to_end(key)
+                self._stats['render_hits'] += 1
+                return cached[1]
+
+        content = self._render(window.slice(start, end), slots, today)
+        with self._lock:
+            self._renders[key] = (window.loaded_at, content)
+            self._renders.move_to_end(key)
+            while len(self._renders) > MAX_RENDERS:
+                self._renders.popitem(last=False)
+            self._stats['renders'] += 1
+        return content
+
+    @staticmethod
+    def _render(days: List[Tuple[str, List[Dict]]], slots: Optional[Tuple[str, ...]], today: date) -> Optional[str]:
+        if not days:
+            return None
+        slot_filter = set(slots) if slots else None
+        parts = ["# 📅 排班信息推送\n\n"]
+        for day, rows in days:
+            if slot_filter is not None:
+                rows = [row for row in rows if row['time_slot'] in slot_filter]
+                if not rows:
+                    continue
+            date_obj = datetime.strptime(day, '%Y-%m-%d').date()
+            weekday = WEEKDAY_NAMES[date_obj.weekday()]
+            delta = (date_obj - today).days
+            if delta == 0:
+                date_label = f"**今天** {day} ({weekday})"
+            elif delta == 1:
+                date_label = f"**明天** {day} ({weekday})"
+            elif delta == -1:
+                date_label = f"**昨天** {day} ({weekday})"
+            else:
+                date_label = f"**{day}** ({weekday})"
+            parts.append(f"### {date_label}\n\n")
+
+            # 行已按时段顺序、主班优先排好，这里只需按时段合并
+            slot_staff: 'OrderedDict[str, List[str]]' = OrderedDict()
+            for row in rows:
+                slot_staff.setdefault(row['time_slot'], []).append(row['staff_name'])
+            for time_slot, staff in slot_staff.items():
+                parts.append(f"- **{time_slot}**: {'、'.join(staff) if staff else '空闲'}\n")
+            parts.append("\n---\n\n")
+        parts.append(f"[查看完整排班]({SCHEDULE_VIEW_URL})\n")
+        return ''.join(parts)
+
+    # ---------- 失效 ----------
+
+    def invalidate(self, start_date=None, end_date=None) -> None:
+        """排班写入后调用；不传日期时清空全部缓存"""
+        with self._lock:
+            self._stats['invalidations'] += 1
+            if start_date is None or end_date is None:
+                self._windows.clear()
+                self._renders.clear()
+                return
+            start, end = date_key(start_date), date_key(end_date)
+            self._windows = [window for window in self._windows if not window.overlaps(start, end)]
+            for key in [key for key in self._renders if key[0] <= end and start <= key[1]]:
+                del self._renders[key]
+        logger.info(f"[ROSTER_CACHE] 排班缓存已失效：{start} ~ {end}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, windows=len(self._windows), rendered=len(self._renders))
+
+
+# 全局排班读模型实例
+roster_read_model = RosterReadModel()
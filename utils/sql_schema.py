@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQL 生成器的表结构目录（解析、按需裁剪、本地校验、结果缓存）
+
+- 粘贴的 DDL（CREATE TABLE / COMMENT ON）或 JSON 表结构按内容哈希解析一次，结果缓存为结构化目录；
+  无法解析时退回原文（超过 SQL_SCHEMA_RAW_LIMIT 字符截断）
+- 按需求与表名、列名、注释的词重合度选出相关的表和列（中文按二字词、英文按下划线 / 驼峰拆词），
+  外键和 xxx_id 指向的表一并带上，提示词中只放这些表的精简摘要
+- 生成的 SQL 在内存 SQLite 副本上逐条 EXPLAIN，提前发现语法错误和不存在的表 / 列；
+  MySQL 的 INTERVAL、PostgreSQL 的 :: 类型转换等先改写，未知函数按任意参数的占位函数处理；
+  Oracle / 达梦 / SQL Server 语法差异太大，不做校验
+- 生成结果按（表结构哈希, 规范化后的需求, 数据库类型, SQL 类型, 是否优化）缓存，校验失败的结果不缓存
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 提示词中最多放几张表、列数不超过多少的表保留全部列
+SQL_SCHEMA_MAX_TABLES = int(os.getenv('SQL_SCHEMA_MAX_TABLES', '8'))
+SQL_SCHEMA_FULL_COLUMNS = int(os.getenv('SQL_SCHEMA_FULL_COLUMNS', '12'))
+# 无法解析的表结构原文最多放多少字符
+SQL_SCHEMA_RAW_LIMIT = int(os.getenv('SQL_SCHEMA_RAW_LIMIT', '12000'))
+# 缓存的表结构目录数
+SQL_SCHEMA_CACHE_SIZE = int(os.getenv('SQL_SCHEMA_CACHE_SIZE', '32'))
+# 生成结果缓存条数与有效期（秒）
+SQL_RESULT_CACHE_SIZE = int(os.getenv('SQL_RESULT_CACHE_SIZE', '256'))
+SQL_RESULT_CACHE_TTL = int(os.getenv('SQL_RESULT_CACHE_TTL', '86400'))
+
+# 可以在 SQLite 上校验的数据库类型
+VALIDATABLE_DIALECTS = {'mysql', 'postgresql', 'sqlite'}
+
+# 需求里常见、对选表没有帮助的词
+STOP_WORDS = {
+    '查询', '统计', '每个', '所有', '数据', '信息', '记录', '列表', '获取', '显示', '根据', '按照', '以及', '并且',
+    '需要', '一个', '最近', '前的', '的数', 'select', 'from', 'where', 'the', 'and', 'for', 'with', 'all', 'of',
+    'by', 'id', 'sql', 'table',
+}
+
+_CREATE_TABLE = re.compile(
+    r'CREATE\s+(?:GLOBAL\s+TEMPORARY\s+|TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([`"\[\]\w.]+)\s*\(',
+    re.IGNORECASE)
+_COMMENT_ON = re.compile(
+    r"COMMENT\s+ON\s+(TABLE|COLUMN)\s+([`\"\[\]\w.]+)\s+IS\s+'((?:[^']|'')*)'", re.IGNORECASE)
+_INLINE_COMMENT = re.compile(r"COMMENT\s*=?\s*'((?:[^']|'')*)'", re.IGNORECASE)
+_REFERENCES = re.compile(r'REFERENCES\s+([`"\[\]\w.]+)\s*\(\s*([`"\[\]\w]+)', re.IGNORECASE)
+_CONSTRAINT_PREFIX = re.compile(
+    r'(PRIMARY\s+KEY|FOREIGN\s+KEY|UNIQUE|KEY|INDEX|CONSTRAINT|CHECK|FULLTEXT|SPATIAL)\b', re.IGNORECASE)
+
+
+def schema_hash(table_structure: str) -> str:
+    return hashlib.sha256((table_structure or '').strip().encode('utf-8')).hexdigest()
+
+
+def _unquote(name: str) -> str:
+    name = name.strip().strip('`"[]')
+    return name.split('.')[-1].strip('`"[]')
+
+
+def _words(text: str) -> Set[str]:
+    """拆词：英文按下划线 / 驼峰 / 非字母数字拆分并去掉复数 s，中文连续片段拆成二字词"""
+    if not text:
+        return set()
+    words = set()
+    for token in re.findall(r'[A-Za-z][A-Za-z0-9]*', re.sub(r'([a-z0-9])([A-Z])', r'\1_\2', text)):
+        token = token.lower()
+        if len(token) < 2:
+            continue
+        if len(token) > 3 and token.endswith('s'):
+            token = token[:-1]
+        words.add(token)
+    for run in re.findall(r'[一-鿿]+', text):
+        if len(run) == 1:
+            words.add(run)
+        words.update(run[i:i + 2] for i in range(len(run) - 1))
+    return words - STOP_WORDS
+
+
+def _split_top_level(body: str) -> List[str]:
+    """按最外层逗号拆分（忽略括号与引号内的逗号）"""
+    parts, depth, quote, current = [], 0, None, []
+    for char in body:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '\'"`':
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if ''.join(current).strip():
+        parts.append(''.join(current).strip())
+    return parts
+
+
+def _matching_paren(text: str, start: int) -> int:
+    """start 为左括号之后的位置，返回对应右括号的位置（没有时返回 -1）"""
+    depth, quote = 1, None
+    for index in range(start, len(text)):
+        char = text[index]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '\'"`':
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return index
+    return -1
+
+
+def _new_table(name: str, comment: str = '') -> Dict:
+    return {'name': name, 'comment': comment, 'columns': [], 'primary_key': [], 'references': {}}
+
+
+def _new_column(name: str, data_type: str = '', comment: str = '') -> Dict:
+    return {'name': name, 'type': data_type, 'comment': comment}
+
+
+def parse_ddl(text: str) -> List[Dict]:
+    """解析 CREATE TABLE 语句（含 MySQL 行内 COMMENT 与 Oracle / PostgreSQL 的 COMMENT ON）"""
+    tables = OrderedDict()
+    for match in _CREATE_TABLE.finditer(text):
+        end = _matching_paren(text, match.end())
+        if end < 0:
+            continue
+        table_options = text[end + 1:text.find(';', end) if text.find(';', end) >= 0 else len(text)]
+        comment = _INLINE_COMMENT.search(table_options)
+        table = _new_table(_unquote(match.group(1)), comment.group(1).replace("''", "'") if comment else '')
+
+        for item in _split_top_level(text[match.end():end]):
+            constraint = _CONSTRAINT_PREFIX.match(item)
+            if constraint:
+                keyword = constraint.group(1).upper()
+                if 'PRIMARY' in keyword or ('CONSTRAINT' in keyword and 'PRIMARY KEY' in item.upper()):
+                    columns = re.search(r'PRIMARY\s+KEY\s*\(([^)]*)\)', item, re.IGNORECASE)
+                    if columns:
+                        table['primary_key'].extend(_unquote(name) for name in columns.group(1).split(','))
+                if 'FOREIGN KEY' in item.upper():
+                    columns = re.search(r'FOREIGN\s+KEY\s*\(([^)]*)\)', item, re.IGNORECASE)
+                    reference = _REFERENCES.search(item)
+                    if columns and reference:
+                        table['references'][_unquote(columns.group(1).split(',')[0])] = (
+                            _unquote(reference.group(1)), _unquote(reference.group(2)))
+                continue
+
+            column_match = re.match(r'([`"\[][^`"\]]+[`"\]]|[\w一-鿿]+)\s*(.*)', item, re.DOTALL)
+            if not column_match:
+                continue
+            name, rest = _unquote(column_match.group(1)), column_match.group(2)
+            type_match = re.match(r'([A-Za-z][\w ]*?(?:\([^)]*\))?)(?=\s|$)', rest.strip())
+            data_type = type_match.group(1).strip() if type_match else ''
+            column_comment = _INLINE_COMMENT.search(rest)
+            table['columns'].append(_new_column(
+                name, data_type, column_comment.group(1).replace("''", "'") if column_comment else ''))
+            if re.search(r'PRIMARY\s+KEY', rest, re.IGNORECASE):
+                table['primary_key'].append(name)
+            reference = _REFERENCES.search(rest)
+            if reference:
+                table['references'][name] = (_unquote(reference.group(1)), _unquote(reference.group(2)))
+        tables[table['name'].lower()] = table
+
+    for kind, target, comment in _COMMENT_ON.findall(text):
+        comment = comment.replace("''", "'")
+        parts = [_unquote(part) for part in target.split('.')]
+        if kind.upper() == 'TABLE':
+            table = tables.get(parts[-1].lower())
+            if table:
+                table['comment'] = comment
+        elif len(parts) >= 2:
+            table = tables.get(parts[-2].lower())
+            for column in (table or {}).get('columns', []):
+                if column['name'].lower() == parts[-1].lower():
+                    column['comment'] = comment
+    return list(tables.values())
+
+
+def _json_column(value, name: str = None) -> Optional[Dict]:
+    if isinstance(value, str):
+        return _new_column(name, value) if name else _new_column(value)
+    if isinstance(value, dict):
+        column_name = name or value.get('name') or value.get('column_name') or value.get('field')
+        if not column_name:
+            return None
+        return _new_column(str(column_name), str(value.get('type') or value.get('data_type') or ''),
+                           str(value.get('comment') or value.get('description') or ''))
+    return None
+
+
+def parse_json_schema(data) -> List[Dict]:
+    """
+    解析 JSON 表结构，支持：
+    - [{"name": 表名, "comment": ..., "columns": [{"name", "type", "comment"} | 列名] | {列名: 类型}}]
+    - {"tables": [...]}
+    - {表名: [列...] | {列名: 类型}}
+    """
+    if isinstance(data, dict) and isinstance(data.get('tables'), list):
+        data = data['tables']
+    if isinstance(data, dict):
+        data = [{'name': name, 'columns': columns} for name, columns in data.items()]
+    if not isinstance(data, list):
+        return []
+
+    tables = []
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        name = item.get('name') or item.get('table_name') or item.get('table')
+        if not name:
+            continue
+        table = _new_table(str(name), str(item.get('comment') or item.get('description') or ''))
+        columns = item.get('columns') or item.get('fields') or []
+        if isinstance(columns, dict):
+            parsed = [_json_column(value, str(key)) for key, value in columns.items()]
+        else:
+            parsed = [_json_column(value) for value in columns]
+        table['columns'] = [column for column in parsed if column]
+        for column in columns if isinstance(columns, list) else []:
+            if isinstance(column, dict) and (column.get('primary_key') or column.get('pk')):
+                table['primary_key'].append(column.get('name'))
+        tables.append(table)
+    return tables
+
+
+class SchemaCatalog:
+    """解析后的表结构目录"""
+
+    def __init__(self, tables: List[Dict], raw_text: str = ''):
+        self.tables = tables
+        self.raw_text = raw_text
+        self.hash = schema_hash(raw_text)
+        self._by_name = {table['name'].lower(): table for table in tables}
+        self._table_words = {}
+        self._column_words = {}
+        for table in tables:
+            key = table['name'].lower()
+            self._table_words[key] = _words(table['name']) | _words(table['comment'])
+            self._column_words[key] = [_words(column['name']) | _words(column['comment'])
+                                       for column in table['columns']]
+        self._sqlite_script = None
+
+    @classmethod
+    def parse(cls, table_structure: str) -> 'SchemaCatalog':
+        text = (table_structure or '').strip()
+        tables = []
+        if text[:1] in '[{':
+            try:
+                tables = parse_json_schema(json.loads(text))
+            except ValueError:
+                tables = []
+        if not tables:
+            tables = parse_ddl(text)
+        return cls(tables, text)
+
+    @property
+    def parsed(self) -> bool:
+        return bool(self.tables)
+
+    def table(self, name: str) -> Optional[Dict]:
+        return self._by_name.get((name or '').lower())
+
+    # ---------- 选表 ----------
+
+    def _linked_tables(self, table: Dict) -> List[str]:
+        """外键与 xxx_id 列指向的表"""
+        linked = [target for target, _ in table['references'].values()]
+        for column in table['columns']:
+            name = column['name'].lower()
+            if name.endswith('_id') and name != 'id':
+                prefix = name[:-3]
+                for candidate in (prefix, prefix + 's', prefix + 'es', 't_' + prefix):
+                    if candidate in self._by_name:
+                        linked.append(candidate)
+                        break
+        return [name for name in linked if name.lower() in self._by_name and name.lower() != table['name'].lower()]
+
+    def _key_column(self, table: Dict, column: Dict) -> bool:
+        name = column['name'].lower()
+        return (column['name'] in table['primary_key'] or name == 'id' or name.endswith('_id')
+                or column['name'] in table['references'])
+
+    def select(self, text: str, max_tables: int = SQL_SCHEMA_MAX_TABLES) -> List[Dict]:
+        """
+        选出与需求相关的表和列
+
+        Returns:
+            [{'table': 表, 'columns': 保留的列, 'omitted': 省略的列数}]，按相关度排序
+        """
+        query = _words(text)
+        mentioned = {word.lower() for word in re.findall(r'\w+', text or '')}
+        scored = []
+        for index, table in enumerate(self.tables):
+            key = table['name'].lower()
+            column_hits = [len(query & words) for words in self._column_words[key]]
+            score = 3 * len(query & self._table_words[key]) + sum(column_hits)
+            if key in mentioned:
+                score += 10
+            if score:
+                scored.append((-score, index, table, column_hits))
+        scored.sort(key=lambda item: (item[0], item[1]))
+
+        if not scored:
+            # 没有任何重合：按原顺序放前几张表
+            scored = [(0, index, table, [0] * len(table['columns']))
+                      for index, table in enumerate(self.tables[:max_tables])]
+
+        selected, seen = [], set()
+
+        def add(table, column_hits):
+            key = table['name'].lower()
+            if key in seen or len(selected) >= max_tables:
+                return
+            seen.add(key)
+            if len(table['columns']) <= SQL_SCHEMA_FULL_COLUMNS:
+                columns = list(table['columns'])
+            else:
+                columns = [column for column, hits in zip(table['columns'], column_hits)
+                           if hits or self._key_column(table, column)]
+            selected.append({'table': table, 'columns': columns, 'omitted': len(table['columns']) - len(columns)})
+
+        for _, _, table, column_hits in scored[:max_tables]:
+            add(table, column_hits)
+        # 关联表放在最后（只保留键列和命中的列）
+        for entry in list(selected):
+            for name in self._linked_tables(entry['table']):
+                linked = self._by_name[name.lower()]
+                add(linked, [len(query & words) for words in self._column_words[name.lower()]])
+        return selected
+
+    def digest(self, text: str, max_tables: int = SQL_SCHEMA_MAX_TABLES) -> str:
+        """提示词用的表结构摘要（无法解析时返回截断的原文）"""
+        if not self.parsed:
+            if len(self.raw_text) > SQL_SCHEMA_RAW_LIMIT:
+                return self.raw_text[:SQL_SCHEMA_RAW_LIMIT] + '\n-- （表结构过长，已截断）'
+            return self.raw_text
+
+        selected = self.select(text, max_tables)
+        lines = []
+        omitted = any(entry['omitted'] for entry in selected)
+        if len(selected) < len(self.tables) or omitted:
+            lines.append(f'-- 共 {len(self.tables)} 张表，以下为与需求相关的 {len(selected)} 张'
+                         + ('（部分列已省略）' if omitted else ''))
+        for entry in selected:
+            table = entry['table']
+            columns = []
+            for column in entry['columns']:
+                parts = [column['name']]
+                if column['type']:
+                    parts.append(column['type'])
+                if column['name'] in table['primary_key']:
+                    parts.append('PK')
+                reference = table['references'].get(column['name'])
+                if reference:
+                    parts.append(f'-> {reference[0]}.{reference[1]}')
+                if column['comment']:
+                    parts.append(column['comment'])
+                columns.append(' '.join(parts))
+            if entry['omitted']:
+                columns.append(f'...另有 {entry["omitted"]} 列')
+            title = f"{table['name']} {table['comment']}".strip()
+            lines.append(f"{title} ({', '.join(columns)})")
+        return '\n'.join(lines)
+
+    # ---------- 本地校验 ----------
+
+    def sqlite_script(self) -> str:
+        """SQLite 建表脚本（只有列名，不带类型与约束）"""
+        if self._sqlite_script is None:
+            statements = []
+            for table in self.tables:
+                if not table['columns']:
+                    continue
+                columns = ', '.join('"{}"'.format(column['name'].replace('"', '""')) for column in table['columns'])
+                statements.append('CREATE TABLE "{}" ({});'.format(table['name'].replace('"', '""'), columns))
+            self._sqlite_script = '\n'.join(statements)
+        return self._sqlite_script
+
+
+def split_statements(sql: str) -> List[str]:
+    """按分号拆分多条语句（忽略字符串与注释中的分号）"""
+    statements, current = [], ''
+    for piece in sql.split(';'):
+        current = f'{current};{piece}' if current else piece
+        if sqlite3.complete_statement(current + ';'):
+            if current.strip():
+                statements.append(current.strip())
+            current = ''
+    if current.strip():
+        statements.append(current.strip())
+    return [statement for statement in statements if re.sub(r'--[^\n]*|/\*.*?\*/', '', statement, flags=re.DOTALL).strip()]
+
+
+def _to_sqlite_syntax(statement: str) -> str:
+    """改写 SQLite 不支持但在 MySQL / PostgreSQL 中合法的写法"""
+    statement = re.sub(r"\bINTERVAL\s+('[^']*'|-?\d+)\s*(?:[A-Za-z_]+\b)?", r'\1', statement, flags=re.IGNORECASE)
+    statement = re.sub(r'::\s*[A-Za-z_][\w ]*?(\(\d+(?:,\s*\d+)?\))?(?=[\s,)]|$)', '', statement)
+    statement = re.sub(r'\bILIKE\b', 'LIKE', statement, flags=re.IGNORECASE)
+    statement = re.sub(r'\bSEPARATOR\s+\'[^\']*\'', '', statement, flags=re.IGNORECASE)
+    return statement
+
+
+_SCHEMA_ERROR = re.compile(r'no such (table|column): ')
+
+
+def validate_sql(catalog: SchemaCatalog, sql: str, database_type: str) -> Dict:
+    """
+    在内存 SQLite 副本上逐条 EXPLAIN 生成的 SQL
+
+    只有表或列不存在才判定为错误；其余失败多半是 SQLite 不支持的 MySQL / PostgreSQL 写法，
+    记为 skipped（附带错误信息），不触发修正也不影响缓存
+
+    Returns:
+        {'status': 'ok' | 'error' | 'skipped', 'error': 错误信息, 'statement': 出错 / 未能校验的语句}
+    """
+    if (database_type or '').lower() not in VALIDATABLE_DIALECTS:
+        return {'status': 'skipped', 'error': f'{database_type} 语法不做本地校验'}
+    if not catalog.parsed:
+        return {'status': 'skipped', 'error': '表结构无法解析'}
+    statements = split_statements(sql or '')
+    if not statements:
+        return {'status': 'error', 'error': '未找到 SQL 语句'}
+
+    conn = sqlite3.connect(':memory:')
+    unchecked = None
+    try:
+        conn.executescript(catalog.sqlite_script())
+        for statement in statements:
+            rewritten = _to_sqlite_syntax(statement)
+            for _ in range(20):
+                try:
+                    conn.execute('EXPLAIN ' + rewritten)
+                    break
+                except sqlite3.Error as e:
+                    message = str(e)
+                    if _SCHEMA_ERROR.match(message):
+                        return {'status': 'error', 'error': message, 'statement': statement}
+                    missing = re.match(r'no such function: (\w+)', message)
+                    if not missing:
+                        unchecked = unchecked or {'status': 'skipped', 'error': message, 'statement': statement}
+                        break
+                    # 数据库特有的函数：注册为接受任意参数的占位函数后重试
+                    conn.create_function(missing.group(1), -1, lambda *args: None)
+        return unchecked or {'status': 'ok', 'error': ''}
+    finally:
+        conn.close()
+
+
+# ==================== 缓存 ====================
+
+class SchemaCatalogCache:
+    """按表结构哈希缓存解析结果"""
+
+    def __init__(self, max_size: int = SQL_SCHEMA_CACHE_SIZE):
+        self.max_size = max_size
+        self._catalogs: 'OrderedDict[str, SchemaCatalog]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'parses': 0}
+
+    def get(self, table_structure: str) -> SchemaCatalog:
+        key = schema_hash(table_structure)
+        with self._lock:
+            catalog = self._catalogs.get(key)
+            if catalog is not None:
+                self._catalogs.move_to_end(key)
+                self._stats['hits'] += 1
+                return catalog
+
+        catalog = SchemaCatalog.parse(table_structure)
+        with self._lock:
+            self._catalogs[key] = catalog
+            self._stats['parses'] += 1
+            while len(self._catalogs) > self.max_size:
+                self._catalogs.popitem(last=False)
+        return catalog
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, size=len(self._catalogs))
+
+
+def normalize_requirement(requirement: str) -> str:
+    """需求规范化：合并空白、忽略大小写与结尾标点"""
+    return re.sub(r'\s+', ' ', (requirement or '').strip()).rstrip('。.！!？?；;').lower()
+
+
+class SqlResultCache:
+    """生成结果缓存（带有效期的 LRU）"""
+
+    def __init__(self, max_size: int = SQL_RESULT_CACHE_SIZE, ttl: float = SQL_RESULT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._results: 'OrderedDict[tuple, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def key(schema_key: str, requirement: str, database_type: str, sql_type: str, optimization: bool = True) -> tuple:
+        return (schema_key, normalize_requirement(requirement), (database_type or '').lower(),
+                (sql_type or '').lower(), bool(optimization))
+
+    def get(self, key: tuple) -> Optional[Dict]:
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._results.move_to_end(key)
+                self._stats['hits'] += 1
+                return dict(entry[1])
+            if entry is not None:
+                del self._results[key]
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, key: tuple, result: Dict) -> None:
+        with self._lock:
+            self._results[key] = (time.monotonic(), dict(result))
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, size=len(self._results))
+
+
+# 全局缓存实例
+schema_catalog_cache = SchemaCatalogCache()
+sql_result_cache = SqlResultCache()
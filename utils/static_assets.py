@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+前端构建产物（frontend/dist）静态资源服务
+
+- 首次请求时遍历一次构建目录建立文件索引，请求时只查字典，不再逐次 os.path.exists
+- 构建目录的签名（dist、dist/assets、index.html 的修改时间）最多每 STATIC_INDEX_CHECK_SECONDS 秒检查一次，
+  未命中时立即检查；重新构建（或启动后才构建）时自动重建索引
+- Vite 内容哈希命名的文件（assets/[name]-[hash].js）内容永不变化，返回一年 immutable 缓存
+- index.html 等非哈希文件返回 no-cache + 强 ETag，每次校验（304）
+- 按 Accept-Encoding 返回预压缩的 .br / .gz 兄弟文件；预压缩在前端构建后执行（npm run build 的 postbuild：
+  python -m utils.static_assets frontend/dist），运行时只建索引
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+import time
+
+from flask import send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 检查构建目录是否重新构建的间隔（秒）
+STATIC_INDEX_CHECK_SECONDS = float(os.getenv('STATIC_INDEX_CHECK_SECONDS', '5'))
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# 值得预压缩的文本类资源
+COMPRESSIBLE_EXTENSIONS = {'.js', '.mjs', '.css', '.html', '.svg', '.json', '.map', '.txt', '.xml', '.wasm'}
+# 小于该大小的文件压缩收益不明显
+MIN_COMPRESS_SIZE = 1024
+
+# 编码 -> 兄弟文件后缀（按优先级排列）
+ENCODING_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+
+# Vite 默认命名 [name]-[hash].[ext]，hash 为 8 位 base64url 字符
+HASHED_NAME_PATTERN = re.compile(r'[-.](?P<hash>[A-Za-z0-9_-]{8,})\.[A-Za-z0-9]+$')
+
+
+def is_hashed_filename(rel_path: str) -> bool:
+    """
+    判断是否为内容哈希命名的构建产物
+
+    只认 assets/ 目录下的文件，且 hash 段不能是纯小写单词（避免 vendor-element.js 之类误判）
+    """
+    if not rel_path.startswith('assets/'):
+        return False
+    match = HASHED_NAME_PATTERN.search(rel_path)
+    if not match:
+        return False
+    digest = match.group('hash')
+    return not digest.islower() or any(ch.isdigit() for ch in digest)
+
+
+def _compress_variants(path: str, data: bytes) -> None:
+    """生成缺失或过期的 .gz / .br 兄弟文件（原子写入）"""
+    source_mtime = os.stat(path).st_mtime_ns
+    compressors = [('.gz', lambda raw: gzip.compress(raw, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda raw: brotli.compress(raw, quality=11)))
+
+    for suffix, compress in compressors:
+        target = path + suffix
+        try:
+            if os.stat(target).st_mtime_ns >= source_mtime:
+                continue
+        except OSError:
+            pass
+        compressed = compress(data)
+        if len(compressed) >= len(data):
+            continue
+        tmp_path = f"{target}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, target)
+
+
+class StaticAssetIndex:
+    """
+    构建目录的内存文件索引
+
+    Args:
+        root: 构建目录（如 frontend/dist）
+        precompress: 建索引时是否为文本资源生成 .br / .gz（构建后的预压缩步骤使用，运行时不开启）
+        check_seconds: 检查构建目录签名的间隔
+    """
+
+    def __init__(self, root: str, precompress: bool = False, check_seconds: float = STATIC_INDEX_CHECK_SECONDS):
+        self.root = root
+        self.precompress = precompress
+        self.check_seconds = check_seconds
+        self._entries = {}
+        self._signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def _build_signature(self):
+        """构建目录签名：Vite 重新构建会替换 index.html 与 assets 下的文件，目录与文件的修改时间随之变化"""
+        signature = []
+        for path in (self.root, os.path.join(self.root, 'assets'), os.path.join(self.root, 'index.html')):
+            try:
+                signature.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def refresh(self, force_check: bool = False) -> bool:
+        """
+        构建目录签名变化时重建索引
+
+        Args:
+            force_check: 忽略检查间隔（未命中时使用）
+
+        Returns:
+            是否重建了索引
+        """
+        now = time.monotonic()
+        if not force_check and now < self._next_check:
+            return False
+        self._next_check = now + self.check_seconds
+        if self._build_signature() == self._signature:
+            return False
+        with self._build_lock:
+            # 并发请求同时发现变化时只重建一次
+            if self._build_signature() == self._signature:
+                return False
+            self.build()
+        return True
+
+    def build(self) -> int:
+        """
+        遍历构建目录建立索引（构建目录不存在时索引为空）
+
+        Returns:
+            索引的文件数
+        """
+        signature = self._build_signature()
+        entries = {}
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    if filename.endswith('.tmp'):
+                        continue
+                    full_path = os.path.join(dirpath, filename)
+                    rel_path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                    base, ext = os.path.splitext(full_path)
+                    # 预压缩兄弟文件挂到源文件条目下，不单独建条目
+                    if ext in ('.br', '.gz') and os.path.isfile(base):
+                        continue
+                    try:
+                        entries[rel_path] = self._make_entry(full_path, rel_path)
+                    except OSError as e:
+                        logger.warning(f"[STATIC] 索引文件失败 {rel_path}: {e}")
+
+        with self._lock:
+            self._entries = entries
+            self._signature = signature
+        hashed = sum(1 for entry in entries.values() if entry['hashed'])
+        logger.info(f"[STATIC] 索引 {self.root}: {len(entries)} 个文件（内容哈希 {hashed} 个）")
+        return len(entries)
+
+    def _make_entry(self, full_path: str, rel_path: str) -> dict:
+        with open(full_path, 'rb') as f:
+            data = f.read()
+
+        ext = os.path.splitext(full_path)[1].lower()
+        if self.precompress and ext in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+            try:
+                _compress_variants(full_path, data)
+            except OSError as e:
+                logger.warning(f"[STATIC] 预压缩失败 {rel_path}: {e}")
+
+        variants = {}
+        for encoding, suffix in ENCODING_SUFFIXES:
+            if os.path.isfile(full_path + suffix):
+                variants[encoding] = full_path + suffix
+
+        return {
+            'path': full_path,
+            'mimetype': mimetypes.guess_type(full_path)[0] or 'application/octet-stream',
+            'etag': hashlib.sha256(data).hexdigest()[:16],
+            'hashed': is_hashed_filename(rel_path),
+            'variants': variants,
+        }
+
+    def lookup(self, rel_path: str):
+        """按相对路径（不含开头的 /）查找索引条目，不存在返回 None"""
+        self.refresh()
+        return self._entries.get(rel_path.lstrip('/'))
+
+    def __contains__(self, rel_path):
+        return self.lookup(rel_path) is not None
+
+    def __len__(self):
+        self.refresh()
+        return len(self._entries)
+
+    def send(self, rel_path: str, request):
+        """
+        发送索引中的文件
+
+        Args:
+            rel_path: 相对构建目录的路径
+            request: 当前请求（读取 Accept-Encoding / 条件请求头）
+
+        Returns:
+            Response；文件不在索引中时返回 None
+        """
+        entry = self.lookup(rel_path)
+        if entry is None and self.refresh(force_check=True):
+            entry = self.lookup(rel_path)
+        if entry is None:
+            return None
+
+        path, etag, encoding = entry['path'], entry['etag'], None
+        for candidate, _ in ENCODING_SUFFIXES:
+            if candidate in entry['variants'] and request.accept_encodings[candidate] > 0:
+                encoding = candidate
+                path = entry['variants'][candidate]
+                # 不同编码是不同的表示，强 ETag 必须区分
+                etag = f"{etag}-{candidate}"
+                break
+
+        response = send_file(path, mimetype=entry['mimetype'], conditional=True, etag=etag, max_age=0)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if entry['variants']:
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = (
+            IMMUTABLE_CACHE_CONTROL if entry['hashed'] else REVALIDATE_CACHE_CONTROL
+        )
+        return response
+
+
+if __name__ == '__main__':
+    # 前端构建后预压缩：python -m utils.static_assets frontend/dist
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    for build_dir in sys.argv[1:] or ['frontend/dist']:
+        StaticAssetIndex(build_dir, precompress=True).build()
@@ -9,9 +9,10 @@ import re
 import logging
 import pandas as pd
 from typing import Dict, List, Optional, Tuple
-from docx import Document
 from pathlib import Path
 
+from utils.docx_reader import DocxReader, TABLE
+
 logger = logging.getLogger(__name__)
 
 
@@ -50,22 +51,20 @@ class WordDocumentParser:
         logger.info(f"[WORD_PARSER] 开始解析文档：{filepath}")
         
         try:
-            doc = Document(filepath)
-            logger.info(f"[WORD_PARSER] 文档加载成功，段落数：{len(doc.paragraphs)}, 表格数：{len(doc.tables)}")
-            
             # 重置状态
             self.reset_state()
             
-            # 用于跟踪当前段落索引，以便关联表格
-            para_index = 0
-            
-            # 遍历所有段落
-            for para in doc.paragraphs:
-                self._process_paragraph(para)
-                para_index += 1
+            # 按正文顺序读取，表格记录其前面的段落数作为实际位置
+            tables = []
+            for event in DocxReader(filepath):
+                if event.kind == TABLE:
+                    tables.append((self.para_index, event.rows))
+                else:
+                    self._process_paragraph(event)
+            logger.info(f"[WORD_PARSER] 文档读取完成，段落数：{self.para_index}, 表格数：{len(tables)}")
             
-            # 处理表格（将表格关联到最近的功能点）
-            self._process_tables(doc)
+            # 处理表格（将表格关联到所在位置之前最近的功能点）
+            self._process_tables(tables)
             
             logger.info(f"[WORD_PARSER] 解析完成，共提取 {len(self.data_rows)} 条功能点")
             return self.data_rows
@@ -85,19 +84,19 @@ class WordDocumentParser:
         self.para_index = 0  # 当前段落索引
         self.last_para_index = -1  # 记录最后一个处理的段落索引
     
-    def _process_tables(self, doc):
+    def _process_tables(self, tables: List[Tuple[int, List[List[str]]]]):
         """
         处理文档中的所有表格，将表格内容关联到对应的功能点
         
         策略：根据表格在文档中的实际位置，匹配到距离最近的功能点
         
         Args:
-            doc: Document 对象
+            tables: [(表格所在位置的段落索引, 单元格文本), ...]
         """
-        if not doc.tables:
+        if not tables:
             return
         
-        logger.info(f"[WORD_PARSER] 开始处理 {len(doc.tables)} 个表格...")
+        logger.info(f"[WORD_PARSER] 开始处理 {len(tables)} 个表格...")
         
         # 关键词映射表：表格内容关键词 -> 功能点名称关键词
         keyword_mapping = {
@@ -120,10 +119,10 @@ class WordDocumentParser:
         sorted_func_indices = sorted(func_point_by_index.keys())
         
         # 按顺序处理每个表格
-        for table_idx, table in enumerate(doc.tables):
+        for table_idx, (table_position, rows) in enumerate(tables):
             try:
                 # 提取表格内容
-                table_content = self._extract_table_content(table)
+                table_content = self._extract_table_content(rows)
                 
                 if not table_content:
                     continue
@@ -149,16 +148,7 @@ class WordDocumentParser:
                     logger.warning(f"[WORD_PARSER] ⚠️ 表格 {table_idx+1} 识别到关键词'{target_function_point}'但未找到匹配的功能点")
                     continue
                 
-                # 关键改进：估算表格的段落位置，然后找到距离最近的功能点
-                # 策略：表格通常紧跟在某个功能点之后
-                # 我们假设表格 table_idx 出现在大约 table_idx * (总段落数/总表格数) 的位置
-                # 更精确的方法：找到表格前后的功能点
-                
-                # 简化策略：按顺序匹配，每个表格匹配到它之后的第一个未使用的功能点
-                # 首先估算表格位置
-                estimated_table_position = (table_idx + 1) * (len(doc.paragraphs) // (len(doc.tables) + 1))
-                
-                # 找到距离表格最近且未被占用的功能点
+                # 表格通常紧跟在某个功能点之后：找到表格之前距离最近且未被占用的功能点
                 best_fp = None
                 best_distance = float('inf')
                 
@@ -171,8 +161,8 @@ class WordDocumentParser:
                     # 计算距离
                     fp_position = fp['index']
                     # 我们想要功能点在表格之前的
-                    if fp_position <= estimated_table_position:
-                        distance = estimated_table_position - fp_position
+                    if fp_position <= table_position:
+                        distance = table_position - fp_position
                         if distance < best_distance:
                             best_distance = distance
                             best_fp = fp
@@ -207,25 +197,25 @@ class WordDocumentParser:
                         else:
                             last_row['功能点描述'] = '[表格内容]\n' + table_content
                     
-                    logger.info(f"[WORD_PARSER] ✅ 表格 {table_idx+1} 关联到功能点：{best_fp['title']} (位置：{best_fp['index']}, 估算表格：{estimated_table_position})")
+                    logger.info(f"[WORD_PARSER] ✅ 表格 {table_idx+1} 关联到功能点：{best_fp['title']} (位置：{best_fp['index']}, 表格：{table_position})")
                     
             except Exception as e:
                 logger.error(f"[WORD_PARSER] ❌ 处理表格 {table_idx+1} 失败：{e}", exc_info=True)
     
-    def _extract_table_content(self, table) -> str:
+    def _extract_table_content(self, rows: List[List[str]]) -> str:
         """
         提取表格内容，转换为文本格式
         
         Args:
-            table: docx 表格对象
+            rows: 表格单元格文本（docx_reader 的 table 事件）
             
         Returns:
             表格内容的文本表示
         """
         lines = []
-        for i, row in enumerate(table.rows):
+        for row in rows:
             # 提取每一行的单元格内容
-            cells_text = [cell.text.strip() for cell in row.cells]
+            cells_text = [cell.strip() for cell in row]
             # 如果只有一个单元格，直接添加文本
             if len(cells_text) == 1:
                 lines.append(cells_text[0])
@@ -240,10 +230,10 @@ class WordDocumentParser:
         处理单个段落
         
         Args:
-            paragraph: docx 段落对象
+            paragraph: docx_reader 段落事件
         """
         text = paragraph.text.strip()
-        style = paragraph.style.name if paragraph.style else 'Normal'
+        style = paragraph.style or 'Normal'
         
         if not text:
             self.para_index += 1
@@ -335,7 +325,7 @@ class WordDocumentParser:
         
         Args:
             title: 功能点名称
-            paragraph: 段落对象
+            paragraph: docx_reader 段落事件
         """
         # 增加序号
         self.sequence_number += 1
@@ -379,7 +369,7 @@ class WordDocumentParser:
         提取功能点描述（纯文本，不包含图片）
         
         Args:
-            paragraph: docx 段落对象
+            paragraph: docx_reader 段落事件
             
         Returns:
             功能点描述文本（保留原始格式和换行）